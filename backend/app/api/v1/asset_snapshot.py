@@ -7,8 +7,9 @@ from app.models.asset_snapshot import AssetSnapshot, ExchangeRateSnapshot
 from sqlalchemy import desc, func
 import logging
 from app.services.asset_snapshot_service import extract_asset_snapshot, extract_exchange_rate_snapshot
+from app.utils.json_response import FastJSONResponse
 
-router = APIRouter(prefix="/snapshot", tags=["资产快照"])
+router = APIRouter(prefix="/snapshot", tags=["资产快照"], default_response_class=FastJSONResponse)
 
 @router.get("/assets")
 def get_asset_snapshots(
@@ -102,6 +103,7 @@ def get_asset_snapshots(
         
         filtered_data.append(r)
     
+    # Decimal/时间由 FastJSONResponse 直接序列化
     result = [{
         'id': r.id,
         'user_id': r.user_id,
@@ -110,20 +112,20 @@ def get_asset_snapshots(
         'asset_code': r.asset_code,
         'asset_name': r.asset_name,
         'currency': r.currency,
-        'balance': float(r.balance),
-        'balance_cny': float(r.balance_cny) if r.balance_cny else None,
-        'balance_usd': float(r.balance_usd) if r.balance_usd else None,
-        'balance_eur': float(r.balance_eur) if r.balance_eur else None,
-        'base_value': float(get_base_value(r)) if get_base_value(r) else None,
-        'snapshot_time': r.snapshot_time.isoformat(),
+        'balance': r.balance,
+        'balance_cny': r.balance_cny or None,
+        'balance_usd': r.balance_usd or None,
+        'balance_eur': r.balance_eur or None,
+        'base_value': get_base_value(r) or None,
+        'snapshot_time': r.snapshot_time,
         'extra': r.extra
     } for r in filtered_data]
     
-    return {
+    return FastJSONResponse({
         "success": True,
         "message": f"获取到 {len(result)} 条快照数据",
         "data": result
-    }
+    })
 
 @router.get("/assets/trend")
 def get_asset_trend(
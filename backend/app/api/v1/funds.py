@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Body, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import date
 import json
+from loguru import logger
 
 from app.utils.database import get_db
 from app.models.schemas import (
@@ -13,15 +14,20 @@ from app.models.schemas import (
     OperationQuery, BaseResponse, FundInfoCreate, FundInfo,
     FundListResponse, DCAPlanCreate, DCAPlanUpdate, DCAPlan,
     DCAPlanResponse, DCAPlanListResponse, PositionSummaryResponse,
-    PositionSummary
+    PositionSummary, DCABacktestRequest
 )
 from app.models.database import UserOperation, FundNav, FundDividend
-from app.services.fund_service import FundOperationService, FundInfoService, FundNavService, DCAService, FundDividendService
+from app.services.fund_service import FundOperationService, FundInfoService, FundNavService, DCAService, FundDividendService, PendingOperationConfirmer
 from app.services.fund_api_service import FundSyncService, FundAPIService
+from app.services.fund_nav_index import fund_nav_index
+from app.services.fund_dividend_cache import fund_dividend_cache
+from app.services import akshare_provider
+from app.utils.json_response import FastJSONResponse
+from app.services.dca_backtest_service import DCABacktestService
 from app.services.scheduler_service import scheduler_service
 from app.services.okx_api_service import OKXAPIService
 
-router = APIRouter()
+router = APIRouter(default_response_class=FastJSONResponse)
 
 
 @router.post("/operations", response_model=FundOperationResponse)
@@ -148,14 +154,15 @@ def get_fund_operations(
         for idx, op in enumerate(fund_operations):
             print(f"[调试] 返回第{idx+1}条: id={op.id}, asset_code={op.asset_code}, nav={op.nav}, latest_nav={getattr(op, 'latest_nav', None)}")
         
-        return FundOperationListResponse(
+        # 直接返回序列化好的响应，跳过 jsonable_encoder
+        return FastJSONResponse(FundOperationListResponse(
             success=True,
             message=f"获取到 {len(fund_operations)} 条记录",
             data=fund_operations,
             total=total,
             page=page,
             page_size=page_size
-        )
+        ))
     except Exception as e:
         print(f"[调试] API异常: {e}")
         import traceback
@@ -654,6 +661,22 @@ def get_dca_plans(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.get("/dca/plans/statistics", response_model=BaseResponse)
+def get_all_dca_statistics(
+    db: Session = Depends(get_db)
+):
+    """一次获取所有定投计划的统计信息（{plan_id: 统计}）"""
+    try:
+        stats = DCAService.get_all_dca_statistics(db)
+        return BaseResponse(
+            success=True,
+            message=f"获取到 {len(stats)} 个定投计划的统计信息",
+            data={str(plan_id): item for plan_id, item in stats.items()}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/dca/plans/{plan_id}", response_model=DCAPlanResponse)
 def get_dca_plan(
     plan_id: int,
@@ -791,36 +814,74 @@ def execute_dca_plan(
 def execute_all_dca_plans(
     db: Session = Depends(get_db)
 ):
-    """执行所有到期的定投计划"""
+    """执行所有到期的定投计划（批量执行，返回逐计划的执行报告）"""
     try:
-        operations = DCAService.check_and_execute_dca_plans(db)
+        report = DCAService.execute_due_plans(db)
+        executed_count = report["executed"]
         
         # 重新计算持仓（批量执行定投会产生多个操作记录）
-        try:
-            recalculate_result = FundOperationService.recalculate_all_positions(db)
-            if recalculate_result["success"]:
-                return BaseResponse(
-                    success=True,
-                    message=f"执行了 {len(operations)} 个定投计划，持仓已重新计算",
-                    data={"executed_count": len(operations)}
-                )
-            else:
-                return BaseResponse(
-                    success=True,
-                    message=f"执行了 {len(operations)} 个定投计划，但持仓重新计算失败",
-                    data={"executed_count": len(operations)}
-                )
-        except Exception as e:
-            print(f"重新计算持仓失败: {e}")
-            return BaseResponse(
-                success=True,
-                message=f"执行了 {len(operations)} 个定投计划，但持仓重新计算失败",
-                data={"executed_count": len(operations)}
-            )
+        recalculated = False
+        if executed_count:
+            try:
+                recalculated = FundOperationService.recalculate_all_positions(db)["success"]
+            except Exception as e:
+                print(f"重新计算持仓失败: {e}")
+        
+        message = f"执行了 {executed_count} 个定投计划"
+        if executed_count:
+            message += "，持仓已重新计算" if recalculated else "，但持仓重新计算失败"
+        return BaseResponse(
+            success=True,
+            message=message,
+            data={"executed_count": executed_count, **report}
+        )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/dca/backtest", response_model=BaseResponse)
+def backtest_dca_strategy(
+    request: DCABacktestRequest,
+    db: Session = Depends(get_db)
+):
+    """用历史净值回测定投参数（可传参数网格批量回测）"""
+    try:
+        result = DCABacktestService.backtest(
+            db, request.fund_code, request.start_date, request.end_date,
+            request.base_config, request.grid, request.sort_by
+        )
+        return BaseResponse(
+            success=True,
+            message=f"回测完成，共 {result['config_count']} 个参数组合",
+            data=result
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/dca/plans/{plan_id}/backtest", response_model=BaseResponse)
+def backtest_dca_plan(
+    plan_id: int,
+    start_date: date = Query(..., description="回测开始日期"),
+    end_date: Optional[date] = Query(None, description="回测结束日期，默认今天"),
+    sort_by: str = Query("xirr", description="结果排序指标"),
+    grid: Optional[Dict[str, List[Any]]] = Body(None, description="在计划参数基础上扫描的参数网格"),
+    db: Session = Depends(get_db)
+):
+    """以已有定投计划的参数回测（可叠加参数网格）"""
+    try:
+        result = DCABacktestService.backtest_plan(db, plan_id, start_date, end_date, grid, sort_by)
+        if result is None:
+            raise HTTPException(status_code=404, detail="定投计划不存在")
+        return BaseResponse(
+            success=True,
+            message=f"回测完成，共 {result['config_count']} 个参数组合",
+            data=result
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/dca/plans/{plan_id}/statistics", response_model=BaseResponse)
 def get_dca_statistics(
     plan_id: int,
@@ -856,14 +917,17 @@ def get_fund_nav_history_with_cache(
             # 使用统一的净值更新方法，避免重复
             count = FundNavService.force_update_nav_history(db, fund_code)
         
-        navs = db.query(FundNav).filter_by(fund_code=fund_code).order_by(FundNav.nav_date.desc()).all()
+        navs = db.query(
+            FundNav.id, FundNav.fund_code, FundNav.nav_date, FundNav.nav, FundNav.accumulated_nav, FundNav.source
+        ).filter_by(fund_code=fund_code).order_by(FundNav.nav_date.desc()).all()
+        # Decimal/日期由 FastJSONResponse 直接序列化
         data = [
             {
                 "id": nav.id,
                 "fund_code": nav.fund_code,
-                "nav_date": str(nav.nav_date),
-                "nav": float(nav.nav) if nav.nav else None,
-                "accumulated_nav": float(nav.accumulated_nav) if nav.accumulated_nav else None,
+                "nav_date": nav.nav_date,
+                "nav": nav.nav or None,
+                "accumulated_nav": nav.accumulated_nav or None,
                 "source": nav.source or "akshare"
             }
             for nav in navs
@@ -875,19 +939,23 @@ def get_fund_nav_history_with_cache(
             dividends = FundDividendService.get_dividends_by_fund(db, fund_code)
             
             # 合并分红数据到净值数据
-            dividend_map = {str(div.dividend_date): div for div in dividends}
+            dividend_map = {div.dividend_date: div for div in dividends}
             for item in data:
                 div = dividend_map.get(item['nav_date'])
                 if div is not None:
-                    item['dividend_amount'] = float(div.dividend_amount) if div.dividend_amount else None
-                    item['dividend_date'] = str(div.dividend_date) if div.dividend_date else None
-                    item['record_date'] = str(div.record_date) if div.record_date else None
+                    item['dividend_amount'] = div.dividend_amount or None
+                    item['dividend_date'] = div.dividend_date
+                    item['record_date'] = div.record_date
                 else:
                     item['dividend_amount'] = None
                     item['dividend_date'] = None
                     item['record_date'] = None
         
-        return BaseResponse(success=True, message=f"获取到 {len(data)} 条历史净值记录", data={"nav_history": data})
+        return FastJSONResponse({
+            "success": True,
+            "message": f"获取到 {len(data)} 条历史净值记录",
+            "data": {"nav_history": data}
+        })
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -904,40 +972,18 @@ def get_fund_dividends(
     try:
         from app.services.fund_service import FundDividendService
         
-        # 如果强制更新，先清空现有数据并从API重新拉取
+        # 如果强制更新，从全市场分红表缓存重新拉取后替换现有数据
         if force_update:
-            # 删除现有分红数据
-            db.query(FundDividend).filter(FundDividend.fund_code == fund_code).delete()
-            db.commit()
-            
-            # 从API拉取最新分红数据
-            import akshare as ak
-            import pandas as pd
             try:
                 print(f"[调试] 强制更新分红数据: {fund_code}")
-                df = ak.fund_fh_em()
-                df = df[df['基金代码'] == fund_code]
-                
-                if not df.empty:
-                    dividend_data = []
-                    for _, row in df.iterrows():
-                        try:
-                            dividend_data.append({
-                                'dividend_date': pd.to_datetime(row['权益登记日']).date(),
-                                'record_date': pd.to_datetime(row['权益登记日']).date(),
-                                'dividend_amount': float(row['分红']) if pd.notna(row['分红']) else 0,
-                                'total_dividend': None,
-                                'announcement_date': None
-                            })
-                        except Exception as e:
-                            print(f"[调试] 转换分红数据失败: {e}")
-                            continue
-                    
-                    if dividend_data:
-                        saved_count = FundDividendService.save_dividend_data(db, fund_code, dividend_data)
-                        print(f"[调试] 强制更新保存了 {saved_count} 条分红记录")
-                
+                # 同步接口在线程池中执行，这里直接阻塞等待分红表即可
+                dividend_data = fund_dividend_cache.get_fund_dividends(fund_code)
+                db.query(FundDividend).filter(FundDividend.fund_code == fund_code).delete()
+                db.commit()
+                saved_count = FundDividendService.save_dividend_data(db, fund_code, dividend_data)
+                print(f"[调试] 强制更新保存了 {saved_count} 条分红记录")
             except Exception as e:
+                db.rollback()
                 print(f"[调试] 强制更新分红数据失败: {e}")
         
         # 查询分红数据
@@ -966,6 +1012,23 @@ def get_fund_dividends(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/dividends/sync-held", response_model=BaseResponse)
+async def sync_held_fund_dividends(db: Session = Depends(get_db)):
+    """为所有持仓基金同步分红数据（共用一次全市场分红表下载）"""
+    try:
+        import asyncio
+        
+        result = await asyncio.to_thread(FundDividendService.sync_held_fund_dividends, db)
+        return BaseResponse(
+            success=True,
+            message=f"同步了 {result['fund_count']} 只持仓基金的分红数据，保存了 {result['saved_count']} 条记录",
+            data=result
+        )
+    except Exception as e:
+        logger.error(f"批量同步分红数据失败: {e}")
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/dividends/{fund_code}/sync", response_model=BaseResponse)
 async def sync_fund_dividends(
     fund_code: str,
@@ -973,54 +1036,12 @@ async def sync_fund_dividends(
 ):
     """同步基金分红数据"""
     try:
-        from app.services.fund_service import FundDividendService
-        import akshare as ak
-        import pandas as pd
-        
-        print(f"[调试] 开始同步分红数据: {fund_code}")
-        
-        # 使用异步方式拉取数据，避免阻塞
         import asyncio
-        import concurrent.futures
-        
-        def fetch_dividend_data():
-            try:
-                df = ak.fund_fh_em()
-                df = df[df['基金代码'] == fund_code]
-                return df
-            except Exception as e:
-                print(f"[调试] 拉取分红数据失败: {e}")
-                return pd.DataFrame()
-        
-        # 在线程池中执行akshare调用
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            loop = asyncio.get_event_loop()
-            df = await loop.run_in_executor(executor, fetch_dividend_data)
-        
-        if df.empty:
-            return BaseResponse(
-                success=True,
-                message="未找到分红数据",
-                data={"saved_count": 0}
-            )
         
-        # 转换数据格式
-        dividend_data = []
-        for _, row in df.iterrows():
-            try:
-                dividend_data.append({
-                    'dividend_date': pd.to_datetime(row['权益登记日']).date(),
-                    'record_date': pd.to_datetime(row['权益登记日']).date(),
-                    'dividend_amount': float(row['分红']) if pd.notna(row['分红']) else 0,
-                    'total_dividend': None,
-                    'announcement_date': None
-                })
-            except Exception as e:
-                print(f"[调试] 转换分红数据失败: {e}")
-                continue
+        print(f"[调试] 开始同步分红数据: {fund_code}")
         
-        # 保存到数据库
-        saved_count = FundDividendService.save_dividend_data(db, fund_code, dividend_data)
+        # 分红表下载和写库都是阻塞调用，放到线程中执行
+        saved_count = await asyncio.to_thread(FundDividendService.sync_fund_dividends, db, fund_code)
         
         print(f"[调试] 分红数据同步完成，保存了 {saved_count} 条记录")
         
@@ -1040,11 +1061,15 @@ def update_pending_operations(
 ):
     """更新所有待确认的定投操作记录"""
     try:
-        updated_count = DCAService.update_pending_operations(db)
+        report = PendingOperationConfirmer.run(db)
         return BaseResponse(
             success=True,
-            message=f"更新了 {updated_count} 条待确认的操作记录",
-            data={"updated_count": updated_count}
+            message=f"更新了 {report['confirmed']} 条待确认的操作记录",
+            data={
+                "updated_count": report["confirmed"],
+                "pending_count": report["pending"],
+                "by_fund": report["by_fund"]
+            }
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -1166,6 +1191,23 @@ def delete_plan_operations(
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/dca/plans/update-statistics", response_model=BaseResponse)
+def update_all_plan_statistics(
+    db: Session = Depends(get_db)
+):
+    """批量刷新所有定投计划的统计信息（一次聚合查询，同一事务提交）"""
+    try:
+        updated_count = DCAService.update_all_plan_statistics(db)
+        return BaseResponse(
+            success=True,
+            message=f"更新了 {updated_count} 个定投计划的统计信息",
+            data={"updated_count": updated_count}
+        )
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/dca/plans/{plan_id}/update-statistics", response_model=BaseResponse)
 def update_plan_statistics(
     plan_id: int,
@@ -1552,6 +1594,22 @@ def get_batch_latest_nav(
         print(f"[调试] 批量获取净值异常: {e}")
         raise HTTPException(status_code=400, detail=str(e)) 
 
+def _export_response(export_format: str, columns, row_chunks, filename_prefix: str):
+    """以流式响应返回导出文件"""
+    from fastapi.responses import StreamingResponse
+    from datetime import datetime
+    from app.services.fund_export_service import EXPORT_FORMATS, encode_rows
+    
+    extension, media_type = EXPORT_FORMATS[export_format]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{filename_prefix}_{timestamp}.{extension}"
+    return StreamingResponse(
+        encode_rows(export_format, columns, row_chunks),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
 @router.get("/operations/export-csv")
 def export_fund_operations_csv(
     fund_code: Optional[str] = Query(None, description="基金代码，不填则导出所有基金"),
@@ -1561,232 +1619,58 @@ def export_fund_operations_csv(
     include_nav: bool = Query(True, description="是否包含净值信息"),
     include_dividend: bool = Query(True, description="是否包含分红信息"),
     include_nav_check: bool = Query(True, description="是否包含净值匹配检查"),
+    format: str = Query("csv", description="导出格式: csv / csv.gz / parquet"),
     db: Session = Depends(get_db)
 ):
-    """导出基金操作记录为CSV文件，包含所有计算因素"""
-    from fastapi.responses import StreamingResponse
-    import csv
-    import io
-    from datetime import datetime
+    """导出基金操作记录（包含所有计算因素），按块流式输出，不限制行数"""
+    from app.services.fund_export_service import (
+        build_operations_query, iter_operation_rows, operation_columns, require_export_format
+    )
     
     try:
-        # 获取所有操作记录（不分页）
-        operations, total = FundOperationService.get_operations(
-            db=db,
-            fund_code=fund_code,
-            operation_type=operation_type,
-            start_date=start_date,
-            end_date=end_date,
-            page=1,
-            page_size=10000  # 获取大量数据
-        )
-        
-        if not operations:
-            raise HTTPException(status_code=404, detail="没有找到符合条件的操作记录")
-        
-        # 创建CSV文件
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # 写入CSV头部
-        headers = [
-            "操作ID", "操作日期", "平台", "资产类型", "操作类型", "基金代码", "基金名称",
-            "金额", "货币", "数量", "价格", "净值", "手续费", "策略", "情绪评分",
-            "标签", "备注", "状态", "定投计划ID", "定投执行类型", "创建时间", "更新时间"
-        ]
-        
-        # 如果需要包含净值信息，添加净值相关字段
-        if include_nav:
-            headers.extend([
-                "净值日期", "累计净值", "净值增长率", "净值来源"
-            ])
-        
-        # 如果需要包含分红信息，添加分红相关字段
-        if include_dividend:
-            headers.extend([
-                "分红日期", "分红金额", "总分红", "公告日期"
-            ])
-        
-        # 如果需要包含净值匹配检查，添加检查相关字段
-        if include_nav_check:
-            headers.extend([
-                "净值匹配检查", "预期净值日期", "实际净值日期", "匹配状态", "问题描述"
-            ])
-        
-        writer.writerow(headers)
-        
-        # 批量获取净值信息
-        fund_codes = list(set(op.asset_code for op in operations))
-        nav_map = {}
-        if include_nav and fund_codes:
-            for fund_code in fund_codes:
-                nav_records = FundNavService.get_nav_history(db, fund_code, days=365)
-                nav_map[fund_code] = {nav.nav_date: nav for nav in nav_records}
-        
-        # 批量获取分红信息
-        dividend_map = {}
-        if include_dividend and fund_codes:
-            for fund_code in fund_codes:
-                dividend_records = FundDividendService.get_dividends_by_fund(
-                    db, fund_code, start_date=start_date, end_date=end_date
-                )
-                dividend_map[fund_code] = {div.dividend_date: div for div in dividend_records}
-        
-        # 批量获取净值匹配检查结果
-        nav_check_map = {}
-        if include_nav_check:
-            from app.services.fund_service import NavMatchingCheckService
-            for operation in operations:
-                check_result = NavMatchingCheckService._check_single_operation(db, operation)
-                nav_check_map[operation.id] = check_result
-        
-        # 写入数据行
-        for operation in operations:
-            row = [
-                operation.id,
-                operation.operation_date.strftime("%Y-%m-%d %H:%M:%S") if operation.operation_date else "",
-                operation.platform,
-                operation.asset_type,
-                operation.operation_type,
-                operation.asset_code,
-                operation.asset_name,
-                float(operation.amount) if operation.amount else 0,
-                operation.currency,
-                float(operation.quantity) if operation.quantity else 0,
-                float(operation.price) if operation.price else 0,
-                float(operation.nav) if operation.nav else 0,
-                float(operation.fee) if operation.fee else 0,
-                operation.strategy or "",
-                operation.emotion_score or 0,
-                operation.tags or "",
-                operation.notes or "",
-                operation.status,
-                operation.dca_plan_id or "",
-                operation.dca_execution_type or "",
-                operation.created_at.strftime("%Y-%m-%d %H:%M:%S") if operation.created_at else "",
-                operation.updated_at.strftime("%Y-%m-%d %H:%M:%S") if operation.updated_at else ""
-            ]
-            
-            # 添加净值信息
-            if include_nav:
-                nav_date = operation.operation_date.date() if operation.operation_date else None
-                nav_info = nav_map.get(operation.asset_code, {}).get(nav_date) if nav_date else None
-                
-                row.extend([
-                    nav_info.nav_date.strftime("%Y-%m-%d") if nav_info and nav_info.nav_date else "",
-                    float(nav_info.accumulated_nav) if nav_info and nav_info.accumulated_nav else "",
-                    float(nav_info.growth_rate) if nav_info and nav_info.growth_rate else "",
-                    nav_info.source if nav_info else ""
-                ])
-            
-            # 添加分红信息
-            if include_dividend:
-                op_date = operation.operation_date.date() if operation.operation_date else None
-                dividend_info = dividend_map.get(operation.asset_code, {}).get(op_date) if op_date else None
-                
-                row.extend([
-                    dividend_info.dividend_date.strftime("%Y-%m-%d") if dividend_info and dividend_info.dividend_date else "",
-                    float(dividend_info.dividend_amount) if dividend_info and dividend_info.dividend_amount else "",
-                    float(dividend_info.total_dividend) if dividend_info and dividend_info.total_dividend else "",
-                    dividend_info.announcement_date.strftime("%Y-%m-%d") if dividend_info and dividend_info.announcement_date else ""
-                ])
-            
-            # 添加净值匹配检查信息
-            if include_nav_check:
-                check_result = nav_check_map.get(operation.id, {})
-                
-                row.extend([
-                    "✓" if check_result.get('is_correct', False) else "✗",
-                    check_result.get('expected_nav_date', ''),
-                    check_result.get('actual_nav_date', ''),
-                    check_result.get('status', ''),
-                    check_result.get('issue_description', '')
-                ])
-            
-            writer.writerow(row)
-        
-        # 准备文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        fund_suffix = f"_{fund_code}" if fund_code else "_all"
-        filename = f"fund_operations{fund_suffix}_{timestamp}.csv"
-        
-        # 返回CSV文件
-        output.seek(0)
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),  # 使用UTF-8-BOM确保Excel正确显示中文
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        print(f"导出CSV失败: {e}")
-        raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
+        require_export_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if build_operations_query(db, fund_code, operation_type, start_date, end_date).with_entities(UserOperation.id).first() is None:
+        raise HTTPException(status_code=404, detail="没有找到符合条件的操作记录")
+    
+    row_chunks = iter_operation_rows(
+        fund_code=fund_code,
+        operation_type=operation_type,
+        start_date=start_date,
+        end_date=end_date,
+        include_nav=include_nav,
+        include_dividend=include_dividend,
+        include_nav_check=include_nav_check
+    )
+    fund_suffix = f"_{fund_code}" if fund_code else "_all"
+    return _export_response(
+        format,
+        operation_columns(include_nav, include_dividend, include_nav_check),
+        row_chunks,
+        f"fund_operations{fund_suffix}"
+    )
 
 
 @router.get("/positions/export-csv")
 def export_fund_positions_csv(
+    format: str = Query("csv", description="导出格式: csv / csv.gz / parquet"),
     db: Session = Depends(get_db)
 ):
-    """导出基金持仓信息为CSV文件"""
-    from fastapi.responses import StreamingResponse
-    import csv
-    import io
-    from datetime import datetime
+    """导出基金持仓信息，按块流式输出"""
+    from app.models.database import AssetPosition
+    from app.services.fund_export_service import POSITION_COLUMNS, iter_position_rows, require_export_format
     
     try:
-        # 获取所有持仓信息
-        positions = FundOperationService.get_fund_positions(db)
-        
-        if not positions:
-            raise HTTPException(status_code=404, detail="没有找到持仓信息")
-        
-        # 创建CSV文件
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # 写入CSV头部
-        headers = [
-            "持仓ID", "平台", "资产类型", "基金代码", "基金名称", "货币",
-            "持仓数量", "平均成本", "当前价格", "当前价值", "总投入", "总盈亏", "盈亏率",
-            "最后更新时间"
-        ]
-        writer.writerow(headers)
-        
-        # 写入数据行
-        for position in positions:
-            row = [
-                position.id,
-                position.platform,
-                position.asset_type,
-                position.asset_code,
-                position.asset_name,
-                position.currency,
-                float(position.quantity) if position.quantity else 0,
-                float(position.avg_cost) if position.avg_cost else 0,
-                float(position.current_price) if position.current_price else 0,
-                float(position.current_value) if position.current_value else 0,
-                float(position.total_invested) if position.total_invested else 0,
-                float(position.total_profit) if position.total_profit else 0,
-                float(position.profit_rate) if position.profit_rate else 0,
-                position.last_updated.strftime("%Y-%m-%d %H:%M:%S") if position.last_updated else ""
-            ]
-            writer.writerow(row)
-        
-        # 准备文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"fund_positions_{timestamp}.csv"
-        
-        # 返回CSV文件
-        output.seek(0)
-        return StreamingResponse(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        print(f"导出持仓CSV失败: {e}")
-        raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
+        require_export_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if db.query(AssetPosition.id).filter(AssetPosition.asset_type == "基金").first() is None:
+        raise HTTPException(status_code=404, detail="没有找到持仓信息")
+    
+    return _export_response(format, POSITION_COLUMNS, iter_position_rows(), "fund_positions")
 
 
 @router.get("/nav/{fund_code}/estimate", response_model=BaseResponse)
@@ -1885,6 +1769,8 @@ def delete_nav_by_source(source: str, db: Session = Depends(get_db)):
         # 删除指定来源的数据
         deleted_count = db.query(FundNav).filter(FundNav.source == source).delete()
         db.commit()
+        # 批量删除不触发ORM事件，需手动使净值索引失效
+        fund_nav_index.invalidate()
         
         return BaseResponse(
             success=True,
@@ -1913,8 +1799,7 @@ def incremental_update_nav(fund_code: str, db: Session = Depends(get_db)):
         latest_date = latest_nav.nav_date if latest_nav else None
         
         # 使用akshare获取增量数据
-        import akshare as ak
-        df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
+        df = akshare_provider.fund_nav_history(fund_code)
         
         new_count = 0
         if not df.empty:
@@ -13,6 +13,7 @@ from datetime import datetime
 
 from app.services.mcp_client import MCPDatabaseClient, MCPQueryResult
 from app.services.chart_config_generator import ChartConfigGenerator, ChartConfig
+from app.services.query_cache import nl_query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,7 @@ class ChartGenerationResponse(BaseModel):
     data_points: Optional[int] = None
     error: Optional[str] = None
     method: str  # "mcp" 或 "template"
+    cache_hit: Optional[str] = None  # 命中的查询缓存层
 
 class HealthCheckResponse(BaseModel):
     """健康检查响应模型"""
@@ -119,7 +121,8 @@ async def generate_chart(request: ChartGenerationRequest):
             sql=query_result.sql,
             execution_time=execution_time,
             data_points=len(chart_config.data),
-            method=method
+            method=method,
+            cache_hit=query_result.cache_hit
         )
         
     except Exception as e:
@@ -170,6 +173,23 @@ async def get_example_questions():
         ]
     }
 
+@router.get("/cache-stats")
+async def get_query_cache_stats():
+    """获取自然语言查询缓存命中统计"""
+    return {
+        "success": True,
+        "data": nl_query_cache.get_stats()
+    }
+
+@router.post("/cache/clear")
+async def clear_query_cache():
+    """清空自然语言查询缓存"""
+    nl_query_cache.clear()
+    return {
+        "success": True,
+        "message": "查询缓存已清空"
+    }
+
 @router.post("/test-sql")
 async def test_sql_execution(sql: str):
     """测试SQL执行（开发用）"""
@@ -1,12 +1,15 @@
 """
 可扩展调度器管理API
 """
+import asyncio
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from loguru import logger
 
 from app.services.extensible_scheduler_service import ExtensibleSchedulerService
+from app.services.scheduler_leader import NotSchedulerLeaderError
+from app.services.task_run_store import task_run_store
 from app.models.schemas import BaseResponse
 
 router = APIRouter(prefix="/scheduler", tags=["调度器管理"])
@@ -23,6 +26,11 @@ def get_scheduler_service() -> ExtensibleSchedulerService:
     return extensible_scheduler
 
 
+def _not_leader_error(e: NotSchedulerLeaderError) -> HTTPException:
+    """非主节点上修改任务：返回409和主节点标识，由调用方改发到主节点"""
+    return HTTPException(status_code=409, detail={"message": str(e), "leader": e.leader})
+
+
 @router.get("/test")
 async def test_scheduler():
     """测试接口"""
@@ -167,6 +175,8 @@ async def create_job(job_config: Dict[str, Any]):
         service = get_scheduler_service()
         job_id = await service.create_job(job_config)
         return BaseResponse(success=True, message="任务创建成功", data={"job_id": job_id})
+    except NotSchedulerLeaderError as e:
+        raise _not_leader_error(e)
     except Exception as e:
         logger.error(f"创建任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -209,6 +219,8 @@ async def remove_job(job_id: str):
             return BaseResponse(success=True, message="任务移除成功")
         else:
             return BaseResponse(success=False, message="任务移除失败")
+    except NotSchedulerLeaderError as e:
+        raise _not_leader_error(e)
     except Exception as e:
         logger.error(f"移除任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -225,6 +237,8 @@ async def pause_job(job_id: str):
             return BaseResponse(success=True, message="任务暂停成功")
         else:
             return BaseResponse(success=False, message="任务暂停失败")
+    except NotSchedulerLeaderError as e:
+        raise _not_leader_error(e)
     except Exception as e:
         logger.error(f"暂停任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -241,6 +255,8 @@ async def resume_job(job_id: str):
             return BaseResponse(success=True, message="任务恢复成功")
         else:
             return BaseResponse(success=False, message="任务恢复失败")
+    except NotSchedulerLeaderError as e:
+        raise _not_leader_error(e)
     except Exception as e:
         logger.error(f"恢复任务失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -261,6 +277,60 @@ async def get_events(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/runs", response_model=BaseResponse)
+async def get_task_runs(
+    task_id: Optional[str] = Query(None, description="任务ID"),
+    status: Optional[str] = Query(None, description="执行状态: success / failed"),
+    limit: int = Query(50, ge=1, le=500, description="返回数量限制")
+):
+    """获取最近的任务执行记录（持久化，重启后仍可查询）"""
+    try:
+        runs = await asyncio.to_thread(task_run_store.get_recent_runs, task_id, status, limit)
+        return BaseResponse(success=True, message="获取任务执行记录成功", data={"runs": runs})
+    except Exception as e:
+        logger.error(f"获取任务执行记录失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/runs/trends", response_model=BaseResponse)
+async def get_task_run_trends(
+    task_id: Optional[str] = Query(None, description="任务ID"),
+    days: int = Query(30, ge=1, le=365, description="统计天数")
+):
+    """按任务和日期汇总执行次数、失败次数和耗时趋势"""
+    try:
+        trends = await asyncio.to_thread(task_run_store.get_duration_trends, task_id, days)
+        return BaseResponse(success=True, message="获取任务耗时趋势成功", data={"trends": trends})
+    except Exception as e:
+        logger.error(f"获取任务耗时趋势失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/leader", response_model=BaseResponse)
+async def get_leader_status():
+    """获取当前进程的调度主节点选举状态（只有主节点执行定时任务）"""
+    try:
+        service = get_scheduler_service()
+        return BaseResponse(success=True, message="获取主节点状态成功", data=service.get_leader_status())
+    except Exception as e:
+        logger.error(f"获取主节点状态失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/events/metrics", response_model=BaseResponse)
+async def get_event_metrics(
+    event_type: Optional[str] = Query(None, description="事件类型")
+):
+    """获取事件总线各订阅者的队列长度、丢弃数和分发耗时"""
+    try:
+        service = get_scheduler_service()
+        metrics = service.event_bus.get_metrics(event_type)
+        return BaseResponse(success=True, message="获取事件总线指标成功", data=metrics)
+    except Exception as e:
+        logger.error(f"获取事件总线指标失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/initialize", response_model=BaseResponse)
 async def initialize_scheduler():
     """初始化调度器"""
@@ -3,7 +3,9 @@
 """
 from typing import Dict, Any, Optional, List
 from datetime import datetime
+from contextlib import contextmanager
 import json
+import time
 from loguru import logger
 
 
@@ -19,6 +21,7 @@ class TaskContext:
         self.storage = None
         self.logger = logger
         self.start_time = datetime.now()
+        self.phase_timings: Dict[str, float] = {}  # 各阶段耗时（毫秒），写入任务执行记录
         
     def set_variable(self, key: str, value: Any):
         """设置运行时变量"""
@@ -32,6 +35,15 @@ class TaskContext:
         """获取配置参数"""
         return self.config.get(key, default)
         
+    @contextmanager
+    def phase(self, name: str):
+        """记录一个执行阶段的耗时: with context.phase("fetch"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+            
     def log(self, message: str, level: str = "INFO"):
         """记录日志"""
         if hasattr(self.logger, level.lower()):
@@ -49,6 +61,7 @@ class TaskResult:
         self.error = error
         self.events = events or []
         self.next_tasks = next_tasks or []
+        self.phase_timings: Dict[str, float] = {}
         self.timestamp = datetime.now()
         
     def add_event(self, event_type: str, event_data: Dict[str, Any] = None):
@@ -75,5 +88,6 @@ class TaskResult:
             "error": self.error,
             "events": self.events,
             "next_tasks": self.next_tasks,
+            "phase_timings": self.phase_timings,
             "timestamp": self.timestamp.isoformat()
         } 
\ No newline at end of file
@@ -1,81 +1,215 @@
 """
 事件总线系统
+
+- 事件历史使用环形缓冲区（deque），并按事件类型单独建索引，查询某类事件不再扫描全部历史
+- 每个订阅者有自己的异步队列和消费协程：publish 只负责入队，慢的处理器（如净值更新后的待确认操作更新）
+  不会拖慢发布事件的任务，也不会阻塞其他订阅者
+- 同步回调在线程池中执行（asyncio.to_thread），不占用事件循环；异步回调中的阻塞操作（数据库等）也应放进线程
+- 队列有上限，满了以后按订阅时指定的策略处理：
+    block       发布者等待队列有空位（背压，不丢事件，默认）
+    drop_oldest 丢弃队列中最旧的事件
+    drop_newest 丢弃新到的事件
+- 每个订阅者记录排队等待和处理耗时，供 /scheduler/events/metrics 查询
 """
 import asyncio
-from typing import Dict, List, Callable, Any, Optional
+import time
+from collections import deque
+from typing import Deque, Dict, List, Callable, Any, Optional
 from datetime import datetime
-import json
 from loguru import logger
 
+OVERFLOW_POLICIES = ("block", "drop_oldest", "drop_newest")
+
+
+class _Subscription:
+    """单个订阅者：队列、消费协程和分发耗时统计"""
+
+    def __init__(self, event_type: str, callback: Callable, max_queue: int, overflow: str):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"不支持的队列溢出策略: {overflow}")
+        self.event_type = event_type
+        self.callback = callback
+        self.name = getattr(callback, "__qualname__", repr(callback))
+        self.is_async = asyncio.iscoroutinefunction(callback)
+        self.overflow = overflow
+        self.max_queue = max_queue
+        # 队列在事件循环中首次发布时创建
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker: Optional[asyncio.Task] = None
+        self.delivered = 0
+        self.failed = 0
+        self.dropped = 0
+        self.wait_ms_total = 0.0
+        self.handle_ms_total = 0.0
+        self.handle_ms_max = 0.0
+        self.recent_latency_ms: Deque[float] = deque(maxlen=200)
+
+    def ensure_worker(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue(maxsize=self.max_queue)
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.create_task(self._run(), name=f"event:{self.event_type}:{self.name}")
+
+    async def offer(self, event: Dict[str, Any], published_at: float):
+        """按溢出策略入队"""
+        self.ensure_worker()
+        item = (event, published_at)
+        if self.overflow == "block":
+            await self.queue.put(item)
+            return
+        if self.queue.full():
+            self.dropped += 1
+            if self.overflow == "drop_newest":
+                return
+            self.queue.get_nowait()
+            self.queue.task_done()
+        self.queue.put_nowait(item)
+
+    async def _run(self):
+        while True:
+            event, published_at = await self.queue.get()
+            started = time.perf_counter()
+            try:
+                if self.is_async:
+                    await self.callback(event)
+                else:
+                    await asyncio.to_thread(self.callback, event)
+                self.delivered += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"事件处理失败: {self.event_type} -> {self.name}, 错误: {e}")
+            finally:
+                finished = time.perf_counter()
+                wait_ms = (started - published_at) * 1000
+                handle_ms = (finished - started) * 1000
+                self.wait_ms_total += wait_ms
+                self.handle_ms_total += handle_ms
+                self.handle_ms_max = max(self.handle_ms_max, handle_ms)
+                self.recent_latency_ms.append(wait_ms + handle_ms)
+                self.queue.task_done()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        processed = self.delivered + self.failed
+        recent = sorted(self.recent_latency_ms)
+        return {
+            "event_type": self.event_type,
+            "subscriber": self.name,
+            "overflow": self.overflow,
+            "queue_size": self.queue.qsize() if self.queue else 0,
+            "queue_max": self.max_queue,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "avg_wait_ms": round(self.wait_ms_total / processed, 2) if processed else None,
+            "avg_handle_ms": round(self.handle_ms_total / processed, 2) if processed else None,
+            "max_handle_ms": round(self.handle_ms_max, 2),
+            "p95_latency_ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2) if recent else None,
+        }
+
 
 class EventBus:
     """事件总线"""
-    
-    def __init__(self):
-        self._subscribers: Dict[str, List[Callable]] = {}
-        self._event_history: List[Dict[str, Any]] = []
-        self._max_history = 1000  # 最大历史记录数
-        
+
+    def __init__(self, max_history: int = 1000, max_history_per_type: int = 200,
+                 max_queue: int = 1000, overflow: str = "block"):
+        self._subscribers: Dict[str, List[_Subscription]] = {}
+        self._max_history = max_history  # 最大历史记录数
+        self._max_history_per_type = max_history_per_type  # 每类事件的最大历史记录数
+        self._event_history: Deque[Dict[str, Any]] = deque(maxlen=max_history)
+        self._history_by_type: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._default_max_queue = max_queue
+        self._default_overflow = overflow
+        self._published = 0
+
     async def publish(self, event_type: str, event_data: Dict[str, Any] = None):
-        """发布事件"""
+        """发布事件：记录历史并放入各订阅者队列，不等待处理完成"""
+        now = datetime.now()
         event = {
             "type": event_type,
             "data": event_data or {},
-            "timestamp": datetime.now().isoformat(),
-            "id": f"{event_type}_{datetime.now().timestamp()}"
+            "timestamp": now.isoformat(),
+            "id": f"{event_type}_{now.timestamp()}"
         }
-        
-        # 记录事件历史
+        published_at = time.perf_counter()
+        self._published += 1
+
+        # 记录事件历史（deque 满时自动淘汰最旧的记录）
         self._event_history.append(event)
-        if len(self._event_history) > self._max_history:
-            self._event_history.pop(0)
-            
+        history = self._history_by_type.get(event_type)
+        if history is None:
+            history = self._history_by_type[event_type] = deque(maxlen=self._max_history_per_type)
+        history.append(event)
+
         # 通知订阅者
-        if event_type in self._subscribers:
-            tasks = []
-            for callback in self._subscribers[event_type]:
-                try:
-                    if asyncio.iscoroutinefunction(callback):
-                        tasks.append(callback(event))
-                    else:
-                        callback(event)
-                except Exception as e:
-                    logger.error(f"事件处理失败: {event_type}, 错误: {e}")
-                    
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
-                
+        for subscription in list(self._subscribers.get(event_type, ())):
+            await subscription.offer(event, published_at)
+
         logger.debug(f"事件已发布: {event_type}")
-        
-    def subscribe(self, event_type: str, callback: Callable):
-        """订阅事件"""
-        if event_type not in self._subscribers:
-            self._subscribers[event_type] = []
-        self._subscribers[event_type].append(callback)
+
+    def subscribe(self, event_type: str, callback: Callable,
+                  max_queue: Optional[int] = None, overflow: Optional[str] = None):
+        """订阅事件，可为该订阅者单独指定队列长度和溢出策略"""
+        subscription = _Subscription(
+            event_type, callback,
+            max_queue or self._default_max_queue,
+            overflow or self._default_overflow
+        )
+        self._subscribers.setdefault(event_type, []).append(subscription)
         logger.debug(f"事件订阅: {event_type}")
-        
+
     def unsubscribe(self, event_type: str, callback: Callable):
         """取消订阅"""
-        if event_type in self._subscribers:
-            try:
-                self._subscribers[event_type].remove(callback)
+        for subscription in self._subscribers.get(event_type, []):
+            if subscription.callback == callback:
+                self._subscribers[event_type].remove(subscription)
+                if subscription.worker:
+                    subscription.worker.cancel()
                 logger.debug(f"事件取消订阅: {event_type}")
-            except ValueError:
-                pass
-                
+                return
+
+    async def wait_idle(self, timeout: Optional[float] = None):
+        """等待所有订阅者处理完已入队的事件"""
+        queues = [s.queue.join() for subs in self._subscribers.values() for s in subs if s.queue]
+        if queues:
+            await asyncio.wait_for(asyncio.gather(*queues), timeout)
+
+    async def close(self, timeout: float = 5.0):
+        """处理完队列中的事件（最多等待 timeout 秒）后停止所有消费协程"""
+        try:
+            await self.wait_idle(timeout)
+        except asyncio.TimeoutError:
+            logger.warning("事件总线关闭时仍有未处理的事件，已丢弃")
+        workers = [s.worker for subs in self._subscribers.values() for s in subs if s.worker]
+        for worker in workers:
+            worker.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+
     def get_event_history(self, event_type: str = None, limit: int = 100) -> List[Dict[str, Any]]:
         """获取事件历史"""
-        if event_type:
-            filtered_events = [e for e in self._event_history if e["type"] == event_type]
-            return filtered_events[-limit:]
-        return self._event_history[-limit:]
-        
+        history = self._history_by_type.get(event_type, ()) if event_type else self._event_history
+        return list(history)[-limit:]
+
     def get_subscribers(self, event_type: str = None) -> Dict[str, int]:
         """获取订阅者信息"""
         if event_type:
             return {event_type: len(self._subscribers.get(event_type, []))}
         return {k: len(v) for k, v in self._subscribers.items()}
-        
+
+    def get_metrics(self, event_type: str = None) -> Dict[str, Any]:
+        """获取各订阅者的队列和分发耗时统计"""
+        subscriptions = [
+            s for type_, subs in self._subscribers.items()
+            if event_type is None or type_ == event_type
+            for s in subs
+        ]
+        return {
+            "published": self._published,
+            "history_size": len(self._event_history),
+            "subscribers": [s.get_metrics() for s in subscriptions],
+        }
+
     def clear_history(self):
         """清空事件历史"""
-        self._event_history.clear() 
\ No newline at end of file
+        self._event_history.clear()
+        self._history_by_type.clear()
@@ -6,6 +6,7 @@ import inspect
 from typing import Dict, List, Any, Optional, Type
 from pathlib import Path
 import asyncio
+import time
 from loguru import logger
 
 from .base_plugin import BaseTaskPlugin, BaseTask
@@ -156,7 +157,9 @@ class PluginManager:
         """执行任务"""
         try:
             # 创建任务实例（可能会更新配置为默认配置）
+            started = time.perf_counter()
             task = await self.create_task_instance(task_id, config)
+            create_ms = round((time.perf_counter() - started) * 1000, 1)
             if not task:
                 return TaskResult(success=False, error=f"任务 {task_id} 创建失败")
                 
@@ -175,7 +178,13 @@ class PluginManager:
             context.event_bus = scheduler_service.event_bus
             
             # 执行任务
+            started = time.perf_counter()
             result = await task.execute(context)
+            result.phase_timings = {
+                "create_instance": create_ms,
+                **context.phase_timings,
+                "execute": round((time.perf_counter() - started) * 1000, 1),
+            }
             
             logger.info(f"任务 {task_id} 执行完成: {'成功' if result.success else '失败'}")
             return result
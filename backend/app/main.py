@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 from contextlib import asynccontextmanager
 import os
 from pathlib import Path
@@ -10,13 +10,67 @@ from app.settings import settings
 from app.utils.database import init_database, get_data_directory, get_database_path
 from app.api.v1 import funds, exchange_rates, wise, paypal, upload_db_router, logs, ibkr, scheduler, config, okx, aggregation, ai_analyst, asset_snapshot
 from app.services.extensible_scheduler_service import ExtensibleSchedulerService
+from app.services.http_clients import close_all as close_http_clients
 from app.utils.middleware import RequestLoggingMiddleware
 from app.utils.logger import log_system
+from app.utils.startup import startup_state
+
+
+def _run_database_diagnostics():
+    """PostgreSQL数据库诊断查询（只记录日志，使用应用共享的连接池）"""
+    from sqlalchemy import text
+    from app.utils.database import engine
+    
+    with engine.connect() as conn:
+        log_system("🔍 执行PostgreSQL数据库诊断查询...")
+        
+        # 查询1: 列出所有schema
+        result = conn.execute(text("SELECT schema_name FROM information_schema.schemata"))
+        schemas = [row[0] for row in result]
+        log_system(f"📋 所有schema: {schemas}")
+        
+        # 查询2: 列出public schema中的所有表
+        result = conn.execute(text("""
+            SELECT table_name, table_type 
+            FROM information_schema.tables 
+            WHERE table_schema = 'public'
+            ORDER BY table_name
+        """))
+        tables = [(row[0], row[1]) for row in result]
+        log_system(f"📋 public schema中的表: {len(tables)}个")
+        
+        # 查询3: 检查audit_log表是否存在
+        result = conn.execute(text("""
+            SELECT table_name, table_schema 
+            FROM information_schema.tables 
+            WHERE table_name = 'audit_log'
+        """))
+        audit_tables = [(row[0], row[1]) for row in result]
+        if audit_tables:
+            log_system(f"✅ audit_log表存在: {audit_tables}")
+        else:
+            log_system("❌ audit_log表不存在")
+
+
+def _prewarm_caches():
+    """预热首个请求会用到的缓存：AI分析师数据包、收益分析"""
+    from app.services.analyst_bundle_service import analyst_bundle_service
+    from app.services.return_analytics_service import return_analytics_service
+    from app.utils.database import get_db_context
+    
+    # 首次获取时同步构建数据包
+    analyst_bundle_service.get("CNY", "asset-data")
+    with get_db_context() as db:
+        return_analytics_service.analyze(db)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """应用生命周期管理"""
+    """应用生命周期管理
+
+    只有数据库初始化是接收请求前必须完成的，调度器加载插件/任务、数据库诊断和缓存预热
+    都在就绪后作为后台任务执行，各阶段耗时见 /health/ready。
+    """
     global extensible_scheduler
     
     # 启动时执行
@@ -26,66 +80,34 @@ async def lifespan(app: FastAPI):
     is_railway = os.getenv("RAILWAY_ENVIRONMENT") is not None
     log_system(f"运行环境: {'Railway' if is_railway else '本地/其他'}")
     
-
-    init_database()
+    await startup_state.run_phase("database", init_database)
     
-    # 初始化可扩展调度器
+    # 初始化可扩展调度器（只创建实例，插件和任务在后台加载）
     extensible_scheduler = ExtensibleSchedulerService()
     
-    # 生产环境延迟启动定时任务，避免启动时阻塞
+    startup_state.mark_ready()
+    log_system("应用启动完成")
+    
     if os.environ.get("ENABLE_SCHEDULER", "true").lower() == "true":
-        log_system("正在启动可扩展定时任务...")
-        await extensible_scheduler.initialize()
+        log_system("正在后台启动可扩展定时任务...")
+        startup_state.run_in_background("scheduler", extensible_scheduler.initialize)
     else:
         log_system("定时任务已禁用")
     
-    log_system("应用启动完成")
-    
     # 在应用启动完成后执行数据库诊断查询
     if is_railway and os.getenv("DATABASE_URL", "").startswith("postgresql://"):
-        try:
-            from sqlalchemy import create_engine, text
-            database_url = os.getenv("DATABASE_URL")
-            engine = create_engine(database_url, echo=False)
-            
-            with engine.connect() as conn:
-                log_system("🔍 执行PostgreSQL数据库诊断查询...")
-                
-                # 查询1: 列出所有schema
-                result = conn.execute(text("SELECT schema_name FROM information_schema.schemata"))
-                schemas = [row[0] for row in result]
-                log_system(f"📋 所有schema: {schemas}")
-                
-                # 查询2: 列出public schema中的所有表
-                result = conn.execute(text("""
-                    SELECT table_name, table_type 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                    ORDER BY table_name
-                """))
-                tables = [(row[0], row[1]) for row in result]
-                log_system(f"📋 public schema中的表: {len(tables)}个")
-                
-                # 查询3: 检查audit_log表是否存在
-                result = conn.execute(text("""
-                    SELECT table_name, table_schema 
-                    FROM information_schema.tables 
-                    WHERE table_name = 'audit_log'
-                """))
-                audit_tables = [(row[0], row[1]) for row in result]
-                if audit_tables:
-                    log_system(f"✅ audit_log表存在: {audit_tables}")
-                else:
-                    log_system("❌ audit_log表不存在")
-                    
-        except Exception as e:
-            log_system(f"⚠️  数据库诊断查询失败: {e}")
+        startup_state.run_in_background("database_diagnostics", _run_database_diagnostics)
+    
+    if settings.startup_prewarm_caches:
+        startup_state.run_in_background("cache_prewarm", _prewarm_caches)
     
     yield
     
     # 关闭时执行
+    await startup_state.cancel_background()
     log_system("正在停止定时任务...")
     await extensible_scheduler.shutdown()
+    await close_http_clients()
     log_system("应用正在关闭...")
 
 
@@ -307,6 +329,43 @@ async def health_check():
         "database": db_info
     }
 
+@app.get("/health/live")
+async def liveness_check():
+    """存活检查：进程能处理请求即返回200，不访问数据库"""
+    return {"status": "alive", "timestamp": datetime.now().isoformat()}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """就绪检查：关键启动阶段完成且数据库可用时返回200，否则503；附带各启动阶段耗时"""
+    import asyncio
+    from sqlalchemy import text
+    from app.utils.database import engine
+    
+    status = startup_state.get_status()
+    database_ok = False
+    if startup_state.ready:
+        def _ping():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        try:
+            await asyncio.to_thread(_ping)
+            database_ok = True
+        except Exception as e:
+            status["database_error"] = str(e)[:100]
+    
+    ready = startup_state.ready and database_ok
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "timestamp": datetime.now().isoformat(),
+            "database": database_ok,
+            **status
+        }
+    )
+
+
 @app.get("/health/data")
 async def health_data_check():
     """数据健康检查"""
@@ -371,7 +371,10 @@ Index('idx_ibkr_positions_symbol', IBKRPosition.symbol)
 Index('idx_ibkr_positions_date', IBKRPosition.snapshot_date)
 Index('idx_ibkr_sync_logs_status', IBKRSyncLog.status)
 Index('idx_ibkr_sync_logs_date', IBKRSyncLog.created_at)
-Index('idx_ibkr_sync_logs_account', IBKRSyncLog.account_id) 
+Index('idx_ibkr_sync_logs_account', IBKRSyncLog.account_id)
+# 同步写入使用 ON CONFLICT DO NOTHING 的冲突目标
+Index('uq_ibkr_balances_account_time', IBKRBalance.account_id, IBKRBalance.snapshot_time, unique=True)
+Index('uq_ibkr_positions_account_symbol_time', IBKRPosition.account_id, IBKRPosition.symbol, IBKRPosition.snapshot_time, unique=True)
 
 # OKX相关模型
 class OKXBalance(Base):
@@ -582,4 +585,26 @@ class Web3Transaction(Base):
         UniqueConstraint('transaction_hash', name='uq_web3_transaction'),
     )
 
-# OKX索引 - 这些索引已经在__table_args__中定义，这里不需要重复定义 
\ No newline at end of file
+# OKX索引 - 这些索引已经在__table_args__中定义，这里不需要重复定义 
+
+class TaskRun(Base):
+    """调度任务执行记录表（由调度器异步写入）"""
+    __tablename__ = "task_runs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String(100), nullable=False)
+    execution_id = Column(String(50), nullable=False, unique=True)
+    trigger = Column(String(20), nullable=False, default="scheduled")  # scheduled / manual
+    status = Column(String(20), nullable=False)  # success / failed
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    duration_ms = Column(Integer, nullable=False)
+    rows_affected = Column(Integer)  # 任务结果中的处理条数，没有则为空
+    error = Column(Text)
+    phase_timings = Column(Text)  # JSON: 各阶段耗时（毫秒）
+    created_at = Column(DateTime, default=func.now())
+    
+    __table_args__ = (
+        Index('idx_task_runs_task_started', 'task_id', 'started_at'),
+        Index('idx_task_runs_started', 'started_at'),
+    )
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Dict, Literal
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -245,6 +245,34 @@ class DCAPlan(DCAPlanBase):
         from_attributes = True
 
 
+class DCABacktestConfig(BaseModel):
+    """单个定投回测配置（base_config 与参数网格合并后逐个校验），字段含义同定投计划"""
+    amount: float = Field(1000.0, gt=0, description="定投金额")
+    frequency: Literal["daily", "weekly", "monthly", "custom"] = Field("monthly", description="频率，custom 按 frequency_value 天")
+    frequency_value: int = Field(1, ge=1, description="频率值")
+    smart_dca: bool = False
+    base_amount: Optional[float] = Field(None, gt=0, description="智能定投基础金额，默认等于 amount")
+    max_amount: Optional[float] = Field(None, gt=0)
+    increase_rate: Optional[float] = Field(None, ge=0)
+    min_nav: Optional[float] = Field(None, gt=0)
+    max_nav: Optional[float] = Field(None, gt=0)
+    fee_rate: float = Field(0.0, ge=0, lt=1)
+    nav_window: int = Field(30, ge=1, description="智能定投均值窗口（与 DCAService._calculate_smart_amount 一致）")
+
+    class Config:
+        extra = "forbid"
+
+
+class DCABacktestRequest(BaseModel):
+    """定投回测请求：base_config 为基础参数，grid 为要扫描的参数网格"""
+    fund_code: str
+    start_date: date
+    end_date: Optional[date] = None
+    base_config: Dict[str, Any] = Field(default_factory=dict, description="基础参数，字段同定投计划（amount、frequency、smart_dca、increase_rate等）")
+    grid: Optional[Dict[str, List[Any]]] = Field(None, description="参数网格，如 {\"increase_rate\": [0.5, 1, 2]}")
+    sort_by: str = Field("xirr", description="结果排序指标: xirr, twr, total_return, profit, final_value（降序）; max_drawdown, volatility, cost_vs_avg_nav, avg_cost, total_fee（升序）")
+
+
 # 操作历史查询模型
 class OperationQuery(BaseModel):
     platform: Optional[str] = None
@@ -487,6 +515,7 @@ class IBKRSyncResponse(BaseModel):
     received_at: str
     records_updated: dict
     sync_id: Optional[int] = None
+    ingest_ms: Optional[float] = None  # 余额+持仓+同步日志入库耗时（毫秒）
     errors: List[str] = Field(default_factory=list)
 
 
@@ -1,14 +1,13 @@
 """
 数字货币汇率缓存任务
 """
-from typing import Dict, Any, List
+from typing import List
 from datetime import datetime
 from app.core.base_plugin import BaseTask
 from app.core.context import TaskContext, TaskResult
 from app.services.okx_api_service import OKXAPIService
 from app.models.database import OKXBalance, OKXMarketData
 from app.utils.database import SessionLocal
-from sqlalchemy import and_
 
 
 class CryptoExchangeRateCacheTask(BaseTask):
@@ -52,49 +51,27 @@ class CryptoExchangeRateCacheTask(BaseTask):
                 
                 context.log(f"需要查询的币种对: {currency_pairs}")
                 
-                # 3. 批量获取汇率数据
+                # 3. 一次请求获取全部行情，内存中筛选后批量写入
+                tickers = await okx_service.get_tickers_map(currency_pairs)
+                sync_time = datetime.now()
+                rows = [okx_service.ticker_to_market_data(tickers[pair], sync_time) for pair in currency_pairs if pair in tickers]
+                failed_pairs = [pair for pair in currency_pairs if pair not in tickers]
+                
                 cached_count = 0
-                failed_pairs = []
+                try:
+                    cached_count = okx_service.save_market_data(db, rows)
+                except Exception as e:
+                    db.rollback()
+                    failed_pairs = currency_pairs
+                    context.log(f"保存汇率到数据库失败: {e}", "ERROR")
                 
-                for pair in currency_pairs:
-                    try:
-                        # 获取行情数据
-                        ticker_data = await okx_service.get_ticker(pair)
-                        
-                        if ticker_data and ticker_data.get('code') == '0' and ticker_data.get('data'):
-                            ticker = ticker_data['data'][0]
-                            
-                            # 提取汇率信息
-                            rate_data = {
-                                'inst_id': pair,
-                                'inst_type': 'SPOT',  # 添加必需的inst_type字段
-                                'last_price': float(ticker.get('last', 0)),
-                                'bid_price': float(ticker.get('bidPx', 0)),
-                                'ask_price': float(ticker.get('askPx', 0)),
-                                'high_24h': float(ticker.get('high24h', 0)),
-                                'low_24h': float(ticker.get('low24h', 0)),
-                                'volume_24h': float(ticker.get('vol24h', 0)),
-                                'timestamp': datetime.now()
-                            }
-                            
-                            # 保存到数据库
-                            success = self._save_market_data(db, rate_data)
-                            if success:
-                                cached_count += 1
-                                context.log(f"成功缓存 {pair} 汇率: {rate_data['last_price']}")
-                                
-                                # 设置运行时变量
-                                context.set_variable(f'crypto_rate_{pair}', rate_data['last_price'])
-                            else:
-                                failed_pairs.append(pair)
-                                context.log(f"保存 {pair} 汇率到数据库失败", "WARNING")
-                        else:
-                            failed_pairs.append(pair)
-                            context.log(f"获取 {pair} 行情数据失败", "WARNING")
-                            
-                    except Exception as e:
-                        failed_pairs.append(pair)
-                        context.log(f"处理 {pair} 汇率时出错: {e}", "ERROR")
+                if cached_count:
+                    for row in rows:
+                        # 设置运行时变量
+                        context.set_variable(f"crypto_rate_{row['inst_id']}", row['last_price'])
+                    context.log(f"成功缓存 {cached_count} 个币种对汇率")
+                if failed_pairs:
+                    context.log(f"未获取到行情的币种对: {failed_pairs}", "WARNING")
                 
                 # 4. 清理过期缓存数据
                 cleaned_count = self._cleanup_expired_cache(db, cache_duration)
@@ -151,39 +128,6 @@ class CryptoExchangeRateCacheTask(BaseTask):
             # 这里不能使用context.log，因为是在类方法中
             return []
     
-    def _save_market_data(self, db, rate_data: Dict[str, Any]) -> bool:
-        """保存市场数据到数据库"""
-        try:
-            # 检查是否已存在相同时间戳的数据
-            existing = db.query(OKXMarketData).filter(
-                and_(
-                    OKXMarketData.inst_id == rate_data['inst_id'],
-                    OKXMarketData.inst_type == rate_data['inst_type'],
-                    OKXMarketData.timestamp == rate_data['timestamp']
-                )
-            ).first()
-            
-            if existing:
-                # 更新现有记录
-                existing.last_price = rate_data['last_price']
-                existing.bid_price = rate_data['bid_price']
-                existing.ask_price = rate_data['ask_price']
-                existing.high_24h = rate_data['high_24h']
-                existing.low_24h = rate_data['low_24h']
-                existing.volume_24h = rate_data['volume_24h']
-            else:
-                # 创建新记录
-                market_data = OKXMarketData(**rate_data)
-                db.add(market_data)
-            
-            db.commit()
-            return True
-            
-        except Exception as e:
-            db.rollback()
-            # 这里不能使用context.log，因为是在类方法中
-            return False
-    
     def _cleanup_expired_cache(self, db, cache_duration: int) -> int:
         """清理过期的缓存数据"""
         try:
@@ -2,7 +2,6 @@
 定投计划执行任务
 """
 from typing import Dict, Any
-from datetime import date
 from app.core.base_plugin import BaseTask
 from app.core.context import TaskContext, TaskResult
 from app.services.fund_service import DCAService
@@ -30,36 +29,40 @@ class DCAExecuteTask(BaseTask):
                 # 检查并执行到期的定投计划
                 if dry_run:
                     context.log("试运行模式：只检查不执行")
-                    # 在试运行模式下，只检查计划状态
-                    all_plans = DCAService.get_dca_plans(db, status="active")
-                    context.log(f"找到 {len(all_plans)} 个活跃的定投计划")
+                    # 在试运行模式下，只统计到期的计划
+                    due_count = DCAService.count_due_plans(db, plan_ids or None)
+                    context.log(f"找到 {due_count} 个到期的定投计划")
                     
                     result_data = {
                         'executed_count': 0,
-                        'total_count': len(all_plans),
+                        'total_count': due_count,
                         'failed_plans': [],
                         'dry_run': True
                     }
                 else:
-                    # 实际执行定投计划
-                    executed_operations = DCAService.check_and_execute_dca_plans(db)
+                    # 实际执行定投计划（批量执行，同一事务提交）
+                    report = DCAService.execute_due_plans(db, plan_ids or None)
+                    # 批量执行器的分阶段耗时一并写入任务执行记录
+                    context.phase_timings.update(report['timings'])
                     
-                    context.log(f"执行了 {len(executed_operations)} 个定投操作")
+                    context.log(f"执行了 {report['executed']} 个定投操作，耗时 {report['timings']['total_ms']}ms")
                     
                     result_data = {
-                        'executed_count': len(executed_operations),
-                        'total_count': len(executed_operations),
-                        'failed_plans': [],
+                        'executed_count': report['executed'],
+                        'total_count': len(report['plans']),
+                        'failed_plans': [item['plan_id'] for item in report['plans'] if item['status'] == 'failed'],
                         'dry_run': False,
                         'operations': [
                             {
-                                'id': op.id,
-                                'operation_type': op.operation_type,
-                                'asset_code': op.asset_code,
-                                'amount': float(op.amount) if op.amount else 0,
-                                'status': op.status
-                            } for op in executed_operations
-                        ]
+                                'id': item['operation_id'],
+                                'operation_type': 'buy',
+                                'asset_code': item['asset_code'],
+                                'amount': item['amount'] or 0,
+                                'status': item['status']
+                            } for item in report['plans'] if item['status'] != 'failed'
+                        ],
+                        'plans': report['plans'],
+                        'timings': report['timings']
                     }
                 
                 context.log(f"定投计划执行任务完成，成功执行 {result_data['executed_count']} 个操作")
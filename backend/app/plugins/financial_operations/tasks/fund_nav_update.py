@@ -7,6 +7,7 @@ from app.core.base_plugin import BaseTask
 from app.core.context import TaskContext, TaskResult
 from app.services.fund_service import FundOperationService, FundNavService
 from app.services.fund_api_service import FundAPIService
+from app.services import akshare_provider
 from app.utils.database import get_db
 import logging
 
@@ -56,9 +57,8 @@ class FundNavUpdateTask(BaseTask):
                         context.log(f"开始更新基金 {fund_code} 净值")
                         
                         # 调用akshare获取最新净值数据
-                        import akshare as ak
                         # 使用 fund_open_fund_info_em 获取基金净值走势
-                        df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
+                        df = akshare_provider.fund_nav_history(fund_code)
                         
                         if not df.empty:
                             # 获取最新的一条数据（最后一行）
@@ -0,0 +1,57 @@
+"""
+akshare 数据提供者（懒加载）
+
+akshare 导入时会连带导入 pandas、requests、lxml 等大量模块，耗时明显。
+应用启动（包括健康检查触发的重启）时大部分请求根本用不到 akshare，
+因此所有 akshare 调用都集中在这里，第一次真正调用时才导入。
+
+其他模块不要在模块顶层 import akshare / pandas，scripts/profile_import_time.py 会检查这一点。
+"""
+
+import logging
+import threading
+from types import ModuleType
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_akshare: Optional[ModuleType] = None
+_lock = threading.Lock()
+
+
+def get_akshare() -> ModuleType:
+    """返回 akshare 模块，首次调用时导入"""
+    global _akshare
+    if _akshare is None:
+        with _lock:
+            if _akshare is None:
+                import time
+                started = time.perf_counter()
+                import akshare
+                _akshare = akshare
+                logger.info(f"akshare 已加载，耗时 {(time.perf_counter() - started) * 1000:.0f}ms")
+    return _akshare
+
+
+def is_loaded() -> bool:
+    return _akshare is not None
+
+
+def fund_nav_history(fund_code: str):
+    """开放式基金单位净值走势（DataFrame，列：净值日期、单位净值、日增长率）"""
+    return get_akshare().fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
+
+
+def fund_dividend_table():
+    """全市场基金分红表（DataFrame）"""
+    return get_akshare().fund_fh_em()
+
+
+def boc_exchange_rates():
+    """中国银行外汇牌价（DataFrame）"""
+    return get_akshare().currency_boc_sina()
+
+
+def fx_spot_history():
+    """外汇即期历史报价（DataFrame）"""
+    return get_akshare().currency_hist_fx_spot()
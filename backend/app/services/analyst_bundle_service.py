@@ -0,0 +1,658 @@
+"""
+AI分析师数据包服务
+
+AI分析师接口（资产、交易、历史、市场、定投）的数据按基准货币预先构建成"数据包"：
+每个接口的默认参数结果提前序列化为JSON并gzip压缩，附带ETag。
+快照抽取、同步任务等事件发生后在后台重建，外部分析师客户端轮询时直接返回内存中的字节。
+"""
+
+import gzip
+import hashlib
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+from app.config.exchange_rates import get_fallback_exchange_rate
+from app.models.asset_snapshot import AssetSnapshot, ExchangeRateSnapshot
+from app.models.database import DCAPlan, FundInfo, FundNav, UserOperation
+from app.settings import settings
+from app.utils.json_response import dumps
+from app.utils.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# 数据包覆盖的默认参数（与接口Query默认值一致）
+DEFAULT_TRANSACTION_LIMIT = 1000
+DEFAULT_HISTORY_DAYS = 90
+
+# 预先构建数据包的基准货币，与快照表的 balance_cny/balance_usd/balance_eur 字段对应；
+# 其他基准货币不缓存，由接口按请求实时换算（避免任意请求参数让数据包无限增长）
+BUNDLED_BASE_CURRENCIES = ("CNY", "USD", "EUR")
+
+
+# ---- 数据构建 ----
+
+def _convert_to_base(
+    amount: float,
+    currency: str,
+    base_currency: str,
+    rate_cache: Dict[str, Tuple[Optional[float], bool]]
+) -> Tuple[Optional[float], bool]:
+    """按币种缓存汇率后换算为基准货币，返回 (换算金额, 是否使用了默认汇率)
+
+    汇率换算是线性的，同一次构建内每个币种只查询一次实时汇率，而不是每条快照查询一次。
+    """
+    if currency not in rate_cache:
+        rate, used_fallback = None, False
+        try:
+            from app.services.exchange_rate_service import ExchangeRateService
+            rate = ExchangeRateService.convert_currency(1.0, currency, base_currency)
+        except Exception as e:
+            logger.warning(f"实时汇率转换失败: {currency} -> {base_currency}, 错误: {e}")
+        if rate is None:
+            rate, used_fallback = get_fallback_exchange_rate(1.0, currency, base_currency)
+            if rate is not None:
+                logger.warning(f"使用备用汇率: {currency} -> {base_currency} = {rate}")
+        rate_cache[currency] = (rate, used_fallback)
+
+    rate, used_fallback = rate_cache[currency]
+    if rate is None:
+        return None, False
+    return amount * rate, used_fallback
+
+
+def build_asset_data(db: Session, base_currency: str, include_small_amounts: bool) -> Optional[Dict[str, Any]]:
+    """构建当前资产持仓数据，没有快照时返回None"""
+    latest_snapshot_time = db.query(func.max(AssetSnapshot.snapshot_time)).scalar()
+    if not latest_snapshot_time:
+        return None
+
+    # 使用前后5分钟时间窗口获取快照数据，避免精确时间匹配导致的数据缺失
+    latest_snapshots = db.query(AssetSnapshot).filter(
+        AssetSnapshot.snapshot_time >= latest_snapshot_time - timedelta(minutes=5),
+        AssetSnapshot.snapshot_time <= latest_snapshot_time + timedelta(minutes=5)
+    ).all()
+
+    balance_field = f"balance_{base_currency.lower()}"
+    min_amount = 0.0 if include_small_amounts else 0.01
+    rate_cache: Dict[str, Tuple[Optional[float], bool]] = {}
+
+    current_holdings = []
+    total_by_currency: Dict[str, float] = {}
+    platform_totals: Dict[str, Dict[str, Any]] = {}
+    asset_type_totals: Dict[str, Dict[str, Any]] = {}
+    fallback_count = 0
+
+    for snapshot in latest_snapshots:
+        balance_original = float(snapshot.balance)
+        extra = dict(snapshot.extra or {})
+
+        base_value = getattr(snapshot, balance_field, None)
+        if base_value is not None:
+            base_value = float(base_value)
+        else:
+            # 目标货币字段不存在时通过汇率转换
+            converted_value, used_fallback = _convert_to_base(
+                balance_original, snapshot.currency, base_currency, rate_cache
+            )
+            if converted_value is not None:
+                base_value = converted_value
+                if used_fallback:
+                    fallback_count += 1
+                    extra_data = dict(extra.get('extra_data') or {})
+                    extra_data['used_fallback_rate'] = True
+                    extra_data['fallback_rate_note'] = f"使用默认汇率转换 {snapshot.currency} -> {base_currency}"
+                    extra['extra_data'] = extra_data
+            else:
+                # 所有方法都失败时使用原始值，并标记为未转换
+                logger.error(f"所有汇率转换方法都失败: {balance_original} {snapshot.currency} -> {base_currency}")
+                base_value = balance_original
+                extra_data = dict(extra.get('extra_data') or {})
+                extra_data['conversion_warning'] = f"汇率转换失败，显示原始{snapshot.currency}金额"
+                extra['extra_data'] = extra_data
+
+        # 过滤小额资产
+        if base_value < min_amount:
+            continue
+
+        current_holdings.append({
+            "id": snapshot.id,
+            "platform": snapshot.platform,
+            "asset_type": snapshot.asset_type,
+            "asset_code": snapshot.asset_code,
+            "asset_name": snapshot.asset_name,
+            "currency": snapshot.currency,
+            "balance_original": balance_original,
+            "balance_cny": float(snapshot.balance_cny) if snapshot.balance_cny else 0,
+            "balance_usd": float(snapshot.balance_usd) if snapshot.balance_usd else 0,
+            "balance_eur": float(snapshot.balance_eur) if snapshot.balance_eur else 0,
+            "base_currency_value": base_value,
+            "snapshot_time": snapshot.snapshot_time.isoformat(),
+            "extra_data": extra
+        })
+
+        currency = snapshot.currency
+        total_by_currency[currency] = total_by_currency.get(currency, 0) + base_value
+
+        platform = platform_totals.setdefault(snapshot.platform, {"count": 0, "value": 0, "currencies": set()})
+        platform["count"] += 1
+        platform["value"] += base_value
+        platform["currencies"].add(currency)
+
+        asset_type = asset_type_totals.setdefault(snapshot.asset_type, {"count": 0, "value": 0, "assets": set()})
+        asset_type["count"] += 1
+        asset_type["value"] += base_value
+        asset_type["assets"].add(snapshot.asset_code)
+
+    platform_summary = [
+        {
+            "platform": name,
+            "asset_count": data["count"],
+            "total_value": data["value"],
+            "currencies": list(data["currencies"])
+        }
+        for name, data in platform_totals.items()
+    ]
+    asset_type_summary = [
+        {
+            "asset_type": name,
+            "asset_count": data["count"],
+            "total_value": data["value"],
+            "unique_assets": len(data["assets"])
+        }
+        for name, data in asset_type_totals.items()
+    ]
+
+    warnings = []
+    if fallback_count > 0:
+        warnings.append(f"⚠️ 有 {fallback_count} 项资产使用了默认汇率进行转换，可能与实时汇率存在差异")
+
+    return {
+        "current_holdings": current_holdings,
+        "total_value_by_currency": total_by_currency,
+        "platform_summary": platform_summary,
+        "asset_type_summary": asset_type_summary,
+        "snapshot_time": latest_snapshot_time.isoformat(),
+        "warnings": warnings
+    }
+
+
+def build_transaction_data(
+    db: Session,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    platform: Optional[str] = None,
+    asset_type: Optional[str] = None,
+    operation_type: Optional[str] = None,
+    limit: int = DEFAULT_TRANSACTION_LIMIT
+) -> Dict[str, Any]:
+    """构建交易操作数据"""
+    query = db.query(UserOperation)
+    if start_date:
+        query = query.filter(UserOperation.operation_date >= start_date)
+    if end_date:
+        query = query.filter(UserOperation.operation_date <= end_date)
+    if platform:
+        query = query.filter(UserOperation.platform == platform)
+    if asset_type:
+        query = query.filter(UserOperation.asset_type == asset_type)
+    if operation_type:
+        query = query.filter(UserOperation.operation_type == operation_type)
+
+    operations = query.order_by(desc(UserOperation.operation_date)).limit(limit).all()
+
+    transactions = []
+    operation_types: Dict[str, Dict[str, Any]] = {}
+    currencies: Dict[str, Dict[str, Any]] = {}
+    platforms: Dict[str, Dict[str, Any]] = {}
+    monthly_counts: Dict[str, int] = {}
+
+    for op in operations:
+        amount = float(op.amount)
+        transactions.append({
+            "id": op.id,
+            "date": op.operation_date.isoformat(),
+            "platform": op.platform,
+            "asset_type": op.asset_type,
+            "operation_type": op.operation_type,
+            "asset_code": op.asset_code,
+            "asset_name": op.asset_name,
+            "amount": amount,
+            "currency": op.currency,
+            "quantity": float(op.quantity) if op.quantity else None,
+            "price": float(op.price) if op.price else None,
+            "nav": float(op.nav) if op.nav else None,
+            "fee": float(op.fee) if op.fee else 0,
+            "strategy": op.strategy,
+            "emotion_score": op.emotion_score,
+            "notes": op.notes,
+            "status": op.status,
+            "dca_plan_id": op.dca_plan_id,
+            "dca_execution_type": op.dca_execution_type
+        })
+
+        op_type = operation_types.setdefault(op.operation_type, {"count": 0, "total_amount": 0})
+        op_type["count"] += 1
+        op_type["total_amount"] += amount
+
+        currency = currencies.setdefault(op.currency, {"count": 0, "total_amount": 0})
+        currency["count"] += 1
+        currency["total_amount"] += amount
+
+        platforms.setdefault(op.platform, {"count": 0})["count"] += 1
+
+        month_key = op.operation_date.strftime('%Y-%m')
+        monthly_counts[month_key] = monthly_counts.get(month_key, 0) + 1
+
+    time_series_data = [
+        {"period": month, "operation_count": count}
+        for month, count in sorted(monthly_counts.items())
+    ]
+
+    summary_stats = {
+        "total_operations": len(operations),
+        "operation_types": operation_types,
+        "currencies": currencies,
+        "platforms": platforms,
+        "date_range": {
+            "start": operations[-1].operation_date.isoformat() if operations else None,
+            "end": operations[0].operation_date.isoformat() if operations else None
+        }
+    }
+
+    return {
+        "transactions": transactions,
+        "summary_stats": summary_stats,
+        "time_series_data": time_series_data
+    }
+
+
+def build_historical_data(
+    db: Session,
+    days: int = DEFAULT_HISTORY_DAYS,
+    asset_codes: Optional[str] = None,
+    base_currency: str = "CNY"
+) -> Dict[str, Any]:
+    """构建历史数据（资产价值、基金净值、交易价格）"""
+    end_date = datetime.now()
+    start_date = end_date - timedelta(days=days)
+    code_list = [code.strip() for code in asset_codes.split(',')] if asset_codes else None
+
+    snapshot_query = db.query(AssetSnapshot).filter(
+        AssetSnapshot.snapshot_time >= start_date,
+        AssetSnapshot.snapshot_time <= end_date
+    )
+    if code_list:
+        snapshot_query = snapshot_query.filter(AssetSnapshot.asset_code.in_(code_list))
+    snapshots = snapshot_query.order_by(AssetSnapshot.snapshot_time).all()
+
+    asset_values = []
+    balance_field = f"balance_{base_currency.lower()}"
+    for snapshot in snapshots:
+        balance = getattr(snapshot, balance_field, None) or snapshot.balance
+        if balance:
+            asset_values.append({
+                "date": snapshot.snapshot_time.isoformat(),
+                "platform": snapshot.platform,
+                "asset_type": snapshot.asset_type,
+                "asset_code": snapshot.asset_code,
+                "asset_name": snapshot.asset_name,
+                "currency": snapshot.currency,
+                "balance_original": float(snapshot.balance),
+                "balance_cny": float(snapshot.balance_cny) if snapshot.balance_cny else None,
+                "balance_usd": float(snapshot.balance_usd) if snapshot.balance_usd else None,
+                "balance_eur": float(snapshot.balance_eur) if snapshot.balance_eur else None,
+                "base_value": float(balance),
+                "extra_data": snapshot.extra
+            })
+
+    nav_query = db.query(FundNav).filter(
+        FundNav.nav_date >= start_date.date(),
+        FundNav.nav_date <= end_date.date()
+    )
+    if code_list:
+        nav_query = nav_query.filter(FundNav.fund_code.in_(code_list))
+
+    nav_data = [
+        {
+            "date": nav.nav_date.isoformat(),
+            "fund_code": nav.fund_code,
+            "nav": float(nav.nav),
+            "accumulated_nav": float(nav.accumulated_nav) if nav.accumulated_nav else None,
+            "growth_rate": float(nav.growth_rate) if nav.growth_rate else None,
+            "source": nav.source
+        }
+        for nav in nav_query.order_by(FundNav.nav_date).all()
+    ]
+
+    # 价格数据（基于交易记录中的价格）
+    price_query = db.query(UserOperation).filter(
+        UserOperation.operation_date >= start_date,
+        UserOperation.operation_date <= end_date,
+        UserOperation.price.isnot(None)
+    )
+    if code_list:
+        price_query = price_query.filter(UserOperation.asset_code.in_(code_list))
+
+    price_data = [
+        {
+            "date": op.operation_date.isoformat(),
+            "asset_code": op.asset_code,
+            "asset_name": op.asset_name,
+            "price": float(op.price),
+            "nav": float(op.nav) if op.nav else None,
+            "operation_type": op.operation_type,
+            "platform": op.platform
+        }
+        for op in price_query.order_by(UserOperation.operation_date).all()
+    ]
+
+    return {
+        "asset_values": asset_values,
+        "nav_data": nav_data,
+        "price_data": price_data
+    }
+
+
+def build_market_data(db: Session) -> Dict[str, Any]:
+    """构建市场数据（汇率、基金净值、基础指标）"""
+    latest_rates = db.query(ExchangeRateSnapshot).order_by(desc(ExchangeRateSnapshot.snapshot_time)).limit(50).all()
+
+    rate_dict: Dict[str, Dict[str, Any]] = {}
+    for rate in latest_rates:
+        key = f"{rate.from_currency}-{rate.to_currency}"
+        if key not in rate_dict or rate.snapshot_time > rate_dict[key]["snapshot_time"]:
+            rate_dict[key] = {
+                "from_currency": rate.from_currency,
+                "to_currency": rate.to_currency,
+                "rate": float(rate.rate),
+                "snapshot_time": rate.snapshot_time,
+                "source": rate.source,
+                "extra_data": rate.extra
+            }
+
+    # 最近7天的基金净值
+    recent_date = datetime.now().date() - timedelta(days=7)
+    recent_navs = db.query(FundNav).filter(
+        FundNav.nav_date >= recent_date
+    ).order_by(desc(FundNav.nav_date)).limit(100).all()
+
+    fund_navs = [
+        {
+            "fund_code": nav.fund_code,
+            "nav_date": nav.nav_date.isoformat(),
+            "nav": float(nav.nav),
+            "accumulated_nav": float(nav.accumulated_nav) if nav.accumulated_nav else None,
+            "growth_rate": float(nav.growth_rate) if nav.growth_rate else None,
+            "source": nav.source
+        }
+        for nav in recent_navs
+    ]
+
+    total_funds = db.query(func.count(FundInfo.id)).scalar()
+    active_funds = db.query(func.count(func.distinct(FundNav.fund_code))).filter(
+        FundNav.nav_date >= recent_date
+    ).scalar()
+    total_operations = db.query(func.count(UserOperation.id)).scalar()
+    recent_operations = db.query(func.count(UserOperation.id)).filter(
+        UserOperation.operation_date >= datetime.now() - timedelta(days=30)
+    ).scalar()
+
+    market_indicators = {
+        "total_funds_tracked": total_funds or 0,
+        "active_funds_last_week": active_funds or 0,
+        "total_user_operations": total_operations or 0,
+        "operations_last_30_days": recent_operations or 0,
+        "data_freshness": {
+            "latest_snapshot": db.query(func.max(AssetSnapshot.snapshot_time)).scalar(),
+            "latest_exchange_rate": db.query(func.max(ExchangeRateSnapshot.snapshot_time)).scalar(),
+            "latest_fund_nav": db.query(func.max(FundNav.nav_date)).scalar()
+        }
+    }
+
+    return {
+        "exchange_rates": list(rate_dict.values()),
+        "fund_navs": fund_navs,
+        "market_indicators": market_indicators
+    }
+
+
+def build_dca_data(db: Session) -> Dict[str, Any]:
+    """构建定投计划数据"""
+    dca_plans_raw = db.query(DCAPlan).all()
+
+    dca_plans = [
+        {
+            "id": plan.id,
+            "plan_name": plan.plan_name,
+            "platform": plan.platform,
+            "asset_type": plan.asset_type,
+            "asset_code": plan.asset_code,
+            "asset_name": plan.asset_name,
+            "amount": float(plan.amount),
+            "currency": plan.currency,
+            "frequency": plan.frequency,
+            "frequency_value": plan.frequency_value,
+            "start_date": plan.start_date.isoformat() if plan.start_date else None,
+            "end_date": plan.end_date.isoformat() if plan.end_date else None,
+            "status": plan.status,
+            "strategy": plan.strategy,
+            "execution_time": plan.execution_time,
+            "next_execution_date": plan.next_execution_date.isoformat() if plan.next_execution_date else None,
+            "last_execution_date": plan.last_execution_date.isoformat() if plan.last_execution_date else None,
+            "execution_count": plan.execution_count or 0,
+            "total_invested": float(plan.total_invested or 0),
+            "total_shares": float(plan.total_shares or 0),
+            "smart_dca": plan.smart_dca,
+            "base_amount": float(plan.base_amount) if plan.base_amount else None,
+            "max_amount": float(plan.max_amount) if plan.max_amount else None,
+            "increase_rate": float(plan.increase_rate) if plan.increase_rate else None
+        }
+        for plan in dca_plans_raw
+    ]
+
+    dca_operations = db.query(UserOperation).filter(
+        UserOperation.dca_plan_id.isnot(None)
+    ).order_by(desc(UserOperation.operation_date)).all()
+
+    execution_history = []
+    plan_stats: Dict[int, Dict[str, Any]] = {}
+    total_dca_invested = 0.0
+    for op in dca_operations:
+        amount = float(op.amount)
+        execution_history.append({
+            "operation_id": op.id,
+            "dca_plan_id": op.dca_plan_id,
+            "execution_date": op.operation_date.isoformat(),
+            "amount": amount,
+            "quantity": float(op.quantity) if op.quantity else None,
+            "nav": float(op.nav) if op.nav else None,
+            "fee": float(op.fee) if op.fee else 0,
+            "execution_type": op.dca_execution_type,
+            "asset_code": op.asset_code,
+            "platform": op.platform
+        })
+        total_dca_invested += amount
+
+        stats = plan_stats.setdefault(op.dca_plan_id, {
+            "operation_count": 0,
+            "total_invested": 0,
+            "avg_nav": []
+        })
+        stats["operation_count"] += 1
+        stats["total_invested"] += amount
+        if op.nav:
+            stats["avg_nav"].append(float(op.nav))
+
+    statistics = {
+        "total_plans": len(dca_plans_raw),
+        "active_plans": len([p for p in dca_plans_raw if p.status == "active"]),
+        "total_invested": total_dca_invested,
+        "total_operations": len(dca_operations),
+        "plan_statistics": plan_stats
+    }
+
+    return {
+        "dca_plans": dca_plans,
+        "execution_history": execution_history,
+        "statistics": statistics
+    }
+
+
+# ---- 数据包 ----
+
+class BundleEntry:
+    """单个接口的预序列化响应：JSON字节、gzip字节和ETag"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        # 同一份数据的原始/压缩两种编码共用一个弱ETag
+        self.etag = f'W/"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+    @classmethod
+    def from_payload(cls, payload: Dict[str, Any]) -> "BundleEntry":
+        return cls(dumps(payload))
+
+
+class AnalystBundleService:
+    """按基准货币维护的AI分析师数据包
+
+    - 首次请求某个基准货币时同步构建，之后都从内存返回
+    - `invalidate` 在快照抽取、同步任务完成后调用，已有数据包在后台线程重建，重建期间继续返回旧数据
+    - 超过 `max_age` 秒未重建的数据包同样在后台刷新，兜底没有发布事件的数据变更（如手工录入操作）
+    """
+
+    def __init__(self, enabled: bool = True, max_age: float = 300):
+        self.enabled = enabled
+        self.max_age = max_age
+        self.generation = 0
+        self._bundles: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._rebuilding: set = set()
+
+    def _build_lock(self, base_currency: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(base_currency, threading.Lock())
+
+    def build(self, base_currency: str) -> Dict[str, Any]:
+        """构建并替换指定基准货币的数据包"""
+        generation = self.generation
+        started = time.perf_counter()
+        builders: List[Tuple[str, Callable[[Session], Optional[Dict[str, Any]]]]] = [
+            ("asset-data", lambda db: build_asset_data(db, base_currency, False)),
+            ("asset-data:all", lambda db: build_asset_data(db, base_currency, True)),
+            ("transaction-data", build_transaction_data),
+            ("historical-data", lambda db: build_historical_data(db, base_currency=base_currency)),
+            ("market-data", build_market_data),
+            ("dca-data", build_dca_data),
+        ]
+
+        entries: Dict[str, BundleEntry] = {}
+        db = SessionLocal()
+        try:
+            for key, builder in builders:
+                payload = builder(db)
+                if payload is not None:
+                    entries[key] = BundleEntry.from_payload(payload)
+        finally:
+            db.close()
+
+        version = hashlib.sha1(
+            "|".join(f"{key}={entry.etag}" for key, entry in sorted(entries.items())).encode("utf-8")
+        ).hexdigest()[:12]
+        bundle = {
+            "entries": entries,
+            "version": version,
+            "generation": generation,
+            "built_at": datetime.now(),
+            "built_monotonic": time.monotonic(),
+            "build_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        with self._lock:
+            self._bundles[base_currency] = bundle
+        logger.info(f"AI分析师数据包已构建: base_currency={base_currency}, version={version}, 耗时={bundle['build_ms']}ms")
+        return bundle
+
+    def _rebuild_in_background(self, base_currency: str) -> None:
+        with self._lock:
+            if base_currency in self._rebuilding:
+                return
+            self._rebuilding.add(base_currency)
+
+        def _run():
+            try:
+                with self._build_lock(base_currency):
+                    self.build(base_currency)
+            except Exception as e:
+                logger.error(f"AI分析师数据包后台重建失败: base_currency={base_currency}, 错误: {e}")
+            finally:
+                with self._lock:
+                    self._rebuilding.discard(base_currency)
+
+        threading.Thread(target=_run, name=f"analyst-bundle-{base_currency}", daemon=True).start()
+
+    def get(self, base_currency: str, key: str) -> Optional[BundleEntry]:
+        """获取数据包中的某个接口响应；未启用、基准货币不在 BUNDLED_BASE_CURRENCIES 中或数据包中没有该项时返回None"""
+        if not self.enabled:
+            return None
+        base_currency = base_currency.upper()
+        if base_currency not in BUNDLED_BASE_CURRENCIES:
+            return None
+
+        bundle = self._bundles.get(base_currency)
+        if bundle is None:
+            try:
+                with self._build_lock(base_currency):
+                    bundle = self._bundles.get(base_currency) or self.build(base_currency)
+            except Exception as e:
+                logger.error(f"AI分析师数据包构建失败: base_currency={base_currency}, 错误: {e}")
+                return None
+        elif (bundle["generation"] != self.generation
+              or time.monotonic() - bundle["built_monotonic"] > self.max_age):
+            self._rebuild_in_background(base_currency)
+
+        return bundle["entries"].get(key)
+
+    def invalidate(self, reason: str = "") -> None:
+        """标记数据已变化，并在后台重建所有已有的数据包"""
+        if not self.enabled:
+            return
+        self.generation += 1
+        currencies = list(self._bundles.keys())
+        logger.info(f"AI分析师数据包失效: reason={reason}, 待重建={currencies}")
+        for base_currency in currencies:
+            self._rebuild_in_background(base_currency)
+
+    def get_status(self) -> Dict[str, Any]:
+        """返回各数据包的版本和构建信息"""
+        return {
+            "enabled": self.enabled,
+            "generation": self.generation,
+            "max_age": self.max_age,
+            "bundles": {
+                base_currency: {
+                    "version": bundle["version"],
+                    "built_at": bundle["built_at"].isoformat(),
+                    "build_ms": bundle["build_ms"],
+                    "stale": bundle["generation"] != self.generation,
+                    "entries": {
+                        key: {"etag": entry.etag, "bytes": len(entry.body), "gzip_bytes": len(entry.gzip_body)}
+                        for key, entry in bundle["entries"].items()
+                    }
+                }
+                for base_currency, bundle in self._bundles.items()
+            }
+        }
+
+
+analyst_bundle_service = AnalystBundleService(
+    enabled=settings.ai_analyst_bundle_enabled,
+    max_age=settings.ai_analyst_bundle_max_age,
+)
@@ -4,6 +4,7 @@ from decimal import Decimal
 from sqlalchemy.orm import Session
 from app.models.database import AssetPosition, WiseBalance, IBKRBalance, OKXBalance, Web3Balance, ExchangeRate, WiseExchangeRate
 from app.models.asset_snapshot import AssetSnapshot, ExchangeRateSnapshot
+from app.services.analyst_bundle_service import analyst_bundle_service
 import redis
 import json
 import os
@@ -455,6 +456,7 @@ def extract_asset_snapshot(db: Session, snapshot_time: datetime = None, base_cur
         db.add(snapshot)
         snapshot_count += 1
     db.commit()
+    analyst_bundle_service.invalidate("asset_snapshot")
     return snapshot_count
 
 
@@ -578,6 +580,7 @@ def extract_exchange_rate_snapshot(db: Session, snapshot_time: datetime = None):
         
         db.commit()
         logging.info(f"汇率快照生成完成，共生成 {snapshot_count} 条记录")
+        analyst_bundle_service.invalidate("exchange_rate_snapshot")
         return snapshot_count
         
     except Exception as e:
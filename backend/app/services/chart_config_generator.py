@@ -5,11 +5,13 @@
 
 import json
 import re
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import logging
 
+from app.services.chart_data import ColumnarData, as_columnar, infer_column_type, lttb_indices, top_n_with_other
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -64,14 +66,19 @@ class ChartConfigGenerator:
             'rainbow': ['#10B981', '#3B82F6', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899', '#14B8A6'],
             'monochrome': ['#374151', '#4B5563', '#6B7280', '#9CA3AF', '#D1D5DB']
         }
+        
+        # 服务端降采样配置：折线图最多保留的点数，饼图最多保留的扇区数（其余合并为"其他"）
+        self.max_line_points = 500
+        self.pie_top_n = 8
     
     def generate_config(self, 
-                       query_result: List[Dict[str, Any]], 
+                       query_result: Union[List[Dict[str, Any]], ColumnarData], 
                        user_question: str = "",
                        sql: str = "") -> ChartConfig:
-        """生成图表配置"""
+        """生成图表配置（接受字典行列表或列式数据）"""
         
-        if not query_result:
+        query_result = as_columnar(query_result)
+        if not query_result.row_count:
             return self._create_empty_config(user_question)
         
         # 1. 分析数据结构
@@ -103,16 +110,16 @@ class ChartConfigGenerator:
             color_field=data_analysis.get('color_field')
         )
     
-    def _analyze_data_structure(self, data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """分析数据结构"""
-        if not data:
+    def _analyze_data_structure(self, data: Union[List[Dict[str, Any]], ColumnarData]) -> Dict[str, Any]:
+        """分析数据结构（在整列上推断类型）"""
+        data = as_columnar(data)
+        if not data.row_count:
             return {}
         
-        sample_row = data[0]
-        columns = list(sample_row.keys())
+        columns = data.column_names
         
         analysis = {
-            'row_count': len(data),
+            'row_count': data.row_count,
             'column_count': len(columns),
             'columns': columns,
             'numeric_columns': [],
@@ -126,13 +133,13 @@ class ChartConfigGenerator:
         
         # 分析每列的数据类型
         for col in columns:
-            sample_values = [row.get(col) for row in data[:5] if row.get(col) is not None]
+            column_type = infer_column_type(data.columns[col])
             
-            if not sample_values:
+            if column_type == 'unknown':
                 continue
             
             # 检查是否为数值列
-            if all(isinstance(v, (int, float)) for v in sample_values):
+            if column_type == 'numeric':
                 analysis['numeric_columns'].append(col)
                 
                 # 寻找主要数值列（通常是value, total, amount等）
@@ -140,7 +147,7 @@ class ChartConfigGenerator:
                     analysis['primary_value_column'] = col
             
             # 检查是否为日期列
-            elif any(keyword in col.lower() for keyword in ['date', 'time', 'created', 'updated']):
+            elif column_type == 'datetime' or any(keyword in col.lower() for keyword in ['date', 'time', 'created', 'updated']):
                 analysis['date_columns'].append(col)
                 analysis['has_time_series'] = True
             
@@ -219,12 +226,10 @@ class ChartConfigGenerator:
         
         return title, description
     
-    def _format_data_for_chart(self, data: List[Dict[str, Any]], chart_type: str, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """格式化数据以适应图表"""
+    def _format_data_for_chart(self, data: Union[List[Dict[str, Any]], ColumnarData], chart_type: str, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """格式化数据以适应图表（折线图LTTB降采样，饼图Top-N合并）"""
         
-        if chart_type == 'table':
-            # 表格直接返回原始数据
-            return data
+        data = as_columnar(data)
         
         # 确定标签和数值字段
         categorical_columns = data_analysis.get('categorical_columns', [])
@@ -233,24 +238,41 @@ class ChartConfigGenerator:
         label_field = data_analysis.get('primary_label_column') or (categorical_columns[0] if categorical_columns else None)
         value_field = data_analysis.get('primary_value_column') or (numeric_columns[0] if numeric_columns else None)
         
+        # 折线图点数过多时先降采样，后续只格式化保留下来的行
+        if chart_type == 'line' and value_field and data.row_count > self.max_line_points:
+            data = data.take(lttb_indices(data.numeric(value_field), self.max_line_points))
+        
+        if chart_type == 'table':
+            # 表格直接返回原始数据
+            return data.to_rows()
+        
         if not label_field or not value_field:
-            return data  # 无法确定字段，返回原始数据
+            return data.to_rows()  # 无法确定字段，返回原始数据
+        
+        # 按列取值；饼图优先使用asset_count，如果没有则使用total_value
+        if chart_type == 'pie':
+            asset_counts = data.columns.get('asset_count')
+            total_values = data.columns.get('total_value')
+            values = []
+            for i in range(data.row_count):
+                if asset_counts is not None and asset_counts[i] is not None:
+                    values.append(asset_counts[i])
+                elif total_values is not None and total_values[i] is not None:
+                    values.append(total_values[i])
+                else:
+                    values.append(0)
+        else:
+            values = data.columns[value_field]
+        
+        labels = data.columns[label_field]
+        extra_fields = [name for name in data.column_names if name not in (label_field, value_field)]
+        extra_columns = [data.columns[name] for name in extra_fields]
         
         formatted_data = []
         
-        for row in data:
-            label = row.get(label_field, 'Unknown')
-            
-            # 对于饼图，优先使用asset_count，如果没有则使用total_value
-            if chart_type == 'pie':
-                if 'asset_count' in row and row['asset_count'] is not None:
-                    value = row['asset_count']
-                elif 'total_value' in row and row['total_value'] is not None:
-                    value = row['total_value']
-                else:
-                    value = 0
-            else:
-                value = row.get(value_field, 0)
+        for i in range(data.row_count):
+            label = labels[i]
+            value = values[i]
             
             # 确保value是数值类型
             if not isinstance(value, (int, float)):
@@ -266,9 +288,8 @@ class ChartConfigGenerator:
             }
             
             # 添加其他字段作为额外信息
-            for key, val in row.items():
-                if key not in [label_field, value_field]:
-                    formatted_item[key] = val
+            for key, column in zip(extra_fields, extra_columns):
+                formatted_item[key] = column[i]
             
             formatted_data.append(formatted_item)
         
@@ -276,6 +297,15 @@ class ChartConfigGenerator:
         if chart_type in ['bar', 'pie']:
             formatted_data.sort(key=lambda x: x['value'], reverse=True)
         
+        # 饼图扇区过多时合并为"其他"
+        if chart_type == 'pie':
+            formatted_data = top_n_with_other(
+                formatted_data,
+                self.pie_top_n,
+                'value',
+                {'name': '其他', 'label': '其他'}
+            )
+        
         return formatted_data
     
     def _generate_style_config(self, chart_type: str, data_count: int) -> Dict[str, Any]:
@@ -0,0 +1,313 @@
+"""
+定投策略回测
+
+用 fund_nav 历史净值回放定投计划参数（普通/智能定投、净值上下限、手续费），
+整段历史一次加载为数组，执行日、金额、份额和每日市值都用数组运算得到，不做逐日的数据库查询。
+
+参数网格（如不同的 increase_rate × max_amount × 频率）展开后可以分发到多个进程并行回测，
+每个配置返回收益、回撤和成本指标。
+"""
+
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import ValidationError
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.models.database import DCAPlan, FundNav
+from app.models.schemas import DCABacktestConfig
+from app.services.return_analytics_service import compute_return_metrics
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 回测配置可调的参数及默认值，含义与 DCAPlan 同名字段一致
+DEFAULT_CONFIG: Dict[str, Any] = DCABacktestConfig().model_dump()
+
+# 回测起点前额外加载的净值天数，保证开头的智能定投均值有足够的历史
+NAV_LOOKBACK_DAYS = 90
+
+# 网格展开后配置数少于该值时直接在当前进程中回测
+PARALLEL_THRESHOLD = 16
+
+# 可用于排序的结果指标及方向：True 表示越大越好（降序），False 表示越小越好（升序）
+SORT_METRICS: Dict[str, bool] = {
+    "xirr": True,
+    "twr": True,
+    "total_return": True,
+    "profit": True,
+    "final_value": True,
+    "max_drawdown": False,  # 回撤为正数，越小越好
+    "volatility": False,
+    "cost_vs_avg_nav": False,
+    "avg_cost": False,
+    "total_fee": False,
+}
+
+
+def schedule_dates(start_date: date, end_date: date, frequency: str, frequency_value: int) -> np.ndarray:
+    """计划执行日期（datetime64[D]），按月定投时超出月末的日期取月末"""
+    start = np.datetime64(start_date, "D")
+    end = np.datetime64(end_date, "D")
+    step = max(int(frequency_value or 1), 1)
+    if frequency == "monthly":
+        months = np.arange(start.astype("datetime64[M]"), end.astype("datetime64[M]") + 1, step)
+        day_offset = start - start.astype("datetime64[M]").astype("datetime64[D]")
+        month_ends = (months + 1).astype("datetime64[D]") - 1
+        dates = np.minimum(months.astype("datetime64[D]") + day_offset, month_ends)
+    else:
+        days = step * 7 if frequency == "weekly" else step
+        dates = np.arange(start, end + 1, days)
+    return dates[dates <= end]
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """截至每个位置（含）最近 window 个值的均值，开头不足 window 个时按实际个数"""
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    index = np.arange(1, len(values) + 1)
+    lower = np.maximum(index - window, 0)
+    return (cumulative[index] - cumulative[lower]) / (index - lower)
+
+
+def run_backtest(days: np.ndarray, navs: np.ndarray, start_date: date, end_date: date,
+                 config: Dict[str, Any]) -> Dict[str, Any]:
+    """回测单个配置
+
+    Args:
+        days: (T,) 有净值的交易日，升序
+        navs: (T,) 对应净值
+        config: DEFAULT_CONFIG 中的参数
+    """
+    config = {**DEFAULT_CONFIG, **config}
+    result: Dict[str, Any] = {"config": config}
+
+    # 计划日期遇到非交易日顺延到下一个交易日（同一交易日只执行一次）
+    planned = schedule_dates(start_date, end_date, config["frequency"], config["frequency_value"])
+    execution_index = np.unique(np.searchsorted(days, planned, side="left"))
+    execution_index = execution_index[execution_index < len(days)]
+    execution_navs = navs[execution_index]
+
+    # 净值执行条件
+    allowed = np.ones(len(execution_index), dtype=bool)
+    if config["min_nav"] is not None:
+        allowed &= execution_navs >= float(config["min_nav"])
+    if config["max_nav"] is not None:
+        allowed &= execution_navs <= float(config["max_nav"])
+    skipped = int((~allowed).sum())
+    execution_index, execution_navs = execution_index[allowed], execution_navs[allowed]
+
+    # 定投金额（规则同 DCAService._smart_amount）
+    amount = float(config["amount"])
+    if config["smart_dca"]:
+        base_amount = float(config["base_amount"] or amount)
+        average = rolling_mean(navs, int(config["nav_window"]))[execution_index]
+        deviation = (average - execution_navs) / average
+        amounts = np.full(len(execution_index), base_amount)
+        if config["increase_rate"]:
+            amounts = np.where(deviation > 0, base_amount * (1 + deviation * float(config["increase_rate"])), base_amount)
+        if config["max_amount"]:
+            amounts = np.minimum(amounts, float(config["max_amount"]))
+    else:
+        amounts = np.full(len(execution_index), amount)
+
+    fees = amounts * float(config["fee_rate"] or 0)
+    shares = (amounts - fees) / execution_navs
+
+    if not len(execution_index):
+        result.update({"execution_count": 0, "skipped_count": skipped, "total_invested": 0.0})
+        return result
+
+    # 每日持有份额和市值
+    share_changes = np.zeros(len(days))
+    flows = np.zeros(len(days))
+    np.add.at(share_changes, execution_index, shares)
+    np.add.at(flows, execution_index, amounts)
+    held_from = execution_index[0]
+    values = np.cumsum(share_changes) * navs
+    metrics = compute_return_metrics(days[held_from:], values[None, held_from:], flows[None, held_from:])
+
+    total_invested = float(amounts.sum())
+    total_shares = float(shares.sum())
+    final_value = float(values[-1])
+    result.update({
+        "execution_count": int(len(execution_index)),
+        "skipped_count": skipped,
+        "first_execution": str(days[execution_index[0]]),
+        "last_execution": str(days[execution_index[-1]]),
+        "total_invested": round(total_invested, 2),
+        "total_fee": round(float(fees.sum()), 2),
+        "total_shares": round(total_shares, 4),
+        "final_value": round(final_value, 2),
+        "profit": round(final_value - total_invested, 2),
+        "total_return": round(final_value / total_invested - 1, 6),
+        "avg_cost": round(total_invested / total_shares, 4),
+        # 平均成本相对同期平均净值的折让，越小越好
+        "cost_vs_avg_nav": round(total_invested / total_shares / float(navs[held_from:].mean()) - 1, 6),
+        "xirr": _finite(metrics["xirr"][0]),
+        "twr": _finite(metrics["twr"][0]),
+        "max_drawdown": _finite(metrics["max_drawdown"][0]),
+        "volatility": _finite(metrics["volatility"][0]),
+    })
+    return result
+
+
+def _finite(value: float) -> Optional[float]:
+    return round(float(value), 6) if np.isfinite(value) else None
+
+
+def validate_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """校验并补全单个回测配置，参数无效时抛出 ValueError"""
+    try:
+        return DCABacktestConfig(**config).model_dump()
+    except ValidationError as e:
+        details = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+        raise ValueError(f"回测参数无效: {details}") from None
+
+
+def expand_grid(base_config: Dict[str, Any], grid: Optional[Dict[str, List[Any]]]) -> List[Dict[str, Any]]:
+    """把参数网格展开为配置列表：{参数: [候选值]} 的笛卡尔积覆盖在 base_config 上"""
+    if not grid:
+        return [dict(base_config)]
+    unknown = set(grid) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"不支持的回测参数: {', '.join(sorted(unknown))}")
+    keys = list(grid)
+    return [{**base_config, **dict(zip(keys, values))} for values in itertools.product(*(grid[key] for key in keys))]
+
+
+# ---- 多进程 ----
+
+_worker_series: Optional[Tuple[np.ndarray, np.ndarray, date, date]] = None
+
+
+def _init_worker(days: np.ndarray, navs: np.ndarray, start_date: date, end_date: date) -> None:
+    global _worker_series
+    _worker_series = (days, navs, start_date, end_date)
+
+
+def _run_in_worker(config: Dict[str, Any]) -> Dict[str, Any]:
+    days, navs, start_date, end_date = _worker_series
+    return run_backtest(days, navs, start_date, end_date, config)
+
+
+def _process_context():
+    """子进程启动方式：不用 fork，避免复制 uvicorn 进程中的线程、数据库连接和事件循环"""
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def sort_results(results: List[Dict[str, Any]], sort_by: str) -> None:
+    """按 SORT_METRICS 中的方向原地排序，指标为空的配置（如没有执行记录）排在最后"""
+    sign = -1 if SORT_METRICS[sort_by] else 1
+    results.sort(key=lambda item: (item.get(sort_by) is None, sign * (item.get(sort_by) or 0)))
+
+
+class DCABacktestService:
+    """定投回测服务"""
+
+    @staticmethod
+    def load_nav_series(db: Session, fund_code: str, start_date: date, end_date: date) -> Tuple[np.ndarray, np.ndarray]:
+        """一次查询加载回测区间的净值：(交易日数组, 净值数组)"""
+        rows = db.query(FundNav.nav_date, FundNav.nav).filter(
+            and_(
+                FundNav.fund_code == fund_code,
+                FundNav.nav_date >= start_date,
+                FundNav.nav_date <= end_date
+            )
+        ).order_by(FundNav.nav_date).all()
+        days = np.array([row[0] for row in rows], dtype="datetime64[D]")
+        navs = np.array([float(row[1]) for row in rows], dtype=float)
+        return days, navs
+
+    @staticmethod
+    def plan_config(plan: DCAPlan) -> Dict[str, Any]:
+        """把已有定投计划的参数转为回测配置"""
+        def number(value):
+            return float(value) if value is not None else None
+
+        return {
+            "amount": float(plan.amount),
+            "frequency": plan.frequency,
+            "frequency_value": plan.frequency_value,
+            "smart_dca": bool(plan.smart_dca),
+            "base_amount": number(plan.base_amount),
+            "max_amount": number(plan.max_amount),
+            "increase_rate": number(plan.increase_rate),
+            "min_nav": number(plan.min_nav),
+            "max_nav": number(plan.max_nav),
+            "fee_rate": number(plan.fee_rate) or 0.0,
+        }
+
+    @staticmethod
+    def backtest(
+        db: Session,
+        fund_code: str,
+        start_date: date,
+        end_date: Optional[date] = None,
+        base_config: Optional[Dict[str, Any]] = None,
+        grid: Optional[Dict[str, List[Any]]] = None,
+        sort_by: str = "xirr"
+    ) -> Dict[str, Any]:
+        """回测一个配置或一组参数网格，结果按 sort_by 指标由优到劣排列（见 SORT_METRICS）"""
+        if sort_by not in SORT_METRICS:
+            raise ValueError(f"不支持的排序指标: {sort_by}，可选: {', '.join(SORT_METRICS)}")
+        end_date = end_date or date.today()
+        configs = expand_grid(base_config or {}, grid)
+        if len(configs) > settings.dca_backtest_max_configs:
+            raise ValueError(f"参数组合过多: {len(configs)} > {settings.dca_backtest_max_configs}")
+        configs = [validate_config(config) for config in configs]
+
+        days, navs = DCABacktestService.load_nav_series(
+            db, fund_code, start_date - timedelta(days=NAV_LOOKBACK_DAYS), end_date
+        )
+        if not len(days) or days[-1] < np.datetime64(start_date, "D"):
+            raise ValueError(f"基金 {fund_code} 在 {start_date} ~ {end_date} 没有净值数据")
+
+        max_workers = settings.dca_backtest_max_workers
+        if len(configs) < PARALLEL_THRESHOLD or max_workers <= 1:
+            results = [run_backtest(days, navs, start_date, end_date, config) for config in configs]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=min(max_workers, len(configs)),
+                mp_context=_process_context(),
+                initializer=_init_worker,
+                initargs=(days, navs, start_date, end_date)
+            ) as executor:
+                chunk_size = max(len(configs) // (max_workers * 4), 1)
+                results = list(executor.map(_run_in_worker, configs, chunksize=chunk_size))
+
+        sort_results(results, sort_by)
+        logger.info(f"定投回测完成: 基金 {fund_code}，{len(configs)} 个配置，{len(days)} 个交易日")
+        return {
+            "fund_code": fund_code,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "trading_days": int((days >= np.datetime64(start_date, "D")).sum()),
+            "config_count": len(configs),
+            "results": results,
+        }
+
+    @staticmethod
+    def backtest_plan(
+        db: Session,
+        plan_id: int,
+        start_date: date,
+        end_date: Optional[date] = None,
+        grid: Optional[Dict[str, List[Any]]] = None,
+        sort_by: str = "xirr"
+    ) -> Optional[Dict[str, Any]]:
+        """以已有定投计划的参数为基础回测，计划不存在时返回None"""
+        plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
+        if not plan:
+            return None
+        result = DCABacktestService.backtest(
+            db, plan.asset_code, start_date, end_date, DCABacktestService.plan_config(plan), grid, sort_by
+        )
+        result["plan_id"] = plan_id
+        return result
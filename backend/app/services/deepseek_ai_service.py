@@ -4,12 +4,12 @@ DeepSeek AI API集成服务
 提供自然语言处理、智能分析等功能
 """
 
-import httpx
 import json
 import logging
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from app.settings import settings
+from app.services.http_clients import get_client
 
 logger = logging.getLogger(__name__)
 
@@ -88,20 +88,20 @@ class DeepSeekAIService:
             
             logger.info(f"发送DeepSeek API请求: model={self.model}, messages_count={len(messages)}")
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/v1/chat/completions",
-                    headers=self.headers,
-                    json=request_data
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.info(f"DeepSeek API请求成功: tokens_used={result.get('usage', {}).get('total_tokens', 0)}")
-                    return result
-                else:
-                    logger.error(f"DeepSeek API请求失败: {response.status_code} - {response.text}")
-                    return None
+            client = get_client("deepseek")
+            response = await client.post(
+                f"{self.base_url}/v1/chat/completions",
+                headers=self.headers,
+                json=request_data
+            )
+
+            if response.status_code == 200:
+                result = response.json()
+                logger.info(f"DeepSeek API请求成功: tokens_used={result.get('usage', {}).get('total_tokens', 0)}")
+                return result
+            else:
+                logger.error(f"DeepSeek API请求失败: {response.status_code} - {response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"DeepSeek API请求异常: {e}")
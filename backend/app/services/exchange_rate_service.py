@@ -1,5 +1,3 @@
-import akshare as ak
-import pandas as pd
 import httpx
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, date, timedelta
@@ -8,6 +6,7 @@ from loguru import logger
 import itertools
 from app.models.database import WiseExchangeRate, WiseTransaction
 from app.utils.database import SessionLocal
+from app.services import akshare_provider
 from sqlalchemy import and_
 from app.utils.auto_logger import auto_log
 import re
@@ -17,6 +16,16 @@ from sqlalchemy import text
 
 WISE_API_BASE = "https://api.transferwise.com"
 
+
+def _number(value) -> float:
+    """akshare返回的数值转float，缺失值（None/NaN）和无法转换的值记为0"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return number if number == number else 0
+
+
 class ExchangeRateService:
     """外币汇率服务"""
     
@@ -33,7 +42,7 @@ class ExchangeRateService:
         """获取支持的货币列表"""
         try:
             # 使用akshare获取货币列表
-            df = ak.currency_boc_sina()
+            df = akshare_provider.boc_exchange_rates()
             currencies = []
             
             # 根据实际数据结构处理
@@ -42,7 +51,7 @@ class ExchangeRateService:
                     "code": "USD",  # 默认美元
                     "name": "美元",
                     "symbol": "$",
-                    "rate": float(row.get('中行汇买价', 0)) if pd.notna(row.get('中行汇买价')) else 0,
+                    "rate": _number(row.get('中行汇买价')),
                     "update_time": datetime.now().isoformat()
                 })
             
@@ -57,7 +66,7 @@ class ExchangeRateService:
         """获取指定货币对人民币的汇率"""
         try:
             # 使用akshare获取汇率数据
-            df = ak.currency_boc_sina()
+            df = akshare_provider.boc_exchange_rates()
             
             # 获取最新一行数据（美元汇率）
             if not df.empty:
@@ -65,11 +74,11 @@ class ExchangeRateService:
                 return {
                     "currency": currency,
                     "currency_name": "美元",
-                    "spot_buy": float(row.get('中行汇买价', 0)) if pd.notna(row.get('中行汇买价')) else 0,
-                    "spot_sell": float(row.get('中行钞卖价/汇卖价', 0)) if pd.notna(row.get('中行钞卖价/汇卖价')) else 0,
-                    "cash_buy": float(row.get('中行钞买价', 0)) if pd.notna(row.get('中行钞买价')) else 0,
-                    "cash_sell": float(row.get('中行钞卖价/汇卖价', 0)) if pd.notna(row.get('中行钞卖价/汇卖价')) else 0,
-                    "middle_rate": float(row.get('央行中间价', 0)) if pd.notna(row.get('央行中间价')) else 0,
+                    "spot_buy": _number(row.get('中行汇买价')),
+                    "spot_sell": _number(row.get('中行钞卖价/汇卖价')),
+                    "cash_buy": _number(row.get('中行钞买价')),
+                    "cash_sell": _number(row.get('中行钞卖价/汇卖价')),
+                    "middle_rate": _number(row.get('央行中间价')),
                     "update_time": datetime.now().isoformat()
                 }
             
@@ -83,7 +92,7 @@ class ExchangeRateService:
     def get_all_exchange_rates() -> List[Dict[str, Any]]:
         """获取所有货币的汇率"""
         try:
-            df = ak.currency_boc_sina()
+            df = akshare_provider.boc_exchange_rates()
             rates = []
             
             # 获取最新一行数据（美元汇率）
@@ -92,11 +101,11 @@ class ExchangeRateService:
                 rates.append({
                     "currency": "USD",
                     "currency_name": "美元",
-                    "spot_buy": float(row.get('中行汇买价', 0)) if pd.notna(row.get('中行汇买价')) else 0,
-                    "spot_sell": float(row.get('中行钞卖价/汇卖价', 0)) if pd.notna(row.get('中行钞卖价/汇卖价')) else 0,
-                    "cash_buy": float(row.get('中行钞买价', 0)) if pd.notna(row.get('中行钞买价')) else 0,
-                    "cash_sell": float(row.get('中行钞卖价/汇卖价', 0)) if pd.notna(row.get('中行钞卖价/汇卖价')) else 0,
-                    "middle_rate": float(row.get('央行中间价', 0)) if pd.notna(row.get('央行中间价')) else 0,
+                    "spot_buy": _number(row.get('中行汇买价')),
+                    "spot_sell": _number(row.get('中行钞卖价/汇卖价')),
+                    "cash_buy": _number(row.get('中行钞买价')),
+                    "cash_sell": _number(row.get('中行钞卖价/汇卖价')),
+                    "middle_rate": _number(row.get('央行中间价')),
                     "update_time": datetime.now().isoformat()
                 })
             
@@ -111,7 +120,7 @@ class ExchangeRateService:
         """获取历史汇率数据"""
         try:
             # 使用akshare获取历史汇率
-            df = ak.currency_hist_fx_spot()
+            df = akshare_provider.fx_spot_history()
             
             # 过滤指定货币
             if currency and currency != "USD":
@@ -129,9 +138,9 @@ class ExchangeRateService:
                 historical_data.append({
                     "date": str(row.get('日期', '')),
                     "currency": currency,
-                    "rate": float(row.get('汇率', 0)) if pd.notna(row.get('汇率')) else 0,
-                    "change": float(row.get('涨跌', 0)) if pd.notna(row.get('涨跌')) else 0,
-                    "change_pct": float(row.get('涨跌幅', 0)) if pd.notna(row.get('涨跌幅')) else 0
+                    "rate": _number(row.get('汇率')),
+                    "change": _number(row.get('涨跌')),
+                    "change_pct": _number(row.get('涨跌幅'))
                 })
             
             return historical_data
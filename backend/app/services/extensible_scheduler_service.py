@@ -2,6 +2,7 @@
 可扩展定时任务调度器服务
 """
 import asyncio
+import time
 import uuid
 from datetime import datetime
 from typing import Dict, List, Any, Optional
@@ -15,6 +16,22 @@ from app.core.plugin_manager import PluginManager
 from app.core.event_bus import EventBus
 from app.core.context import TaskContext, TaskResult
 from app.settings import settings
+from app.services.scheduler_leader import SchedulerLeaderElection
+from app.services.task_run_store import task_run_store
+from app.services.analyst_bundle_service import analyst_bundle_service
+
+# 会改变AI分析师数据包内容的事件
+ANALYST_DATA_EVENTS = [
+    'fund.nav.updated',
+    'dca.executed',
+    'wise.balance.synced',
+    'wise.transaction.synced',
+    'wise.exchange_rate.synced',
+    'okx.balance.synced',
+    'okx.transaction.synced',
+    'ibkr.balance.synced',
+    'web3.balance.synced',
+]
 
 
 class ExtensibleSchedulerService:
@@ -34,7 +51,13 @@ class ExtensibleSchedulerService:
             }
         )
         self.plugin_manager = PluginManager()
-        self.event_bus = EventBus()
+        self.leader_election = SchedulerLeaderElection() if settings.scheduler_leader_election else None
+        self.event_bus = EventBus(
+            max_history=settings.event_bus_max_history,
+            max_history_per_type=settings.event_bus_max_history_per_type,
+            max_queue=settings.event_bus_queue_size,
+            overflow=settings.event_bus_overflow_policy
+        )
         self._setup_event_handlers()
             
     def _setup_event_handlers(self):
@@ -50,6 +73,10 @@ class ExtensibleSchedulerService:
         self.event_bus.subscribe('ibkr.balance.synced', self._handle_ibkr_balance_synced)
         self.event_bus.subscribe('web3.balance.synced', self._handle_web3_balance_synced)
         
+        # 数据变化后重建AI分析师数据包（只需知道"数据变了"，队列满时丢弃旧事件即可）
+        for event_type in ANALYST_DATA_EVENTS:
+            self.event_bus.subscribe(event_type, self._handle_analyst_data_changed, max_queue=10, overflow='drop_oldest')
+        
     async def initialize(self):
         """初始化调度器，并从配置文件加载任务"""
         import os
@@ -141,8 +168,12 @@ class ExtensibleSchedulerService:
                 logger.warning(f"未找到调度任务配置文件: {config_path}")
             # ===== 结束 =====
 
-            # 启动调度器
-            self.scheduler.start()
+            # 启动调度器：启用主节点选举时先以暂停状态启动，当选后才开始执行定时任务
+            if self.leader_election:
+                self.scheduler.start(paused=True)
+                self.leader_election.start(self._on_elected_leader, self._on_demoted)
+            else:
+                self.scheduler.start()
 
             # 启动事件总线
             logger.info("可扩展调度器初始化完成")
@@ -161,8 +192,14 @@ class ExtensibleSchedulerService:
         
         logger.info(f"已加载 {len(self.plugin_manager.get_plugins())} 个插件")
         
+    async def _require_leader(self):
+        """启用主节点选举时，只有主节点的任务存储决定实际执行哪些任务"""
+        if self.leader_election:
+            await self.leader_election.require_leader()
+        
     async def create_job(self, job_config: Dict[str, Any]) -> str:
         """创建定时任务"""
+        await self._require_leader()
         try:
             job_id = job_config.get('job_id') or f"job_{uuid.uuid4().hex[:8]}"
             task_id = job_config['task_id']
@@ -242,7 +279,11 @@ class ExtensibleSchedulerService:
             
     async def _execute_task_wrapper(self, task_id: str, config: Dict[str, Any]):
         """任务执行包装器"""
-        execution_id = f"exec_{uuid.uuid4().hex[:8]}"
+        execution_id = f"exec_{uuid.uuid4().hex}"
+        started_at = datetime.now()
+        phase_timings = {}
+        result = None
+        error = None
         
         try:
             # 发布任务开始事件
@@ -254,11 +295,13 @@ class ExtensibleSchedulerService:
             
             # 执行任务
             result = await self.plugin_manager.execute_task(task_id, execution_id, config)
+            phase_timings.update(result.phase_timings)
             
             # 设置事件总线到结果中
             result.event_bus = self.event_bus
             
             # 发布任务完成事件
+            started = time.perf_counter()
             if result.success:
                 await self.event_bus.publish('task.completed', {
                     'task_id': task_id,
@@ -271,27 +314,40 @@ class ExtensibleSchedulerService:
                     'execution_id': execution_id,
                     'error': result.error
                 })
+            phase_timings['publish_events'] = round((time.perf_counter() - started) * 1000, 1)
                 
         except Exception as e:
             logger.error(f"任务执行异常: {task_id}, 错误: {e}")
+            error = str(e)
             await self.event_bus.publish('task.failed', {
                 'task_id': task_id,
                 'execution_id': execution_id,
-                'error': str(e)
+                'error': error
             })
+        finally:
+            # 异步写入执行记录
+            task_run_store.record(
+                task_id, execution_id, 'scheduled', started_at, datetime.now(),
+                result=result, error=error, phase_timings=phase_timings
+            )
             
     async def execute_task_now(self, task_id: str, config: Dict[str, Any] = None) -> TaskResult:
         """立即执行任务"""
-        execution_id = f"manual_{uuid.uuid4().hex[:8]}"
+        execution_id = f"manual_{uuid.uuid4().hex}"
         config = config or {}
+        started_at = datetime.now()
         
         try:
             logger.info(f"手动执行任务: {task_id}")
             result = await self.plugin_manager.execute_task(task_id, execution_id, config)
-            return result
         except Exception as e:
             logger.error(f"手动执行任务失败: {task_id}, 错误: {e}")
-            return TaskResult(success=False, error=str(e))
+            result = TaskResult(success=False, error=str(e))
+        task_run_store.record(
+            task_id, execution_id, 'manual', started_at, datetime.now(),
+            result=result, phase_timings=result.phase_timings
+        )
+        return result
             
     def get_jobs(self) -> List[Dict[str, Any]]:
         """获取所有任务"""
@@ -358,6 +414,7 @@ class ExtensibleSchedulerService:
 
     async def remove_job(self, job_id: str) -> bool:
         """移除任务"""
+        await self._require_leader()
         try:
             if not self._job_exists(job_id):
                 logger.error(f"移除任务失败: {job_id} 不存在")
@@ -371,6 +428,7 @@ class ExtensibleSchedulerService:
             
     async def pause_job(self, job_id: str) -> bool:
         """暂停任务"""
+        await self._require_leader()
         try:
             if not self._job_exists(job_id):
                 logger.error(f"暂停任务失败: {job_id} 不存在")
@@ -384,6 +442,7 @@ class ExtensibleSchedulerService:
             
     async def resume_job(self, job_id: str) -> bool:
         """恢复任务"""
+        await self._require_leader()
         try:
             if not self._job_exists(job_id):
                 logger.error(f"恢复任务失败: {job_id} 不存在")
@@ -395,6 +454,20 @@ class ExtensibleSchedulerService:
             logger.error(f"恢复任务失败: {job_id}, 错误: {e}")
             return False
             
+    async def _on_elected_leader(self):
+        """当选调度主节点：开始执行定时任务"""
+        self.scheduler.resume()
+        
+    async def _on_demoted(self):
+        """失去主节点身份：暂停定时任务，避免与新的主节点重复执行"""
+        self.scheduler.pause()
+        
+    def get_leader_status(self) -> Dict[str, Any]:
+        """获取主节点选举状态"""
+        if not self.leader_election:
+            return {"enabled": False, "is_leader": self.scheduler.running}
+        return {"enabled": True, **self.leader_election.get_status()}
+            
     # 事件处理方法
     async def _handle_task_completed(self, event: Dict[str, Any]):
         """处理任务完成事件"""
@@ -409,34 +482,42 @@ class ExtensibleSchedulerService:
         logger.info(f"🔍 收到基金净值更新事件: {event}")
         logger.info(f"基金净值已更新: {event['data']['updated_count']} 个基金")
         
-        # 后续操作：更新待确认的操作记录
+        # 后续操作：更新待确认的操作记录（数据库操作在线程中执行，不阻塞事件循环）
         try:
-            from app.utils.database import get_db
-            from app.services.fund_service import DCAService, FundOperationService
-            
-            logger.info("🔍 开始更新待确认操作...")
-            db = next(get_db())
-            try:
-                # 更新定投相关的待确认操作
-                dca_updated = DCAService.update_pending_operations(db)
-                logger.info(f"✅ 更新了 {dca_updated} 个定投待确认操作")
-                
-                # 更新所有待确认操作
-                nav_updated = FundOperationService.update_pending_operations(db)
-                logger.info(f"✅ 更新了 {nav_updated} 个待确认操作")
-                
-                # 提交数据库事务
-                db.commit()
-                logger.info("✅ 待确认操作更新完成")
-                
-            except Exception as e:
-                logger.error(f"❌ 更新待确认操作失败: {e}")
-                db.rollback()
-            finally:
-                db.close()
-                
+            await asyncio.to_thread(self._update_pending_operations)
         except Exception as e:
             logger.error(f"❌ 处理基金净值更新后续操作失败: {e}")
+
+    @staticmethod
+    def _update_pending_operations():
+        """用最新净值更新待确认的定投和普通操作"""
+        from app.utils.database import get_db
+        from app.services.fund_service import DCAService, FundOperationService
+        
+        logger.info("🔍 开始更新待确认操作...")
+        db = next(get_db())
+        try:
+            # 更新定投相关的待确认操作
+            dca_updated = DCAService.update_pending_operations(db)
+            logger.info(f"✅ 更新了 {dca_updated} 个定投待确认操作")
+            
+            # 更新所有待确认操作
+            nav_updated = FundOperationService.update_pending_operations(db)
+            logger.info(f"✅ 更新了 {nav_updated} 个待确认操作")
+            
+            # 提交数据库事务
+            db.commit()
+            logger.info("✅ 待确认操作更新完成")
+            
+        except Exception as e:
+            logger.error(f"❌ 更新待确认操作失败: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        
+    async def _handle_analyst_data_changed(self, event: Dict[str, Any]):
+        """数据同步类事件：使AI分析师数据包失效并在后台重建"""
+        analyst_bundle_service.invalidate(event['type'])
         
     async def _handle_wise_balance_synced(self, event: Dict[str, Any]):
         """处理Wise余额同步事件"""
@@ -457,7 +538,11 @@ class ExtensibleSchedulerService:
     async def shutdown(self):
         """关闭调度器"""
         try:
+            if self.leader_election:
+                await self.leader_election.stop()
             self.scheduler.shutdown()
+            await self.event_bus.close()
+            await task_run_store.flush()
             logger.info("可扩展调度器已关闭")
         except Exception as e:
             logger.error(f"关闭调度器失败: {e}") 
\ No newline at end of file
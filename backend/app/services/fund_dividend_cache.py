@@ -0,0 +1,85 @@
+"""
+全市场基金分红表缓存
+
+akshare 的 fund_fh_em() 每次都会下载全市场的分红表。这里每天最多下载一次，
+按基金代码建好索引，单个基金的分红同步和批量同步都从这一份数据中取。
+下载是阻塞调用，异步代码中请通过 asyncio.to_thread 调用。
+"""
+
+import logging
+import threading
+from datetime import date
+from typing import Dict, List, Optional
+
+from app.services import akshare_provider
+
+logger = logging.getLogger(__name__)
+
+
+class FundDividendTableCache:
+    """按天缓存的全市场分红表，{基金代码: [分红记录]}"""
+
+    def __init__(self):
+        self._by_code: Dict[str, List[dict]] = {}
+        self._loaded_on: Optional[date] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _download() -> Dict[str, List[dict]]:
+        import pandas as pd
+
+        df = akshare_provider.fund_dividend_table()
+        if df is None or df.empty:
+            return {}
+
+        df = df[['基金代码', '权益登记日', '分红']].copy()
+        df['record_date'] = pd.to_datetime(df['权益登记日'], errors='coerce').dt.date
+        df['dividend_amount'] = pd.to_numeric(df['分红'], errors='coerce').fillna(0).astype(float)
+        df = df.dropna(subset=['record_date'])
+
+        by_code: Dict[str, List[dict]] = {}
+        for fund_code, record_date, amount in zip(df['基金代码'], df['record_date'], df['dividend_amount']):
+            by_code.setdefault(str(fund_code), []).append({
+                'dividend_date': record_date,
+                'record_date': record_date,
+                'dividend_amount': amount,
+                'total_dividend': None,
+                'announcement_date': None
+            })
+        return by_code
+
+    def load(self, force: bool = False) -> Dict[str, List[dict]]:
+        """返回当天的分红表，当天尚未下载（或 force）时下载；并发调用只会下载一次"""
+        today = date.today()
+        if not force and self._loaded_on == today:
+            return self._by_code
+
+        with self._lock:
+            if not force and self._loaded_on == today:
+                return self._by_code
+            try:
+                by_code = self._download()
+            except Exception as e:
+                if self._loaded_on is None:
+                    raise
+                # 下载失败时继续使用上一次的数据
+                logger.warning(f"下载全市场分红表失败，继续使用 {self._loaded_on} 的数据: {e}")
+                return self._by_code
+
+            self._by_code = by_code
+            self._loaded_on = today
+            logger.info(f"全市场分红表已更新: {len(by_code)} 只基金")
+            return self._by_code
+
+    def get_fund_dividends(self, fund_code: str) -> List[dict]:
+        """单个基金的分红记录（可直接传给 FundDividendService.save_dividend_data）"""
+        return list(self.load().get(fund_code, []))
+
+    def get_status(self) -> dict:
+        return {
+            "loaded_on": self._loaded_on.isoformat() if self._loaded_on else None,
+            "fund_count": len(self._by_code),
+        }
+
+
+fund_dividend_cache = FundDividendTableCache()
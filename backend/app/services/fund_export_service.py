@@ -0,0 +1,379 @@
+"""
+基金数据流式导出服务
+
+操作记录和持仓按块从数据库游标读取（yield_per，PostgreSQL下为服务端游标），
+每块内批量预加载净值、分红和净值匹配所需的数据，逐块编码为CSV / gzip CSV / Parquet 后输出，
+内存占用与导出总行数无关。
+"""
+
+import csv
+import importlib.util
+import io
+import zlib
+from datetime import date
+from decimal import Decimal
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import desc, func
+from sqlalchemy.orm import Session
+
+from app.models.database import AssetPosition, FundDividend, FundNav, UserOperation
+from app.services.fund_nav_index import fund_nav_index
+from app.services.fund_service import NavMatchingCheckService
+from app.utils.database import SessionLocal
+
+# 每块读取的行数
+EXPORT_CHUNK_SIZE = 1000
+
+# 支持的导出格式: 格式 -> (文件扩展名, media_type)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "csv.gz": ("csv.gz", "application/gzip"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+# 列定义: (列名, 类型)，类型用于Parquet schema: int / float / str
+OPERATION_COLUMNS = [
+    ("操作ID", "int"), ("操作日期", "str"), ("平台", "str"), ("资产类型", "str"), ("操作类型", "str"),
+    ("基金代码", "str"), ("基金名称", "str"), ("金额", "float"), ("货币", "str"), ("数量", "float"),
+    ("价格", "float"), ("净值", "float"), ("手续费", "float"), ("策略", "str"), ("情绪评分", "int"),
+    ("标签", "str"), ("备注", "str"), ("状态", "str"), ("定投计划ID", "int"), ("定投执行类型", "str"),
+    ("创建时间", "str"), ("更新时间", "str"),
+]
+NAV_COLUMNS = [("净值日期", "str"), ("累计净值", "float"), ("净值增长率", "float"), ("净值来源", "str")]
+DIVIDEND_COLUMNS = [("分红日期", "str"), ("分红金额", "float"), ("总分红", "float"), ("公告日期", "str")]
+NAV_CHECK_COLUMNS = [
+    ("净值匹配检查", "str"), ("预期净值日期", "str"), ("实际净值日期", "str"), ("匹配状态", "str"), ("问题描述", "str"),
+]
+POSITION_COLUMNS = [
+    ("持仓ID", "int"), ("平台", "str"), ("资产类型", "str"), ("基金代码", "str"), ("基金名称", "str"), ("货币", "str"),
+    ("持仓数量", "float"), ("平均成本", "float"), ("当前价格", "float"), ("当前价值", "float"), ("总投入", "float"),
+    ("总盈亏", "float"), ("盈亏率", "float"), ("最后更新时间", "str"),
+]
+
+
+def require_export_format(export_format: str) -> None:
+    """校验导出格式，Parquet需要可选依赖pyarrow"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {export_format}，可选: {', '.join(EXPORT_FORMATS)}")
+    if export_format == "parquet":
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ValueError("Parquet导出需要安装pyarrow")
+
+
+def _chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _fmt_datetime(value) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else ""
+
+
+def _fmt_date(value) -> str:
+    return value.strftime("%Y-%m-%d") if value else ""
+
+
+# ---- 操作记录 ----
+
+def operation_columns(include_nav: bool, include_dividend: bool, include_nav_check: bool) -> List[Tuple[str, str]]:
+    columns = list(OPERATION_COLUMNS)
+    if include_nav:
+        columns.extend(NAV_COLUMNS)
+    if include_dividend:
+        columns.extend(DIVIDEND_COLUMNS)
+    if include_nav_check:
+        columns.extend(NAV_CHECK_COLUMNS)
+    return columns
+
+
+def build_operations_query(
+    db: Session,
+    fund_code: Optional[str] = None,
+    operation_type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+):
+    """与 FundOperationService.get_operations 相同的筛选条件，不分页"""
+    query = db.query(UserOperation).filter(UserOperation.asset_type == "基金")
+    if fund_code:
+        query = query.filter(UserOperation.asset_code == fund_code)
+    if operation_type:
+        query = query.filter(UserOperation.operation_type == operation_type)
+    if start_date:
+        query = query.filter(UserOperation.operation_date >= start_date)
+    if end_date:
+        query = query.filter(UserOperation.operation_date <= end_date)
+    return query
+
+
+def _load_dividends(
+    db: Session,
+    cache: Dict[str, Dict[date, FundDividend]],
+    fund_codes: Iterable[str],
+    start_date: Optional[date],
+    end_date: Optional[date]
+) -> None:
+    """一次查询加载一批基金的分红记录"""
+    missing = [code for code in set(fund_codes) if code and code not in cache]
+    if not missing:
+        return
+    query = db.query(FundDividend).filter(FundDividend.fund_code.in_(missing))
+    if start_date:
+        query = query.filter(FundDividend.dividend_date >= start_date)
+    if end_date:
+        query = query.filter(FundDividend.dividend_date <= end_date)
+    for code in missing:
+        cache[code] = {}
+    for dividend in query.all():
+        cache[dividend.fund_code][dividend.dividend_date] = dividend
+
+
+def iter_operation_rows(
+    fund_code: Optional[str] = None,
+    operation_type: Optional[str] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    include_nav: bool = True,
+    include_dividend: bool = True,
+    include_nav_check: bool = True,
+    chunk_size: int = EXPORT_CHUNK_SIZE
+) -> Iterator[List[List[Any]]]:
+    """按块生成操作记录行（每次产出一块行列表）
+
+    使用独立的数据库会话，保证流式响应期间会话一直可用。
+    """
+    db = SessionLocal()
+    try:
+        query = build_operations_query(db, fund_code, operation_type, start_date, end_date)
+        operations = query.order_by(desc(UserOperation.operation_date)).yield_per(chunk_size)
+
+        dividends: Dict[str, Dict[date, FundDividend]] = {}
+
+        for chunk in _chunks(operations, chunk_size):
+            codes = {op.asset_code for op in chunk}
+            if include_nav or include_nav_check:
+                fund_nav_index.preload(db, codes)
+            if include_dividend:
+                _load_dividends(db, dividends, codes, start_date, end_date)
+
+            rows = []
+            for operation in chunk:
+                row = [
+                    operation.id,
+                    _fmt_datetime(operation.operation_date),
+                    operation.platform,
+                    operation.asset_type,
+                    operation.operation_type,
+                    operation.asset_code,
+                    operation.asset_name,
+                    float(operation.amount) if operation.amount else 0,
+                    operation.currency,
+                    float(operation.quantity) if operation.quantity else 0,
+                    float(operation.price) if operation.price else 0,
+                    float(operation.nav) if operation.nav else 0,
+                    float(operation.fee) if operation.fee else 0,
+                    operation.strategy or "",
+                    operation.emotion_score or 0,
+                    operation.tags or "",
+                    operation.notes or "",
+                    operation.status,
+                    operation.dca_plan_id or "",
+                    operation.dca_execution_type or "",
+                    _fmt_datetime(operation.created_at),
+                    _fmt_datetime(operation.updated_at)
+                ]
+                op_date = operation.operation_date.date() if operation.operation_date else None
+
+                if include_nav:
+                    nav_info = fund_nav_index.nav_on(db, operation.asset_code, op_date) if op_date else None
+                    row.extend([
+                        _fmt_date(nav_info.nav_date) if nav_info else "",
+                        float(nav_info.accumulated_nav) if nav_info and nav_info.accumulated_nav else "",
+                        float(nav_info.growth_rate) if nav_info and nav_info.growth_rate else "",
+                        nav_info.source if nav_info else ""
+                    ])
+
+                if include_dividend:
+                    dividend_info = dividends.get(operation.asset_code, {}).get(op_date) if op_date else None
+                    row.extend([
+                        _fmt_date(dividend_info.dividend_date) if dividend_info else "",
+                        float(dividend_info.dividend_amount) if dividend_info and dividend_info.dividend_amount else "",
+                        float(dividend_info.total_dividend) if dividend_info and dividend_info.total_dividend else "",
+                        _fmt_date(dividend_info.announcement_date) if dividend_info else ""
+                    ])
+
+                if include_nav_check:
+                    check_result = NavMatchingCheckService._check_single_operation(db, operation)
+                    row.extend([
+                        "✓" if check_result.get('is_correct', False) else "✗",
+                        check_result.get('expected_nav_date') or '',
+                        check_result.get('actual_nav_date') or '',
+                        check_result.get('status', ''),
+                        check_result.get('issue_description', '')
+                    ])
+
+                rows.append(row)
+            yield rows
+    finally:
+        db.close()
+
+
+# ---- 持仓 ----
+
+def iter_position_rows(chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[List[List[Any]]]:
+    """按块生成基金持仓行，当前价格取每个基金的最新净值（一次查询），不回写数据库"""
+    db = SessionLocal()
+    try:
+        latest_dates = db.query(
+            FundNav.fund_code,
+            func.max(FundNav.nav_date).label("nav_date")
+        ).group_by(FundNav.fund_code).subquery()
+        latest_navs = dict(
+            db.query(FundNav.fund_code, FundNav.nav).join(
+                latest_dates,
+                (FundNav.fund_code == latest_dates.c.fund_code) & (FundNav.nav_date == latest_dates.c.nav_date)
+            ).all()
+        )
+
+        positions = db.query(AssetPosition).filter(
+            AssetPosition.asset_type == "基金"
+        ).order_by(AssetPosition.id).yield_per(chunk_size)
+
+        for chunk in _chunks(positions, chunk_size):
+            rows = []
+            for position in chunk:
+                current_price = latest_navs.get(position.asset_code) or position.current_price
+                quantity = position.quantity or Decimal("0")
+                total_invested = position.total_invested or Decimal("0")
+                if current_price:
+                    current_value = quantity * current_price
+                    total_profit = current_value - total_invested
+                    profit_rate = total_profit / total_invested if total_invested > 0 else Decimal("0")
+                else:
+                    current_value, total_profit, profit_rate = position.current_value, position.total_profit, position.profit_rate
+
+                rows.append([
+                    position.id,
+                    position.platform,
+                    position.asset_type,
+                    position.asset_code,
+                    position.asset_name,
+                    position.currency,
+                    float(quantity),
+                    float(position.avg_cost) if position.avg_cost else 0,
+                    float(current_price) if current_price else 0,
+                    float(current_value) if current_value else 0,
+                    float(total_invested),
+                    float(total_profit) if total_profit else 0,
+                    float(profit_rate) if profit_rate else 0,
+                    _fmt_datetime(position.last_updated)
+                ])
+            yield rows
+    finally:
+        db.close()
+
+
+# ---- 编码 ----
+
+def stream_csv(
+    columns: List[Tuple[str, str]],
+    row_chunks: Iterable[List[List[Any]]],
+    compress: bool = False
+) -> Iterator[bytes]:
+    """逐块编码为CSV（UTF-8-BOM，确保Excel正确显示中文），compress时输出gzip流"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+
+    def _drain(prefix: str = "") -> bytes:
+        data = (prefix + buffer.getvalue()).encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow([name for name, _ in columns])
+    yield _drain("\ufeff")
+    for rows in row_chunks:
+        writer.writerows(rows)
+        data = _drain()
+        if data:
+            yield data
+    if compressor:
+        yield compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """只追加的输出目标：ParquetWriter写入的字节按块取走，tell()返回累计偏移"""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def stream_parquet(columns: List[Tuple[str, str]], row_chunks: Iterable[List[List[Any]]]) -> Iterator[bytes]:
+    """逐块编码为Parquet，每块一个row group"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    arrow_types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+    schema = pa.schema([(name, arrow_types[kind]) for name, kind in columns])
+
+    def _value(value, kind):
+        if value is None or (value == "" and kind != "str"):
+            return None
+        if kind == "int":
+            return int(value)
+        if kind == "float":
+            return float(value)
+        return str(value)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        for rows in row_chunks:
+            arrays = [
+                pa.array([_value(row[i], kind) for row in rows], type=arrow_types[kind])
+                for i, (_, kind) in enumerate(columns)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def encode_rows(
+    export_format: str,
+    columns: List[Tuple[str, str]],
+    row_chunks: Iterable[List[List[Any]]]
+) -> Iterator[bytes]:
+    """按导出格式编码行块"""
+    if export_format == "parquet":
+        return stream_parquet(columns, row_chunks)
+    return stream_csv(columns, row_chunks, compress=export_format == "csv.gz")
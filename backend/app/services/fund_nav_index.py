@@ -0,0 +1,162 @@
+"""
+基金交易日历 / 净值索引
+
+每个基金首次使用时一次性加载全部净值，保存为按日期排序的数组，
+之后"下一个交易日"、"指定日期净值"、"截至某日的最新净值"都是内存中的二分查找。
+
+FundNav 有写入（插入、更新、删除）并提交后，对应基金的索引自动失效，下次使用时重新加载。
+"""
+
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.models.database import FundNav
+from app.settings import settings
+
+# "下一个交易日"的查找窗口（天）
+NEXT_TRADING_DAY_WINDOW = 30
+
+
+class NavPoint(NamedTuple):
+    """净值点，字段名与 FundNav 一致，可直接替代只读的 FundNav 使用"""
+    fund_code: str
+    nav_date: date
+    nav: Decimal
+    accumulated_nav: Optional[Decimal]
+    growth_rate: Optional[Decimal]
+    source: Optional[str]
+
+
+class _FundCalendar:
+    """单个基金的交易日历：升序日期数组 + 对应净值点"""
+
+    def __init__(self, points: List[NavPoint]):
+        self.points = points
+        self.dates = [point.nav_date for point in points]
+        self.loaded_at = time.monotonic()
+
+
+class FundNavIndex:
+    """进程内的基金净值索引（按基金懒加载）"""
+
+    def __init__(self, ttl: float = 3600):
+        # 兜底过期时间，防止绕过ORM的写入（如其他进程）导致索引长期不一致
+        self.ttl = ttl
+        self._calendars: Dict[str, _FundCalendar] = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, fund_code: str) -> Optional[_FundCalendar]:
+        calendar = self._calendars.get(fund_code)
+        if calendar is not None and time.monotonic() - calendar.loaded_at < self.ttl:
+            return calendar
+        return None
+
+    def _load(self, db: Session, fund_codes: List[str]) -> Dict[str, _FundCalendar]:
+        """一次查询加载指定基金的索引"""
+        if not fund_codes:
+            return {}
+
+        rows = db.query(
+            FundNav.fund_code, FundNav.nav_date, FundNav.nav,
+            FundNav.accumulated_nav, FundNav.growth_rate, FundNav.source
+        ).filter(FundNav.fund_code.in_(fund_codes)).order_by(FundNav.fund_code, FundNav.nav_date).all()
+        points: Dict[str, List[NavPoint]] = {code: [] for code in fund_codes}
+        for row in rows:
+            points[row[0]].append(NavPoint(*row))
+        calendars = {code: _FundCalendar(code_points) for code, code_points in points.items()}
+        with self._lock:
+            self._calendars.update(calendars)
+        return calendars
+
+    def preload(self, db: Session, fund_codes: Iterable[str]) -> None:
+        """一次查询加载多个基金中尚未加载（或已过期）的索引，批量处理前调用"""
+        self._load(db, [code for code in set(fund_codes) if code and self._fresh(code) is None])
+
+    def _calendar(self, db: Session, fund_code: str) -> _FundCalendar:
+        calendar = self._fresh(fund_code)
+        if calendar is not None:
+            return calendar
+        return self._load(db, [fund_code])[fund_code]
+
+    def points(self, db: Session, fund_code: str) -> List[NavPoint]:
+        """按日期升序的全部净值点"""
+        return self._calendar(db, fund_code).points
+
+    def nav_on(self, db: Session, fund_code: str, nav_date: date) -> Optional[NavPoint]:
+        """指定日期的净值"""
+        calendar = self._calendar(db, fund_code)
+        index = bisect_left(calendar.dates, nav_date)
+        if index < len(calendar.dates) and calendar.dates[index] == nav_date:
+            return calendar.points[index]
+        return None
+
+    def nav_as_of(self, db: Session, fund_code: str, as_of: date) -> Optional[NavPoint]:
+        """截至指定日期（含）的最新净值"""
+        calendar = self._calendar(db, fund_code)
+        index = bisect_right(calendar.dates, as_of)
+        return calendar.points[index - 1] if index else None
+
+    def next_trading_day(self, db: Session, fund_code: str, start_date: date,
+                         window_days: int = NEXT_TRADING_DAY_WINDOW) -> Optional[date]:
+        """start_date 之后（不含）window_days 天内第一个有净值的日期"""
+        calendar = self._calendar(db, fund_code)
+        index = bisect_right(calendar.dates, start_date)
+        if index < len(calendar.dates) and calendar.dates[index] <= start_date + timedelta(days=window_days):
+            return calendar.dates[index]
+        return None
+
+    def invalidate(self, fund_code: Optional[str] = None) -> None:
+        """使某个基金（不指定时为全部）的索引失效"""
+        with self._lock:
+            if fund_code is None:
+                self._calendars.clear()
+            else:
+                self._calendars.pop(fund_code, None)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {
+            "funds": len(self._calendars),
+            "points": sum(len(calendar.dates) for calendar in self._calendars.values()),
+        }
+
+
+fund_nav_index = FundNavIndex(ttl=settings.fund_nav_index_ttl)
+
+
+# ---- 写入后失效 ----
+
+_DIRTY_KEY = "fund_nav_index_dirty"
+
+
+def _mark_dirty(mapper, connection, target) -> None:
+    session = Session.object_session(target)
+    if session is not None:
+        dirty: Set[str] = session.info.setdefault(_DIRTY_KEY, set())
+        dirty.add(target.fund_code)
+    # 立即失效一次，避免同一会话在提交前读到旧索引
+    fund_nav_index.invalidate(target.fund_code)
+
+
+def _invalidate_committed(session: Session) -> None:
+    # 提交后再失效一次：提交前其他会话可能按旧数据重建了索引
+    for fund_code in session.info.pop(_DIRTY_KEY, set()):
+        fund_nav_index.invalidate(fund_code)
+
+
+def _invalidate_rolled_back(session: Session) -> None:
+    # 回滚后也要失效：回滚前本会话可能按已flush未提交的数据重建了索引
+    for fund_code in session.info.pop(_DIRTY_KEY, set()):
+        fund_nav_index.invalidate(fund_code)
+
+
+for _event_name in ("after_insert", "after_update", "after_delete"):
+    event.listen(FundNav, _event_name, _mark_dirty)
+event.listen(Session, "after_commit", _invalidate_committed)
+event.listen(Session, "after_rollback", _invalidate_rolled_back)
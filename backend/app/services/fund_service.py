@@ -1,16 +1,21 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, desc, func, text
-from typing import List, Optional, Tuple
+from sqlalchemy import and_, or_, desc, func, text, case
+from typing import Dict, Iterable, List, Optional, Tuple
 from datetime import datetime, date, timedelta, time
 from decimal import Decimal, ROUND_HALF_UP
 import json
-import akshare as ak
+from itertools import groupby
+from time import perf_counter
 import logging
+import numpy as np
 
 from app.models.database import UserOperation, FundInfo, FundNav, AssetPosition, DCAPlan, FundDividend
 from app.models.schemas import FundOperationCreate, FundOperationUpdate, FundPosition, DCAPlanCreate, DCAPlanUpdate, FundDividendCreate
 from app.utils.database import get_db_context
 from app.services.fund_api_service import FundAPIService
+from app.services.fund_nav_index import NEXT_TRADING_DAY_WINDOW, NavPoint, fund_nav_index
+from app.services.fund_dividend_cache import fund_dividend_cache
+from app.services import akshare_provider
 from app.utils.auto_logger import auto_log
 
 
@@ -255,14 +260,9 @@ class FundOperationService:
                     return
     
     @staticmethod
-    def _get_nav_by_date(db: Session, fund_code: str, nav_date: date) -> Optional[FundNav]:
-        """根据日期获取基金净值"""
-        return db.query(FundNav).filter(
-            and_(
-                FundNav.fund_code == fund_code,
-                FundNav.nav_date == nav_date
-            )
-        ).first()
+    def _get_nav_by_date(db: Session, fund_code: str, nav_date: date) -> Optional[NavPoint]:
+        """根据日期获取基金净值（走净值索引）"""
+        return fund_nav_index.nav_on(db, fund_code, nav_date)
     
     @staticmethod
     def _update_position(db: Session, operation: UserOperation):
@@ -278,6 +278,37 @@ class FundOperationService:
             )
         ).first()
         
+        if operation.operation_type == "buy" and not position:
+            FundOperationService._sync_position_sequence(db)
+        
+        FundOperationService._apply_position_change(db, operation, position)
+        db.commit()
+    
+    @staticmethod
+    def _sync_position_sequence(db: Session):
+        """PostgreSQL序列修复：序列值落后于表中最大ID时重置序列"""
+        try:
+            # 获取表中最大ID
+            max_id_result = db.execute(text("SELECT MAX(id) FROM asset_positions"))
+            max_id = max_id_result.scalar()
+            
+            if max_id is not None:
+                # 获取当前序列值
+                seq_result = db.execute(text("SELECT last_value FROM asset_positions_id_seq"))
+                current_seq = seq_result.scalar()
+                
+                # 如果序列值小于最大ID，重置序列
+                if current_seq < max_id:
+                    print(f"[调试] 重置asset_positions序列: 当前={current_seq}, 最大ID={max_id}")
+                    db.execute(text(f"SELECT setval('asset_positions_id_seq', {max_id})"))
+                    db.commit()  # 提交序列重置
+                    print(f"[调试] asset_positions序列重置完成")
+        except Exception as e:
+            print(f"[调试] asset_positions序列检查失败: {e}")
+    
+    @staticmethod
+    def _apply_position_change(db: Session, operation: UserOperation, position: Optional[AssetPosition]) -> Optional[AssetPosition]:
+        """把一条已确认操作计入持仓（不提交），返回操作后的持仓，全部卖出时返回None"""
         if operation.operation_type == "buy":
             if position:
                 # 更新现有持仓
@@ -296,26 +327,6 @@ class FundOperationService:
                 
                 # 更新持仓: {operation.asset_code}
             else:
-                # PostgreSQL序列修复：检查并重置序列
-                try:
-                    # 获取表中最大ID
-                    max_id_result = db.execute(text("SELECT MAX(id) FROM asset_positions"))
-                    max_id = max_id_result.scalar()
-                    
-                    if max_id is not None:
-                        # 获取当前序列值
-                        seq_result = db.execute(text("SELECT last_value FROM asset_positions_id_seq"))
-                        current_seq = seq_result.scalar()
-                        
-                        # 如果序列值小于最大ID，重置序列
-                        if current_seq < max_id:
-                            print(f"[调试] 重置asset_positions序列: 当前={current_seq}, 最大ID={max_id}")
-                            db.execute(text(f"SELECT setval('asset_positions_id_seq', {max_id})"))
-                            db.commit()  # 提交序列重置
-                            print(f"[调试] asset_positions序列重置完成")
-                except Exception as e:
-                    print(f"[调试] asset_positions序列检查失败: {e}")
-                
                 # 创建新持仓
                 position = AssetPosition(
                     platform=operation.platform,
@@ -354,11 +365,12 @@ class FundOperationService:
                     # 全部卖出，删除持仓记录
                     # 全部卖出: {operation.asset_code}
                     db.delete(position)
+                    position = None
             else:
                 # 卖出失败: {operation.asset_code}, 持仓不存在或份额不足
                 pass
         
-        db.commit()
+        return position
     
     @staticmethod
     @auto_log("database", log_result=True)
@@ -790,100 +802,28 @@ class FundOperationService:
     
     @staticmethod
     def update_pending_operations(db: Session) -> int:
-        """更新所有待确认的操作记录的净值"""
-        today = date.today()
-        updated_count = 0
-        
-        # 查找所有待确认的操作记录
-        pending_operations = db.query(UserOperation).filter(
-            and_(
-                UserOperation.status == "pending",
-                UserOperation.operation_type == "buy",
-                UserOperation.dca_plan_id.isnot(None)
-            )
-        ).all()
-        
-        for operation in pending_operations:
-            # 查找对应基金的当天净值
-            nav_obj = db.query(FundNav).filter(
-                and_(
-                    FundNav.fund_code == operation.asset_code,
-                    FundNav.nav_date == today
-                )
-            ).first()
-            
-            if nav_obj:
-                # 更新操作记录
-                operation.nav = nav_obj.nav
-                operation.status = "confirmed"
-                
-                # 计算份额
-                shares = (operation.amount - operation.fee) / nav_obj.nav
-                operation.quantity = shares
-                operation.price = nav_obj.nav
-                
-                # 更新持仓
-                FundOperationService._update_position(db, operation)
-                
-                updated_count += 1
-        
-        if updated_count > 0:
-            db.commit()
-        
-        return updated_count
+        """更新所有待确认的定投买入操作（批量确认，见 PendingOperationConfirmer）"""
+        return PendingOperationConfirmer.run(db, dca_buys_only=True)["confirmed"]
     
     @staticmethod
     def _get_next_trading_day(db: Session, fund_code: str, start_date: date) -> Optional[date]:
-        """获取下一个交易日（通过查询净值数据判断）"""
-        print(f"[调试] 查找基金 {fund_code} 从 {start_date} 开始的下一个交易日")
-        
-        # 查找从start_date开始未来30天内的所有净值记录
-        future_navs = db.query(FundNav).filter(
-                and_(
-                    FundNav.fund_code == fund_code,
-                FundNav.nav_date > start_date,
-                FundNav.nav_date <= start_date + timedelta(days=30)
-            )
-        ).order_by(FundNav.nav_date).all()
-        
-        if future_navs:
-            next_trading_day = future_navs[0].nav_date
-            print(f"[调试] 找到下一个交易日: {next_trading_day}")
-            return next_trading_day
-        else:
-            print(f"[调试] 未找到下一个交易日，仅依赖数据库中的akshare数据")
-        
-        print(f"[调试] 无法确定下一个交易日")
-        return None
+        """获取下一个交易日（净值索引中 start_date 之后30天内第一个有净值的日期）"""
+        return fund_nav_index.next_trading_day(db, fund_code, start_date)
     
     @staticmethod
     def _get_nav_date_by_operation_time(db: Session, fund_code: str, operation_datetime: datetime) -> Optional[date]:
         """根据操作时间确定对应的净值日期"""
         operation_date = operation_datetime.date()
-        operation_time = operation_datetime.time()
-        
-        print(f"[调试] 根据操作时间确定净值日期: {operation_datetime}")
-        print(f"[调试] 操作日期: {operation_date}, 操作时间: {operation_time}")
         
         # 15:00之前使用当天净值，15:00之后使用下一个交易日净值
-        if operation_time < time(15, 0):
-            nav_date = operation_date
-            print(f"[调试] 15:00之前，使用当天净值日期: {nav_date}")
-        else:
-            # 15:00之后，查找下一个交易日
-            next_trading_day = FundOperationService._get_next_trading_day(db, fund_code, operation_date)
-            if next_trading_day:
-                nav_date = next_trading_day
-                print(f"[调试] 15:00之后，使用下一个交易日净值日期: {nav_date}")
-            else:
-                # 如果无法确定下一个交易日，使用当天
-                nav_date = operation_date
-                print(f"[调试] 无法确定下一个交易日，使用当天净值日期: {nav_date}")
+        if operation_datetime.time() < time(15, 0):
+            return operation_date
         
-        return nav_date
+        # 如果无法确定下一个交易日，使用当天
+        return FundOperationService._get_next_trading_day(db, fund_code, operation_date) or operation_date
     
     @staticmethod
-    def _get_nav_by_operation_time(db: Session, fund_code: str, operation_datetime: datetime) -> Optional[FundNav]:
+    def _get_nav_by_operation_time(db: Session, fund_code: str, operation_datetime: datetime) -> Optional[NavPoint]:
         """根据操作时间获取对应的基金净值"""
         nav_date = FundOperationService._get_nav_date_by_operation_time(db, fund_code, operation_datetime)
         if nav_date:
@@ -1053,7 +993,7 @@ class FundNavService:
         """用akshare拉取指定基金的历史净值并写入数据库，返回写入条数"""
         try:
             print(f"[调试] 开始用akshare拉取基金 {fund_code} 的历史净值")
-            df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
+            df = akshare_provider.fund_nav_history(fund_code)
             print(f"[调试] akshare返回数据行数: {len(df)}")
             
             count = 0
@@ -1108,7 +1048,7 @@ class FundNavService:
         """强制更新基金历史净值（统一方法，避免重复）"""
         try:
             print(f"[调试] 开始强制更新基金 {fund_code} 的历史净值")
-            df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
+            df = akshare_provider.fund_nav_history(fund_code)
             print(f"[调试] akshare返回数据行数: {len(df)}")
             
             count = 0
@@ -1547,100 +1487,24 @@ class DCAService:
     @staticmethod
     def _update_plan_statistics(db: Session, plan_id: int):
         """手动更新定投计划统计信息"""
-        plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
-        if not plan:
-            return False
-        
-        # 重新计算计划统计信息
-        operations = db.query(UserOperation).filter(
-            UserOperation.dca_plan_id == plan_id
-        ).all()
-        
-        plan.execution_count = len(operations)
-        plan.total_invested = sum(op.amount for op in operations)
-        plan.total_shares = sum(op.quantity for op in operations if op.quantity is not None)
-        
-        # 修改：基于实际执行时间计算last_execution_date，而不是操作记录中的历史日期
-        from datetime import date
-        today = date.today()
-        
-        # 如果有操作记录，检查是否有最近执行的操作
-        if operations:
-            # 查找最近7天内的操作记录
-            recent_operations = [op for op in operations if (today - op.operation_date.date()).days <= 7]
-            if recent_operations:
-                # 如果有最近的操作，使用最新的操作日期
-                plan.last_execution_date = max(op.operation_date.date() for op in recent_operations)
-            else:
-                # 如果没有最近的操作，使用今天作为最后执行日期（表示计划是活跃的）
-                plan.last_execution_date = today
-        else:
-            # 没有操作记录，设置为None
-            plan.last_execution_date = None
-        
-        plan.updated_at = datetime.now()
-        
-        db.commit()
-        return True
+        return DCAService.update_plan_statistics(db, plan_id)
     
     @staticmethod
     def check_and_execute_dca_plans(db: Session) -> List[UserOperation]:
-        """检查并执行到期的定投计划"""
-        today = datetime.now().date()
-        active_plans = DCAService.get_dca_plans(db, "active")
-        
-        print(f"[调试] 检查定投计划执行 - 今天: {today}")
-        print(f"[调试] 找到 {len(active_plans)} 个活跃计划")
-        
-        executed_operations = []
-        for plan in active_plans:
-            # 使用字典键值访问，因为get_dca_plans返回的是字典列表
-            next_execution_date = plan.get('next_execution_date')
-            end_date = plan.get('end_date')
-            plan_id = plan.get('id')
-            start_date = plan.get('start_date')
-            frequency = plan.get('frequency')
-            frequency_value = plan.get('frequency_value')
-            
-            # 检查计划是否已过期
-            # 对于已过期的计划，跳过执行，让用户在前端修改
-            if end_date and end_date < today:
-                print(f"[警告] 定投计划 {plan_id} 已过期 (结束日期: {end_date})，跳过执行")
-                continue
-            
-            # 如果next_execution_date为null，说明是第一次运行，应该执行今天的定投
-            if not next_execution_date:
-                if start_date and frequency and frequency_value:
-                    print(f"[信息] 计划 {plan_id} 是第一次运行，设置为今天执行")
-                    # 设置为今天执行
-                    next_execution_date = today
-                else:
-                    # 无法计算下次执行日期，跳过
-                    print(f"[警告] 计划 {plan_id} 缺少必要信息，跳过")
-                    continue
-            
-            # 检查计划是否已过期（只有设置了结束日期的计划才检查）
-            if end_date and end_date < today:
-                print(f"[警告] 定投计划 {plan_id} 已过期 (结束日期: {end_date})，跳过执行")
-                continue
-            
-            # 检查是否应该执行
-            print(f"[调试] 计划 {plan_id}: next_execution_date={next_execution_date}, end_date={end_date}")
-            
-            if (next_execution_date and 
-                next_execution_date <= today):
-                
-                print(f"[调试] 执行计划 {plan_id}")
-                operation = DCAService.execute_dca_plan(db, plan_id, "scheduled")
-                if operation:
-                    executed_operations.append(operation)
-                    print(f"[调试] 计划 {plan_id} 执行成功")
-                else:
-                    print(f"[调试] 计划 {plan_id} 执行失败")
-            else:
-                print(f"[调试] 计划 {plan_id} 不满足执行条件")
-        
-        return executed_operations
+        """检查并执行到期的定投计划（批量执行，见 DCABatchExecutor）"""
+        operations, _ = DCABatchExecutor.run(db)
+        return operations
+    
+    @staticmethod
+    def count_due_plans(db: Session, plan_ids: Optional[List[int]] = None) -> int:
+        """今天到期的定投计划数（不执行）"""
+        return DCABatchExecutor.due_plans_query(db, date.today(), plan_ids).count()
+    
+    @staticmethod
+    def execute_due_plans(db: Session, plan_ids: Optional[List[int]] = None) -> dict:
+        """批量执行到期的定投计划，返回逐计划的执行报告"""
+        _, report = DCABatchExecutor.run(db, plan_ids)
+        return report
     
     @staticmethod
     def _calculate_next_execution_date(start_date: date, frequency: str, frequency_value: int) -> date:
@@ -1685,22 +1549,17 @@ class DCAService:
         if not plan.smart_dca:
             return plan.amount
         
-        # 获取最新净值
-        latest_nav = FundNavService.get_latest_nav(db, plan.asset_code)
-        if not latest_nav:
+        latest_nav, avg_nav = DCAService._load_nav_benchmarks(db, [plan.asset_code]).get(plan.asset_code, (None, None))
+        return DCAService._smart_amount(plan, latest_nav, avg_nav)
+    
+    @staticmethod
+    def _smart_amount(plan: DCAPlan, latest_nav: Optional[Decimal], avg_nav: Optional[Decimal]) -> Decimal:
+        """根据最新净值相对近30个净值均值的偏离度调整定投金额"""
+        if not plan.smart_dca:
             return plan.amount
-        
-        # 获取历史净值数据（用于计算平均净值）
-        nav_history = db.query(FundNav).filter(
-            FundNav.fund_code == plan.asset_code
-        ).order_by(FundNav.nav_date.desc()).limit(30).all()
-        
-        if not nav_history:
+        if not latest_nav or not avg_nav:
             return plan.amount
         
-        # 计算平均净值
-        avg_nav = sum(nav.nav for nav in nav_history) / len(nav_history)
-        
         # 计算净值偏离度
         nav_deviation = (avg_nav - latest_nav) / avg_nav
         
@@ -1713,66 +1572,92 @@ class DCAService:
             return plan.base_amount or plan.amount
     
     @staticmethod
-    @auto_log("database", log_result=True)
-    def get_dca_statistics(db: Session, plan_id: int) -> dict:
-        """获取定投计划统计信息"""
-        print(f'[统计] 查询plan_id={plan_id}')
-        plan = DCAService.get_dca_plan_by_id(db, plan_id)
-        if not plan:
-            print(f'[统计] 未找到定投计划 plan_id={plan_id}')
+    def _load_nav_benchmarks(db: Session, fund_codes: Iterable[str], window: int = 30) -> Dict[str, Tuple[Decimal, Decimal]]:
+        """一次查询取多个基金的最新净值和最近 window 个净值的均值：{基金代码: (最新净值, 平均净值)}"""
+        fund_codes = [code for code in set(fund_codes) if code]
+        if not fund_codes:
             return {}
         
-        # 获取该计划的所有操作记录
-        operations = db.query(UserOperation).filter(
-            UserOperation.dca_plan_id == plan_id
-        ).order_by(UserOperation.operation_date).all()
-        print(f'[统计] 操作记录数: {len(operations)}')
-        if not operations:
-            print(f'[统计] 无操作记录，返回全为0')
-            return {
-                "plan_id": plan_id,
-                "total_operations": 0,
-                "total_invested": 0,
-                "total_shares": 0,
-                "avg_cost": 0,
-                "current_value": 0,
-                "total_profit": 0,
-                "profit_rate": 0
-            }
+        ranked = db.query(
+            FundNav.fund_code,
+            FundNav.nav,
+            func.row_number().over(partition_by=FundNav.fund_code, order_by=FundNav.nav_date.desc()).label("rn")
+        ).filter(FundNav.fund_code.in_(fund_codes)).subquery()
+        rows = db.query(
+            ranked.c.fund_code,
+            func.max(case((ranked.c.rn == 1, ranked.c.nav))).label("latest_nav"),
+            func.avg(ranked.c.nav).label("avg_nav")
+        ).filter(ranked.c.rn <= window).group_by(ranked.c.fund_code).all()
         
-        total_invested = sum(float(op.amount or 0) for op in operations)
-        total_shares = sum(float(op.quantity or 0) for op in operations)
-        avg_cost = float(total_invested / total_shares) if total_shares else 0
-
-        # 获取最新净值，修复为取nav字段
-        latest_nav_obj = db.query(FundNav).filter(FundNav.fund_code == plan.asset_code).order_by(FundNav.nav_date.desc()).first()
-        if latest_nav_obj:
-            latest_nav = float(getattr(latest_nav_obj, 'nav', 0) or 0)
-        else:
-            latest_nav = 0.0
-        print(f'[统计] latest_nav={latest_nav}')
-
-        current_value = float(total_shares * latest_nav)
-        total_profit = float(current_value - total_invested)
-        profit_rate = float(total_profit / total_invested) if total_invested else 0
-
-        print(f'[统计] total_invested={total_invested}')
-        print(f'[统计] total_shares={total_shares}')
-        print(f'[统计] avg_cost={avg_cost}')
-        print(f'[统计] current_value={current_value}')
-        print(f'[统计] total_profit={total_profit}')
-        print(f'[统计] profit_rate={profit_rate}')
-
         return {
-            "plan_id": plan_id,
-            "total_operations": len(operations),
-            "total_invested": total_invested,
-            "total_shares": total_shares,
-            "avg_cost": avg_cost,
-            "current_value": current_value,
-            "total_profit": total_profit,
-            "profit_rate": profit_rate
+            row.fund_code: (Decimal(str(row.latest_nav)), Decimal(str(row.avg_nav)))
+            for row in rows
         }
+    
+    @staticmethod
+    def _plan_operation_aggregates(db: Session, plan_ids: Optional[List[int]] = None):
+        """按 dca_plan_id 聚合操作记录：次数、投入金额、份额、最近7天内最后一次操作时间"""
+        recent_since = datetime.combine(date.today() - timedelta(days=7), time.min)
+        query = db.query(
+            UserOperation.dca_plan_id.label("plan_id"),
+            func.count(UserOperation.id).label("operation_count"),
+            func.coalesce(func.sum(UserOperation.amount), 0).label("total_invested"),
+            func.coalesce(func.sum(UserOperation.quantity), 0).label("total_shares"),
+            func.max(
+                case((UserOperation.operation_date >= recent_since, UserOperation.operation_date))
+            ).label("last_recent_operation")
+        ).filter(UserOperation.dca_plan_id.isnot(None))
+        if plan_ids is not None:
+            query = query.filter(UserOperation.dca_plan_id.in_(plan_ids))
+        return query.group_by(UserOperation.dca_plan_id)
+    
+    @staticmethod
+    def get_all_dca_statistics(db: Session, plan_ids: Optional[List[int]] = None) -> Dict[int, dict]:
+        """一条语句计算所有（或指定）定投计划的统计信息：操作聚合 + 基金最新净值"""
+        aggregates = DCAService._plan_operation_aggregates(db, plan_ids).subquery()
+        ranked_nav = db.query(
+            FundNav.fund_code,
+            FundNav.nav,
+            func.row_number().over(partition_by=FundNav.fund_code, order_by=FundNav.nav_date.desc()).label("rn")
+        ).filter(FundNav.fund_code.in_(db.query(DCAPlan.asset_code))).subquery()
+        latest_nav = db.query(ranked_nav.c.fund_code, ranked_nav.c.nav).filter(ranked_nav.c.rn == 1).subquery()
+        
+        query = db.query(
+            DCAPlan.id,
+            aggregates.c.operation_count,
+            aggregates.c.total_invested,
+            aggregates.c.total_shares,
+            latest_nav.c.nav
+        ).outerjoin(aggregates, aggregates.c.plan_id == DCAPlan.id
+        ).outerjoin(latest_nav, latest_nav.c.fund_code == DCAPlan.asset_code)
+        if plan_ids is not None:
+            query = query.filter(DCAPlan.id.in_(plan_ids))
+        
+        statistics = {}
+        for plan_id, operation_count, total_invested, total_shares, nav in query.all():
+            total_invested = float(total_invested or 0)
+            total_shares = float(total_shares or 0)
+            nav_value = float(nav or 0)
+            # 没有操作记录时全部为0
+            current_value = total_shares * nav_value if operation_count else 0
+            total_profit = current_value - total_invested
+            statistics[plan_id] = {
+                "plan_id": plan_id,
+                "total_operations": operation_count or 0,
+                "total_invested": total_invested,
+                "total_shares": total_shares,
+                "avg_cost": total_invested / total_shares if total_shares else 0,
+                "current_value": current_value,
+                "total_profit": total_profit,
+                "profit_rate": total_profit / total_invested if total_invested else 0
+            }
+        return statistics
+    
+    @staticmethod
+    @auto_log("database", log_result=True)
+    def get_dca_statistics(db: Session, plan_id: int) -> dict:
+        """获取定投计划统计信息，计划不存在时返回空字典"""
+        return DCAService.get_all_dca_statistics(db, [plan_id]).get(plan_id, {})
 
     @staticmethod
     def generate_historical_operations(db: Session, plan_id: int, end_date: Optional[date] = None, skip_holidays: bool = True, exclude_dates: Optional[List[date]] = None) -> int:
@@ -1946,14 +1831,14 @@ class DCAService:
 
     @staticmethod
     def update_all_plan_statuses(db: Session) -> int:
-        """批量更新所有定投计划状态"""
-        updated_count = 0
-        plans = db.query(DCAPlan).filter(DCAPlan.status == 'active').all()
-        
-        for plan in plans:
-            if plan.end_date and plan.end_date < date.today():
-                plan.status = 'completed'
-                updated_count += 1
+        """批量更新所有定投计划状态：已过结束日期的进行中计划改为已完成"""
+        updated_count = db.query(DCAPlan).filter(
+            and_(
+                DCAPlan.status == 'active',
+                DCAPlan.end_date.isnot(None),
+                DCAPlan.end_date < date.today()
+            )
+        ).update({DCAPlan.status: 'completed'}, synchronize_session=False)
         
         if updated_count > 0:
             db.commit()
@@ -1986,41 +1871,44 @@ class DCAService:
     @staticmethod
     def update_plan_statistics(db: Session, plan_id: int) -> bool:
         """手动更新定投计划统计信息"""
-        plan = db.query(DCAPlan).filter(DCAPlan.id == plan_id).first()
-        if not plan:
-            return False
-        
-        # 重新计算计划统计信息
-        operations = db.query(UserOperation).filter(
-            UserOperation.dca_plan_id == plan_id
-        ).all()
-        
-        plan.execution_count = len(operations)
-        plan.total_invested = sum(op.amount for op in operations)
-        plan.total_shares = sum(op.quantity for op in operations if op.quantity is not None)
+        return DCAService.update_all_plan_statistics(db, [plan_id]) > 0
+    
+    @staticmethod
+    def update_all_plan_statistics(db: Session, plan_ids: Optional[List[int]] = None, commit: bool = True) -> int:
+        """用一次聚合查询刷新所有（或指定）定投计划的统计信息，在同一个事务中提交，返回更新的计划数
+
+        commit=False 时只修改不提交，由调用方和其他写入一起提交
+        """
+        plans_query = db.query(DCAPlan)
+        if plan_ids is not None:
+            plans_query = plans_query.filter(DCAPlan.id.in_(plan_ids))
+        plans = plans_query.all()
+        if not plans:
+            return 0
         
-        # 修改：基于实际执行时间计算last_execution_date，而不是操作记录中的历史日期
-        from datetime import date
+        aggregates = {row.plan_id: row for row in DCAService._plan_operation_aggregates(db, plan_ids).all()}
         today = date.today()
+        now = datetime.now()
         
-        # 如果有操作记录，检查是否有最近执行的操作
-        if operations:
-            # 查找最近7天内的操作记录
-            recent_operations = [op for op in operations if (today - op.operation_date.date()).days <= 7]
-            if recent_operations:
-                # 如果有最近的操作，使用最新的操作日期
-                plan.last_execution_date = max(op.operation_date.date() for op in recent_operations)
+        for plan in plans:
+            row = aggregates.get(plan.id)
+            if row is None:
+                # 没有操作记录
+                plan.execution_count = 0
+                plan.total_invested = Decimal('0')
+                plan.total_shares = Decimal('0')
+                plan.last_execution_date = None
             else:
-                # 如果没有最近的操作，使用今天作为最后执行日期（表示计划是活跃的）
-                plan.last_execution_date = today
-        else:
-            # 没有操作记录，设置为None
-            plan.last_execution_date = None
-        
-        plan.updated_at = datetime.now()
-        
-        db.commit()
-        return True
+                plan.execution_count = row.operation_count
+                plan.total_invested = row.total_invested
+                plan.total_shares = row.total_shares
+                # 基于实际执行时间：最近7天内有操作用最新操作日期，否则用今天（表示计划是活跃的）
+                plan.last_execution_date = row.last_recent_operation.date() if row.last_recent_operation else today
+            plan.updated_at = now
+        
+        if commit:
+            db.commit()
+        return len(plans)
 
     @staticmethod
     def clean_plan_operations_by_date_range(db: Session, plan_id: int, start_date: date, end_date: date) -> int:
@@ -2085,47 +1973,8 @@ class DCAService:
 
     @staticmethod
     def update_pending_operations(db: Session) -> int:
-        """更新所有待确认的操作记录（包括手动操作和定投操作）"""
-        updated_count = 0
-        
-        # 查找所有待确认的操作（包括手动操作和定投操作）
-        pending_operations = db.query(UserOperation).filter(
-            UserOperation.status == "pending"
-        ).all()
-        
-        print(f"[调试] 找到 {len(pending_operations)} 个待确认的操作")
-        
-        for operation in pending_operations:
-            try:
-                print(f"[调试] 处理操作 {operation.id}: asset_code={operation.asset_code}, operation_date={operation.operation_date}")
-                
-                # 根据操作时间获取对应的净值
-                nav_record = FundOperationService._get_nav_by_operation_time(db, operation.asset_code, operation.operation_date)
-                
-                print(f"[调试] 操作 {operation.id} 根据时间匹配的净值记录: {nav_record}")
-                
-                if nav_record:
-                    print(f"[调试] 找到净值记录，开始计算份额: nav={nav_record.nav}")
-                    # 计算份额并确认操作
-                    if operation.operation_type == "buy":
-                        FundOperationService._calculate_buy_shares(db, operation)
-                    elif operation.operation_type == "sell":
-                        FundOperationService._calculate_sell_shares(db, operation)
-                    
-                    # 更新操作状态为已确认
-                    operation.status = "confirmed"
-                    operation.updated_at = datetime.now()
-                    updated_count += 1
-                    print(f"[调试] 操作 {operation.id} 更新成功")
-                else:
-                    print(f"[调试] 操作 {operation.id} 未找到对应净值记录，保持待确认状态")
-                    
-            except Exception as e:
-                print(f"更新待确认操作 {operation.id} 失败: {e}")
-                continue
-        
-        print(f"[调试] 总共更新了 {updated_count} 个操作")
-        return updated_count
+        """更新所有待确认的操作记录（包括手动操作和定投操作，批量确认，见 PendingOperationConfirmer）"""
+        return PendingOperationConfirmer.run(db)["confirmed"]
 
     @staticmethod
     def update_fund_nav(db: Session, fund_code: str, nav: Decimal, nav_date: date) -> bool:
@@ -2197,20 +2046,15 @@ class FundDividendService:
     
     @staticmethod
     def save_dividend_data(db: Session, fund_code: str, dividend_data: List[dict]) -> int:
-        """批量保存分红数据"""
+        """批量保存分红数据（已存在的分红日期跳过）"""
+        existing_dates = {
+            row[0] for row in db.query(FundDividend.dividend_date).filter(FundDividend.fund_code == fund_code).all()
+        }
         saved_count = 0
         
         for item in dividend_data:
             try:
-                # 检查是否已存在相同的分红记录
-                existing = db.query(FundDividend).filter(
-                    and_(
-                        FundDividend.fund_code == fund_code,
-                        FundDividend.dividend_date == item['dividend_date']
-                    )
-                ).first()
-                
-                if existing:
+                if item['dividend_date'] in existing_dates:
                     continue  # 跳过已存在的记录
                 
                 # 创建新的分红记录
@@ -2224,6 +2068,7 @@ class FundDividendService:
                 )
                 
                 db.add(dividend)
+                existing_dates.add(item['dividend_date'])
                 saved_count += 1
                 
             except Exception as e:
@@ -2234,33 +2079,481 @@ class FundDividendService:
             db.commit()
         
         return saved_count 
+    
+    @staticmethod
+    def sync_fund_dividends(db: Session, fund_code: str) -> int:
+        """从全市场分红表缓存同步单个基金的分红（阻塞调用，首次会下载分红表）"""
+        return FundDividendService.save_dividend_data(db, fund_code, fund_dividend_cache.get_fund_dividends(fund_code))
+    
+    @staticmethod
+    def sync_held_fund_dividends(db: Session) -> dict:
+        """为所有持仓基金同步分红，共用同一份全市场分红表"""
+        fund_codes = [
+            row[0] for row in db.query(AssetPosition.asset_code).filter(
+                and_(
+                    AssetPosition.asset_type == "基金",
+                    AssetPosition.quantity > 0
+                )
+            ).distinct().all()
+        ]
+        
+        table = fund_dividend_cache.load()
+        saved = {}
+        for fund_code in fund_codes:
+            saved[fund_code] = FundDividendService.save_dividend_data(db, fund_code, table.get(fund_code, []))
+        
+        return {
+            "fund_count": len(fund_codes),
+            "saved_count": sum(saved.values()),
+            "by_fund": saved
+        }
+
+
+class PendingOperationConfirmer:
+    """待确认操作批量确认
+
+    一次查询取出待确认操作，按基金分组后一次查询预加载净值索引和持仓，
+    在内存中计算份额、更新操作和持仓，最后在同一个事务中提交。
+    """
+    
+    @staticmethod
+    def _confirm_buy(operation: UserOperation, nav_value: Decimal) -> Optional[str]:
+        """计算买入份额，返回None表示可以确认，否则返回不能确认的原因"""
+        if operation.quantity is None:
+            fee = operation.fee or 0
+            operation.quantity = Decimal((operation.amount - fee) / nav_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        operation.nav = nav_value
+        operation.price = nav_value
+        return None
+    
+    @staticmethod
+    def _confirm_sell(operation: UserOperation, nav_value: Decimal, position: Optional[AssetPosition]) -> Optional[str]:
+        """计算卖出份额/金额，规则同 FundOperationService._calculate_sell_shares"""
+        if not position:
+            return "未找到持仓"
+        
+        fee = operation.fee or 0
+        if operation.amount and operation.quantity is None:
+            shares = Decimal((operation.amount - fee) / nav_value).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            if shares > position.quantity:
+                return f"份额超过持仓: {shares} > {position.quantity}"
+            operation.quantity = shares
+        elif operation.quantity and operation.amount is None:
+            operation.amount = operation.quantity * nav_value + fee
+        elif operation.amount and operation.quantity:
+            if abs(operation.amount - (operation.quantity * nav_value + fee)) >= Decimal('0.01'):
+                return "金额和份额不一致"
+        else:
+            return "缺少金额和份额"
+        
+        operation.nav = nav_value
+        operation.price = nav_value
+        return None
+    
+    @staticmethod
+    def run(db: Session, dca_buys_only: bool = False) -> dict:
+        """确认所有能匹配到净值的待确认操作
+
+        Args:
+            dca_buys_only: 只处理定投产生的买入操作
+
+        Returns:
+            {"confirmed": 确认数, "pending": 仍待确认数, "by_fund": {基金代码: {"confirmed": n, "pending": n}}}
+        """
+        query = db.query(UserOperation).filter(
+            and_(
+                UserOperation.status == "pending",
+                UserOperation.asset_type == "基金"
+            )
+        )
+        if dca_buys_only:
+            query = query.filter(
+                and_(
+                    UserOperation.operation_type == "buy",
+                    UserOperation.dca_plan_id.isnot(None)
+                )
+            )
+        # 按基金、时间排序，同一基金的操作按发生顺序计入持仓
+        operations = query.order_by(UserOperation.asset_code, UserOperation.operation_date, UserOperation.id).all()
+        
+        report = {"confirmed": 0, "pending": 0, "by_fund": {}}
+        if not operations:
+            return report
+        
+        fund_codes = {op.asset_code for op in operations}
+        fund_nav_index.preload(db, fund_codes)
+        
+        positions = {
+            (position.platform, position.asset_code, position.currency): position
+            for position in db.query(AssetPosition).filter(AssetPosition.asset_code.in_(fund_codes)).all()
+        }
+        if any(op.operation_type == "buy" for op in operations):
+            FundOperationService._sync_position_sequence(db)
+        
+        now = datetime.now()
+        try:
+            for fund_code, fund_operations in groupby(operations, key=lambda op: op.asset_code):
+                fund_report = report["by_fund"].setdefault(fund_code, {"confirmed": 0, "pending": 0})
+                for operation in fund_operations:
+                    nav_record = FundOperationService._get_nav_by_operation_time(db, fund_code, operation.operation_date)
+                    if nav_record is None:
+                        fund_report["pending"] += 1
+                        continue
+                    
+                    # 优先使用用户填写的净值
+                    nav_value = operation.nav if operation.nav is not None else nav_record.nav
+                    key = (operation.platform, operation.asset_code, operation.currency)
+                    if operation.operation_type == "buy":
+                        reason = PendingOperationConfirmer._confirm_buy(operation, nav_value)
+                    elif operation.operation_type == "sell":
+                        reason = PendingOperationConfirmer._confirm_sell(operation, nav_value, positions.get(key))
+                    else:
+                        reason = f"不支持的操作类型: {operation.operation_type}"
+                    
+                    if reason:
+                        print(f"[调试] 操作 {operation.id} 保持待确认: {reason}")
+                        fund_report["pending"] += 1
+                        continue
+                    
+                    operation.status = "confirmed"
+                    operation.updated_at = now
+                    positions[key] = FundOperationService._apply_position_change(db, operation, positions.get(key))
+                    fund_report["confirmed"] += 1
+            
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        report["confirmed"] = sum(item["confirmed"] for item in report["by_fund"].values())
+        report["pending"] = sum(item["pending"] for item in report["by_fund"].values())
+        print(f"[调试] 待确认操作批量确认完成: 确认 {report['confirmed']} 条，仍待确认 {report['pending']} 条")
+        return report
+
+
+class DCABatchExecutor:
+    """到期定投计划批量执行
+
+    用一条SQL筛选出到期的计划，一次查询预取所有相关基金的最新净值/30日均值（智能定投）
+    和执行净值，在内存中生成操作记录、更新持仓和下次执行日期，最后在同一个事务中提交。
+    """
+    
+    @staticmethod
+    def due_plans_query(db: Session, today: date, plan_ids: Optional[List[int]] = None):
+        """到期计划：进行中、未过结束日期，且下次执行日期已到（首次运行的计划下次执行日期为空）"""
+        query = db.query(DCAPlan).filter(
+            and_(
+                DCAPlan.status == "active",
+                or_(DCAPlan.end_date.is_(None), DCAPlan.end_date >= today),
+                or_(
+                    DCAPlan.next_execution_date <= today,
+                    and_(
+                        DCAPlan.next_execution_date.is_(None),
+                        DCAPlan.start_date.isnot(None),
+                        DCAPlan.frequency.isnot(None),
+                        DCAPlan.frequency_value.isnot(None)
+                    )
+                )
+            )
+        )
+        if plan_ids:
+            query = query.filter(DCAPlan.id.in_(plan_ids))
+        return query.order_by(DCAPlan.asset_code, DCAPlan.id)
+    
+    @staticmethod
+    def run(db: Session, plan_ids: Optional[List[int]] = None, execution_type: str = "scheduled") -> Tuple[List[UserOperation], dict]:
+        """执行所有（或指定的）到期计划
+
+        Returns:
+            (新建的操作记录, 执行报告)，报告格式：
+            {"executed": n, "confirmed": n, "pending": n, "failed": n,
+             "plans": [{"plan_id", "plan_name", "asset_code", "status", "operation_id", "amount", "nav",
+                        "next_execution_date", "elapsed_ms", "error"}],
+             "timings": {"select_ms", "prefetch_ms", "execute_ms", "commit_ms", "total_ms"}}
+        """
+        started = perf_counter()
+        today = date.today()
+        now = datetime.now()
+        report = {"executed": 0, "confirmed": 0, "pending": 0, "failed": 0, "plans": [], "timings": {}}
+        
+        plans = DCABatchExecutor.due_plans_query(db, today, plan_ids).all()
+        selected = perf_counter()
+        report["timings"]["select_ms"] = round((selected - started) * 1000, 1)
+        print(f"[调试] 批量执行定投 - 今天: {today}，到期计划 {len(plans)} 个")
+        if not plans:
+            report["timings"]["total_ms"] = report["timings"]["select_ms"]
+            return [], report
+        
+        fund_codes = {plan.asset_code for plan in plans}
+        benchmarks = DCAService._load_nav_benchmarks(
+            db, [plan.asset_code for plan in plans if plan.smart_dca]
+        )
+        # 执行净值（15:00之前为当天净值，之后为下一个交易日净值）从净值索引中查找
+        fund_nav_index.preload(db, fund_codes)
+        positions = {
+            (position.platform, position.asset_code, position.currency): position
+            for position in db.query(AssetPosition).filter(AssetPosition.asset_code.in_(fund_codes)).all()
+        }
+        if any((plan.platform, plan.asset_code, plan.currency) not in positions for plan in plans):
+            FundOperationService._sync_position_sequence(db)
+        prefetched = perf_counter()
+        report["timings"]["prefetch_ms"] = round((prefetched - selected) * 1000, 1)
+        
+        created = []
+        plan_reports = []
+        try:
+            for plan in plans:
+                plan_started = perf_counter()
+                plan_report = {
+                    "plan_id": plan.id,
+                    "plan_name": plan.plan_name,
+                    "asset_code": plan.asset_code,
+                    "status": "failed",
+                    "operation_id": None,
+                    "amount": None,
+                    "nav": None,
+                    "next_execution_date": None,
+                    "elapsed_ms": 0.0,
+                    "error": None
+                }
+                plan_reports.append(plan_report)
+                try:
+                    latest_nav, avg_nav = benchmarks.get(plan.asset_code, (None, None))
+                    amount = DCAService._smart_amount(plan, latest_nav, avg_nav)
+                    
+                    nav_record = FundOperationService._get_nav_by_operation_time(db, plan.asset_code, now)
+                    nav_value = nav_record.nav if nav_record else None
+                    
+                    # 首次运行的计划以今天为基准计算下次执行日期
+                    next_execution_date = DCAService._calculate_next_execution_date(
+                        plan.next_execution_date or today,
+                        plan.frequency,
+                        plan.frequency_value
+                    )
+                except Exception as e:
+                    plan_report["error"] = str(e)
+                    print(f"[错误] 定投计划 {plan.id} 执行失败: {e}")
+                    continue
+                finally:
+                    plan_report["elapsed_ms"] = round((perf_counter() - plan_started) * 1000, 2)
+                
+                fee_rate = plan.fee_rate or 0
+                fee = (amount * fee_rate).quantize(Decimal('0.0001')) if fee_rate else Decimal('0')
+                operation = UserOperation(
+                    operation_date=now,
+                    platform=plan.platform,
+                    asset_type=plan.asset_type,
+                    operation_type="buy",
+                    asset_code=plan.asset_code,
+                    asset_name=plan.asset_name,
+                    amount=amount,
+                    currency=plan.currency,
+                    quantity=None,
+                    price=None,
+                    nav=None,
+                    fee=fee,
+                    strategy=f"定投计划: {plan.plan_name}",
+                    dca_plan_id=plan.id,
+                    dca_execution_type=execution_type,
+                    status="pending"
+                )
+                if nav_value is not None:
+                    PendingOperationConfirmer._confirm_buy(operation, nav_value)
+                    operation.status = "confirmed"
+                    key = (operation.platform, operation.asset_code, operation.currency)
+                    positions[key] = FundOperationService._apply_position_change(db, operation, positions.get(key))
+                
+                db.add(operation)
+                created.append((operation, plan_report))
+                plan.next_execution_date = next_execution_date
+                
+                plan_report.update({
+                    "status": operation.status,
+                    "amount": float(amount),
+                    "nav": float(nav_value) if nav_value is not None else None,
+                    "next_execution_date": next_execution_date.isoformat()
+                })
+            
+            executed = perf_counter()
+            report["timings"]["execute_ms"] = round((executed - prefetched) * 1000, 1)
+            
+            db.flush()
+            for operation, plan_report in created:
+                plan_report["operation_id"] = operation.id
+            
+            # 统计信息和操作记录一起提交
+            DCAService.update_all_plan_statistics(db, [plan.id for plan in plans], commit=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        finished = perf_counter()
+        report["timings"]["commit_ms"] = round((finished - executed) * 1000, 1)
+        report["timings"]["total_ms"] = round((finished - started) * 1000, 1)
+        operations = [operation for operation, _ in created]
+        report["plans"] = plan_reports
+        report["executed"] = len(operations)
+        report["confirmed"] = sum(1 for item in plan_reports if item["status"] == "confirmed")
+        report["pending"] = sum(1 for item in plan_reports if item["status"] == "pending")
+        report["failed"] = sum(1 for item in plan_reports if item["status"] == "failed")
+        print(f"[调试] 批量执行定投完成: 执行 {report['executed']} 个（确认 {report['confirmed']}，待确认 {report['pending']}），"
+              f"失败 {report['failed']} 个，耗时 {report['timings']['total_ms']}ms")
+        return operations, report
 
 
 class NavMatchingCheckService:
     """净值匹配检查服务"""
     
+    # 批量检查需要的操作字段
+    _OPERATION_FIELDS = (
+        UserOperation.id, UserOperation.operation_date, UserOperation.asset_code, UserOperation.asset_name,
+        UserOperation.operation_type, UserOperation.amount, UserOperation.nav
+    )
+    
+    @staticmethod
+    def _load_trading_calendars(db: Session, fund_codes: Iterable[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """从净值索引取基金的交易日历：{基金代码: (有净值的日期数组, 对应净值数组)}，日期升序"""
+        fund_codes = {code for code in fund_codes if code}
+        fund_nav_index.preload(db, fund_codes)
+        
+        calendars = {}
+        for fund_code in fund_codes:
+            points = fund_nav_index.points(db, fund_code)
+            calendars[fund_code] = (
+                np.array([point.nav_date for point in points], dtype='datetime64[D]'),
+                np.array([float(point.nav) if point.nav is not None else np.nan for point in points], dtype=float)
+            )
+        return calendars
+    
+    @staticmethod
+    def check_operations_bulk(db: Session, operation_rows: List[tuple]) -> List[dict]:
+        """批量检查净值匹配，结果与 _check_single_operation 相同、顺序与输入一致
+        
+        operation_rows 为 (id, operation_date, asset_code, asset_name, operation_type, amount, nav) 元组。
+        每个基金的交易日历只加载一次，预期净值日期通过有序数组二分查找整体求出。
+        """
+        calendars = NavMatchingCheckService._load_trading_calendars(db, (row[2] for row in operation_rows))
+        empty_calendar = (np.array([], dtype='datetime64[D]'), np.array([], dtype=float))
+        window = np.timedelta64(NEXT_TRADING_DAY_WINDOW, 'D')
+        close_time = time(15, 0)
+        
+        # 按基金分组，每组向量化计算
+        indices_by_fund: Dict[str, List[int]] = {}
+        operation_datetimes = []
+        for i, row in enumerate(operation_rows):
+            operation_datetime = row[1]
+            if isinstance(operation_datetime, str):
+                operation_datetime = datetime.fromisoformat(operation_datetime.replace('Z', '+00:00'))
+            operation_datetimes.append(operation_datetime)
+            indices_by_fund.setdefault(row[2], []).append(i)
+        
+        results: List[Optional[dict]] = [None] * len(operation_rows)
+        for fund_code, indices in indices_by_fund.items():
+            dates, navs = calendars.get(fund_code, empty_calendar)
+            n = len(dates)
+            op_dates = np.array([operation_datetimes[i].date() for i in indices], dtype='datetime64[D]')
+            after_close = np.array([operation_datetimes[i].time() >= close_time for i in indices], dtype=bool)
+            
+            if n:
+                # 下一个交易日：严格大于操作日期的第一个净值日期，且在查找窗口内
+                next_idx = np.searchsorted(dates, op_dates, side='right')
+                next_dates = dates[np.minimum(next_idx, n - 1)]
+                has_next = (next_idx < n) & (next_dates <= op_dates + window)
+                expected = np.where(after_close & has_next, next_dates, op_dates)
+                
+                # 预期日期上的净值
+                pos = np.searchsorted(dates, expected, side='left')
+                clipped = np.minimum(pos, n - 1)
+                has_nav = (pos < n) & (dates[clipped] == expected)
+                nav_at = np.where(has_nav, navs[clipped], np.nan)
+            else:
+                has_next = np.zeros(len(indices), dtype=bool)
+                expected = op_dates
+                has_nav = np.zeros(len(indices), dtype=bool)
+                nav_at = np.full(len(indices), np.nan)
+            
+            expected_dates = expected.astype(object)
+            for k, i in enumerate(indices):
+                op_id, _, asset_code, asset_name, operation_type, amount, user_nav = operation_rows[i]
+                operation_datetime = operation_datetimes[i]
+                operation_time = operation_datetime.time()
+                expected_nav_date = expected_dates[k]
+                
+                if not after_close[k]:
+                    expected_nav_source = "当天净值"
+                elif has_next[k]:
+                    expected_nav_source = "下一个交易日净值"
+                else:
+                    expected_nav_source = "当天净值(无法确定下一个交易日)"
+                
+                actual_nav = None
+                actual_nav_date = None
+                if user_nav:
+                    actual_nav = user_nav
+                    if has_nav[k]:
+                        if abs(float(user_nav) - nav_at[k]) < 0.001:
+                            actual_nav_date = expected_nav_date
+                            nav_source = "用户填写(验证正确)"
+                        else:
+                            nav_source = "用户填写(净值不匹配)"
+                    else:
+                        actual_nav_date = expected_nav_date
+                        nav_source = "用户填写(无验证数据)"
+                elif has_nav[k]:
+                    actual_nav = nav_at[k]
+                    actual_nav_date = expected_nav_date
+                    nav_source = "数据库匹配"
+                else:
+                    nav_source = "无净值数据"
+                
+                is_correct = bool(actual_nav_date and expected_nav_date and actual_nav_date == expected_nav_date)
+                results[i] = {
+                    'operation_id': op_id,
+                    'operation_date': operation_datetime.isoformat(),
+                    'operation_time': operation_time.strftime('%H:%M:%S'),
+                    'asset_code': asset_code,
+                    'asset_name': asset_name,
+                    'operation_type': operation_type,
+                    'amount': float(amount) if amount else None,
+                    'expected_nav_date': expected_nav_date.isoformat() if expected_nav_date else None,
+                    'expected_nav_source': expected_nav_source,
+                    'actual_nav_date': actual_nav_date.isoformat() if actual_nav_date else None,
+                    'actual_nav': float(actual_nav) if actual_nav else None,
+                    'nav_source': nav_source,
+                    'is_correct': is_correct,
+                    'status': 'correct' if is_correct else ('incorrect' if actual_nav_date else 'no_nav'),
+                    'issue_description': NavMatchingCheckService._get_issue_description(
+                        operation_time, expected_nav_date, actual_nav_date, nav_source
+                    )
+                }
+        
+        return results
+    
+    @staticmethod
+    def _check_all_fund_operations(db: Session) -> List[dict]:
+        """按操作时间顺序批量检查所有基金操作"""
+        operation_rows = db.query(*NavMatchingCheckService._OPERATION_FIELDS).filter(
+            UserOperation.asset_type == "基金"
+        ).order_by(UserOperation.operation_date).all()
+        return NavMatchingCheckService.check_operations_bulk(db, [tuple(row) for row in operation_rows])
+    
     @staticmethod
     def check_nav_matching_consistency(db: Session) -> dict:
         """检查所有操作记录的净值匹配一致性"""
         print("[净值匹配检查] 开始检查所有操作记录...")
         
-        # 获取所有操作记录
-        operations = db.query(UserOperation).filter(
-            UserOperation.asset_type == "基金"
-        ).order_by(UserOperation.operation_date).all()
+        check_results = NavMatchingCheckService._check_all_fund_operations(db)
         
         results = {
-            'total_operations': len(operations),
+            'total_operations': len(check_results),
             'correct_matching': 0,
             'incorrect_matching': 0,
             'no_nav_data': 0,
-            'details': []
+            'details': check_results
         }
         
-        for operation in operations:
-            check_result = NavMatchingCheckService._check_single_operation(db, operation)
-            results['details'].append(check_result)
-            
+        for check_result in check_results:
             if check_result['status'] == 'correct':
                 results['correct_matching'] += 1
             elif check_result['status'] == 'incorrect':
@@ -2277,7 +2570,8 @@ class NavMatchingCheckService:
     
     @staticmethod
     def _check_single_operation(db: Session, operation: UserOperation) -> dict:
-        """检查单个操作的净值匹配"""
+        """检查单个操作的净值匹配（净值和交易日都从净值索引中查找）"""
+        
         operation_datetime = operation.operation_date
         if isinstance(operation_datetime, str):
             operation_datetime = datetime.fromisoformat(operation_datetime.replace('Z', '+00:00'))
@@ -2302,40 +2596,26 @@ class NavMatchingCheckService:
             actual_nav = operation.nav
             nav_source = "用户填写"
             
-            # 根据操作时间确定应该使用的净值日期
-            if operation_time < time(15, 0):
-                # 15:00前操作，净值日期应该是当天
-                expected_nav_date_for_check = operation_date
-            else:
-                # 15:00后操作，净值日期应该是下一个交易日
-                next_trading_day = FundOperationService._get_next_trading_day(db, operation.asset_code, operation_date)
-                expected_nav_date_for_check = next_trading_day if next_trading_day else operation_date
+            # 15:00前操作净值日期应该是当天，15:00后是下一个交易日（即上面算出的预期日期）
+            expected_nav_date_for_check = expected_nav_date
             
             # 验证用户填写的净值是否真的对应这个日期
             nav_record = FundOperationService._get_nav_by_date(db, operation.asset_code, expected_nav_date_for_check)
-            print(f"[净值匹配调试] 操作ID: {operation.id}")
-            print(f"[净值匹配调试] 用户填写净值: {operation.nav}")
-            print(f"[净值匹配调试] 预期净值日期: {expected_nav_date_for_check}")
-            print(f"[净值匹配调试] 数据库净值记录: {nav_record.nav if nav_record else 'None'}")
             
             if nav_record:
                 # 如果数据库中有对应日期的净值，比较用户填写的净值是否匹配
                 nav_diff = abs(float(operation.nav) - float(nav_record.nav))
-                print(f"[净值匹配调试] 净值差异: {nav_diff}")
                 if nav_diff < 0.001:  # 允许0.001的误差
                     actual_nav_date = expected_nav_date_for_check
                     nav_source = "用户填写(验证正确)"
-                    print(f"[净值匹配调试] 净值匹配正确")
                 else:
                     # 用户填写的净值与预期日期不匹配，尝试找到匹配的日期
                     actual_nav_date = None
                     nav_source = "用户填写(净值不匹配)"
-                    print(f"[净值匹配调试] 净值不匹配")
             else:
                 # 数据库中没有对应日期的净值，无法验证
                 actual_nav_date = expected_nav_date_for_check
                 nav_source = "用户填写(无验证数据)"
-                print(f"[净值匹配调试] 无验证数据")
         else:
             # 查找数据库中对应的净值记录
             nav_record = FundOperationService._get_nav_by_date(db, operation.asset_code, expected_nav_date)
@@ -2399,19 +2679,24 @@ class NavMatchingCheckService:
         """标记净值匹配错误的操作记录"""
         print("[净值匹配检查] 开始标记错误匹配的操作...")
         
-        operations = db.query(UserOperation).filter(
-            UserOperation.asset_type == "基金"
-        ).all()
+        incorrect = {
+            result['operation_id']: result
+            for result in NavMatchingCheckService._check_all_fund_operations(db)
+            if result['status'] == 'incorrect'
+        }
         
         marked_count = 0
         
-        for operation in operations:
-            check_result = NavMatchingCheckService._check_single_operation(db, operation)
-            
-            if check_result['status'] == 'incorrect':
+        # 只加载需要标记的操作
+        incorrect_ids = list(incorrect)
+        for start in range(0, len(incorrect_ids), 500):
+            operations = db.query(UserOperation).filter(
+                UserOperation.id.in_(incorrect_ids[start:start + 500])
+            ).all()
+            for operation in operations:
                 # 在notes字段中添加标记
                 current_notes = operation.notes or ""
-                issue_desc = check_result['issue_description']
+                issue_desc = incorrect[operation.id]['issue_description']
                 
                 if "净值匹配检查" not in current_notes:
                     new_notes = f"{current_notes}\n[净值匹配检查] {issue_desc}".strip()
@@ -2428,21 +2713,16 @@ class NavMatchingCheckService:
     @staticmethod
     def get_operations_with_nav_issues(db: Session) -> List[dict]:
         """获取有净值匹配问题的操作记录"""
-        operations = db.query(UserOperation).filter(
-            UserOperation.asset_type == "基金"
-        ).order_by(UserOperation.operation_date).all()
-        
         issues = []
-        for operation in operations:
-            check_result = NavMatchingCheckService._check_single_operation(db, operation)
+        for check_result in NavMatchingCheckService._check_all_fund_operations(db):
             if check_result['status'] != 'correct':
                 issues.append({
-                    'operation_id': operation.id,
-                    'operation_date': operation.operation_date.isoformat() if isinstance(operation.operation_date, datetime) else str(operation.operation_date),
-                    'asset_code': operation.asset_code,
-                    'asset_name': operation.asset_name,
-                    'operation_type': operation.operation_type,
-                    'amount': float(operation.amount) if operation.amount else None,
+                    'operation_id': check_result['operation_id'],
+                    'operation_date': check_result['operation_date'],
+                    'asset_code': check_result['asset_code'],
+                    'asset_name': check_result['asset_name'],
+                    'operation_type': check_result['operation_type'],
+                    'amount': check_result['amount'],
                     'issue': check_result['issue_description'],
                     'expected_nav_date': check_result['expected_nav_date'],
                     'actual_nav_date': check_result['actual_nav_date'],
@@ -0,0 +1,42 @@
+"""
+共享HTTP客户端
+每个AI服务提供方复用一个带连接池的 httpx.AsyncClient，避免每次请求重新建立TCP/TLS连接
+"""
+
+import logging
+from typing import Dict, Optional
+
+import httpx
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_client(provider: str, timeout: Optional[float] = None) -> httpx.AsyncClient:
+    """获取指定提供方的共享客户端，不存在或已关闭时创建"""
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=timeout if timeout is not None else settings.ai_http_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.ai_http_max_connections,
+                max_keepalive_connections=settings.ai_http_max_connections,
+                keepalive_expiry=settings.ai_http_keepalive_expiry,
+            ),
+        )
+        _clients[provider] = client
+        logger.info(f"创建共享HTTP客户端: provider={provider}, max_connections={settings.ai_http_max_connections}")
+    return client
+
+
+async def close_all() -> None:
+    """关闭所有共享客户端（应用关闭时调用）"""
+    for provider, client in list(_clients.items()):
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning(f"关闭HTTP客户端失败: provider={provider}, 错误: {e}")
+    _clients.clear()
@@ -1,9 +1,10 @@
+import threading
 import time
 from typing import Optional, Dict, Any, List
 from datetime import datetime, date
 from decimal import Decimal
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, desc, func
+from sqlalchemy import desc, func
 from loguru import logger
 
 from app.settings import settings
@@ -13,6 +14,36 @@ from app.models.schemas import IBKRSyncRequest, IBKRSyncResponse
 from app.utils.auto_logger import auto_log
 
 
+class _LatestSnapshotCache:
+    """最新余额/持仓查询结果的短时缓存，进程内所有 IBKRAPIService 实例共享，sync_data 写入后清空"""
+    
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._entries: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: tuple) -> Optional[List[Dict[str, Any]]]:
+        if self.ttl <= 0:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[0]:
+            return None
+        return [dict(row) for row in entry[1]]
+    
+    def set(self, key: tuple, rows: List[Dict[str, Any]]) -> None:
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, [dict(row) for row in rows])
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_latest_cache = _LatestSnapshotCache(settings.ibkr_latest_cache_ttl)
+
+
 class IBKRAPIService:
     """IBKR API集成服务"""
     
@@ -80,9 +111,8 @@ class IBKRAPIService:
         db.refresh(sync_log)
         return sync_log
     
-    @auto_log("database", log_result=True)
     def _ensure_account_exists(self, db: Session, account_id: str) -> IBKRAccount:
-        """确保账户记录存在，不存在则创建"""
+        """确保账户记录存在，不存在则创建（只flush，由调用方统一提交）"""
         account = db.query(IBKRAccount).filter(IBKRAccount.account_id == account_id).first()
         if not account:
             account = IBKRAccount(
@@ -93,115 +123,67 @@ class IBKRAPIService:
                 status="ACTIVE"
             )
             db.add(account)
-            db.commit()
-            db.refresh(account)
+            db.flush()
             logger.info(f"创建新的IBKR账户记录: {account_id}")
         return account
     
-    @auto_log("database", log_result=True)
+    @staticmethod
+    def _insert_ignore_duplicates(db: Session, model, rows: List[Dict[str, Any]], conflict_columns: List[str]) -> int:
+        """一条 INSERT ... ON CONFLICT DO NOTHING 写入多行，返回实际插入的行数"""
+        if not rows:
+            return 0
+        if db.bind.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(model).values(rows).on_conflict_do_nothing(index_elements=conflict_columns)
+        return db.execute(stmt).rowcount or 0
+    
     def _sync_balances(self, db: Session, account_id: str, balances_data: Dict[str, Any], 
                       snapshot_time: datetime, sync_source: str = "gcp_scheduler") -> int:
-        """同步账户余额数据"""
-        try:
-            snapshot_date = snapshot_time.date()
-            
-            # 简化日志
-            logger.info(f"🔍 准备写入余额数据: {account_id}")
-            
-            # 检查是否已存在相同时间的余额记录
-            existing_balance = db.query(IBKRBalance).filter(
-                and_(
-                    IBKRBalance.account_id == account_id,
-                    IBKRBalance.snapshot_date == snapshot_date,
-                    IBKRBalance.snapshot_time == snapshot_time
-                )
-            ).first()
-            
-            if existing_balance:
-                logger.info(f"余额记录已存在，跳过: {account_id} - {snapshot_time}")
-                return 0
-            
-            # 创建新的余额记录
-            balance = IBKRBalance(
-                account_id=account_id,
-                total_cash=Decimal(str(balances_data.get('total_cash', 0))),
-                net_liquidation=Decimal(str(balances_data.get('net_liquidation', 0))),
-                buying_power=Decimal(str(balances_data.get('buying_power', 0))),
-                currency=balances_data.get('currency', 'USD'),
-                snapshot_date=snapshot_date,
-                snapshot_time=snapshot_time,
-                sync_source=sync_source
-            )
-            
-            db.add(balance)
-            db.commit()
-            logger.info(f"✅ 成功同步余额数据: {account_id} - {snapshot_time}")
-            return 1
-            
-        except Exception as e:
-            logger.error(f"❌ 同步余额数据失败: {e}")
-            db.rollback()
-            raise
+        """写入账户余额快照，同一时间点已存在则跳过（不提交）"""
+        row = {
+            "account_id": account_id,
+            "total_cash": Decimal(str(balances_data.get('total_cash', 0))),
+            "net_liquidation": Decimal(str(balances_data.get('net_liquidation', 0))),
+            "buying_power": Decimal(str(balances_data.get('buying_power', 0))),
+            "currency": balances_data.get('currency', 'USD'),
+            "snapshot_date": snapshot_time.date(),
+            "snapshot_time": snapshot_time,
+            "sync_source": sync_source
+        }
+        return self._insert_ignore_duplicates(db, IBKRBalance, [row], ["account_id", "snapshot_time"])
     
-    @auto_log("database", log_result=True)
     def _sync_positions(self, db: Session, account_id: str, positions_data: List[Dict[str, Any]], 
                        snapshot_time: datetime, sync_source: str = "gcp_scheduler") -> int:
-        """同步持仓数据"""
-        try:
-            snapshot_date = snapshot_time.date()
-            inserted_count = 0
-            
-            for position_data in positions_data:
-                symbol = position_data.get('symbol')
-                if not symbol:
-                    logger.warning("持仓数据缺少symbol字段，跳过")
-                    continue
-                
-                # 检查是否已存在相同时间的持仓记录
-                existing_position = db.query(IBKRPosition).filter(
-                    and_(
-                        IBKRPosition.account_id == account_id,
-                        IBKRPosition.symbol == symbol,
-                        IBKRPosition.snapshot_date == snapshot_date,
-                        IBKRPosition.snapshot_time == snapshot_time
-                    )
-                ).first()
-                
-                if existing_position:
-                    logger.info(f"持仓记录已存在，跳过: {account_id} - {symbol} - {snapshot_time}")
-                    continue
-                
-                # 创建新的持仓记录
-                position = IBKRPosition(
-                    account_id=account_id,
-                    symbol=symbol,
-                    quantity=Decimal(str(position_data.get('quantity', 0))),
-                    market_value=Decimal(str(position_data.get('market_value', 0))),
-                    average_cost=Decimal(str(position_data.get('average_cost', 0))),
-                    unrealized_pnl=Decimal(str(position_data.get('unrealized_pnl', 0))),
-                    realized_pnl=Decimal(str(position_data.get('realized_pnl', 0))),
-                    currency=position_data.get('currency', 'USD'),
-                    asset_class=position_data.get('asset_class', 'STK'),
-                    snapshot_date=snapshot_date,
-                    snapshot_time=snapshot_time,
-                    sync_source=sync_source
-                )
-                
-                db.add(position)
-                inserted_count += 1
-            
-            if inserted_count > 0:
-                db.commit()
-                logger.info(f"成功同步持仓数据: {account_id} - {inserted_count}条记录")
-            
-            return inserted_count
-            
-        except Exception as e:
-            logger.error(f"同步持仓数据失败: {e}")
-            db.rollback()
-            raise
+        """一条语句写入全部持仓快照，同一时间点已存在的持仓跳过（不提交）"""
+        snapshot_date = snapshot_time.date()
+        rows = []
+        for position_data in positions_data:
+            symbol = position_data.get('symbol')
+            if not symbol:
+                logger.warning("持仓数据缺少symbol字段，跳过")
+                continue
+            rows.append({
+                "account_id": account_id,
+                "symbol": symbol,
+                "quantity": Decimal(str(position_data.get('quantity', 0))),
+                "market_value": Decimal(str(position_data.get('market_value', 0))),
+                "average_cost": Decimal(str(position_data.get('average_cost', 0))),
+                "unrealized_pnl": Decimal(str(position_data.get('unrealized_pnl', 0))),
+                "realized_pnl": Decimal(str(position_data.get('realized_pnl', 0))),
+                "currency": position_data.get('currency', 'USD'),
+                "asset_class": position_data.get('asset_class', 'STK'),
+                "snapshot_date": snapshot_date,
+                "snapshot_time": snapshot_time,
+                "sync_source": sync_source
+            })
+        
+        inserted_count = self._insert_ignore_duplicates(db, IBKRPosition, rows, ["account_id", "symbol", "snapshot_time"])
+        logger.info(f"同步持仓数据: {account_id} - 收到{len(rows)}条, 新增{inserted_count}条")
+        return inserted_count
     
-    @auto_log("external", log_result=True)
+    @auto_log("external", log_args=False, log_result=True)
     async def sync_data(self, request_data: IBKRSyncRequest, client_ip: str = None, 
                        user_agent: str = None) -> IBKRSyncResponse:
         """处理IBKR数据同步请求"""
@@ -234,39 +216,36 @@ class IBKRAPIService:
             if snapshot_time.tzinfo:
                 snapshot_time = snapshot_time.replace(tzinfo=None)
             
-            # 5. 确保账户存在
+            # 5. 账户、余额、持仓和同步日志在同一个事务中写入
+            ingest_start = time.perf_counter()
             self._ensure_account_exists(db, request_data.account_id)
             
-            # 5. 同步余额数据
             balance_count = self._sync_balances(
                 db, request_data.account_id, request_data.balances, snapshot_time
             )
-            
-            # 6. 同步持仓数据
             position_count = self._sync_positions(
                 db, request_data.account_id, request_data.positions, snapshot_time
             )
             
-            # 7. 记录成功日志
-            sync_duration_ms = int((time.time() - start_time) * 1000)
-            sync_log = self._create_sync_log(
-                db=db,
+            sync_log = IBKRSyncLog(
                 account_id=request_data.account_id,
                 sync_type="full",
                 status="success",
                 request_data=request_data.json() if self.enable_request_logging else None,
                 source_ip=client_ip,
                 user_agent=user_agent,
-                sync_duration_ms=sync_duration_ms
+                records_processed=len(request_data.positions) + 1,  # positions + balances
+                records_inserted=balance_count + position_count,
+                records_updated=0,
+                sync_duration_ms=int((time.time() - start_time) * 1000)
             )
-            
-            # 8. 更新同步日志统计
-            sync_log.records_processed = len(request_data.positions) + 1  # positions + balances
-            sync_log.records_inserted = balance_count + position_count
-            sync_log.records_updated = 0
+            db.add(sync_log)
             db.commit()
+            _latest_cache.clear()
+            ingest_ms = round((time.perf_counter() - ingest_start) * 1000, 1)
+            sync_duration_ms = int((time.time() - start_time) * 1000)
             
-            # 9. 更新audit_log记录，添加上下文信息
+            # 6. 更新audit_log记录，添加上下文信息
             try:
                 from sqlalchemy import text
                 # 更新本次请求产生的所有audit_log记录
@@ -295,14 +274,16 @@ class IBKRAPIService:
                     "balances": balance_count,
                     "positions": position_count
                 },
-                sync_id=sync_log.id
+                sync_id=sync_log.id,
+                ingest_ms=ingest_ms
             )
             
-            logger.info(f"IBKR数据同步成功: {request_data.account_id}, 耗时: {sync_duration_ms}ms")
+            logger.info(f"IBKR数据同步成功: {request_data.account_id}, 耗时: {sync_duration_ms}ms, 入库: {ingest_ms}ms")
             return response
             
         except Exception as e:
-            # 记录错误日志
+            # 丢弃未提交的写入，再记录错误日志
+            db.rollback()
             sync_duration_ms = int((time.time() - start_time) * 1000)
             error_message = str(e)
             
@@ -365,78 +346,33 @@ class IBKRAPIService:
         finally:
             db.close()
     
+    @staticmethod
+    def _latest_rows(db: Session, model, partition_by: List, account_id: Optional[str] = None,
+                     rank_func=func.row_number):
+        """构造一条窗口函数查询：每个分组中 snapshot_time 最新的记录"""
+        ranked = db.query(
+            model.id.label("id"),
+            rank_func().over(partition_by=partition_by, order_by=desc(model.snapshot_time)).label("rn")
+        )
+        if account_id:
+            ranked = ranked.filter(model.account_id == account_id)
+        ranked = ranked.subquery()
+        return db.query(model).join(ranked, model.id == ranked.c.id).filter(ranked.c.rn == 1)
+    
     @auto_log("database", log_result=True)
     async def get_latest_balances(self, account_id: str = None) -> List[Dict[str, Any]]:
-        """获取最新的账户余额"""
-        logger.info(f"🔍 开始获取IBKR余额数据 - account_id: {account_id}")
+        """获取每个账户最新快照时间的余额"""
+        cache_key = ("balances", account_id)
+        cached = _latest_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         db = SessionLocal()
         try:
-            # 检查数据库连接
-            try:
-                from sqlalchemy import text
-                db.execute(text("SELECT 1"))
-                logger.info("✅ 数据库连接正常")
-            except Exception as e:
-                logger.error(f"❌ 数据库连接失败: {e}")
-                return []
-            
-            # 检查表是否存在
-            try:
-                table_count = db.query(IBKRBalance).count()
-                logger.info(f"📊 IBKRBalance表记录总数: {table_count}")
-            except Exception as e:
-                logger.error(f"❌ 查询IBKRBalance表失败: {e}")
-                return []
-            
-            query = db.query(IBKRBalance)
-            if account_id:
-                query = query.filter(IBKRBalance.account_id == account_id)
-                logger.info(f"🔍 过滤账户: {account_id}")
-            
-            # 简化查询逻辑：直接获取最新记录
-            logger.info("🔍 执行余额查询...")
-            if account_id:
-                # 获取指定账户的最新余额
-                logger.info(f"🔍 查询指定账户: {account_id}")
-                latest_time = db.query(func.max(IBKRBalance.snapshot_time)).filter(
-                    IBKRBalance.account_id == account_id
-                ).scalar()
-                logger.info(f"📊 账户 {account_id} 的最新时间: {latest_time} (类型: {type(latest_time)})")
-                if latest_time:
-                    balances = db.query(IBKRBalance).filter(
-                        and_(
-                            IBKRBalance.account_id == account_id,
-                            IBKRBalance.snapshot_time == latest_time
-                        )
-                    ).all()
-                    logger.info(f"📊 查询到 {len(balances)} 条余额记录")
-                else:
-                    balances = []
-                    logger.info(f"❌ 账户 {account_id} 没有找到最新时间")
-            else:
-                # 获取所有账户的最新余额
-                balances = []
-                account_ids = db.query(IBKRBalance.account_id).distinct().all()
-                logger.info(f"📊 所有账户ID: {[aid[0] for aid in account_ids]}")
-                for (account_id,) in account_ids:
-                    logger.info(f"🔍 查询账户: {account_id}")
-                    latest_time = db.query(func.max(IBKRBalance.snapshot_time)).filter(
-                        IBKRBalance.account_id == account_id
-                    ).scalar()
-                    logger.info(f"📊 账户 {account_id} 的最新时间: {latest_time} (类型: {type(latest_time)})")
-                    if latest_time:
-                        account_balances = db.query(IBKRBalance).filter(
-                            and_(
-                                IBKRBalance.account_id == account_id,
-                                IBKRBalance.snapshot_time == latest_time
-                            )
-                        ).all()
-                        logger.info(f"📊 账户 {account_id} 查询到 {len(account_balances)} 条余额记录")
-                        balances.extend(account_balances)
-                    else:
-                        logger.info(f"❌ 账户 {account_id} 没有找到最新时间")
-            
-            logger.info(f"📊 查询到 {len(balances)} 条余额记录")
+            # rank 而不是 row_number：同一最新时间点的多条记录（如多币种）全部返回
+            balances = self._latest_rows(
+                db, IBKRBalance, [IBKRBalance.account_id], account_id, rank_func=func.rank
+            ).order_by(IBKRBalance.account_id).all()
             
             result = [
                 {
@@ -452,12 +388,8 @@ class IBKRAPIService:
                 for balance in balances
             ]
             
-            logger.info(f"✅ 成功返回 {len(result)} 条余额数据")
-            for balance in result:
-                logger.info(f"💰 账户 {balance['account_id']}: 现金 ${balance['total_cash']:.2f}, 净值 ${balance['net_liquidation']:.2f}")
-            
-            # 移除详细日志输出
-            
+            logger.info(f"✅ 获取IBKR余额数据: account_id={account_id}, {len(result)} 条")
+            _latest_cache.set(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"❌ 获取余额数据失败: {e}")
@@ -467,41 +399,17 @@ class IBKRAPIService:
     
     @auto_log("database", log_result=True)
     async def get_latest_positions(self, account_id: str = None) -> List[Dict[str, Any]]:
-        """获取最新的持仓信息"""
-        logger.info(f"🔍 开始获取IBKR持仓数据 - account_id: {account_id}")
+        """获取每个账户每个代码最新快照时间的持仓（不含空仓）"""
+        cache_key = ("positions", account_id)
+        cached = _latest_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         db = SessionLocal()
         try:
-            # 检查表是否存在
-            try:
-                table_count = db.query(IBKRPosition).count()
-                logger.info(f"📊 IBKRPosition表记录总数: {table_count}")
-            except Exception as e:
-                logger.error(f"❌ 查询IBKRPosition表失败: {e}")
-                return []
-            
-            query = db.query(IBKRPosition)
-            if account_id:
-                query = query.filter(IBKRPosition.account_id == account_id)
-                logger.info(f"🔍 过滤账户: {account_id}")
-            
-            # 获取每个账户每个符号的最新持仓记录
-            subquery = db.query(
-                IBKRPosition.account_id,
-                IBKRPosition.symbol,
-                func.max(IBKRPosition.snapshot_time).label('max_time')
-            ).group_by(IBKRPosition.account_id, IBKRPosition.symbol).subquery()
-            
-            logger.info("🔍 执行持仓查询...")
-            positions = query.join(
-                subquery,
-                and_(
-                    IBKRPosition.account_id == subquery.c.account_id,
-                    IBKRPosition.symbol == subquery.c.symbol,
-                    IBKRPosition.snapshot_time == subquery.c.max_time
-                )
-            ).filter(IBKRPosition.quantity != 0).all()  # 过滤掉空仓
-            
-            logger.info(f"📊 查询到 {len(positions)} 条持仓记录")
+            positions = self._latest_rows(
+                db, IBKRPosition, [IBKRPosition.account_id, IBKRPosition.symbol], account_id
+            ).filter(IBKRPosition.quantity != 0).order_by(IBKRPosition.account_id, IBKRPosition.symbol).all()
             
             result = [
                 {
@@ -521,10 +429,8 @@ class IBKRAPIService:
                 for position in positions
             ]
             
-            logger.info(f"✅ 成功返回 {len(result)} 条持仓数据")
-            for position in result:
-                logger.info(f"📈 持仓 {position['symbol']}: 数量 {position['quantity']}, 市值 ${position['market_value']:.2f}")
-            
+            logger.info(f"✅ 获取IBKR持仓数据: account_id={account_id}, {len(result)} 条")
+            _latest_cache.set(cache_key, result)
             return result
         except Exception as e:
             logger.error(f"❌ 获取持仓数据失败: {e}")
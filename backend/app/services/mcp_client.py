@@ -8,14 +8,20 @@ import asyncio
 import json
 import logging
 import psycopg2
+import time
 from typing import Dict, List, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 from app.services.chart_config_generator import ChartConfigGenerator
 from app.services.deepseek_ai_service import DeepSeekAIService
+from app.services.query_cache import nl_query_cache
+from app.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# MCP服务Schema的进程内缓存，只有MCP服务返回的指纹变化时才重新拉取完整Schema
+_schema_cache: Dict[str, Any] = {"fingerprint": None, "schema": None, "checked_at": 0.0}
+
 @dataclass
 class MCPQueryResult:
     """MCP查询结果数据类"""
@@ -27,6 +33,7 @@ class MCPQueryResult:
     row_count: Optional[int] = None
     ai_analysis: Optional[Dict] = None # 新增字段
     method: Optional[str] = None # 新增字段
+    cache_hit: Optional[str] = None # 命中的缓存层: plan / result / plan+result
 
 class MCPDatabaseClient:
     """MCP数据库客户端"""
@@ -217,7 +224,19 @@ class MCPDatabaseClient:
                 row_count=len(mock_data)
             )
         
-        # 非模拟模式：通过MCP服务器执行SQL
+        # 非模拟模式：优先使用结果缓存
+        cached_data = nl_query_cache.get_result(sql, max_rows)
+        if cached_data is not None:
+            return MCPQueryResult(
+                success=True,
+                sql=sql,
+                data=cached_data,
+                execution_time=(datetime.now() - start_time).total_seconds(),
+                row_count=len(cached_data),
+                cache_hit="result"
+            )
+        
+        # 通过MCP服务器执行SQL
         try:
             if not self.session:
                 self.session = aiohttp.ClientSession(timeout=self.timeout)
@@ -242,6 +261,7 @@ class MCPDatabaseClient:
                 if response.status == 200:
                     result = await response.json()
                     data = result.get("data", [])
+                    nl_query_cache.set_result(sql, max_rows, data)
                     
                     return MCPQueryResult(
                         success=True,
@@ -283,7 +303,27 @@ class MCPDatabaseClient:
                 # 如果没有匹配的模板，返回通用模拟数据
                 return await self.execute_sql("SELECT * FROM asset_snapshot LIMIT 10")
         
-        # 非模拟模式：优先使用DeepSeek AI，然后通过MCP服务器进行自然语言处理
+        # 非模拟模式：先查缓存，相同问题直接复用已生成的SQL，跳过AI调用
+        cached_plan = nl_query_cache.get_plan(question)
+        if cached_plan:
+            logger.info(f"⚡ 命中查询计划缓存: {cached_plan['sql']}")
+            sql_result = await self.execute_sql(cached_plan["sql"])
+            if sql_result.success:
+                sql_result.cache_hit = "plan+result" if sql_result.cache_hit == "result" else "plan"
+                sql_result.ai_analysis = cached_plan["ai_analysis"]
+                sql_result.method = cached_plan["method"]
+                return sql_result
+        
+        if nl_query_cache.fuzzy_template_match:
+            template_result = self._match_query_template(question)
+            if template_result:
+                logger.info(f"⚡ 模板匹配命中，跳过AI调用: {template_result['description']}")
+                nl_query_cache.record_template_hit()
+                sql_result = await self.execute_sql(template_result["sql"])
+                sql_result.method = "template"
+                return sql_result
+        
+        # 优先使用DeepSeek AI，然后通过MCP服务器进行自然语言处理
         try:
             # 1. 尝试使用DeepSeek AI分析问题
             logger.info(f"使用DeepSeek AI分析问题: {question}")
@@ -302,6 +342,13 @@ class MCPDatabaseClient:
                 
                 # 如果SQL执行成功，添加AI分析信息
                 if sql_result.success:
+                    nl_query_cache.set_plan(
+                        question,
+                        generated_sql,
+                        chart_type=ai_analysis.get('chart_type'),
+                        method="deepseek_ai",
+                        ai_analysis=ai_analysis
+                    )
                     sql_result.ai_analysis = ai_analysis
                     sql_result.method = "deepseek_ai"
                     logger.info("✅ DeepSeek AI调用成功，使用AI生成的SQL")
@@ -351,7 +398,10 @@ class MCPDatabaseClient:
                     # 执行生成的SQL
                     generated_sql = result.get("sql")
                     if generated_sql:
-                        return await self.execute_sql(generated_sql)
+                        sql_result = await self.execute_sql(generated_sql)
+                        if sql_result.success:
+                            nl_query_cache.set_plan(question, generated_sql, method="mcp")
+                        return sql_result
                     else:
                         return MCPQueryResult(
                             success=False,
@@ -434,8 +484,34 @@ class MCPDatabaseClient:
                 }
             }
     
+    async def get_schema_fingerprint(self) -> Optional[str]:
+        """获取MCP服务当前的Schema指纹"""
+        try:
+            if not self.session:
+                self.session = aiohttp.ClientSession(timeout=self.timeout)
+            
+            async with self.session.get(f"{self.mcp_server_url}/schema/fingerprint") as response:
+                if response.status == 200:
+                    result = await response.json()
+                    return result.get("fingerprint")
+                return None
+                
+        except Exception as e:
+            logger.warning(f"Schema指纹查询失败: {e}")
+            return None
+    
     async def get_database_schema(self) -> Dict:
-        """获取数据库Schema信息"""
+        """获取数据库Schema信息（进程内缓存，指纹变化时才重新拉取）"""
+        now = time.monotonic()
+        cached_schema = _schema_cache["schema"]
+        if cached_schema is not None and now - _schema_cache["checked_at"] < settings.mcp_schema_check_interval:
+            return cached_schema
+        
+        fingerprint = await self.get_schema_fingerprint()
+        if cached_schema is not None and fingerprint and fingerprint == _schema_cache["fingerprint"]:
+            _schema_cache["checked_at"] = now
+            return cached_schema
+        
         try:
             if not self.session:
                 self.session = aiohttp.ClientSession(timeout=self.timeout)
@@ -453,12 +529,23 @@ class MCPDatabaseClient:
             ) as response:
                 
                 if response.status == 200:
-                    return await response.json()
+                    schema = await response.json()
+                    _schema_cache.update({
+                        "fingerprint": schema.get("fingerprint") or fingerprint,
+                        "schema": schema,
+                        "checked_at": now
+                    })
+                    logger.info(f"Schema已刷新: fingerprint={_schema_cache['fingerprint']}")
+                    return schema
+                elif cached_schema is not None:
+                    return cached_schema
                 else:
                     return {"error": f"Schema查询失败: HTTP {response.status}"}
                     
         except Exception as e:
             logger.error(f"Schema查询异常: {e}")
+            if cached_schema is not None:
+                return cached_schema
             return {"error": str(e)}
 
 # 独立测试类
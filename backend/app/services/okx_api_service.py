@@ -8,11 +8,13 @@ from app.settings import settings
 from app.utils.logger import log_okx_api
 from app.utils.auto_logger import auto_log
 import logging
-import json
 
 # 创建logger实例
 logger = logging.getLogger(__name__)
 
+# bills-archive 每页最多返回100条
+OKX_BILLS_PAGE_SIZE = 100
+
 class OKXAPIService:
     """OKX API集成服务"""
     def __init__(self):
@@ -110,7 +112,7 @@ class OKXAPIService:
         params = {'instId': inst_id}
         return await self._make_request('GET', '/api/v5/market/ticker', params=params, auth_required=False)
 
-    @auto_log("okx", log_result=True)
+    @auto_log("okx")
     async def get_all_tickers(self, inst_type: str = 'SPOT') -> Optional[Dict[str, Any]]:
         """获取所有币种行情"""
         params = {'instType': inst_type}
@@ -128,19 +130,20 @@ class OKXAPIService:
             return None
         return await self._make_request('GET', '/api/v5/account/positions')
 
-    async def get_bills_archive(self, inst_type: str = None, limit: int = 100) -> Optional[Dict[str, Any]]:
-        """获取账单归档流水"""
-        logger.info(f"开始获取账单归档流水: inst_type={inst_type}, limit={limit}")
+    async def get_bills_archive(self, inst_type: str = None, limit: int = 100,
+                                after: str = None, before: str = None) -> Optional[Dict[str, Any]]:
+        """获取账单归档流水（按时间倒序，after/before 为 billId 游标：after 取更早的记录，before 取更新的记录）"""
         if not self._validate_config():
             logger.error("OKX API配置验证失败")
             return None
         params = {'limit': str(limit)}
         if inst_type:
             params['instType'] = inst_type
-        logger.info(f"调用bills-archive接口，参数: {params}")
-        result = await self._make_request('GET', '/api/v5/account/bills-archive', params=params)
-        logger.info(f"bills-archive接口返回结果: {result}")
-        return result
+        if after:
+            params['after'] = after
+        if before:
+            params['before'] = before
+        return await self._make_request('GET', '/api/v5/account/bills-archive', params=params)
 
     @auto_log("system")
     async def get_config(self) -> Dict[str, Any]:
@@ -384,200 +387,145 @@ class OKXAPIService:
         finally:
             db.close()
 
+    def _bill_to_row(self, bill: Dict[str, Any]) -> Dict[str, Any]:
+        """把一条账单转换为 okx_transactions 行"""
+        from datetime import datetime
+        
+        # 解析时间戳（OKX返回的是毫秒级时间戳）
+        try:
+            bill_time = datetime.fromtimestamp(int(bill.get('ts', '')) / 1000)
+        except (ValueError, TypeError):
+            bill_time = datetime.now()
+        
+        # 金额和手续费保持原始精度，不进行float转换
+        amount_raw = bill.get('bal', 0)
+        fee_raw = bill.get('fee', 0)
+        px_raw = bill.get('px', 0)
+        sz_raw = bill.get('sz', 0)
+        price = self.safe_float(px_raw, None) if px_raw not in (None, "") else None
+        quantity = self.safe_float(sz_raw, None) if sz_raw not in (None, "") else None
+        
+        # 根据type和sz推断交易方向
+        side = None
+        bill_type = bill.get('type', '')
+        if bill_type == '2':  # 交易类型
+            if quantity and quantity > 0:
+                side = 'buy'
+            elif quantity and quantity < 0:
+                side = 'sell'
+        elif bill_type == '1':  # 充值
+            side = 'deposit'
+        elif bill_type == '3':  # 提现
+            side = 'withdrawal'
+        elif bill_type == '6':  # 资金划转
+            side = 'transfer'
+        
+        return {
+            "transaction_id": bill.get('billId', ''),
+            "account_id": bill.get('acctId', ''),
+            "inst_type": bill.get('instType', ''),
+            "inst_id": bill.get('instId', ''),
+            "trade_id": bill.get('tradeId'),
+            "order_id": bill.get('ordId'),
+            "bill_id": bill.get('billId'),
+            "type": bill_type,
+            "side": side,
+            "amount": amount_raw if amount_raw not in (None, "") else "0",
+            "currency": bill.get('ccy', ''),
+            "fee": fee_raw if fee_raw not in (None, "") else "0",
+            "fee_currency": bill.get('feeCcy'),
+            "price": price,
+            "quantity": quantity,
+            "timestamp": bill_time,
+            "bal": bill.get('bal'),
+            "bal_chg": bill.get('balChg'),
+            "ccy": bill.get('ccy'),
+            "cl_ord_id": bill.get('clOrdId'),
+            "exec_type": bill.get('execType'),
+            "fill_fwd_px": bill.get('fillFwdPx'),
+            "fill_idx_px": bill.get('fillIdxPx'),
+            "fill_mark_px": bill.get('fillMarkPx'),
+            "fill_mark_vol": bill.get('fillMarkVol'),
+            "fill_px_usd": bill.get('fillPxUsd'),
+            "fill_px_vol": bill.get('fillPxVol'),
+            "fill_time": bill.get('fillTime'),
+            "from_addr": bill.get('from'),
+            "interest": bill.get('interest'),
+            "mgn_mode": bill.get('mgnMode'),
+            "notes": bill.get('notes'),
+            "pnl": bill.get('pnl'),
+            "pos_bal": bill.get('posBal'),
+            "pos_bal_chg": bill.get('posBalChg'),
+            "sub_type": bill.get('subType'),
+            "tag": bill.get('tag'),
+            "to_addr": bill.get('to')
+        }
+
     @auto_log("database", log_result=True)
     async def sync_transactions_to_db(self, days: int = 30) -> Dict[str, Any]:
-        """同步OKX交易记录到数据库"""
+        """增量同步OKX账单到数据库
+
+        从最新账单开始用 after 游标往前翻页，遇到早于水位线（库中最新账单时间）的账单即停止；
+        库中还没有账单时拉取最近 days 天。每页一条 INSERT ... ON CONFLICT 写入。
+        """
         from app.models.database import OKXTransaction
-        from app.utils.database import SessionLocal
+        from app.utils.database import SessionLocal, upsert_rows
         from datetime import datetime, timedelta
-        import traceback
+        from sqlalchemy import func
         
-        logger.info("[DEBUG] sync_transactions_to_db try块已进入")
-        print("[DEBUG] sync_transactions_to_db try块已进入")
         db = SessionLocal()
         try:
-            logger.info(f"[DEBUG] get_bills_archive调用前, days={days}")
-            print(f"[DEBUG] get_bills_archive调用前, days={days}")
-            bills = await self.get_bills_archive(limit=1000)
-            logger.info(f"[DEBUG] get_bills_archive调用后, bills={bills}")
-            print(f"[DEBUG] get_bills_archive调用后, bills={bills}")
-            # 打印原始json
-            logger.info(f"[RAW_BILLS_DATA] {json.dumps(bills, ensure_ascii=False)}")
-            print(f"[RAW_BILLS_DATA] {json.dumps(bills, ensure_ascii=False)}")
+            watermark = db.query(func.max(OKXTransaction.timestamp)).scalar()
+            stop_at = watermark or datetime.now() - timedelta(days=days)
             
-            if not bills or not bills.get('data'):
-                logger.info("[DEBUG] 未获取到交易数据，提前返回")
-                print("[DEBUG] 未获取到交易数据，提前返回")
-                return {"success": False, "message": "未获取到交易数据"}
-            logger.info(f"[DEBUG] 开始处理{len(bills['data'])}条账单数据")
-            print(f"[DEBUG] 开始处理{len(bills['data'])}条账单数据")
             total_new = 0
             total_updated = 0
-            
-            # 计算时间范围
-            end_time = datetime.now()
-            start_time = end_time - timedelta(days=days)
-            logger.info(f"[DEBUG] 时间范围: {start_time} 到 {end_time}")
-            print(f"[DEBUG] 时间范围: {start_time} 到 {end_time}")
-            
-            for bill in bills['data']:
-                logger.info(f"处理账单数据: {bill}")
-                print(f"处理账单数据: {bill}")
-                # 解析时间戳（OKX返回的是毫秒级时间戳）
-                ts_str = bill.get('ts', '')
-                if ts_str:
-                    try:
-                        ts_seconds = int(ts_str) / 1000
-                        bill_time = datetime.fromtimestamp(ts_seconds)
-                    except (ValueError, TypeError):
-                        bill_time = datetime.now()
-                else:
-                    bill_time = datetime.now()
-                logger.info(f"bill['ts']={ts_str}, bill_time={bill_time}, type={type(bill_time)}")
-                print(f"bill['ts']={ts_str}, bill_time={bill_time}, type={type(bill_time)}")
-                assert isinstance(bill_time, datetime), f"bill_time类型错误: {bill_time} ({type(bill_time)})"
-                
-                if bill_time < start_time:
-                    continue
-                
-                # 字段转换日志
-                def log_field(field, val, conv):
-                    logger.info(f"字段[{field}] 原始值: {val!r}, 转换后: {conv!r}")
-                    print(f"字段[{field}] 原始值: {val!r}, 转换后: {conv!r}")
+            pages = 0
+            cursor = None
+            while True:
+                bills = await self.get_bills_archive(limit=OKX_BILLS_PAGE_SIZE, after=cursor)
+                if not bills or bills.get('code') not in (None, '0'):
+                    if pages == 0:
+                        return {"success": False, "message": f"未获取到交易数据: {bills.get('msg') if bills else ''}"}
+                    break
+                data = bills.get('data') or []
+                if not data:
+                    break
+                pages += 1
                 
-                amount_raw = bill.get('bal', 0)
-                # 保持原始精度，不进行float转换
-                amount = amount_raw if amount_raw not in (None, "") else "0"
-                log_field('amount/bal', amount_raw, amount)
+                rows = {}
+                for bill in data:
+                    row = self._bill_to_row(bill)
+                    if row["transaction_id"] and row["timestamp"] >= stop_at:
+                        rows[row["transaction_id"]] = row
                 
-                fee_raw = bill.get('fee', 0)
-                # 保持原始精度，不进行float转换
-                fee = fee_raw if fee_raw not in (None, "") else "0"
-                log_field('fee', fee_raw, fee)
+                if rows:
+                    inserted, updated = upsert_rows(db, OKXTransaction, list(rows.values()), "transaction_id")
+                    db.commit()
+                    total_new += inserted
+                    total_updated += updated
                 
-                px_raw = bill.get('px', 0)
-                price = self.safe_float(px_raw, None) if px_raw not in (None, "") else None
-                log_field('price/px', px_raw, price)
-                
-                sz_raw = bill.get('sz', 0)
-                if sz_raw in (None, ""):
-                    quantity = None
-                else:
-                    quantity = self.safe_float(sz_raw, None)
-                log_field('quantity/sz', sz_raw, quantity)
-                
-                # 根据type和sz推断交易方向
-                side = None
-                bill_type = bill.get('type', '')
-                if bill_type == '2':  # 交易类型
-                    if quantity and quantity > 0:
-                        side = 'buy'
-                    elif quantity and quantity < 0:
-                        side = 'sell'
-                elif bill_type == '1':  # 充值
-                    side = 'deposit'
-                elif bill_type == '3':  # 提现
-                    side = 'withdrawal'
-                elif bill_type == '6':  # 资金划转
-                    side = 'transfer'
-                
-                # 记录side字段的推断过程
-                logger.info(f"[SIDE] type={bill_type}, quantity={quantity}, side={side}")
-                print(f"[SIDE] type={bill_type}, quantity={quantity}, side={side}")
-                
-                # 准备交易数据
-                transaction_data = {
-                    "transaction_id": bill.get('billId', ''),
-                    "account_id": bill.get('acctId', ''),
-                    "inst_type": bill.get('instType', ''),
-                    "inst_id": bill.get('instId', ''),
-                    "trade_id": bill.get('tradeId'),
-                    "order_id": bill.get('ordId'),
-                    "bill_id": bill.get('billId'),
-                    "type": bill.get('type', ''),
-                    "side": side,
-                    "amount": amount,
-                    "currency": bill.get('ccy', ''),
-                    "fee": fee,
-                    "fee_currency": bill.get('feeCcy'),
-                    "price": price,
-                    "quantity": quantity,
-                    "timestamp": bill_time,
-                    "bal": bill.get('bal'),
-                    "bal_chg": bill.get('balChg'),
-                    "ccy": bill.get('ccy'),
-                    "cl_ord_id": bill.get('clOrdId'),
-                    "exec_type": bill.get('execType'),
-                    "fill_fwd_px": bill.get('fillFwdPx'),
-                    "fill_idx_px": bill.get('fillIdxPx'),
-                    "fill_mark_px": bill.get('fillMarkPx'),
-                    "fill_mark_vol": bill.get('fillMarkVol'),
-                    "fill_px_usd": bill.get('fillPxUsd'),
-                    "fill_px_vol": bill.get('fillPxVol'),
-                    "fill_time": bill.get('fillTime'),
-                    "from_addr": bill.get('from'),
-                    "interest": bill.get('interest'),
-                    "mgn_mode": bill.get('mgnMode'),
-                    "notes": bill.get('notes'),
-                    "pnl": bill.get('pnl'),
-                    "pos_bal": bill.get('posBal'),
-                    "pos_bal_chg": bill.get('posBalChg'),
-                    "sub_type": bill.get('subType'),
-                    "tag": bill.get('tag'),
-                    "to_addr": bill.get('to')
-                }
-                logger.info(f"[STEP] transaction_data: {transaction_data}")
-                print(f"[STEP] transaction_data: {transaction_data}")
-                
-                from app.models.database import OKXTransaction
-                model_fields = {c.name for c in OKXTransaction.__table__.columns}
-                filtered_transaction_data = {k: v for k, v in transaction_data.items() if k in model_fields}
-                logger.info(f"[STEP] filtered_transaction_data: {filtered_transaction_data}")
-                print(f"[STEP] filtered_transaction_data: {filtered_transaction_data}")
-                
-                # 检查是否已存在
-                existing = db.query(OKXTransaction).filter_by(
-                    transaction_id=filtered_transaction_data["transaction_id"]
-                ).first()
-                
-                if existing:
-                    # 更新现有记录
-                    for key, value in filtered_transaction_data.items():
-                        if key != 'transaction_id':  # 不更新唯一键
-                            setattr(existing, key, value)
-                    total_updated += 1
-                else:
-                    try:
-                        logger.info(f"准备创建新的OKXTransaction记录")
-                        print(f"准备创建新的OKXTransaction记录")
-                        new_tx = OKXTransaction(**filtered_transaction_data)
-                        logger.info(f"OKXTransaction对象创建成功: {new_tx}")
-                        print(f"OKXTransaction对象创建成功: {new_tx}")
-                        db.add(new_tx)
-                        logger.info(f"记录已添加到数据库会话")
-                        print(f"记录已添加到数据库会话")
-                    except Exception as e:
-                        logger.error(f"入库时异常: {e}, filtered_transaction_data={filtered_transaction_data}")
-                        print(f"入库时异常: {e}, filtered_transaction_data={filtered_transaction_data}")
-                        print(traceback.format_exc())
-                        logger.error(traceback.format_exc())
-                        raise
-                    total_new += 1
-            
-            db.commit()
+                # 本页已有早于水位线的账单，或不足一页，说明更早的都已同步
+                if len(rows) < len(data) or len(data) < OKX_BILLS_PAGE_SIZE:
+                    break
+                cursor = data[-1].get('billId')
+                if not cursor:
+                    break
             
+            logger.info(
+                f"OKX账单同步完成: {pages}页, 新增{total_new}条, 更新{total_updated}条, 水位线={watermark}"
+            )
             return {
                 "success": True, 
                 "message": f"交易记录同步完成，新增{total_new}条，更新{total_updated}条",
                 "total_new": total_new,
-                "total_updated": total_updated
+                "total_updated": total_updated,
+                "pages": pages
             }
             
         except Exception as e:
-            logger.error(f"[EXCEPT] 同步OKX交易记录失败: {e}")
-            print(f"[EXCEPT] 同步OKX交易记录失败: {e}")
-            print(traceback.format_exc())
-            logger.error(traceback.format_exc())
+            db.rollback()
+            logger.error(f"同步OKX交易记录失败: {e}", exc_info=True)
             return {"success": False, "message": f"同步失败: {str(e)}"}
         finally:
             db.close()
@@ -657,76 +605,77 @@ class OKXAPIService:
         finally:
             db.close()
 
+    async def get_tickers_map(self, inst_ids: List[str] = None, inst_type: str = 'SPOT') -> Dict[str, Dict[str, Any]]:
+        """一次请求获取全部行情，返回 {instId: ticker}；指定 inst_ids 时只保留这些产品"""
+        tickers = await self.get_all_tickers(inst_type)
+        if not tickers or tickers.get('code') not in (None, '0') or not tickers.get('data'):
+            return {}
+        wanted = set(inst_ids) if inst_ids else None
+        return {
+            ticker['instId']: ticker
+            for ticker in tickers['data']
+            if ticker.get('instId') and (wanted is None or ticker['instId'] in wanted)
+        }
+
+    @staticmethod
+    def ticker_to_market_data(ticker: Dict[str, Any], timestamp, inst_type: str = 'SPOT') -> Dict[str, Any]:
+        """行情转换为 okx_market_data 行"""
+        def optional_float(key):
+            value = ticker.get(key)
+            return float(value) if value else None
+        
+        return {
+            "inst_id": ticker['instId'],
+            "inst_type": inst_type,
+            "last_price": float(ticker.get('last') or 0),
+            "bid_price": optional_float('bidPx'),
+            "ask_price": optional_float('askPx'),
+            "high_24h": optional_float('high24h'),
+            "low_24h": optional_float('low24h'),
+            "volume_24h": optional_float('vol24h'),
+            "change_24h": optional_float('change24h'),
+            "change_rate_24h": optional_float('changeRate24h'),
+            "timestamp": timestamp
+        }
+
+    @staticmethod
+    def save_market_data(db, rows: List[Dict[str, Any]]) -> int:
+        """一次批量插入市场数据（同一批次共用一个时间戳，不会与已有记录冲突）"""
+        from app.models.database import OKXMarketData
+        
+        if not rows:
+            return 0
+        db.execute(OKXMarketData.__table__.insert(), rows)
+        db.commit()
+        return len(rows)
+
     @auto_log("database", log_result=True)
     async def sync_market_data_to_db(self, inst_ids: List[str] = None) -> Dict[str, Any]:
-        """同步OKX市场数据到数据库"""
-        from app.models.database import OKXMarketData
+        """同步OKX市场数据到数据库（一次全量行情请求，内存中筛选）"""
         from app.utils.database import SessionLocal
         from datetime import datetime
         
         db = SessionLocal()
         try:
-            # 如果没有指定产品，获取所有SPOT产品
+            tickers = await self.get_tickers_map(inst_ids)
             if not inst_ids:
-                instruments = await self.get_instruments('SPOT')
-                if instruments and instruments.get('data'):
-                    inst_ids = [inst['instId'] for inst in instruments['data'][:50]]  # 限制数量
-                else:
-                    inst_ids = ['BTC-USDT', 'ETH-USDT', 'LTC-USDT']  # 默认产品
+                # 未指定产品时取前50个SPOT产品
+                tickers = dict(list(tickers.items())[:50])
             
-            total_new = 0
-            total_updated = 0
             current_time = datetime.now()
+            rows = [self.ticker_to_market_data(ticker, current_time) for ticker in tickers.values()]
+            total_new = self.save_market_data(db, rows)
             
-            for inst_id in inst_ids:
-                # 获取单个产品行情
-                ticker = await self.get_ticker(inst_id)
-                
-                if not ticker or not ticker.get('data'):
-                    continue
-                
-                ticker_data = ticker['data'][0]
-                
-                # 准备市场数据
-                market_data = {
-                    "inst_id": inst_id,
-                    "inst_type": "SPOT",
-                    "last_price": float(ticker_data.get('last', 0)),
-                    "bid_price": float(ticker_data.get('bidPx', 0)) if ticker_data.get('bidPx') else None,
-                    "ask_price": float(ticker_data.get('askPx', 0)) if ticker_data.get('askPx') else None,
-                    "high_24h": float(ticker_data.get('high24h', 0)) if ticker_data.get('high24h') else None,
-                    "low_24h": float(ticker_data.get('low24h', 0)) if ticker_data.get('low24h') else None,
-                    "volume_24h": float(ticker_data.get('vol24h', 0)) if ticker_data.get('vol24h') else None,
-                    "change_24h": float(ticker_data.get('change24h', 0)) if ticker_data.get('change24h') else None,
-                    "change_rate_24h": float(ticker_data.get('changeRate24h', 0)) if ticker_data.get('changeRate24h') else None,
-                    "timestamp": current_time
-                }
-                
-                # 检查是否已存在（同一时间戳）
-                existing = db.query(OKXMarketData).filter_by(
-                    inst_id=market_data["inst_id"],
-                    timestamp=market_data["timestamp"]
-                ).first()
-                
-                if existing:
-                    # 更新现有记录
-                    for key, value in market_data.items():
-                        if key not in ['inst_id', 'timestamp']:
-                            setattr(existing, key, value)
-                    total_updated += 1
-                else:
-                    # 插入新记录
-                    new_market_data = OKXMarketData(**market_data)
-                    db.add(new_market_data)
-                    total_new += 1
-            
-            db.commit()
+            missing = sorted(set(inst_ids) - set(tickers)) if inst_ids else []
+            if missing:
+                logger.warning(f"OKX行情中未找到: {missing}")
             
             return {
                 "success": True, 
-                "message": f"市场数据同步完成，新增{total_new}条，更新{total_updated}条",
+                "message": f"市场数据同步完成，新增{total_new}条，更新0条",
                 "total_new": total_new,
-                "total_updated": total_updated
+                "total_updated": 0,
+                "missing": missing
             }
             
         except Exception as e:
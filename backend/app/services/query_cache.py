@@ -0,0 +1,220 @@
+"""
+自然语言查询缓存
+缓存"问题 → SQL/图表类型"的生成结果以及SQL执行结果，避免重复问题反复调用AI服务
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# 规范化时需要去掉的空白和标点（全角标点经NFKC后已转成半角）
+_NOISE_RE = re.compile(r"[\s,.!?;:'\"()\[\]{}<>、。“”‘’《》【】·~`]+")
+
+
+def normalize_question(question: str) -> str:
+    """规范化问题文本：统一全/半角和大小写，去掉空白和标点"""
+    if not question:
+        return ""
+    text = unicodedata.normalize("NFKC", question).lower()
+    return _NOISE_RE.sub(" ", text).strip()
+
+
+def normalize_sql(sql: str) -> str:
+    """规范化SQL文本：去掉末尾分号并压缩空白"""
+    return " ".join((sql or "").strip().rstrip(";").split())
+
+
+def _hash_key(*parts: Any) -> str:
+    return hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class TTLCache:
+    """线程安全的TTL + LRU缓存"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class NLQueryCache:
+    """自然语言查询缓存
+
+    - 计划缓存: 规范化问题 + schema版本 → 生成的SQL、图表类型和AI分析信息
+    - 结果缓存: 规范化SQL + max_rows → 执行结果（TTL较短，保证数据新鲜度）
+    - 可选的模板模糊匹配: 未命中时优先使用 `_match_query_template` 的预定义模板，跳过AI调用
+    """
+
+    def __init__(
+        self,
+        plan_ttl: float = 24 * 3600,
+        result_ttl: float = 60,
+        max_size: int = 500,
+        fuzzy_template_match: bool = False,
+        schema_version: str = "unknown",
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.plans = TTLCache(max_size, plan_ttl)
+        self.results = TTLCache(max_size, result_ttl)
+        self.fuzzy_template_match = fuzzy_template_match
+        self.schema_version = schema_version
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "plan_hits": 0,
+            "plan_misses": 0,
+            "result_hits": 0,
+            "result_misses": 0,
+            "template_hits": 0,
+        }
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def set_schema_version(self, schema_version: str) -> None:
+        """更新schema版本，版本变化时清空所有缓存"""
+        if schema_version and schema_version != self.schema_version:
+            logger.info(f"🔄 Schema版本变化 {self.schema_version} → {schema_version}，清空查询缓存")
+            self.schema_version = schema_version
+            self.clear()
+
+    # ---- 计划缓存 ----
+
+    def _plan_key(self, question: str) -> str:
+        return _hash_key("plan", self.schema_version, normalize_question(question))
+
+    def get_plan(self, question: str) -> Optional[Dict[str, Any]]:
+        """获取已缓存的SQL生成结果"""
+        if not self.enabled:
+            return None
+        plan = self.plans.get(self._plan_key(question))
+        self._count("plan_hits" if plan is not None else "plan_misses")
+        return plan
+
+    def set_plan(
+        self,
+        question: str,
+        sql: str,
+        chart_type: Optional[str] = None,
+        method: Optional[str] = None,
+        ai_analysis: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """缓存SQL生成结果"""
+        if not self.enabled or not sql:
+            return
+        self.plans.set(self._plan_key(question), {
+            "sql": sql,
+            "chart_type": chart_type,
+            "method": method,
+            "ai_analysis": ai_analysis,
+            "cached_at": time.time(),
+        })
+
+    def record_template_hit(self) -> None:
+        self._count("template_hits")
+
+    # ---- 结果缓存 ----
+
+    def _result_key(self, sql: str, max_rows: int) -> str:
+        return _hash_key("result", self.schema_version, normalize_sql(sql), max_rows)
+
+    def get_result(self, sql: str, max_rows: int) -> Optional[Any]:
+        """获取已缓存的SQL执行结果"""
+        if not self.enabled:
+            return None
+        result = self.results.get(self._result_key(sql, max_rows))
+        self._count("result_hits" if result is not None else "result_misses")
+        return result
+
+    def set_result(self, sql: str, max_rows: int, data: Any) -> None:
+        """缓存SQL执行结果"""
+        if not self.enabled:
+            return
+        self.results.set(self._result_key(sql, max_rows), data)
+
+    # ---- 管理 ----
+
+    def clear(self) -> None:
+        self.plans.clear()
+        self.results.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """返回缓存命中统计"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+
+        def _rate(hits: int, misses: int) -> float:
+            total = hits + misses
+            return round(hits / total, 4) if total else 0.0
+
+        stats.update({
+            "enabled": self.enabled,
+            "plan_hit_rate": _rate(stats["plan_hits"], stats["plan_misses"]),
+            "result_hit_rate": _rate(stats["result_hits"], stats["result_misses"]),
+            "plan_entries": len(self.plans),
+            "result_entries": len(self.results),
+            "plan_ttl": self.plans.ttl,
+            "result_ttl": self.results.ttl,
+            "fuzzy_template_match": self.fuzzy_template_match,
+            "schema_version": self.schema_version,
+        })
+        return stats
+
+
+def _schema_file_version(schema_file: str) -> str:
+    """以schema描述文件内容的哈希作为schema版本"""
+    try:
+        with open(schema_file, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()[:12]
+    except OSError:
+        return "unknown"
+
+
+nl_query_cache = NLQueryCache(
+    plan_ttl=settings.nl_query_plan_ttl,
+    result_ttl=settings.nl_query_result_ttl,
+    max_size=settings.cache_max_size,
+    fuzzy_template_match=settings.nl_query_fuzzy_template_match,
+    schema_version=_schema_file_version(
+        os.path.join(os.path.dirname(__file__), "../../config/database_schema_for_mcp.json")
+    ),
+    enabled=settings.cache_enabled and settings.nl_query_cache_enabled,
+)
@@ -0,0 +1,382 @@
+"""
+基金收益分析（XIRR、时间加权收益、回撤、波动率）
+
+以已确认的基金操作（UserOperation）为现金流、以 fund_nav 为估值序列，
+把所有基金、定投计划和整个组合放进同一个"范围 × 交易日"矩阵中一次性计算：
+
+- 每日市值曲线: 份额变动按日期累加后乘以前向填充的净值
+- TWR（时间加权收益）: 按日剔除当日净流入后的收益率连乘
+- XIRR（资金加权收益）: 所有范围一起在NPV变号区间内做向量化的牛顿迭代（越界时二分）
+- 最大回撤 / 年化波动率: 基于TWR净值曲线
+
+结果按 (范围, 截止日期) 缓存。范围的写法: "portfolio"、"fund:<基金代码>"、"plan:<定投计划ID>"。
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from app.models.database import FundNav, UserOperation
+from app.services.query_cache import TTLCache
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_SCOPE = "portfolio"
+TRADING_DAYS_PER_YEAR = 252
+
+# XIRR 求解参数
+XIRR_MAX_ITERATIONS = 200
+XIRR_TOLERANCE = 1e-10  # 收敛判据: |NPV| <= 容差 × 现金流绝对值之和
+XIRR_GUESS = 0.1
+# 查找NPV变号区间用的利率网格（年化）
+XIRR_RATE_GRID = np.array([
+    -0.999999, -0.99, -0.9, -0.7, -0.5, -0.3, -0.1, 0.0, 0.1, 0.3, 0.5, 1.0, 2.0, 5.0, 10.0, 100.0, 1e4
+])
+
+
+# ---- 向量化计算（纯函数，不依赖数据库） ----
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """按行前向填充NaN（行首的NaN保持不变）"""
+    mask = ~np.isnan(matrix)
+    index = np.where(mask, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    return matrix[np.arange(matrix.shape[0])[:, None], index]
+
+
+def daily_returns(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """剔除当日净流入后的日收益率矩阵 (k, T-1)：r_t = (V_t - F_t) / V_{t-1} - 1，前一日市值为0时记0"""
+    previous = values[:, :-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(previous > 0, (values[:, 1:] - flows[:, 1:]) / previous - 1, 0.0)
+    return returns
+
+
+def _npv(rates: np.ndarray, years: np.ndarray, cash_flows: np.ndarray):
+    """每行按各自利率折现的 (NPV, dNPV/dr)"""
+    base = 1.0 + rates[:, None]
+    with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+        discount = base ** -years
+        npv = (cash_flows * discount).sum(axis=1)
+        derivative = (-years * cash_flows * discount / base).sum(axis=1)
+    return npv, derivative
+
+
+def xirr(day_offsets: np.ndarray, cash_flows: np.ndarray) -> np.ndarray:
+    """向量化XIRR
+
+    先在 XIRR_RATE_GRID 上找出NPV变号、且离 XIRR_GUESS 最近的区间，再在区间内迭代：
+    牛顿步落在区间外或区间收缩过慢时改用二分，只有 |NPV| 满足容差才接受结果。
+
+    Args:
+        day_offsets: (T,) 每一列距第一列的天数
+        cash_flows: (k, T) 投资者视角的现金流（投入为负、取回和期末市值为正）
+
+    Returns:
+        (k,) 年化收益率，无法求解（如只有单向现金流、找不到变号区间）时为NaN
+    """
+    k = cash_flows.shape[0]
+    rates = np.full(k, np.nan)
+    if k == 0:
+        return rates
+
+    has_flow = cash_flows != 0
+    first_column = np.where(has_flow.any(axis=1), has_flow.argmax(axis=1), 0)
+    # 以每个范围自己的首笔现金流为时间零点，避免长周期下的数值溢出
+    years = (day_offsets[None, :] - day_offsets[first_column][:, None]) / 365.0
+    years = np.where(has_flow, years, 0.0)
+
+    rows = np.flatnonzero((cash_flows > 0).any(axis=1) & (cash_flows < 0).any(axis=1))
+    if not len(rows):
+        return rates
+    # 只保留有现金流的列（定投、赎回日远少于交易日），迭代中的折现计算量随之减少
+    columns = np.flatnonzero(has_flow[rows].any(axis=0))
+    years, flows = years[rows][:, columns], cash_flows[rows][:, columns]
+    tolerance = XIRR_TOLERANCE * np.abs(flows).sum(axis=1)
+
+    # 变号区间
+    grid_npv = np.column_stack([_npv(np.full(len(rows), rate), years, flows)[0] for rate in XIRR_RATE_GRID])
+    with np.errstate(invalid="ignore"):
+        sign_change = np.sign(grid_npv[:, :-1]) * np.sign(grid_npv[:, 1:]) <= 0
+    distance = np.maximum(np.maximum(XIRR_RATE_GRID[:-1] - XIRR_GUESS, XIRR_GUESS - XIRR_RATE_GRID[1:]), 0.0)
+    distance = np.where(sign_change, distance[None, :], np.inf)
+    bracket = distance.argmin(axis=1)
+    row_index = np.arange(len(rows))
+    active = np.isfinite(distance[row_index, bracket])
+    low, high = XIRR_RATE_GRID[bracket], XIRR_RATE_GRID[bracket + 1]
+    npv_low = grid_npv[row_index, bracket]
+    width = high - low
+    rate = (low + high) / 2
+    converged = np.zeros(len(rows), dtype=bool)
+
+    for _ in range(XIRR_MAX_ITERATIONS):
+        if not active.any():
+            break
+        index = np.flatnonzero(active)
+        npv, derivative = _npv(rate[index], years[index], flows[index])
+        done = np.abs(npv) <= tolerance[index]
+        converged[index[done]] = True
+
+        # 收缩区间：与低端同号则替换低端，否则替换高端
+        same_as_low = np.sign(npv) == np.sign(npv_low[index])
+        low[index] = np.where(same_as_low, rate[index], low[index])
+        npv_low[index] = np.where(same_as_low, npv, npv_low[index])
+        high[index] = np.where(same_as_low, high[index], rate[index])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = rate[index] - npv / derivative
+        bisect = (low[index] + high[index]) / 2
+        use_newton = (
+            np.isfinite(newton) & (newton > low[index]) & (newton < high[index])
+            & (high[index] - low[index] <= 0.5 * width[index])
+        )
+        width[index] = high[index] - low[index]
+        rate[index] = np.where(done, rate[index], np.where(use_newton, newton, bisect))
+
+        # 区间已缩到浮点精度仍不满足容差的不再迭代（结果为NaN）
+        exhausted = width[index] <= np.finfo(float).eps * np.maximum(np.abs(rate[index]), 1.0)
+        active[index[done | exhausted]] = False
+
+    rates[rows[converged]] = rate[converged]
+    return rates
+
+
+def compute_return_metrics(days: np.ndarray, values: np.ndarray, flows: np.ndarray) -> Dict[str, np.ndarray]:
+    """计算每一行（范围）的收益指标
+
+    Args:
+        days: (T,) datetime64[D] 交易日
+        values: (k, T) 每日收盘市值
+        flows: (k, T) 每日净流入（买入金额为正、卖出金额为负）
+
+    Returns:
+        {"twr", "xirr", "max_drawdown", "volatility", "growth"}，除 growth 为 (k, T) 的TWR净值曲线外均为 (k,)
+    """
+    k, length = values.shape
+    if length < 2:
+        zeros = np.zeros(k)
+        return {"twr": zeros, "xirr": np.full(k, np.nan), "max_drawdown": zeros, "volatility": zeros,
+                "growth": np.ones((k, length))}
+
+    returns = daily_returns(values, flows)
+    growth = np.concatenate([np.ones((k, 1)), np.cumprod(1.0 + returns, axis=1)], axis=1)
+    peaks = np.maximum.accumulate(growth, axis=1)
+    max_drawdown = (1.0 - growth / peaks).max(axis=1)
+
+    # 只在持有期内计算波动率
+    held = values[:, :-1] > 0
+    held_days = held.sum(axis=1)
+    mean = np.where(held_days > 0, (returns * held).sum(axis=1) / np.maximum(held_days, 1), 0.0)
+    variance = ((returns - mean[:, None]) ** 2 * held).sum(axis=1) / np.maximum(held_days - 1, 1)
+    volatility = np.sqrt(variance * TRADING_DAYS_PER_YEAR)
+
+    # 投资者现金流 = -净流入，期末市值视为最后一天取回
+    cash_flows = -flows.astype(float)
+    cash_flows[:, -1] += values[:, -1]
+    day_offsets = (days - days[0]).astype(np.int64).astype(float)
+
+    return {
+        "twr": growth[:, -1] - 1.0,
+        "xirr": xirr(day_offsets, cash_flows),
+        "max_drawdown": max_drawdown,
+        "volatility": volatility,
+        "growth": growth,
+    }
+
+
+def build_value_matrix(
+    days: np.ndarray,
+    navs: np.ndarray,
+    row_funds: np.ndarray,
+    op_rows: np.ndarray,
+    op_days: np.ndarray,
+    op_shares: np.ndarray,
+    op_flows: np.ndarray
+):
+    """由操作明细构建 (市值, 净流入) 矩阵
+
+    Args:
+        days: (T,) 交易日
+        navs: (F, T) 前向填充后的基金净值
+        row_funds: (k,) 每个范围行对应的基金行号（组合行单独汇总，不在此处）
+        op_rows / op_days: 每条操作计入的范围行号和交易日列号（同一操作可计入多行）
+        op_shares / op_flows: 份额变动（卖出为负）和净流入
+    """
+    k, length = len(row_funds), len(days)
+    share_changes = np.zeros((k, length))
+    flows = np.zeros((k, length))
+    np.add.at(share_changes, (op_rows, op_days), op_shares)
+    np.add.at(flows, (op_rows, op_days), op_flows)
+    shares = np.cumsum(share_changes, axis=1)
+    # 浮点误差导致的极小负份额视为清仓
+    shares[np.abs(shares) < 1e-6] = 0.0
+    values = shares * np.nan_to_num(navs[row_funds])
+    return values, flows
+
+
+def _nullable(value: float, digits: int = 6) -> Optional[float]:
+    return None if value is None or not np.isfinite(value) else round(float(value), digits)
+
+
+# ---- 数据加载 + 缓存 ----
+
+class ReturnAnalyticsService:
+    """基金/定投计划/组合的收益分析，一次计算所有范围，按 (范围, 截止日期) 缓存"""
+
+    def __init__(self, ttl: float = 600, max_size: int = 2048):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    @staticmethod
+    def _load(db: Session, as_of: date):
+        operations = db.query(
+            UserOperation.operation_date, UserOperation.operation_type, UserOperation.asset_code,
+            UserOperation.amount, UserOperation.quantity, UserOperation.dca_plan_id
+        ).filter(
+            and_(
+                UserOperation.asset_type == "基金",
+                UserOperation.status == "confirmed",
+                UserOperation.operation_type.in_(["buy", "sell"]),
+                UserOperation.quantity.isnot(None),
+                UserOperation.operation_date < datetime.combine(as_of + timedelta(days=1), time.min)
+            )
+        ).order_by(UserOperation.operation_date).all()
+
+        fund_codes = sorted({op.asset_code for op in operations})
+        navs = []
+        if fund_codes:
+            navs = db.query(FundNav.fund_code, FundNav.nav_date, FundNav.nav).filter(
+                and_(FundNav.fund_code.in_(fund_codes), FundNav.nav_date <= as_of)
+            ).all()
+        return operations, fund_codes, navs
+
+    @staticmethod
+    def compute(operations: Sequence, fund_codes: List[str], nav_rows: Sequence, as_of: date,
+                include_curves: bool = False) -> Dict[str, Dict[str, Any]]:
+        """由操作和净值数据计算所有范围的指标：{范围: 指标}"""
+        if not operations or not nav_rows:
+            return {}
+
+        fund_index = {code: i for i, code in enumerate(fund_codes)}
+        nav_days = np.array([row[1] for row in nav_rows], dtype="datetime64[D]")
+        days = np.unique(np.concatenate([
+            nav_days, np.array([op[0].date() for op in operations], dtype="datetime64[D]")
+        ]))
+        days = days[days <= np.datetime64(as_of, "D")]
+
+        navs = np.full((len(fund_codes), len(days)), np.nan)
+        navs[
+            np.array([fund_index[row[0]] for row in nav_rows]),
+            np.searchsorted(days, nav_days)
+        ] = np.array([float(row[2]) for row in nav_rows])
+        navs = forward_fill(navs)
+
+        # 范围行：每个基金一行、每个定投计划一行
+        scopes = [f"fund:{code}" for code in fund_codes]
+        row_funds = list(range(len(fund_codes)))
+        plan_rows: Dict[int, int] = {}
+        op_rows, op_days, op_shares, op_flows = [], [], [], []
+        operation_days = np.searchsorted(days, np.array([op[0].date() for op in operations], dtype="datetime64[D]"))
+        for op, day in zip(operations, operation_days):
+            sign = 1.0 if op[1] == "buy" else -1.0
+            shares, flow = sign * float(op[4]), sign * float(op[3])
+            fund_row = fund_index[op[2]]
+            op_rows.append(fund_row)
+            op_days.append(day)
+            op_shares.append(shares)
+            op_flows.append(flow)
+            if op[5] is not None:
+                if op[5] not in plan_rows:
+                    plan_rows[op[5]] = len(scopes)
+                    scopes.append(f"plan:{op[5]}")
+                    row_funds.append(fund_row)
+                op_rows.append(plan_rows[op[5]])
+                op_days.append(day)
+                op_shares.append(shares)
+                op_flows.append(flow)
+
+        values, flows = build_value_matrix(
+            days, navs, np.array(row_funds), np.array(op_rows), np.array(op_days),
+            np.array(op_shares), np.array(op_flows)
+        )
+        # 组合行 = 所有基金行之和（定投计划行是基金行的子集，不重复计入）
+        fund_count = len(fund_codes)
+        values = np.vstack([values, values[:fund_count].sum(axis=0)])
+        flows = np.vstack([flows, flows[:fund_count].sum(axis=0)])
+        scopes.append(PORTFOLIO_SCOPE)
+
+        metrics = compute_return_metrics(days, values, flows)
+        invested = np.where(flows > 0, flows, 0).sum(axis=1)
+        # 加 0.0 把没有卖出时的 -0.0 规整为 0.0
+        withdrawn = -np.where(flows < 0, flows, 0).sum(axis=1) + 0.0
+        has_position = values > 0
+        first_day = np.where(has_position.any(axis=1), has_position.argmax(axis=1), -1)
+
+        result = {}
+        for row, scope in enumerate(scopes):
+            entry = {
+                "scope": scope,
+                "as_of": as_of.isoformat(),
+                "start_date": str(days[first_day[row]]) if first_day[row] >= 0 else None,
+                "current_value": round(float(values[row, -1]), 2),
+                "total_invested": round(float(invested[row]), 2),
+                "total_withdrawn": round(float(withdrawn[row]), 2),
+                "twr": _nullable(metrics["twr"][row]),
+                "xirr": _nullable(metrics["xirr"][row]),
+                "max_drawdown": _nullable(metrics["max_drawdown"][row]),
+                "volatility": _nullable(metrics["volatility"][row]),
+            }
+            if include_curves:
+                start = max(first_day[row], 0)
+                entry["curve"] = {
+                    "dates": [str(day) for day in days[start:]],
+                    "values": np.round(values[row, start:], 2).tolist(),
+                    "growth": np.round(metrics["growth"][row, start:], 6).tolist(),
+                }
+            result[scope] = entry
+        return result
+
+    def analyze(self, db: Session, as_of: Optional[date] = None) -> Dict[str, Dict[str, Any]]:
+        """计算所有范围的指标并写入缓存，返回 {范围: 指标（含每日曲线）}"""
+        as_of = as_of or date.today()
+        operations, fund_codes, nav_rows = self._load(db, as_of)
+        result = self.compute(operations, fund_codes, nav_rows, as_of, include_curves=True)
+        for scope, entry in result.items():
+            self._cache.set(f"{scope}|{as_of.isoformat()}", entry)
+        # 记录本次计算出的范围列表，不存在的范围不会触发重新计算
+        self._cache.set(f"*|{as_of.isoformat()}", sorted(result))
+        logger.info(f"收益分析完成: {len(result)} 个范围，截止 {as_of}")
+        return result
+
+    def get(self, db: Session, scope: str = PORTFOLIO_SCOPE, as_of: Optional[date] = None,
+            include_curve: bool = False) -> Optional[Dict[str, Any]]:
+        """单个范围的指标，缓存未命中时重新计算全部范围"""
+        as_of = as_of or date.today()
+        entry = self._cache.get(f"{scope}|{as_of.isoformat()}")
+        if entry is None:
+            known_scopes = self._cache.get(f"*|{as_of.isoformat()}")
+            if known_scopes is None or scope in known_scopes:
+                entry = self.analyze(db, as_of).get(scope)
+        if entry is None:
+            return None
+        if include_curve:
+            return entry
+        return {key: value for key, value in entry.items() if key != "curve"}
+
+    def list_scopes(self, db: Session, as_of: Optional[date] = None) -> List[Dict[str, Any]]:
+        """所有范围的指标（不含曲线）"""
+        as_of = as_of or date.today()
+        scopes = self._cache.get(f"*|{as_of.isoformat()}")
+        if scopes is None:
+            scopes = sorted(self.analyze(db, as_of))
+        return [entry for entry in (self.get(db, scope, as_of) for scope in scopes) if entry]
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+return_analytics_service = ReturnAnalyticsService(ttl=settings.return_analytics_cache_ttl)
@@ -0,0 +1,243 @@
+"""
+调度器主节点选举
+
+每个 uvicorn 进程都会创建 ExtensibleSchedulerService。多 worker 或多副本部署时，
+如果每个进程都启动调度器，同步、定投等定时任务会被重复执行。
+
+这里用"租约锁"选出唯一的调度主节点：
+- PostgreSQL: 会话级 advisory lock（pg_try_advisory_lock），锁随专用连接存在，进程退出或连接断开即释放
+- SQLite 等: 数据目录下的锁文件（fcntl.flock），进程退出时由操作系统释放
+
+所有进程都加载插件和任务（手动执行、任务列表等接口照常可用），但只有主节点的调度器处于运行状态，
+其他进程的调度器保持暂停并定期重试抢锁；主节点失去锁（如数据库连接断开）时暂停调度并重新参与选举。
+任务存储在各进程内存中，因此创建/删除/暂停/恢复任务只能在主节点上进行，其他进程返回 409 并给出主节点标识。
+"""
+import asyncio
+import os
+import socket
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from loguru import logger
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from app.settings import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只能单进程运行
+    fcntl = None
+
+# 主节点持锁连接的 application_name 前缀，其他进程据此查出当前主节点
+_APPLICATION_NAME_PREFIX = "scheduler-leader "
+
+
+class NotSchedulerLeaderError(Exception):
+    """当前进程不是调度主节点，修改任务的操作应发往主节点"""
+
+    def __init__(self, leader: Optional[str]):
+        self.leader = leader
+        super().__init__(f"当前进程不是调度主节点，请在主节点上操作（主节点: {leader or '未知'}）")
+
+
+class _AdvisoryLock:
+    """PostgreSQL 会话级 advisory lock，持有期间占用一个专用连接"""
+
+    def __init__(self, database_url: str, key: int):
+        self.key = key
+        # 独立的无连接池引擎，不占用业务连接池，也不会被连接回收机制悄悄关闭；
+        # 使用自动提交：持锁连接不能停在 "idle in transaction"（会被 idle_in_transaction_session_timeout
+        # 断开导致主节点反复切换，也会阻止 VACUUM 回收旧版本）
+        self._engine = create_engine(database_url, poolclass=NullPool, isolation_level="AUTOCOMMIT")
+        self._conn = None
+
+    def acquire(self, identity: str) -> bool:
+        conn = self._engine.connect()
+        try:
+            acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.key}).scalar()
+            if acquired:
+                conn.execute(
+                    text("SELECT set_config('application_name', :name, false)"),
+                    {"name": f"{_APPLICATION_NAME_PREFIX}{identity}"[:63]}
+                )
+        except Exception:
+            conn.close()
+            raise
+        if acquired:
+            self._conn = conn
+        else:
+            conn.close()
+        return bool(acquired)
+
+    def holder(self) -> Optional[str]:
+        """持有锁的进程标识"""
+        with self._engine.connect() as conn:
+            name = conn.execute(text("""
+                SELECT a.application_name FROM pg_locks l
+                JOIN pg_stat_activity a ON a.pid = l.pid
+                WHERE l.locktype = 'advisory' AND l.granted
+                  AND l.classid = 0 AND l.objid = :key AND l.objsubid = 1
+            """), {"key": self.key}).scalar()
+        if not name:
+            return None
+        return name[len(_APPLICATION_NAME_PREFIX):] if name.startswith(_APPLICATION_NAME_PREFIX) else name
+
+    def is_held(self) -> bool:
+        """连接仍然可用即仍持有锁"""
+        if self._conn is None:
+            return False
+        try:
+            self._conn.execute(text("SELECT 1"))
+            return True
+        except Exception:
+            self._close()
+            return False
+
+    def release(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": self.key})
+        except Exception:
+            pass
+        self._close()
+
+    def _close(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+
+class _FileLock:
+    """锁文件，同一台机器上的多个进程共享（SQLite 部署本来就只能单机）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def acquire(self, identity: str) -> bool:
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{identity}\n".encode())
+        self._fd = fd
+        return True
+
+    def is_held(self) -> bool:
+        return fcntl is None or self._fd is not None
+
+    def holder(self) -> Optional[str]:
+        """锁文件中记录的主节点标识"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SchedulerLeaderElection:
+    """调度主节点选举"""
+
+    def __init__(self):
+        self.identity = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.elected_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+        if make_url(settings.database_url).get_backend_name() == "postgresql":
+            self.backend = "postgres_advisory_lock"
+            self._lock = _AdvisoryLock(settings.database_url, settings.scheduler_leader_lock_key)
+        else:
+            self.backend = "file_lock"
+            self._lock = _FileLock(self._lock_file_path())
+
+    @staticmethod
+    def _lock_file_path() -> str:
+        if settings.scheduler_leader_lock_file:
+            return settings.scheduler_leader_lock_file
+        from app.utils.database import get_data_directory
+        return os.path.join(get_data_directory(), "scheduler.lock")
+
+    def start(self, on_elected: Callable[[], Awaitable[None]], on_demoted: Callable[[], Awaitable[None]]):
+        """在后台持续参与选举"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run(on_elected, on_demoted), name="scheduler-leader-election")
+
+    async def _run(self, on_elected, on_demoted):
+        interval = settings.scheduler_leader_retry_interval
+        while True:
+            try:
+                if self.is_leader:
+                    held = await asyncio.to_thread(self._lock.is_held)
+                    if not held:
+                        self.is_leader = False
+                        self.elected_at = None
+                        logger.warning(f"调度主节点 {self.identity} 失去锁，暂停定时任务")
+                        await on_demoted()
+                else:
+                    acquired = await asyncio.to_thread(self._lock.acquire, self.identity)
+                    if acquired:
+                        self.is_leader = True
+                        self.elected_at = datetime.now().isoformat()
+                        logger.info(f"当前进程 {self.identity} 成为调度主节点（{self.backend}）")
+                        await on_elected()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"调度主节点选举失败: {e}")
+            await asyncio.sleep(interval)
+
+    async def stop(self):
+        """停止选举并释放锁，让其他进程尽快接管"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        was_leader = self.is_leader
+        await asyncio.to_thread(self._lock.release)
+        self.is_leader = False
+        self.elected_at = None
+        if was_leader:
+            logger.info(f"调度主节点 {self.identity} 已释放锁")
+
+    async def current_leader(self) -> Optional[str]:
+        """当前主节点标识（本进程是主节点时直接返回自身）"""
+        if self.is_leader:
+            return self.identity
+        try:
+            return await asyncio.to_thread(self._lock.holder)
+        except Exception as e:
+            logger.warning(f"查询调度主节点失败: {e}")
+            return None
+
+    async def require_leader(self) -> None:
+        """不是主节点时抛出 NotSchedulerLeaderError"""
+        if not self.is_leader:
+            raise NotSchedulerLeaderError(await self.current_leader())
+
+    def get_status(self):
+        return {
+            "identity": self.identity,
+            "backend": self.backend,
+            "is_leader": self.is_leader,
+            "elected_at": self.elected_at,
+        }
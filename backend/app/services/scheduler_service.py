@@ -9,6 +9,7 @@ from app.utils.database import get_db
 from app.services.fund_service import FundOperationService, DCAService
 from app.services.fund_api_service import FundAPIService
 from app.services.wise_api_service import WiseAPIService
+from app.services import akshare_provider
 from app.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -98,8 +99,7 @@ class SchedulerService:
             for fund_code in fund_codes:
                 try:
                     # 使用akshare获取最新净值
-                    import akshare as ak
-                    df = ak.fund_open_fund_info_em(symbol=fund_code, indicator="单位净值走势")
+                    df = akshare_provider.fund_nav_history(fund_code)
                     
                     if not df.empty:
                         # 获取最新的一条数据
@@ -143,9 +143,10 @@ class SchedulerService:
             db = next(get_db())
             
             # 检查并执行到期的定投计划
-            executed_operations = DCAService.check_and_execute_dca_plans(db)
+            report = DCAService.execute_due_plans(db)
             
-            logger.info(f"定投计划执行任务完成，执行了 {len(executed_operations)} 个计划")
+            logger.info(f"定投计划执行任务完成，执行了 {report['executed']} 个计划，"
+                        f"失败 {report['failed']} 个，耗时 {report['timings']['total_ms']}ms")
             
         except Exception as e:
             logger.error(f"定投计划执行任务失败: {e}")
@@ -0,0 +1,185 @@
+"""
+调度任务执行记录存储
+
+任务结果原来只保存在 BaseTask 实例计数和 EventBus 内存历史中，重启即丢失，也无法按任务查询。
+这里把每次执行写入 task_runs 表：
+- record() 只把记录放进队列，由后台协程批量写库（数据库操作在线程中执行），不拖慢任务本身
+- 按 (task_id, started_at) 和 started_at 建索引，支持按任务查询最近执行记录和耗时趋势
+- 超过保留天数的记录在写入时定期清理
+"""
+import asyncio
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from sqlalchemy import case, func
+
+from app.core.context import TaskResult
+from app.models.database import TaskRun
+from app.settings import settings
+from app.utils.database import get_db_context
+
+# 任务结果 data 中表示处理条数的字段，按顺序取第一个存在的
+ROWS_AFFECTED_KEYS = (
+    'rows_affected', 'updated_count', 'executed_count', 'synced_count',
+    'cached_count', 'position_count', 'account_count', 'currency_count',
+)
+
+_BATCH_SIZE = 100
+
+
+def rows_affected(result: TaskResult) -> Optional[int]:
+    for key in ROWS_AFFECTED_KEYS:
+        value = result.data.get(key) if isinstance(result.data, dict) else None
+        if isinstance(value, (int, float)):
+            return int(value)
+    return None
+
+
+class TaskRunStore:
+    """task_runs 表的异步写入和查询"""
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._last_prune: Optional[date] = None
+
+    def record(self, task_id: str, execution_id: str, trigger: str,
+               started_at: datetime, finished_at: datetime,
+               result: Optional[TaskResult] = None, error: Optional[str] = None,
+               phase_timings: Optional[Dict[str, float]] = None):
+        """记录一次执行（不等待写库）"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._run(), name="task-run-writer")
+        success = result.success if result is not None else False
+        self._queue.put_nowait({
+            "task_id": task_id,
+            "execution_id": execution_id,
+            "trigger": trigger,
+            "status": "success" if success else "failed",
+            "started_at": started_at,
+            "finished_at": finished_at,
+            "duration_ms": int((finished_at - started_at).total_seconds() * 1000),
+            "rows_affected": rows_affected(result) if result is not None else None,
+            "error": error if error is not None else (result.error if result is not None else None),
+            "phase_timings": json.dumps(phase_timings or {}),
+        })
+
+    async def _run(self):
+        while True:
+            rows = [await self._queue.get()]
+            while len(rows) < _BATCH_SIZE and not self._queue.empty():
+                rows.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                logger.error(f"写入任务执行记录失败（{len(rows)} 条）: {e}")
+            finally:
+                for _ in rows:
+                    self._queue.task_done()
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        try:
+            with get_db_context() as db:
+                db.bulk_insert_mappings(TaskRun, rows)
+        except Exception as e:
+            if len(rows) == 1:
+                raise
+            # 一条记录出错会回滚整批，逐条重试，只丢弃出错的记录
+            logger.warning(f"批量写入任务执行记录失败，逐条重试: {e}")
+            failed = []
+            for row in rows:
+                try:
+                    with get_db_context() as db:
+                        db.bulk_insert_mappings(TaskRun, [row])
+                except Exception:
+                    failed.append(row["execution_id"])
+            if failed:
+                logger.error(f"{len(failed)}/{len(rows)} 条任务执行记录写入失败: {', '.join(failed[:10])}")
+        self._prune()
+
+    def _prune(self):
+        """每天清理一次超过保留天数的记录"""
+        today = date.today()
+        if self._last_prune == today:
+            return
+        with get_db_context() as db:
+            cutoff = datetime.now() - timedelta(days=settings.task_run_retention_days)
+            deleted = db.query(TaskRun).filter(TaskRun.started_at < cutoff).delete(synchronize_session=False)
+        self._last_prune = today
+        if deleted:
+            logger.info(f"已清理 {deleted} 条过期任务执行记录")
+
+    async def flush(self, timeout: float = 5.0):
+        """关闭前写完队列中的记录"""
+        if self._queue is not None and self._writer is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("任务执行记录未能全部写入")
+        if self._writer is not None:
+            self._writer.cancel()
+            await asyncio.gather(self._writer, return_exceptions=True)
+            self._writer = None
+
+    @staticmethod
+    def _to_dict(run: TaskRun) -> Dict[str, Any]:
+        return {
+            "task_id": run.task_id,
+            "execution_id": run.execution_id,
+            "trigger": run.trigger,
+            "status": run.status,
+            "started_at": run.started_at.isoformat(),
+            "finished_at": run.finished_at.isoformat(),
+            "duration_ms": run.duration_ms,
+            "rows_affected": run.rows_affected,
+            "error": run.error,
+            "phase_timings": json.loads(run.phase_timings) if run.phase_timings else {},
+        }
+
+    def get_recent_runs(self, task_id: Optional[str] = None, status: Optional[str] = None,
+                        limit: int = 50) -> List[Dict[str, Any]]:
+        """最近的执行记录（按开始时间倒序）"""
+        with get_db_context() as db:
+            query = db.query(TaskRun)
+            if task_id:
+                query = query.filter(TaskRun.task_id == task_id)
+            if status:
+                query = query.filter(TaskRun.status == status)
+            runs = query.order_by(TaskRun.started_at.desc()).limit(limit).all()
+            return [self._to_dict(run) for run in runs]
+
+    def get_duration_trends(self, task_id: Optional[str] = None, days: int = 30) -> List[Dict[str, Any]]:
+        """按任务和日期汇总执行次数、失败次数和耗时"""
+        since = datetime.now() - timedelta(days=days)
+        with get_db_context() as db:
+            day = func.date(TaskRun.started_at)
+            query = db.query(
+                TaskRun.task_id,
+                day.label("day"),
+                func.count(TaskRun.id).label("runs"),
+                func.sum(case((TaskRun.status == "failed", 1), else_=0)).label("failures"),
+                func.avg(TaskRun.duration_ms).label("avg_ms"),
+                func.min(TaskRun.duration_ms).label("min_ms"),
+                func.max(TaskRun.duration_ms).label("max_ms"),
+                func.sum(TaskRun.rows_affected).label("rows_affected"),
+            ).filter(TaskRun.started_at >= since)
+            if task_id:
+                query = query.filter(TaskRun.task_id == task_id)
+            rows = query.group_by(TaskRun.task_id, day).order_by(TaskRun.task_id, day).all()
+            return [{
+                "task_id": row.task_id,
+                "date": str(row.day),
+                "runs": row.runs,
+                "failures": int(row.failures or 0),
+                "avg_ms": round(float(row.avg_ms), 1) if row.avg_ms is not None else None,
+                "min_ms": row.min_ms,
+                "max_ms": row.max_ms,
+                "rows_affected": int(row.rows_affected) if row.rows_affected is not None else None,
+            } for row in rows]
+
+
+task_run_store = TaskRunStore()
@@ -1,15 +1,35 @@
+import asyncio
 import httpx
 import time
-from typing import Optional, Dict, Any, List
-from datetime import datetime, date, timedelta
+from typing import Optional, Dict, Any, List, Tuple
+from datetime import datetime, date, timedelta, timezone
 from app.settings import settings
 from loguru import logger
-from app.utils.database import SessionLocal
+from app.utils.database import SessionLocal, upsert_rows
 from app.models.database import WiseTransaction
 import sqlalchemy
 import re
 from app.utils.auto_logger import auto_log
-from sqlalchemy.dialects.postgresql import insert
+
+# 活动列表每页条数
+WISE_SYNC_PAGE_SIZE = 100
+
+# primaryAmount / secondaryAmount 形如 "+1,234.56 USD"
+_AMOUNT_RE = re.compile(r'([+-]?[\d,.]+)\s*([A-Z]{3})')
+
+
+def _parse_amount(text: Optional[str]) -> Tuple[Optional[float], Optional[str]]:
+    """解析金额字符串，返回 (数值, 币种)"""
+    if not text:
+        return None, None
+    match = _AMOUNT_RE.search(text)
+    if not match:
+        return None, None
+    try:
+        value = float(match.group(1).replace(',', ''))
+    except ValueError:
+        value = None
+    return value, match.group(2)
 
 
 class WiseAPIService:
@@ -492,139 +512,143 @@ class WiseAPIService:
         }
         return await self._make_request('GET', path, params=params)
 
+    @staticmethod
+    def _parse_created_on(created_on: Optional[str]) -> Optional[datetime]:
+        """createdOn 转为不带时区的UTC时间（与库中 date 字段、水位线比较时一致）"""
+        if not created_on:
+            return None
+        try:
+            parsed = datetime.fromisoformat(created_on.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+        if parsed.tzinfo:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    @staticmethod
+    def _parse_activities(profile_id: str, activities: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把一页活动记录转换为 wise_transactions 行（按 transaction_id 去重，缺少必填字段的跳过）"""
+        now = datetime.now()
+        rows: Dict[str, Dict[str, Any]] = {}
+        for activity in activities:
+            transaction_id = activity.get('id')
+            created_on = WiseAPIService._parse_created_on(activity.get('createdOn'))
+            primary_value, primary_currency = _parse_amount(activity.get('primaryAmount'))
+            secondary_value, secondary_currency = _parse_amount(activity.get('secondaryAmount'))
+            if not transaction_id or created_on is None or primary_currency is None:
+                logger.warning(f"[Wise] 活动记录缺少必要字段，跳过: {transaction_id}")
+                continue
+
+            resource_id = str(activity.get('resource', {}).get('id', ''))
+            rows[transaction_id] = {
+                "profile_id": str(profile_id),
+                "account_id": resource_id,
+                "transaction_id": transaction_id,
+                "type": activity.get('type'),
+                # amount/currency 用于兼容老字段
+                "amount": primary_value if primary_value is not None else 0.0,
+                "currency": primary_currency,
+                "description": activity.get('description', ''),
+                "title": activity.get('title', ''),
+                "date": created_on,
+                "status": activity.get('status'),
+                "reference_number": resource_id,
+                "primary_amount_value": primary_value,
+                "primary_amount_currency": primary_currency,
+                "secondary_amount_value": secondary_value,
+                "secondary_amount_currency": secondary_currency,
+                "created_at": now,
+                "updated_at": now
+            }
+        return list(rows.values())
+
+    @staticmethod
+    def _upsert_transactions(db, rows: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """按 transaction_id 批量写入一页交易并提交，返回 (新增数, 更新数)"""
+        inserted, updated = upsert_rows(db, WiseTransaction, rows, "transaction_id", keep_on_update=("created_at",))
+        db.commit()
+        return inserted, updated
+
+    async def _sync_profile_transactions(self, profile_id: str, stop_at: datetime) -> Tuple[int, int]:
+        """从最新一页往前拉取单个profile的活动，越过 stop_at 后停止"""
+        db = SessionLocal()
+        total_new = 0
+        total_updated = 0
+        try:
+            offset = 0
+            while True:
+                activities_result = await self.get_profile_activities(profile_id, limit=WISE_SYNC_PAGE_SIZE, offset=offset)
+                if not activities_result or not activities_result.get('activities'):
+                    break
+                activities = activities_result['activities']
+
+                rows = self._parse_activities(profile_id, activities)
+                try:
+                    new_count, updated_count = self._upsert_transactions(db, rows)
+                except Exception as e:
+                    logger.error(f"[Wise] 写入交易记录失败: profile_id={profile_id}, offset={offset}, {e}")
+                    db.rollback()
+                    raise
+                total_new += new_count
+                total_updated += updated_count
+
+                # 活动按时间倒序返回，本页最早的记录已早于水位线时，后面都是已同步的数据
+                oldest = min((row["date"] for row in rows), default=None)
+                if len(activities) < WISE_SYNC_PAGE_SIZE or (oldest is not None and oldest < stop_at):
+                    break
+                offset += WISE_SYNC_PAGE_SIZE
+        finally:
+            db.close()
+
+        logger.info(f"[Wise] profile {profile_id} 同步完成: 新增{total_new}条，更新{total_updated}条")
+        return total_new, total_updated
+
     @auto_log("database", log_result=True)
     async def sync_all_transactions_to_db(self, days: int = 365) -> Dict[str, Any]:
-        """主动拉取所有profile的所有活动，批量写入wise_transactions表，已存在的自动跳过"""
-        from app.utils.database import SessionLocal
-        from app.models.database import WiseTransaction
-        import sqlalchemy
-        import re
-        from datetime import datetime
-        from sqlalchemy.dialects.postgresql import insert
-        
-        db = SessionLocal()
+        """增量同步所有profile的活动到wise_transactions表
+
+        每个profile以库中最新交易时间为水位线，只拉取到水位线（往前多取
+        settings.wise_sync_overlap_hours 小时以刷新状态变化）为止；没有水位线时拉取最近 days 天。
+        多个profile并发拉取。
+        """
         try:
             profiles = await self.get_profile()
             if not profiles:
                 return {"success": False, "message": "未获取到Wise profile"}
-            total_new = 0
-            total_updated = 0
-            
+
+            db = SessionLocal()
+            try:
+                watermarks = dict(
+                    db.query(WiseTransaction.profile_id, sqlalchemy.func.max(WiseTransaction.date))
+                    .group_by(WiseTransaction.profile_id).all()
+                )
+            finally:
+                db.close()
+
+            overlap = timedelta(hours=settings.wise_sync_overlap_hours)
+            initial_stop_at = datetime.utcnow() - timedelta(days=days)
+            tasks = []
             for profile in profiles:
                 profile_id = profile.get('id')
                 if not profile_id:
                     continue
-                # 拉取全部活动（可根据需要调整limit）
-                offset = 0
-                limit = 100
-                fetched = 0
-                while True:
-                    activities_result = await self.get_profile_activities(profile_id, limit=limit, offset=offset)
-                    if not activities_result or 'activities' not in activities_result:
-                        break
-                    activities = activities_result['activities']
-                    if not activities:
-                        break
-                    
-                    # 批量处理活动记录
-                    for activity in activities:
-                        created_on = activity.get('createdOn')
-                        # 修复：将字符串转为datetime对象
-                        created_on_dt = None
-                        if created_on:
-                            try:
-                                # 支持带Z的ISO格式
-                                created_on_dt = datetime.fromisoformat(created_on.replace('Z', '+00:00'))
-                            except Exception:
-                                created_on_dt = None
-                        
-                        # 解析primaryAmount
-                        primary_amount = activity.get('primaryAmount', '')
-                        primary_amount_value = None
-                        primary_amount_currency = None
-                        if primary_amount:
-                            amount_match = re.search(r'([+-]?[\d,.]+)\s*([A-Z]{3})', primary_amount)
-                            if amount_match:
-                                try:
-                                    primary_amount_value = float(amount_match.group(1).replace(',', ''))
-                                except Exception:
-                                    primary_amount_value = None
-                                primary_amount_currency = amount_match.group(2)
-                        # 解析secondaryAmount
-                        secondary_amount = activity.get('secondaryAmount', '')
-                        secondary_amount_value = None
-                        secondary_amount_currency = None
-                        if secondary_amount:
-                            amount_match = re.search(r'([+-]?[\d,.]+)\s*([A-Z]{3})', secondary_amount)
-                            if amount_match:
-                                try:
-                                    secondary_amount_value = float(amount_match.group(1).replace(',', ''))
-                                except Exception:
-                                    secondary_amount_value = None
-                                secondary_amount_currency = amount_match.group(2)
-                        
-                        # amount_value和currency用于兼容老字段
-                        amount_value = primary_amount_value if primary_amount_value is not None else 0.0
-                        currency = primary_amount_currency if primary_amount_currency is not None else None
-                        
-                        # 准备交易数据
-                        transaction_data = {
-                            "profile_id": str(profile_id),
-                            "account_id": str(activity.get('resource', {}).get('id', '')),
-                            "transaction_id": activity.get('id'),
-                            "type": activity.get('type'),
-                            "amount": amount_value,
-                            "currency": currency,
-                            "description": activity.get('description', ''),
-                            "title": activity.get('title', ''),
-                            "date": created_on_dt,
-                            "status": activity.get('status'),
-                            "reference_number": activity.get('resource', {}).get('id', ''),
-                            "updated_at": datetime.now(),
-                            # 新增字段
-                            "primary_amount_value": primary_amount_value,
-                            "primary_amount_currency": primary_amount_currency,
-                            "secondary_amount_value": secondary_amount_value,
-                            "secondary_amount_currency": secondary_amount_currency
-                        }
-                        
-                        # 使用UPSERT逻辑，避免主键冲突
-                        try:
-                            # 检查是否已存在
-                            existing = db.query(WiseTransaction).filter_by(
-                                transaction_id=activity.get('id')
-                            ).first()
-                            
-                            if existing:
-                                # 更新现有记录
-                                for key, value in transaction_data.items():
-                                    if key != 'transaction_id':  # 不更新唯一键
-                                        setattr(existing, key, value)
-                                total_updated += 1
-                            else:
-                                # 插入新记录
-                                transaction_data["created_at"] = datetime.now()
-                                new_tx = WiseTransaction(**transaction_data)
-                                db.add(new_tx)
-                                total_new += 1
-                                
-                        except Exception as e:
-                            logger.error(f"[Wise] 处理交易记录失败: {e}, transaction_id: {activity.get('id')}")
-                            continue
-                    
-                    # 提交当前批次
-                    try:
-                        db.commit()
-                    except Exception as e:
-                        logger.error(f"[Wise] 提交交易记录失败: {e}")
-                        db.rollback()
-                        continue
-                    
-                    fetched += len(activities)
-                    if len(activities) < limit:
-                        break
-                    offset += limit
-            
+                watermark = watermarks.get(str(profile_id))
+                stop_at = watermark - overlap if watermark else initial_stop_at
+                tasks.append(self._sync_profile_transactions(str(profile_id), stop_at))
+
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            errors = [str(result) for result in results if isinstance(result, BaseException)]
+            succeeded = [result for result in results if not isinstance(result, BaseException)]
+            total_new = sum(new_count for new_count, _ in succeeded)
+            total_updated = sum(updated_count for _, updated_count in succeeded)
+
+            if errors:
+                return {
+                    "success": False,
+                    "message": f"{len(errors)}个profile同步失败: {'; '.join(errors)}",
+                    "total_new": total_new,
+                    "total_updated": total_updated
+                }
             return {
                 "success": True, 
                 "message": f"同步完成，新增{total_new}条，更新{total_updated}条交易记录",
@@ -632,11 +656,8 @@ class WiseAPIService:
                 "total_updated": total_updated
             }
         except Exception as e:
-            db.rollback()
             logger.error(f"[Wise] 同步交易记录失败: {e}")
             return {"success": False, "message": f"同步失败: {e}"}
-        finally:
-            db.close() 
 
     @auto_log("database", log_result=True)
     async def sync_balances_to_db(self) -> Dict[str, Any]:
@@ -11,6 +11,7 @@ class BaseConfig(BaseSettings):
     app_version: str = "0.1.0"
     debug: bool = False
     api_v1_prefix: str = "/api/v1"
+    startup_prewarm_caches: bool = True  # 启动就绪后在后台预热AI分析师数据包、收益分析缓存
     
     # 数据库配置
     database_url: str = "sqlite:///./data/personalfinance.db"
@@ -25,6 +26,10 @@ class BaseConfig(BaseSettings):
     # 基金API配置
     fund_api_timeout: int = 10
     fund_api_retry_times: int = 3
+    fund_nav_index_ttl: int = 3600  # 基金净值索引兜底过期时间（秒），写入后会立即失效
+    return_analytics_cache_ttl: int = 600  # 收益分析（XIRR/TWR/回撤）结果缓存时间（秒）
+    dca_backtest_max_workers: int = 4  # 定投回测参数网格的并行进程数，1表示不使用多进程
+    dca_backtest_max_configs: int = 500  # 单次回测允许的最大参数组合数
     
     # 天天基金网API配置
     tiantian_fund_api_base_url: str = "https://fundgz.1234567.com.cn"
@@ -50,6 +55,7 @@ class BaseConfig(BaseSettings):
     # Wise API配置
     wise_api_token: str = ""
     wise_api_base_url: str = "https://api.transferwise.com"
+    wise_sync_overlap_hours: int = 72  # 交易增量同步时在水位线之前多拉取的时间，用于刷新状态变化
     
     # PayPal API配置
     paypal_client_id: str = ""
@@ -64,6 +70,7 @@ class BaseConfig(BaseSettings):
     ibkr_rate_limit_per_minute: int = 60
     ibkr_enable_ip_whitelist: bool = True
     ibkr_enable_request_logging: bool = True
+    ibkr_latest_cache_ttl: int = 30  # 最新余额/持仓查询缓存时间（秒），0表示不缓存
     
     # 定时任务配置
     scheduler_timezone: str = "Asia/Shanghai"
@@ -79,6 +86,11 @@ class BaseConfig(BaseSettings):
     deepseek_max_tokens: int = Field(default=4000, alias="DEEPSEEK_MAX_TOKENS")
     deepseek_temperature: float = Field(default=0.7, alias="DEEPSEEK_TEMPERATURE")
     
+    # AI服务共享HTTP客户端（连接池）配置
+    ai_http_timeout: float = 30.0
+    ai_http_max_connections: int = 10
+    ai_http_keepalive_expiry: float = 60.0
+    
     # 可扩展调度器配置
     scheduler_job_defaults: dict = {
         "coalesce": True,
@@ -86,9 +98,22 @@ class BaseConfig(BaseSettings):
         "misfire_grace_time": 300
     }
     
+    # 调度主节点选举（多worker/多副本时只有一个进程执行定时任务）
+    scheduler_leader_election: bool = True
+    scheduler_leader_lock_key: int = 7201508  # PostgreSQL advisory lock 键
+    scheduler_leader_lock_file: str = ""  # 非PostgreSQL时的锁文件，默认为数据目录下的 scheduler.lock
+    scheduler_leader_retry_interval: int = 15  # 抢锁/检查锁的间隔（秒）
+    
+    # 任务执行记录（task_runs 表）保留天数
+    task_run_retention_days: int = 90
+    
     # 事件总线配置
     event_bus_max_listeners: int = 100
     event_bus_enable_persistence: bool = False
+    event_bus_max_history: int = 1000  # 事件历史环形缓冲区大小
+    event_bus_max_history_per_type: int = 200  # 每类事件保留的历史数
+    event_bus_queue_size: int = 1000  # 每个订阅者的队列长度
+    event_bus_overflow_policy: str = "block"  # 队列满时: block / drop_oldest / drop_newest
     
     # 插件管理器配置
     plugin_auto_discovery: bool = True
@@ -124,6 +149,13 @@ class BaseConfig(BaseSettings):
     cache_enabled: bool = True
     cache_default_ttl: int = 300  # 5分钟
     cache_max_size: int = 1000
+    nl_query_cache_enabled: bool = True
+    nl_query_plan_ttl: int = 24 * 3600  # 自然语言→SQL 生成结果缓存时间
+    nl_query_result_ttl: int = 60  # SQL执行结果缓存时间
+    nl_query_fuzzy_template_match: bool = False  # 命中预定义模板时跳过AI调用
+    mcp_schema_check_interval: int = 300  # MCP服务Schema指纹校验间隔（秒）
+    ai_analyst_bundle_enabled: bool = True  # AI分析师接口使用预构建数据包
+    ai_analyst_bundle_max_age: int = 300  # 数据包最长使用时间（秒），超过后后台重建
     
     # 通知配置
     notification_enabled: bool = False
@@ -1,7 +1,7 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, Session
 from contextlib import contextmanager
-from typing import Generator
+from typing import Any, Dict, Generator, Iterable, List, Tuple
 import os
 from pathlib import Path
 import logging
@@ -58,6 +58,40 @@ def get_db_context() -> Generator[Session, None, None]:
         db.close()
 
 
+def upsert_rows(db: Session, model, rows: List[Dict[str, Any]], key: str,
+                keep_on_update: Iterable[str] = ()) -> Tuple[int, int]:
+    """按唯一键 key 批量写入（INSERT ... ON CONFLICT DO UPDATE），返回 (新增数, 更新数)，不提交
+
+    rows 需已按 key 去重。SQLite 和 PostgreSQL 都支持，新增/更新数通过预先查询已存在的键得到。
+    keep_on_update 中的列（如 created_at）在冲突更新时保留原值。
+    """
+    if not rows:
+        return 0, 0
+    key_column = getattr(model, key)
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        # 旧版本SQLite单条语句最多999个参数
+        chunk_size = max(1, 900 // len(rows[0]))
+    else:
+        from sqlalchemy.dialects.postgresql import insert
+        chunk_size = len(rows)
+
+    keys = [row[key] for row in rows]
+    existing = {value for (value,) in db.query(key_column).filter(key_column.in_(keys))}
+    skip = {key, *keep_on_update}
+    for start in range(0, len(rows), chunk_size):
+        stmt = insert(model).values(rows[start:start + chunk_size])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key_column],
+            set_={column: stmt.excluded[column] for column in rows[0] if column not in skip}
+        )
+        db.execute(stmt)
+
+    inserted = sum(1 for value in keys if value not in existing)
+    return inserted, len(rows) - inserted
+
+
 def create_tables():
     """创建所有数据库表"""
     from app.models.database import (
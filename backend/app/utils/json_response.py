@@ -0,0 +1,46 @@
+"""
+快速JSON响应
+
+FastAPI 默认先用 jsonable_encoder 递归转换整个返回值（Decimal、datetime 逐个字段处理），
+再用标准库 json 序列化。对上万行的净值、操作、快照列表，这两步是响应耗时的大头。
+
+FastJSONResponse 用 orjson 直接序列化：datetime/date 原生支持，Decimal 转 float，
+Pydantic 模型用 pydantic-core 直接输出JSON。接口直接返回 FastJSONResponse 时会跳过 jsonable_encoder。
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def json_default(obj: Any) -> Any:
+    """orjson 不支持的类型"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, BaseModel):
+        # 与 FastAPI 对 response_model 的序列化结果保持一致
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """序列化为UTF-8 JSON字节"""
+    if isinstance(content, BaseModel):
+        return content.model_dump_json().encode("utf-8")
+    return orjson.dumps(content, default=json_default, option=_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    """基于 orjson 的 JSON 响应"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
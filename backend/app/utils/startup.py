@@ -0,0 +1,88 @@
+"""
+应用启动阶段管理
+
+启动工作分为两类：
+- 关键阶段（如数据库初始化）: 在 lifespan 中顺序执行，全部完成后应用才算"就绪"
+- 后台阶段（数据库诊断、调度器加载插件和任务、缓存预热）: 就绪后以后台任务执行，不阻塞接收请求
+
+每个阶段记录开始时间、耗时和结果，供 /health/ready 返回。
+"""
+
+import asyncio
+import inspect
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Set
+
+from app.utils.logger import log_system
+
+
+class StartupState:
+    """记录启动阶段耗时和就绪状态"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready = False
+        self.ready_after_ms: Optional[float] = None
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    async def run_phase(self, name: str, func: Callable, *args, critical: bool = True) -> Any:
+        """执行一个启动阶段，同步函数放到线程中执行；关键阶段失败时抛出异常"""
+        phase = self.phases[name] = {
+            "status": "running",
+            "critical": critical,
+            "started_at": datetime.now().isoformat(),
+            "duration_ms": None,
+            "error": None,
+        }
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(func):
+                result = await func(*args)
+            else:
+                result = await asyncio.to_thread(func, *args)
+            phase["status"] = "done"
+            return result
+        except Exception as e:
+            phase["status"] = "failed"
+            phase["error"] = str(e)
+            log_system(f"⚠️  启动阶段 {name} 失败: {e}")
+            if critical:
+                raise
+            return None
+        finally:
+            phase["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            log_system(f"启动阶段 {name}: {phase['status']}，耗时 {phase['duration_ms']}ms")
+
+    def run_in_background(self, name: str, func: Callable, *args) -> None:
+        """就绪后在后台执行非关键阶段"""
+        self.phases[name] = {"status": "pending", "critical": False, "started_at": None, "duration_ms": None, "error": None}
+        task = asyncio.create_task(self.run_phase(name, func, *args, critical=False), name=f"startup:{name}")
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.ready_after_ms = round((time.perf_counter() - self.started_at) * 1000, 1)
+        log_system(f"应用已就绪，启动耗时 {self.ready_after_ms}ms")
+
+    async def cancel_background(self) -> None:
+        """关闭时取消尚未完成的后台阶段"""
+        for task in list(self._background):
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "ready_after_ms": self.ready_after_ms,
+            "pending_background": sorted(
+                name for name, phase in self.phases.items() if phase["status"] in ("pending", "running")
+            ),
+            "phases": self.phases,
+        }
+
+
+startup_state = StartupState()
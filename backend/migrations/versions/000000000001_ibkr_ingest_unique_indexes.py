@@ -0,0 +1,54 @@
+"""ibkr ingest unique indexes
+
+Revision ID: 000000000001
+Revises: 000000000000
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '000000000001'
+down_revision: Union[str, Sequence[str], None] = '000000000000'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (索引名, 表名, 唯一键列)
+INDEXES = [
+    ('uq_ibkr_balances_account_time', 'ibkr_balances', ['account_id', 'snapshot_time']),
+    ('uq_ibkr_positions_account_symbol_time', 'ibkr_positions', ['account_id', 'symbol', 'snapshot_time']),
+]
+
+
+def upgrade() -> None:
+    """IBKR同步写入使用 ON CONFLICT DO NOTHING，需要唯一索引作为冲突目标"""
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+
+    for index_name, table_name, columns in INDEXES:
+        if not inspector.has_table(table_name):
+            continue
+        existing_columns = {column['name'] for column in inspector.get_columns(table_name)}
+        if not set(columns) <= existing_columns:
+            continue
+
+        # 先清理重复记录（保留最早写入的一条），否则唯一索引无法创建
+        key = ', '.join(columns)
+        connection.execute(sa.text(f"""
+            DELETE FROM {table_name}
+            WHERE id NOT IN (SELECT MIN(id) FROM {table_name} GROUP BY {key})
+        """))
+        connection.execute(sa.text(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {index_name} ON {table_name} ({key})"
+        ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for index_name, _, _ in INDEXES:
+        op.execute(f"DROP INDEX IF EXISTS {index_name}")
@@ -0,0 +1,54 @@
+"""task runs
+
+Revision ID: 000000000002
+Revises: 000000000001
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '000000000002'
+down_revision: Union[str, Sequence[str], None] = '000000000001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """调度任务执行记录表，按任务+时间和时间建索引"""
+    connection = op.get_bind()
+    inspector = sa.inspect(connection)
+    if inspector.has_table('task_runs'):
+        return
+
+    op.create_table('task_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('task_id', sa.String(length=100), nullable=False),
+        sa.Column('execution_id', sa.String(length=50), nullable=False),
+        sa.Column('trigger', sa.String(length=20), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=False),
+        sa.Column('duration_ms', sa.Integer(), nullable=False),
+        sa.Column('rows_affected', sa.Integer(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('phase_timings', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('execution_id')
+    )
+    op.create_index('ix_task_runs_id', 'task_runs', ['id'])
+    op.create_index('idx_task_runs_task_started', 'task_runs', ['task_id', 'started_at'])
+    op.create_index('idx_task_runs_started', 'task_runs', ['started_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('idx_task_runs_started', table_name='task_runs')
+    op.drop_index('idx_task_runs_task_started', table_name='task_runs')
+    op.drop_index('ix_task_runs_id', table_name='task_runs')
+    op.drop_table('task_runs')
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+JSON响应序列化性能基准
+用有代表性的 10k 行数据（资产快照、净值历史、基金操作）对比:
+- FastAPI 默认路径: jsonable_encoder + 标准库 json（JSONResponse.render）
+- FastJSONResponse: orjson 直接序列化（Decimal/datetime 原生处理）
+输出每种数据的序列化耗时、响应体大小和gzip后大小。
+
+用法（在 backend 目录下）:
+    python scripts/benchmark_json_responses.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import gzip
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app.models.schemas import FundOperation, FundOperationListResponse  # noqa: E402
+from app.utils.json_response import FastJSONResponse  # noqa: E402
+
+
+def _decimal(value: float, places: int = 4) -> Decimal:
+    return Decimal(f"{value:.{places}f}")
+
+
+def snapshot_rows(count: int):
+    """/snapshot/assets 的行：FastJSONResponse 直接接收 Decimal/datetime"""
+    now = datetime.now()
+    platforms = ["支付宝", "Wise", "IBKR", "OKX", "Web3"]
+    rows = []
+    for i in range(count):
+        balance = _decimal(random.uniform(0, 100000))
+        rows.append({
+            "id": i,
+            "user_id": 1,
+            "platform": platforms[i % len(platforms)],
+            "asset_type": "基金",
+            "asset_code": f"{i % 500:06d}",
+            "asset_name": f"测试基金{i % 500}",
+            "currency": "CNY",
+            "balance": balance,
+            "balance_cny": balance,
+            "balance_usd": _decimal(float(balance) / 7.2),
+            "balance_eur": _decimal(float(balance) / 7.8),
+            "base_value": balance,
+            "snapshot_time": now - timedelta(minutes=i),
+            "extra": None,
+        })
+    return rows
+
+
+def snapshot_rows_legacy(rows):
+    """改造前的写法：逐字段 float() / isoformat()"""
+    return [{
+        **row,
+        "balance": float(row["balance"]),
+        "balance_cny": float(row["balance_cny"]),
+        "balance_usd": float(row["balance_usd"]),
+        "balance_eur": float(row["balance_eur"]),
+        "base_value": float(row["base_value"]),
+        "snapshot_time": row["snapshot_time"].isoformat(),
+    } for row in rows]
+
+
+def nav_rows(count: int):
+    """/funds/nav_history 的行"""
+    start = date.today() - timedelta(days=count)
+    nav = 1.0
+    rows = []
+    for i in range(count):
+        nav *= 1 + random.gauss(0.0003, 0.01)
+        rows.append({
+            "id": i,
+            "fund_code": "000001",
+            "nav_date": start + timedelta(days=i),
+            "nav": _decimal(nav),
+            "accumulated_nav": _decimal(nav + 0.5),
+            "source": "akshare",
+        })
+    return rows
+
+
+def operation_response(count: int) -> FundOperationListResponse:
+    """/funds/operations 的响应模型"""
+    now = datetime.now()
+    operations = [
+        FundOperation(
+            id=i,
+            operation_date=now - timedelta(days=i),
+            operation_type="buy",
+            asset_code=f"{i % 50:06d}",
+            asset_name=f"测试基金{i % 50}",
+            amount=_decimal(1000),
+            quantity=_decimal(random.uniform(100, 1000), 8),
+            price=_decimal(random.uniform(0.5, 3)),
+            nav=_decimal(random.uniform(0.5, 3)),
+            fee=_decimal(1.5),
+            status="confirmed",
+            dca_plan_id=i % 10,
+            dca_execution_type="scheduled",
+            created_at=now,
+            updated_at=now,
+            latest_nav=random.uniform(0.5, 3),
+        )
+        for i in range(count)
+    ]
+    return FundOperationListResponse(success=True, message="ok", data=operations, total=count, page=1, page_size=count)
+
+
+def fastapi_default(content) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def fast_json(content) -> bytes:
+    return FastJSONResponse(content).body
+
+
+def measure(func, content, repeat: int):
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func(content)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, len(body), len(gzip.compress(body, compresslevel=6))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON响应序列化性能基准")
+    parser.add_argument("--rows", type=int, default=10000, help="每种数据的行数")
+    parser.add_argument("--repeat", type=int, default=5, help="重复次数（取最快一次）")
+    args = parser.parse_args()
+    random.seed(42)
+
+    snapshots = snapshot_rows(args.rows)
+    cases = [
+        ("snapshot/assets", snapshot_rows_legacy(snapshots), snapshots),
+        ("funds/nav_history", nav_rows(args.rows), None),
+        ("funds/operations", operation_response(args.rows), None),
+    ]
+
+    print(f"📊 JSON序列化基准: 每种数据 {args.rows} 行，重复 {args.repeat} 次取最快")
+    print(f"{'数据':<20}{'方式':<22}{'耗时(ms)':>10}{'大小(KB)':>12}{'gzip(KB)':>12}")
+    for name, legacy_content, native_content in cases:
+        baseline = measure(fastapi_default, legacy_content, args.repeat)
+        fast = measure(fast_json, native_content if native_content is not None else legacy_content, args.repeat)
+        for label, (ms, size, gzip_size) in (("jsonable_encoder+json", baseline), ("FastJSONResponse", fast)):
+            print(f"{name:<20}{label:<22}{ms:>10.1f}{size / 1024:>12.1f}{gzip_size / 1024:>12.1f}")
+        print(f"{'':<20}{'加速':<22}{baseline[0] / fast[0]:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
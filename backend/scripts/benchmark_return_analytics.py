@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+收益分析性能基准
+用合成数据（默认 100 只基金 × 10 年净值、每月定投 + 偶尔卖出）测量
+ReturnAnalyticsService.compute 一次计算所有范围（基金、定投计划、组合）的耗时。
+
+用法（在 backend 目录下）:
+    python scripts/benchmark_return_analytics.py [--funds 100] [--years 10] [--repeat 3]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.return_analytics_service import ReturnAnalyticsService  # noqa: E402
+
+
+def build_dataset(fund_count: int, years: int, seed: int = 42):
+    """生成 (操作, 基金代码, 净值) 三元组，格式与 ReturnAnalyticsService._load 的返回一致"""
+    rng = np.random.default_rng(seed)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+    calendar = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    # 只保留工作日作为交易日
+    calendar = calendar[np.is_busday(calendar)]
+    trading_days = [day.astype(object) for day in calendar]
+
+    fund_codes = [f"{i:06d}" for i in range(fund_count)]
+    nav_rows = []
+    operations = []
+    for i, code in enumerate(fund_codes):
+        # 几何布朗运动模拟净值
+        returns = rng.normal(0.0003, 0.012, len(trading_days))
+        navs = np.round(np.exp(np.cumsum(returns)), 4)
+        nav_rows.extend(zip([code] * len(trading_days), trading_days, navs.tolist()))
+
+        plan_id = i + 1
+        for day_index in range(0, len(trading_days), 21):
+            nav = navs[day_index]
+            amount = 1000.0
+            operations.append((
+                datetime.combine(trading_days[day_index], datetime.min.time()) + timedelta(hours=10),
+                "buy", code, amount, amount / nav, plan_id
+            ))
+            # 每年卖出一次
+            if day_index and day_index % 252 < 21:
+                operations.append((
+                    datetime.combine(trading_days[day_index], datetime.min.time()) + timedelta(hours=14),
+                    "sell", code, 500.0, 500.0 / nav, None
+                ))
+
+    operations.sort(key=lambda op: op[0])
+    return operations, fund_codes, nav_rows, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="收益分析性能基准")
+    parser.add_argument("--funds", type=int, default=100, help="基金数量")
+    parser.add_argument("--years", type=int, default=10, help="净值年数")
+    parser.add_argument("--repeat", type=int, default=3, help="重复次数")
+    args = parser.parse_args()
+
+    print(f"🔧 生成合成数据: {args.funds} 只基金 × {args.years} 年")
+    started = time.perf_counter()
+    operations, fund_codes, nav_rows, as_of = build_dataset(args.funds, args.years)
+    print(f"   净值 {len(nav_rows)} 条，操作 {len(operations)} 条，耗时 {time.perf_counter() - started:.2f}s")
+
+    timings = []
+    result = {}
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = ReturnAnalyticsService.compute(operations, fund_codes, nav_rows, as_of)
+        timings.append(time.perf_counter() - started)
+
+    portfolio = result.get("portfolio", {})
+    print(f"\n📊 计算 {len(result)} 个范围")
+    print(f"   最快 {min(timings) * 1000:.1f}ms，平均 {sum(timings) / len(timings) * 1000:.1f}ms")
+    print(f"   组合 XIRR={portfolio.get('xirr')}, TWR={portfolio.get('twr')}, "
+          f"最大回撤={portfolio.get('max_drawdown')}, 波动率={portfolio.get('volatility')}")
+
+
+if __name__ == "__main__":
+    main()
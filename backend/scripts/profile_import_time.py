@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+后端冷启动导入耗时分析
+用 `python -X importtime` 在子进程中导入应用入口模块，汇总最耗时的导入，
+并检查启动路径上没有导入懒加载的重量级依赖（akshare、pandas 等）。
+
+用法（在 backend 目录下）:
+    python scripts/profile_import_time.py                 # 报告 app.main 的导入耗时
+    python scripts/profile_import_time.py --top 30        # 显示前30项
+    python scripts/profile_import_time.py --budget-ms 3000  # 总耗时超过预算时退出码为1
+
+检查失败（出现禁止的模块或超出预算）时退出码为1，可用于CI防止启动耗时回退。
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, NamedTuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 启动时不应导入的模块（应通过 app/services/akshare_provider.py 等懒加载）
+FORBIDDEN_MODULES = ("akshare", "pandas")
+
+_LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+class ImportRecord(NamedTuple):
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def run_importtime(module: str) -> List[ImportRecord]:
+    """在干净的子进程中导入模块，解析 -X importtime 的输出"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    records = []
+    errors = []
+    for line in process.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            records.append(ImportRecord(name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+        elif not line.startswith("import time:"):
+            errors.append(line)
+    if process.returncode != 0:
+        print("\n".join(errors[-20:]), file=sys.stderr)
+        raise SystemExit(f"❌ 导入 {module} 失败（退出码 {process.returncode}）")
+    return records
+
+
+def import_chain(records: List[ImportRecord], index: int) -> List[str]:
+    """importtime 按"子模块在前"的顺序输出，之后第一个深度更浅的记录就是导入它的模块"""
+    chain = [records[index].module]
+    depth = records[index].depth
+    for record in records[index + 1:]:
+        if record.depth < depth:
+            chain.append(record.module)
+            depth = record.depth
+            if depth == 0:
+                break
+    return chain
+
+
+def main():
+    parser = argparse.ArgumentParser(description="后端冷启动导入耗时分析")
+    parser.add_argument("--module", default="app.main", help="要分析的入口模块")
+    parser.add_argument("--top", type=int, default=20, help="显示最耗时的前N项")
+    parser.add_argument("--budget-ms", type=float, default=None, help="总导入耗时预算（毫秒）")
+    args = parser.parse_args()
+
+    print(f"🔍 分析 {args.module} 的导入耗时...")
+    records = run_importtime(args.module)
+    total_us = sum(record.cumulative_us for record in records if record.depth == 0)
+    print(f"   共导入 {len(records)} 个模块，总耗时 {total_us / 1000:.0f}ms")
+
+    # 按顶层包汇总自身耗时
+    by_package = {}
+    for record in records:
+        package = record.module.split(".")[0]
+        by_package[package] = by_package.get(package, 0) + record.self_us
+
+    print(f"\n📦 按顶层包汇总（前{args.top}）:")
+    for package, self_us in sorted(by_package.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"   {self_us / 1000:8.1f}ms  {package}")
+
+    print(f"\n⏱️ 累计耗时最高的模块（前{args.top}）:")
+    for record in sorted(records, key=lambda item: item.cumulative_us, reverse=True)[:args.top]:
+        print(f"   {record.cumulative_us / 1000:8.1f}ms  {record.module}")
+
+    ok = True
+    imported = {record.module.split(".")[0] for record in records}
+    forbidden = [module for module in FORBIDDEN_MODULES if module in imported]
+    if forbidden:
+        ok = False
+        print(f"\n❌ 启动路径上导入了应懒加载的模块: {', '.join(forbidden)}")
+        for module in forbidden:
+            # 打印导入链，找出是谁导入了它
+            for index, record in enumerate(records):
+                if record.module == module:
+                    print(f"   {' <- '.join(import_chain(records, index))}")
+                    break
+    if args.budget_ms is not None and total_us / 1000 > args.budget_ms:
+        ok = False
+        print(f"\n❌ 总导入耗时 {total_us / 1000:.0f}ms 超过预算 {args.budget_ms:.0f}ms")
+
+    if ok:
+        print("\n✅ 导入检查通过")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""AI分析师数据包缓存范围测试"""
+from app.services.analyst_bundle_service import AnalystBundleService
+
+
+def test_unbundled_base_currency_is_not_cached(monkeypatch):
+    service = AnalystBundleService()
+    built = []
+    monkeypatch.setattr(service, "build", lambda base_currency: built.append(base_currency))
+
+    # 不在预构建范围内的基准货币交给接口实时换算，不构建也不占用缓存
+    assert service.get("GBP", "asset-data") is None
+    assert service.get("gbp; drop", "asset-data") is None
+    assert built == []
+    assert service._bundles == {}
@@ -0,0 +1,20 @@
+"""列式图表数据测试"""
+import sqlite3
+
+from app.services.chart_data import ColumnarData, unique_column_names
+
+
+def test_unique_column_names():
+    assert unique_column_names(["name", "name", "id", "name"]) == ["name", "name_1", "id", "name_2"]
+    assert unique_column_names(["name", "name_1", "name"]) == ["name", "name_1", "name_2"]
+
+
+def test_from_cursor_with_duplicate_columns():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.execute("SELECT 1 AS name, 2 AS name UNION ALL SELECT 3, 4")
+    data = ColumnarData.from_cursor(cursor, chunk_size=1)
+
+    assert data.column_names == ["name", "name_1"]
+    assert data.columns == {"name": [1, 3], "name_1": [2, 4]}
+    assert data.row_count == 2
+    assert data.to_rows() == [{"name": 1, "name_1": 2}, {"name": 3, "name_1": 4}]
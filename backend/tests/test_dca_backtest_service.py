@@ -0,0 +1,73 @@
+"""定投回测测试"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import FundNav
+from app.services.dca_backtest_service import DCABacktestService, sort_results
+
+
+def test_sort_results_follows_metric_direction():
+    results = [
+        {"xirr": 0.05, "max_drawdown": 0.20},
+        {"xirr": None, "max_drawdown": None},
+        {"xirr": 0.10, "max_drawdown": 0.30},
+        {"xirr": -0.02, "max_drawdown": 0.05},
+    ]
+
+    sort_results(results, "xirr")
+    assert [r["xirr"] for r in results] == [0.10, 0.05, -0.02, None]
+
+    sort_results(results, "max_drawdown")
+    assert [r["max_drawdown"] for r in results] == [0.05, 0.20, 0.30, None]
+
+
+def test_backtest_rejects_unknown_sort_metric():
+    with pytest.raises(ValueError, match="不支持的排序指标"):
+        DCABacktestService.backtest(None, "000001", date(2024, 1, 1), sort_by="config")
+
+
+@pytest.mark.parametrize("base_config", [
+    {"amount": None},
+    {"amount": -100},
+    {"nav_window": 0},
+    {"frequency": "yearly"},
+    {"fee_rate": 1.5},
+    {"unknown": 1},
+])
+def test_backtest_rejects_invalid_config(base_config):
+    with pytest.raises(ValueError, match="回测参数无效"):
+        DCABacktestService.backtest(None, "000001", date(2024, 1, 1), base_config=base_config)
+
+
+def test_backtest_rejects_invalid_grid_value():
+    with pytest.raises(ValueError, match="nav_window"):
+        DCABacktestService.backtest(None, "000001", date(2024, 1, 1), grid={"nav_window": [10, 0]})
+
+
+def test_backtest_ranks_losing_fund_by_xirr():
+    # 净值三年持续下跌：旧的牛顿迭代在这类长周期亏损定投上会发散
+    engine = create_engine("sqlite://")
+    FundNav.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    start = date(2021, 1, 4)
+    days = [start + timedelta(days=i) for i in range(3 * 365) if (start + timedelta(days=i)).weekday() < 5]
+    navs = np.exp(np.linspace(0, np.log(0.75), len(days)))
+    db.add_all(FundNav(fund_code="000001", nav_date=day, nav=Decimal(f"{nav:.4f}")) for day, nav in zip(days, navs))
+    db.commit()
+
+    result = DCABacktestService.backtest(
+        db, "000001", start, days[-1], base_config={"smart_dca": True, "increase_rate": 1},
+        grid={"fee_rate": [0.02, 0.0, 0.01]}
+    )
+    db.close()
+
+    fee_rates = [item["config"]["fee_rate"] for item in result["results"]]
+    xirrs = [item["xirr"] for item in result["results"]]
+    assert fee_rates == [0.0, 0.01, 0.02]
+    assert all(x is not None and -0.2 < x < 0 for x in xirrs)
+    assert xirrs == sorted(xirrs, reverse=True)
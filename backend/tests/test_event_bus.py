@@ -0,0 +1,36 @@
+"""事件总线测试"""
+import asyncio
+import time
+
+from app.core.event_bus import EventBus
+
+
+def test_sync_subscriber_does_not_block_event_loop():
+    handled = []
+
+    def slow_handler(event):
+        time.sleep(0.05)
+        handled.append(event["data"]["n"])
+
+    async def run():
+        bus = EventBus()
+        bus.subscribe("fund.nav.updated", slow_handler)
+        for n in range(5):
+            await bus.publish("fund.nav.updated", {"n": n})
+
+        # 慢的同步订阅者处理期间，事件循环上的其他协程仍能及时运行
+        worst = 0.0
+        for _ in range(20):
+            started = time.perf_counter()
+            await asyncio.sleep(0.001)
+            worst = max(worst, time.perf_counter() - started)
+
+        await bus.wait_idle(timeout=5)
+        metrics = bus.get_metrics("fund.nav.updated")["subscribers"][0]
+        await bus.close()
+        return worst, metrics
+
+    worst, metrics = asyncio.run(run())
+    assert worst < 0.04
+    assert handled == [0, 1, 2, 3, 4]
+    assert metrics["delivered"] == 5 and metrics["failed"] == 0
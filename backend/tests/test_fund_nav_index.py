@@ -0,0 +1,30 @@
+"""基金净值索引失效测试"""
+from datetime import date
+from decimal import Decimal
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import FundNav
+from app.services.fund_nav_index import fund_nav_index
+
+
+def test_rollback_discards_index_built_from_uncommitted_rows():
+    engine = create_engine("sqlite://")
+    FundNav.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+    fund_nav_index.invalidate()
+
+    db = Session()
+    db.add(FundNav(fund_code="000001", nav_date=date(2026, 1, 5), nav=Decimal("1.2345")))
+    db.flush()
+    # 同一会话能读到已flush未提交的净值，索引按它重建
+    assert fund_nav_index.nav_on(db, "000001", date(2026, 1, 5)) is not None
+    db.rollback()
+    db.close()
+
+    other = Session()
+    try:
+        assert fund_nav_index.nav_on(other, "000001", date(2026, 1, 5)) is None
+    finally:
+        other.close()
@@ -0,0 +1,57 @@
+"""收益分析（XIRR、TWR、回撤）测试"""
+import math
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+from app.services.return_analytics_service import ReturnAnalyticsService, compute_return_metrics, xirr
+
+
+def _monthly_dca(rate: float, months: int = 120, amount: float = 1000.0):
+    """每月定投 amount，期末市值按年化收益率 rate 推算，XIRR 应正好等于 rate"""
+    day_offsets = np.arange(months + 1) * 30.0
+    flows = np.full(months + 1, -amount)
+    flows[-1] = sum(amount * (1 + rate) ** ((day_offsets[-1] - day) / 365.0) for day in day_offsets[:-1])
+    return day_offsets, flows
+
+
+def test_xirr_single_period():
+    day_offsets = np.array([0.0, 365.0])
+    result = xirr(day_offsets, np.array([[-1000.0, 1100.0], [-1000.0, 900.0]]))
+    assert result == pytest.approx([0.1, -0.1], abs=1e-9)
+
+
+@pytest.mark.parametrize("rate", [-0.08, -0.0733, 0.0, 0.35, 3.0])
+def test_xirr_monthly_dca_known_rate(rate):
+    # 长周期定投亏损时，从 0.1 出发的牛顿迭代会越过 -1 或发散
+    day_offsets, flows = _monthly_dca(rate)
+    assert xirr(day_offsets, flows[None, :])[0] == pytest.approx(rate, abs=1e-7)
+
+
+def test_xirr_vectorized_rows_and_unsolvable():
+    day_offsets, loss = _monthly_dca(-0.0797)
+    _, gain = _monthly_dca(0.12)
+    only_outflows = np.full(len(day_offsets), -1000.0)
+    with np.errstate(all="raise"):
+        result = xirr(day_offsets, np.vstack([loss, gain, only_outflows, np.zeros(len(day_offsets))]))
+    assert result[:2] == pytest.approx([-0.0797, 0.12], abs=1e-7)
+    assert np.isnan(result[2:]).all()
+
+
+def test_compute_return_metrics():
+    days = np.array(["2023-01-01", "2023-07-01", "2024-01-01"], dtype="datetime64[D]")
+    values = np.array([[100.0, 80.0, 110.0]])
+    flows = np.array([[100.0, 0.0, 0.0]])
+    metrics = compute_return_metrics(days, values, flows)
+    assert metrics["twr"][0] == pytest.approx(0.1)
+    assert metrics["xirr"][0] == pytest.approx(0.1, abs=1e-9)
+    assert metrics["max_drawdown"][0] == pytest.approx(0.2)
+
+
+def test_compute_normalizes_zero_withdrawn():
+    operations = [(datetime(2024, 1, 2, 10), "buy", "000001", 1000.0, 1000.0, None)]
+    nav_rows = [("000001", date(2024, 1, 2), 1.0), ("000001", date(2024, 6, 28), 1.05)]
+    result = ReturnAnalyticsService.compute(operations, ["000001"], nav_rows, date(2024, 6, 28))
+    withdrawn = result["fund:000001"]["total_withdrawn"]
+    assert withdrawn == 0.0 and math.copysign(1.0, withdrawn) == 1.0
@@ -0,0 +1,27 @@
+"""调度主节点锁测试"""
+from sqlalchemy import text
+
+from app.services.scheduler_leader import _AdvisoryLock, _FileLock
+
+
+def test_advisory_lock_connection_does_not_hold_a_transaction():
+    lock = _AdvisoryLock("sqlite://", 7201508)
+    with lock._engine.connect() as conn:
+        # SQLite 只在写操作时开启事务，用写操作代替 PostgreSQL 上执行任意语句都会开启的事务
+        conn.execute(text("CREATE TEMP TABLE probe (x INTEGER)"))
+        conn.execute(text("INSERT INTO probe VALUES (1)"))
+        assert not conn.connection.dbapi_connection.in_transaction
+
+
+def test_file_lock_is_exclusive_and_records_holder(tmp_path):
+    path = str(tmp_path / "scheduler.lock")
+    leader, follower = _FileLock(path), _FileLock(path)
+
+    assert leader.acquire("host-a:1")
+    assert not follower.acquire("host-b:2")
+    assert follower.holder() == "host-a:1"
+
+    leader.release()
+    assert follower.acquire("host-b:2")
+    assert leader.holder() == "host-b:2"
+    follower.release()
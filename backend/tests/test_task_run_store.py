@@ -0,0 +1,55 @@
+"""任务执行记录写入测试"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import TaskRun
+from app.services import task_run_store as task_run_store_module
+from app.services.task_run_store import TaskRunStore
+
+
+def _row(execution_id, started_at):
+    return {
+        "task_id": "fund_nav_update",
+        "execution_id": execution_id,
+        "trigger": "scheduled",
+        "status": "success",
+        "started_at": started_at,
+        "finished_at": started_at + timedelta(seconds=1),
+        "duration_ms": 1000,
+        "rows_affected": None,
+        "error": None,
+        "phase_timings": "{}",
+    }
+
+
+def test_write_keeps_rest_of_batch_when_one_row_fails(monkeypatch):
+    engine = create_engine("sqlite://")
+    TaskRun.__table__.create(engine)
+    Session = sessionmaker(bind=engine)
+
+    @contextmanager
+    def db_context():
+        db = Session()
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    monkeypatch.setattr(task_run_store_module, "get_db_context", db_context)
+    now = datetime.now()
+    store = TaskRunStore()
+    store._write([_row("exec_a", now), _row("exec_b", now), _row("exec_a", now), _row("exec_c", now)])
+
+    db = Session()
+    try:
+        stored = sorted(run.execution_id for run in db.query(TaskRun).all())
+    finally:
+        db.close()
+    assert stored == ["exec_a", "exec_b", "exec_c"]
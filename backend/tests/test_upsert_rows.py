@@ -0,0 +1,43 @@
+"""upsert_rows 在 SQLite 上的新增/更新计数测试"""
+from datetime import datetime
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.models.database import WiseTransaction
+from app.utils.database import upsert_rows
+
+
+def _row(transaction_id, status, created_at):
+    return {
+        "profile_id": "1",
+        "account_id": "a",
+        "transaction_id": transaction_id,
+        "type": "TRANSFER",
+        "amount": 10.0,
+        "currency": "USD",
+        "date": datetime(2026, 1, 1),
+        "status": status,
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+def test_upsert_rows_counts_new_and_updated_on_sqlite():
+    engine = create_engine("sqlite://")
+    WiseTransaction.__table__.create(engine)
+    db = sessionmaker(bind=engine)()
+    first = datetime(2026, 1, 1, 8)
+    second = datetime(2026, 1, 2, 8)
+
+    assert upsert_rows(db, WiseTransaction, [_row("t1", "PENDING", first)], "transaction_id",
+                       keep_on_update=("created_at",)) == (1, 0)
+    assert upsert_rows(db, WiseTransaction, [_row("t1", "COMPLETED", second), _row("t2", "PENDING", second)],
+                       "transaction_id", keep_on_update=("created_at",)) == (1, 1)
+    db.commit()
+
+    t1 = db.query(WiseTransaction).filter_by(transaction_id="t1").one()
+    assert t1.status == "COMPLETED"
+    assert t1.created_at == first
+    assert db.query(WiseTransaction).count() == 2
+    db.close()
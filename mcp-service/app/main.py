@@ -16,6 +16,9 @@ from datetime import datetime
 from app.services.mcp_server import MCPServer
 from app.services.ai_service import DeepSeekAIService
 from app.services.chart_service import ChartConfigGenerator
+from app.services.query_cache import nl_query_cache
+from app.services.chart_data import ColumnarData
+from app.services.http_clients import close_all as close_http_clients
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -128,6 +131,7 @@ async def startup_event():
 async def shutdown_event():
     """应用关闭时清理资源"""
     logger.info("🔄 MCP智能服务正在关闭...")
+    await close_http_clients()
 
 # 健康检查端点
 @app.get("/health")
@@ -218,6 +222,23 @@ async def get_ai_services():
     
     return mcp_server.get_available_ai_services()
 
+@app.get("/cache-stats")
+async def get_cache_stats():
+    """获取自然语言查询缓存命中统计"""
+    if not mcp_server:
+        raise HTTPException(status_code=503, detail="服务未初始化")
+
+    return mcp_server.get_cache_stats()
+
+@app.post("/cache/clear")
+async def clear_query_cache():
+    """清空自然语言查询缓存"""
+    if not mcp_server:
+        raise HTTPException(status_code=503, detail="服务未初始化")
+
+    nl_query_cache.clear()
+    return {"success": True, "message": "查询缓存已清空"}
+
 # MCP工具调用端点
 @app.post("/mcp-tools")
 async def mcp_tools_call(request: Dict[str, Any]):
@@ -256,11 +277,12 @@ async def mcp_query(request: Dict[str, Any]):
             # 执行SQL查询
             sql = params.get("sql", "")
             max_rows = params.get("max_rows", 1000)
+            columnar = params.get("columnar", False)
             
             if not sql:
                 raise HTTPException(status_code=400, detail="SQL语句不能为空")
             
-            result = await mcp_server.execute_sql(sql, max_rows)
+            result = await mcp_server.execute_sql(sql, max_rows, columnar)
             return result
             
         elif method == "natural_query":
@@ -324,6 +346,14 @@ async def get_schema(request: Dict[str, Any]):
         logger.error(f"❌ Schema查询失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/schema/fingerprint")
+async def get_schema_fingerprint():
+    """获取Schema目录指纹，客户端可据此判断本地缓存的Schema是否过期"""
+    if not mcp_server:
+        raise HTTPException(status_code=503, detail="服务未初始化")
+    
+    return mcp_server.get_schema_status()
+
 # 图表生成端点
 @app.post("/generate-chart")
 async def generate_chart(request: Dict[str, Any]):
@@ -333,6 +363,10 @@ async def generate_chart(request: Dict[str, Any]):
         data = request.get("data", [])
         chart_type = request.get("chart_type", "auto")
         
+        # 支持列式数据输入: {"columns": {"列名": [值, ...]}}
+        if not data and request.get("columns"):
+            data = ColumnarData.from_columns(request["columns"])
+        
         if not question or not data:
             raise HTTPException(status_code=400, detail="问题和数据不能为空")
         
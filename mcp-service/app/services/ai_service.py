@@ -3,13 +3,16 @@ DeepSeek AI API集成服务
 MCP服务专用版本 - 支持MCP工具调用
 """
 
-import httpx
 import json
 import logging
 import os
-from typing import Optional, Dict, Any, List
+import time
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime
 
+from app.services.http_clients import get_client
+from app.services.tool_runner import TurnLatency, elapsed_ms, run_tool_calls
+
 logger = logging.getLogger(__name__)
 
 class DeepSeekAIService:
@@ -219,11 +222,14 @@ class DeepSeekAIService:
                 logger.info(f"🔧 启用MCP工具，可用工具数量: {len(self.tools)}")
             
             # 发送API请求
+            latency = TurnLatency()
+            started = time.perf_counter()
             response = await self._send_request(request_data)
+            model_ms = elapsed_ms(started)
             
             if response:
                 # 处理工具调用结果
-                return await self._process_tool_calls(response, question)
+                return await self._process_tool_calls(response, question, latency, model_ms)
             else:
                 return {"error": "DeepSeek API请求失败"}
                 
@@ -231,8 +237,15 @@ class DeepSeekAIService:
             logger.error(f"DeepSeek AI分析失败: {e}")
             return {"error": f"AI分析失败: {str(e)}"}
     
-    async def _process_tool_calls(self, response: Dict[str, Any], original_question: str) -> Dict[str, Any]:
-        """处理工具调用结果"""
+    async def _process_tool_calls(
+        self,
+        response: Dict[str, Any],
+        original_question: str,
+        latency: Optional[TurnLatency] = None,
+        model_ms: float = 0.0
+    ) -> Dict[str, Any]:
+        """处理工具调用结果（同一轮的多个工具调用并发执行）"""
+        latency = latency or TurnLatency()
         try:
             # 检查是否有工具调用
             if "choices" in response and response["choices"]:
@@ -243,35 +256,40 @@ class DeepSeekAIService:
                     tool_calls = choice["message"]["tool_calls"]
                     logger.info(f"🔧 DeepSeek AI调用了 {len(tool_calls)} 个工具")
                     
-                    # 执行工具调用
-                    tool_results = []
-                    for tool_call in tool_calls:
-                        tool_name = tool_call["function"]["name"]
-                        tool_args = json.loads(tool_call["function"]["arguments"])
-                        
-                        logger.info(f"🔧 执行工具: {tool_name}")
-                        result = await self._execute_tool(tool_name, tool_args)
-                        tool_results.append({
-                            "tool_name": tool_name,
-                            "result": result
-                        })
+                    # 并发执行工具调用
+                    calls = [
+                        (tool_call["function"]["name"], json.loads(tool_call["function"]["arguments"]))
+                        for tool_call in tool_calls
+                    ]
+                    tool_started = time.perf_counter()
+                    results = await self._execute_tools(calls)
+                    latency.add_turn(model_ms, elapsed_ms(tool_started), len(calls))
+                    tool_results = [
+                        {"tool_name": name, "result": result}
+                        for (name, _), result in zip(calls, results)
+                    ]
                     
                     # 基于工具结果生成最终SQL
+                    started = time.perf_counter()
                     final_sql = await self._generate_final_sql(original_question, tool_results)
+                    latency.add_turn(elapsed_ms(started))
+                    logger.info(f"⏱️ DeepSeek分析耗时: {latency.to_dict()}")
                     
                     if final_sql:
                         return {
                             "sql": final_sql,
                             "tool_calls": tool_results,
-                            "method": "deepseek_ai_with_tools"
+                            "method": "deepseek_ai_with_tools",
+                            "latency": latency.to_dict()
                         }
                     else:
-                        return {"error": "无法生成最终SQL"}
+                        return {"error": "无法生成最终SQL", "latency": latency.to_dict()}
                 
                 # 如果没有工具调用，检查是否有直接回答
                 elif "message" in choice and "content" in choice["message"]:
                     content = choice["message"]["content"]
                     logger.info(f"📝 DeepSeek AI直接回答: {content[:100]}...")
+                    latency.add_turn(model_ms)
                     
                     # 尝试从回答中提取SQL
                     extracted_sql = self._extract_sql_from_content(content)
@@ -279,7 +297,8 @@ class DeepSeekAIService:
                         return {
                             "sql": extracted_sql,
                             "ai_response": content,
-                            "method": "deepseek_ai"
+                            "method": "deepseek_ai",
+                            "latency": latency.to_dict()
                         }
                     else:
                         return {"error": "AI回答中未找到有效SQL"}
@@ -290,19 +309,11 @@ class DeepSeekAIService:
             logger.error(f"处理工具调用结果失败: {e}")
             return {"error": f"工具调用处理失败: {str(e)}"}
     
-    async def _execute_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
-        """执行MCP工具"""
+    async def _execute_tools(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Any]:
+        """并发执行一轮中的多个MCP工具调用"""
         if not self.mcp_tools:
-            return {"error": "MCP工具未配置"}
-        
-        try:
-            logger.info(f"🔧 执行MCP工具: {tool_name}, 参数: {tool_args}")
-            result = self.mcp_tools.execute_tool(tool_name, tool_args)
-            logger.info(f"✅ 工具执行成功: {tool_name}")
-            return result
-        except Exception as e:
-            logger.error(f"❌ 工具执行失败: {tool_name}, 错误: {e}")
-            return {"error": f"工具执行失败: {str(e)}"}
+            return [{"error": "MCP工具未配置"} for _ in calls]
+        return await run_tool_calls(self.mcp_tools, calls)
     
     async def _generate_final_sql(self, question: str, tool_results: List[Dict[str, Any]]) -> Optional[str]:
         """基于工具结果生成最终SQL"""
@@ -388,20 +399,20 @@ class DeepSeekAIService:
         try:
             logger.info(f"📤 发送DeepSeek API请求: model={self.model}, messages_count={len(request_data['messages'])}")
             
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/v1/chat/completions",
-                    headers=self.headers,
-                    json=request_data
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.info(f"✅ DeepSeek API请求成功: tokens_used={result.get('usage', {}).get('total_tokens', 0)}")
-                    return result
-                else:
-                    logger.error(f"❌ DeepSeek API请求失败: status={response.status_code}, response={response.text}")
-                    return None
+            client = get_client("deepseek")
+            response = await client.post(
+                f"{self.base_url}/v1/chat/completions",
+                headers=self.headers,
+                json=request_data
+            )
+
+            if response.status_code == 200:
+                result = response.json()
+                logger.info(f"✅ DeepSeek API请求成功: tokens_used={result.get('usage', {}).get('total_tokens', 0)}")
+                return result
+            else:
+                logger.error(f"❌ DeepSeek API请求失败: status={response.status_code}, response={response.text}")
+                return None
                     
         except Exception as e:
             logger.error(f"❌ DeepSeek API请求异常: {e}")
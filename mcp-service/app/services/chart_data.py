@@ -0,0 +1,195 @@
+"""
+列式图表数据
+把查询结果按列组织（每列一个数组），在整列上做类型推断，并提供服务端降采样：
+折线图使用LTTB（Largest-Triangle-Three-Buckets），饼图使用Top-N + "其他"合并
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+NUMERIC_TYPES = (int, float, Decimal)
+
+
+def unique_column_names(names: Iterable[str]) -> List[str]:
+    """重名列（如 JOIN 出来的 a.name, b.name）依次改名为 name_1、name_2...，避免共用同一列数组"""
+    result: List[str] = []
+    seen = set()
+    for name in names:
+        candidate, suffix = name, 0
+        while candidate in seen:
+            suffix += 1
+            candidate = f"{name}_{suffix}"
+        seen.add(candidate)
+        result.append(candidate)
+    return result
+
+
+class ColumnarData:
+    """列式数据：列名列表 + 每列一个值数组"""
+
+    def __init__(self, column_names: List[str], columns: Dict[str, List[Any]]):
+        self.column_names = column_names
+        self.columns = columns
+
+    @property
+    def row_count(self) -> int:
+        if not self.column_names:
+            return 0
+        return len(self.columns[self.column_names[0]])
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]]) -> "ColumnarData":
+        """从字典行列表构建（列名以第一行为准）"""
+        if not rows:
+            return cls([], {})
+        column_names = list(rows[0].keys())
+        columns = {name: [row.get(name) for row in rows] for name in column_names}
+        return cls(column_names, columns)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]]) -> "ColumnarData":
+        """从 {列名: 数组} 构建"""
+        return cls(list(columns.keys()), {name: list(values) for name, values in columns.items()})
+
+    @classmethod
+    def from_cursor(cls, cursor, chunk_size: int = 1000, max_rows: Optional[int] = None) -> "ColumnarData":
+        """从DB-API游标分块读取（fetchmany），不为每行创建字典"""
+        columns: Dict[str, List[Any]] = {}
+        column_names: List[str] = []
+        targets: List[List[Any]] = []
+        fetched = 0
+        while True:
+            size = chunk_size if max_rows is None else min(chunk_size, max_rows - fetched)
+            if size <= 0:
+                break
+            chunk = cursor.fetchmany(size)
+            if not column_names:
+                # 服务端游标在第一次fetch之后才有description
+                column_names = unique_column_names(desc[0] for desc in cursor.description or [])
+                columns = {name: [] for name in column_names}
+                targets = [columns[name] for name in column_names]
+            if not chunk:
+                break
+            for i, target in enumerate(targets):
+                target.extend(row[i] for row in chunk)
+            fetched += len(chunk)
+        return cls(column_names, columns)
+
+    def take(self, indices: Iterable[int]) -> "ColumnarData":
+        """按行下标选取子集"""
+        indices = list(indices)
+        return ColumnarData(
+            self.column_names,
+            {name: [values[i] for i in indices] for name, values in self.columns.items()}
+        )
+
+    def numeric(self, name: str) -> List[float]:
+        """以浮点数组返回数值列，空值和无法转换的值记为0"""
+        result = []
+        for value in self.columns.get(name, []):
+            try:
+                result.append(float(value) if value is not None else 0.0)
+            except (TypeError, ValueError):
+                result.append(0.0)
+        return result
+
+    def to_rows(self) -> List[Dict[str, Any]]:
+        """转换回字典行列表"""
+        names = self.column_names
+        return [dict(zip(names, values)) for values in zip(*(self.columns[name] for name in names))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"column_names": self.column_names, "columns": self.columns, "row_count": self.row_count}
+
+
+def as_columnar(data: Any) -> ColumnarData:
+    """把字典行列表或列式数据统一为 ColumnarData"""
+    if isinstance(data, ColumnarData):
+        return data
+    return ColumnarData.from_rows(data or [])
+
+
+def infer_column_type(values: Sequence[Any]) -> str:
+    """在整列上推断类型: numeric / datetime / categorical / mixed / unknown"""
+    seen_numeric = seen_datetime = seen_str = seen_other = False
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            seen_other = True
+        elif isinstance(value, NUMERIC_TYPES):
+            seen_numeric = True
+        elif isinstance(value, (datetime, date)):
+            seen_datetime = True
+        elif isinstance(value, str):
+            seen_str = True
+        else:
+            seen_other = True
+
+    kinds = seen_numeric + seen_datetime + seen_str + seen_other
+    if kinds == 0:
+        return "unknown"
+    if kinds > 1:
+        return "mixed"
+    if seen_numeric:
+        return "numeric"
+    if seen_datetime:
+        return "datetime"
+    if seen_str:
+        return "categorical"
+    return "mixed"
+
+
+def lttb_indices(values: Sequence[float], threshold: int) -> List[int]:
+    """LTTB降采样，返回保留点的下标（x轴取行序号，保留首尾点）"""
+    n = len(values)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    indices = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = (next_start + next_end - 1) / 2.0
+        avg_y = sum(values[next_start:next_end]) / max(next_end - next_start, 1)
+
+        # 当前桶中与上一个保留点、下一桶平均点构成最大三角形的点
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = a, values[a]
+        max_area = -1.0
+        chosen = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (values[j] - ay) - (ax - j) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        indices.append(chosen)
+        a = chosen
+
+    indices.append(n - 1)
+    return indices
+
+
+def top_n_with_other(
+    items: List[Dict[str, Any]],
+    top_n: int,
+    value_key: str,
+    other_item: Dict[str, Any]
+) -> List[Dict[str, Any]]:
+    """保留数值最大的 top_n 项，其余合并为一项（other_item 的 value_key 会被填充为合计值）"""
+    if len(items) <= top_n:
+        return items
+    ranked = sorted(items, key=lambda item: item.get(value_key) or 0, reverse=True)
+    rest_total = sum(item.get(value_key) or 0 for item in ranked[top_n:])
+    merged = dict(other_item)
+    merged[value_key] = rest_total
+    merged["merged_count"] = len(ranked) - top_n
+    return ranked[:top_n] + [merged]
@@ -5,11 +5,13 @@ MCP服务专用版本
 
 import json
 import re
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union
 from dataclasses import dataclass, asdict
 from datetime import datetime
 import logging
 
+from .chart_data import ColumnarData, as_columnar, infer_column_type, lttb_indices, top_n_with_other
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -64,14 +66,19 @@ class ChartConfigGenerator:
             'rainbow': ['#10B981', '#3B82F6', '#F59E0B', '#EF4444', '#8B5CF6', '#EC4899', '#14B8A6'],
             'monochrome': ['#374151', '#4B5563', '#6B7280', '#9CA3AF', '#D1D5DB']
         }
+        
+        # 服务端降采样配置：折线图最多保留的点数，饼图最多保留的扇区数（其余合并为"其他"）
+        self.max_line_points = 500
+        self.pie_top_n = 8
     
     def generate_config(self, 
-                       query_result: List[Dict[str, Any]], 
+                       query_result: Union[List[Dict[str, Any]], ColumnarData], 
                        user_question: str = "",
                        sql: str = "") -> ChartConfig:
-        """生成图表配置"""
+        """生成图表配置（接受字典行列表或列式数据）"""
         
-        if not query_result:
+        query_result = as_columnar(query_result)
+        if not query_result.row_count:
             return self._create_empty_config(user_question)
         
         # 1. 分析数据结构
@@ -113,33 +120,22 @@ class ChartConfigGenerator:
             style={"colors": self.color_themes["default"]}
         )
     
-    def _analyze_data_structure(self, data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """分析数据结构"""
-        if not data:
+    def _analyze_data_structure(self, data: Union[List[Dict[str, Any]], ColumnarData]) -> Dict[str, Any]:
+        """分析数据结构（在整列上推断类型）"""
+        data = as_columnar(data)
+        if not data.row_count:
             return {"type": "empty", "columns": [], "row_count": 0}
         
-        columns = list(data[0].keys()) if data else []
-        row_count = len(data)
+        columns = data.column_names
         
         # 分析列类型
-        column_types = {}
-        for col in columns:
-            sample_values = [row.get(col) for row in data[:5] if row.get(col) is not None]
-            if sample_values:
-                if all(isinstance(v, (int, float)) for v in sample_values):
-                    column_types[col] = "numeric"
-                elif all(isinstance(v, str) for v in sample_values):
-                    column_types[col] = "categorical"
-                else:
-                    column_types[col] = "mixed"
-            else:
-                column_types[col] = "unknown"
+        column_types = {col: infer_column_type(data.columns[col]) for col in columns}
         
         return {
             "type": "structured",
             "columns": columns,
             "column_types": column_types,
-            "row_count": row_count,
+            "row_count": data.row_count,
             "has_numeric": any(t == "numeric" for t in column_types.values()),
             "has_categorical": any(t == "categorical" for t in column_types.values())
         }
@@ -175,9 +171,10 @@ class ChartConfigGenerator:
         
         return title, description
     
-    def _format_data_for_chart(self, data: List[Dict[str, Any]], chart_type: str, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _format_data_for_chart(self, data: Union[List[Dict[str, Any]], ColumnarData], chart_type: str, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """格式化数据以适应图表"""
-        if not data:
+        data = as_columnar(data)
+        if not data.row_count:
             return []
         
         if chart_type == "pie":
@@ -187,28 +184,36 @@ class ChartConfigGenerator:
         elif chart_type == "line":
             return self._format_for_line(data, data_analysis)
         else:
-            return data
+            return data.to_rows()
+    
+    def _find_fields(self, data_analysis: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+        """查找分类字段和数值字段（各取最后一个匹配列）"""
+        category_field = None
+        value_field = None
+        for col, col_type in data_analysis.get("column_types", {}).items():
+            if col_type == "categorical":
+                category_field = col
+            elif col_type == "numeric":
+                value_field = col
+        return category_field, value_field
     
-    def _format_for_pie(self, data: List[Dict[str, Any]], data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """格式化为饼图数据"""
-        formatted = []
-        for row in data:
-            # 查找分类字段和数值字段
-            category_field = None
-            value_field = None
-            
-            for col, col_type in data_analysis.get("column_types", {}).items():
-                if col_type == "categorical":
-                    category_field = col
-                elif col_type == "numeric":
-                    value_field = col
-            
-            if category_field and value_field:
-                formatted.append({
-                    "category": row.get(category_field, "未知"),
-                    "value": row.get(value_field, 0),
-                    "percentage": 0  # 稍后计算
-                })
+    def _format_for_pie(self, data: ColumnarData, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """格式化为饼图数据（扇区过多时合并为"其他"）"""
+        category_field, value_field = self._find_fields(data_analysis)
+        if not category_field or not value_field:
+            return []
+        
+        categories = data.columns[category_field]
+        values = data.numeric(value_field)
+        formatted = [
+            {
+                "category": "未知" if category is None else category,
+                "value": value,
+                "percentage": 0  # 稍后计算
+            }
+            for category, value in zip(categories, values)
+        ]
+        formatted = top_n_with_other(formatted, self.pie_top_n, "value", {"category": "其他", "percentage": 0})
         
         # 计算百分比
         total = sum(item["value"] for item in formatted)
@@ -218,49 +223,46 @@ class ChartConfigGenerator:
         
         return formatted
     
-    def _format_for_bar(self, data: List[Dict[str, Any]], data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _format_for_bar(self, data: ColumnarData, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
         """格式化为柱状图数据"""
-        formatted = []
-        for row in data:
-            # 查找分类字段和数值字段
-            category_field = None
-            value_field = None
-            
-            for col, col_type in data_analysis.get("column_types", {}).items():
-                if col_type == "categorical":
-                    category_field = col
-                elif col_type == "numeric":
-                    value_field = col
-            
-            if category_field and value_field:
-                formatted.append({
-                    "category": row.get(category_field, "未知"),
-                    "value": row.get(value_field, 0)
-                })
+        category_field, value_field = self._find_fields(data_analysis)
+        if not category_field or not value_field:
+            return []
         
-        return formatted
+        return [
+            {
+                "category": "未知" if category is None else category,
+                "value": value
+            }
+            for category, value in zip(data.columns[category_field], data.numeric(value_field))
+        ]
     
-    def _format_for_line(self, data: List[Dict[str, Any]], data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """格式化为折线图数据"""
-        formatted = []
-        for row in data:
-            # 查找时间字段和数值字段
-            time_field = None
-            value_field = None
-            
-            for col, col_type in data_analysis.get("column_types", {}).items():
-                if col_type == "categorical" and any(time_keyword in col.lower() for time_keyword in ["time", "date", "时间", "日期"]):
-                    time_field = col
-                elif col_type == "numeric":
-                    value_field = col
-            
-            if time_field and value_field:
-                formatted.append({
-                    "time": row.get(time_field, "未知"),
-                    "value": row.get(value_field, 0)
-                })
+    def _format_for_line(self, data: ColumnarData, data_analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """格式化为折线图数据（点数过多时使用LTTB降采样）"""
+        # 查找时间字段和数值字段
+        time_field = None
+        value_field = None
         
-        return formatted
+        for col, col_type in data_analysis.get("column_types", {}).items():
+            if col_type == "datetime" or (col_type == "categorical" and any(time_keyword in col.lower() for time_keyword in ["time", "date", "时间", "日期"])):
+                time_field = col
+            elif col_type == "numeric":
+                value_field = col
+        
+        if not time_field or not value_field:
+            return []
+        
+        values = data.numeric(value_field)
+        times = data.columns[time_field]
+        indices = lttb_indices(values, self.max_line_points)
+        
+        return [
+            {
+                "time": "未知" if times[i] is None else times[i],
+                "value": values[i]
+            }
+            for i in indices
+        ]
     
     def _generate_style_config(self, chart_type: str, data_count: int) -> Dict[str, Any]:
         """生成样式配置"""
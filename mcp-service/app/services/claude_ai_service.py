@@ -2,11 +2,13 @@
 
 import json
 import logging
-import httpx
-import asyncio
+import time
 from typing import Dict, Any, Optional, List
 import os
 
+from app.services.http_clients import get_client
+from app.services.tool_runner import TurnLatency, elapsed_ms, run_tool_calls
+
 logger = logging.getLogger(__name__)
 
 class ClaudeAIService:
@@ -60,10 +62,13 @@ class ClaudeAIService:
             }
             
             # 发送API请求
+            latency = TurnLatency()
+            started = time.perf_counter()
             response = await self._send_request(request_body)
+            model_ms = elapsed_ms(started)
             
             # 处理工具调用结果
-            return await self._process_tool_calls(response, question)
+            return await self._process_tool_calls(response, question, latency, model_ms)
             
         except Exception as e:
             logger.error(f"Claude AI分析失败: {e}")
@@ -136,63 +141,75 @@ class ClaudeAIService:
             "content-type": "application/json"
         }
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.post(
-                "https://api.anthropic.com/v1/messages",
-                headers=headers,
-                json=request_body
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                logger.error(f"Claude API请求失败: {response.status_code} - {response.text}")
-                return {"error": f"API请求失败: {response.status_code}"}
+        client = get_client("claude")
+        response = await client.post(
+            "https://api.anthropic.com/v1/messages",
+            headers=headers,
+            json=request_body
+        )
+
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.error(f"Claude API请求失败: {response.status_code} - {response.text}")
+            return {"error": f"API请求失败: {response.status_code}"}
     
-    async def _process_tool_calls(self, result: Dict[str, Any], original_question: str) -> Dict[str, Any]:
-        """处理工具调用结果"""
+    async def _process_tool_calls(
+        self,
+        result: Dict[str, Any],
+        original_question: str,
+        latency: Optional[TurnLatency] = None,
+        model_ms: float = 0.0
+    ) -> Dict[str, Any]:
+        """处理工具调用结果（同一轮的多个工具调用并发执行）"""
+        latency = latency or TurnLatency()
         try:
             # 检查是否有工具调用
             if "content" in result and isinstance(result["content"], list):
-                for content_item in result["content"]:
-                    if content_item.get("type") == "tool_use":
-                        tool_call = content_item
-                        
-                        # 执行工具调用
-                        tool_name = tool_call["name"]
-                        tool_args = tool_call["input"]
-                        
-                        logger.info(f"🔧 执行工具调用: {tool_name} with args: {tool_args}")
-                        
-                        # 调用MCP工具
-                        tool_result = self.mcp_tools.execute_tool(tool_name, tool_args)
-                        
-                        # 将工具结果返回给Claude进行进一步分析
-                        return await self._continue_analysis_with_tool_result(
-                            original_question, tool_result, tool_name
-                        )
+                calls = [
+                    (item["name"], item["input"])
+                    for item in result["content"]
+                    if item.get("type") == "tool_use"
+                ]
+                if calls:
+                    logger.info(f"🔧 执行 {len(calls)} 个工具调用: {[name for name, _ in calls]}")
+                    tool_started = time.perf_counter()
+                    results = await run_tool_calls(self.mcp_tools, calls)
+                    latency.add_turn(model_ms, elapsed_ms(tool_started), len(calls))
+                    
+                    # 将工具结果返回给Claude进行进一步分析
+                    tool_results = [
+                        {"tool_name": name, "result": tool_result}
+                        for (name, _), tool_result in zip(calls, results)
+                    ]
+                    return await self._continue_analysis_with_tool_results(
+                        original_question, tool_results, latency
+                    )
             
             # 如果没有工具调用，直接返回结果
-            return {"response": result.get("content", "无响应")}
+            latency.add_turn(model_ms)
+            return {"response": result.get("content", "无响应"), "latency": latency.to_dict()}
             
         except Exception as e:
             logger.error(f"处理工具调用失败: {e}")
             return {"error": f"工具调用处理失败: {str(e)}"}
     
-    async def _continue_analysis_with_tool_result(
+    async def _continue_analysis_with_tool_results(
         self, 
         original_question: str, 
-        tool_result: Dict[str, Any],
-        tool_name: str
+        tool_results: List[Dict[str, Any]],
+        latency: TurnLatency
     ) -> Dict[str, Any]:
         """使用工具结果继续分析"""
         try:
+            tool_names = "、".join(item["tool_name"] for item in tool_results)
+            
             # 构建包含工具结果的提示词
             follow_up_prompt = f"""
 基于以下工具执行结果，请继续分析用户问题："{original_question}"
 
-工具名称：{tool_name}
-工具结果：{json.dumps(tool_result, ensure_ascii=False, indent=2)}
+工具名称：{tool_names}
+工具结果：{json.dumps(tool_results, ensure_ascii=False, indent=2)}
 
 请根据工具结果，生成最终的SQL查询并执行，或者提供进一步的分析建议。
 """
@@ -200,7 +217,7 @@ class ClaudeAIService:
             # 构建消息
             messages = [
                 {"role": "user", "content": original_question},
-                {"role": "assistant", "content": f"我执行了工具 {tool_name}，结果如下：{json.dumps(tool_result, ensure_ascii=False)}"},
+                {"role": "assistant", "content": f"我执行了工具 {tool_names}，结果如下：{json.dumps(tool_results, ensure_ascii=False)}"},
                 {"role": "user", "content": follow_up_prompt}
             ]
             
@@ -214,10 +231,15 @@ class ClaudeAIService:
             }
             
             # 发送后续请求
+            started = time.perf_counter()
             response = await self._send_request(request_body)
+            latency.add_turn(elapsed_ms(started))
+            logger.info(f"⏱️ Claude分析耗时: {latency.to_dict()}")
             
             # 处理最终结果
-            return self._extract_final_result(response)
+            final_result = self._extract_final_result(response)
+            final_result["latency"] = latency.to_dict()
+            return final_result
             
         except Exception as e:
             logger.error(f"继续分析失败: {e}")
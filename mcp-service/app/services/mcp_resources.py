@@ -3,26 +3,32 @@
 import json
 import logging
 from typing import Dict, Any, Optional, List
-import psycopg2
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from .schema_catalog import SchemaCatalog
 
 logger = logging.getLogger(__name__)
 
+# 含表统计的表结构资源，读取时重新生成
+TABLE_SCHEMA_RESOURCES = {
+    "db://schema/tables/asset_snapshot.json": "asset_snapshot",
+}
+
 class MCPResourcesManager:
     """MCP Resources管理器 - 生成和管理数据库相关资源"""
     
-    def __init__(self, db_config: Dict[str, Any]):
+    def __init__(self, db_config: Dict[str, Any], schema_catalog: Optional[SchemaCatalog] = None):
         self.db_config = db_config
+        self.schema_catalog = schema_catalog or SchemaCatalog(db_config)
         self.resources = {}
         self._generate_resources()
+        # Schema指纹变化时重新生成依赖表结构的资源
+        self.schema_catalog.add_listener(lambda fingerprint: self._generate_resources())
     
     def _generate_resources(self):
         """生成所有可用的Resources"""
         try:
             self.resources = {
                 "db://schema/overview.md": self._generate_schema_overview(),
-                "db://schema/tables/asset_snapshot.json": self._generate_table_schema("asset_snapshot"),
+                **{uri: self._generate_table_schema(table) for uri, table in TABLE_SCHEMA_RESOURCES.items()},
                 "db://examples/queries.sql": self._generate_example_queries(),
                 "db://examples/analysis_patterns.md": self._generate_analysis_patterns()
             }
@@ -32,12 +38,21 @@ class MCPResourcesManager:
             # 使用默认资源
             self.resources = self._get_default_resources()
     
+    def _refresh_table_schemas(self) -> None:
+        """重新生成表结构资源，带上最新的表统计（统计由Schema目录按TTL缓存）"""
+        for uri, table_name in TABLE_SCHEMA_RESOURCES.items():
+            if uri in self.resources:
+                self.resources[uri] = self._generate_table_schema(table_name)
+
     def get_resource(self, uri: str) -> Optional[str]:
         """获取指定URI的资源"""
+        if uri in TABLE_SCHEMA_RESOURCES and uri in self.resources:
+            self.resources[uri] = self._generate_table_schema(TABLE_SCHEMA_RESOURCES[uri])
         return self.resources.get(uri)
     
     def get_all_resources(self) -> Dict[str, str]:
         """获取所有可用的Resources"""
+        self._refresh_table_schemas()
         return self.resources
     
     def list_resources(self) -> List[str]:
@@ -100,81 +115,16 @@ class MCPResourcesManager:
 """
     
     def _generate_table_schema(self, table_name: str) -> str:
-        """生成表的详细JSON schema"""
+        """生成表的详细JSON schema（从Schema目录读取）"""
         try:
-            with psycopg2.connect(**self.db_config) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    # 获取字段信息
-                    cursor.execute("""
-                        SELECT column_name, data_type, is_nullable, column_default, 
-                               character_maximum_length, numeric_precision, numeric_scale,
-                               ordinal_position
-                        FROM information_schema.columns 
-                        WHERE table_name = %s AND table_schema = 'public'
-                        ORDER BY ordinal_position
-                    """, (table_name,))
-                    
-                    columns = cursor.fetchall()
-                    
-                    # 获取主键信息
-                    cursor.execute("""
-                        SELECT kcu.column_name
-                        FROM information_schema.table_constraints tc
-                        JOIN information_schema.key_column_usage kcu 
-                            ON tc.constraint_name = kcu.constraint_name
-                        WHERE tc.constraint_type = 'PRIMARY KEY' 
-                            AND tc.table_name = %s
-                    """, (table_name,))
-                    
-                    primary_keys = [row["column_name"] for row in cursor.fetchall()]
-                    
-                    # 获取索引信息
-                    cursor.execute("""
-                        SELECT indexname, indexdef
-                        FROM pg_indexes 
-                        WHERE tablename = %s
-                    """, (table_name,))
-                    
-                    indexes = [{"name": row["indexname"], "definition": row["indexdef"]} 
-                              for row in cursor.fetchall()]
-                    
-                    # 获取表统计信息
-                    cursor.execute("""
-                        SELECT n_tup_ins, n_tup_upd, n_tup_del, n_live_tup, n_dead_tup
-                        FROM pg_stat_user_tables 
-                        WHERE relname = %s
-                    """, (table_name,))
-                    
-                    stats = cursor.fetchone()
-                    
-                    schema = {
-                        "table_name": table_name,
-                        "generated_at": datetime.now().isoformat(),
-                        "columns": [
-                            {
-                                "name": col["column_name"],
-                                "type": col["data_type"],
-                                "nullable": col["is_nullable"] == "YES",
-                                "default": col["column_default"],
-                                "max_length": col["character_maximum_length"],
-                                "precision": col["numeric_precision"],
-                                "scale": col["numeric_scale"],
-                                "position": col["ordinal_position"]
-                            }
-                            for col in columns
-                        ],
-                        "primary_keys": primary_keys,
-                        "indexes": indexes,
-                        "statistics": {
-                            "total_rows": stats["n_live_tup"] if stats else 0,
-                            "inserted_rows": stats["n_tup_ins"] if stats else 0,
-                            "updated_rows": stats["n_tup_upd"] if stats else 0,
-                            "deleted_rows": stats["n_tup_del"] if stats else 0
-                        },
-                        "total_columns": len(columns)
-                    }
-                    
-                    return json.dumps(schema, ensure_ascii=False, indent=2)
+            table = self.schema_catalog.get_table(table_name)
+            if table is None:
+                raise ValueError(f"表 {table_name} 不存在或Schema目录不可用")
+            
+            schema = {key: value for key, value in table.items() if key != "table_comment"}
+            schema["statistics"] = self.schema_catalog.get_statistics(table_name)
+            schema["schema_fingerprint"] = self.schema_catalog.fingerprint
+            return json.dumps(schema, ensure_ascii=False, indent=2)
                     
         except Exception as e:
             logger.error(f"获取表 {table_name} 的schema失败: {e}")
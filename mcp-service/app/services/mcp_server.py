@@ -6,15 +6,16 @@ MCP服务器核心服务
 import logging
 import json
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union
 from datetime import datetime
 import psycopg2
-from psycopg2.extras import RealDictCursor
 
 from .ai_service import DeepSeekAIService
 from .claude_ai_service import ClaudeAIService
 from .chart_service import ChartConfigGenerator
+from .chart_data import ColumnarData
 from .mcp_tools import MCPTools
+from .query_cache import nl_query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +38,12 @@ class MCPServer:
         # 初始化MCP工具
         self.mcp_tools = MCPTools(self.db_config)
         
+        # 查询缓存的schema版本跟随Schema目录指纹，schema变化时自动失效
+        self.schema_catalog = self.mcp_tools.schema_catalog
+        self.schema_catalog.add_listener(nl_query_cache.set_schema_version)
+        if self.schema_catalog.fingerprint:
+            nl_query_cache.set_schema_version(self.schema_catalog.fingerprint)
+        
         # 重新初始化DeepSeek AI服务，传入MCP工具
         if hasattr(self.ai_service, '__class__') and self.ai_service.__class__.__name__ == 'DeepSeekAIService':
             # 创建新的DeepSeek AI服务实例，传入MCP工具
@@ -154,24 +161,28 @@ class MCPServer:
             }
         }
     
-    async def execute_sql(self, sql: str, max_rows: int = 1000) -> Dict[str, Any]:
-        """执行SQL查询"""
+    async def execute_sql(self, sql: str, max_rows: int = 1000, columnar: bool = False) -> Dict[str, Any]:
+        """执行SQL查询
+        
+        columnar=True 时以列式返回（column_names + 每列一个数组），不再逐行重复字段名
+        """
         start_time = datetime.now()
         
+        # 命中结果缓存时直接返回
+        cached_columns = nl_query_cache.get_result(sql, max_rows)
+        if cached_columns is not None:
+            result = self._build_sql_result(sql, cached_columns, columnar, start_time)
+            result["cache_hit"] = "result"
+            return result
+        
         try:
             # 尝试连接数据库执行查询
-            data = await self._execute_database_query(sql, max_rows)
+            columns = await self._execute_database_query(sql, max_rows)
             
-            if data is not None:
-                execution_time = (datetime.now() - start_time).total_seconds()
-                return {
-                    "success": True,
-                    "sql": sql,
-                    "data": data,
-                    "execution_time": execution_time,
-                    "row_count": len(data),
-                    "method": "database"
-                }
+            if columns is not None:
+                # 只缓存真实数据库的查询结果
+                nl_query_cache.set_result(sql, max_rows, columns)
+                return self._build_sql_result(sql, columns, columnar, start_time)
         
         except Exception as e:
             logger.warning(f"数据库查询失败，使用模拟数据: {e}")
@@ -201,6 +212,22 @@ class MCPServer:
                 "method": "error"
             }
     
+    def _build_sql_result(self, sql: str, columns: ColumnarData, columnar: bool, start_time: datetime) -> Dict[str, Any]:
+        """构建数据库查询结果（行式或列式）"""
+        result = {
+            "success": True,
+            "sql": sql,
+            "row_count": columns.row_count,
+            "method": "database"
+        }
+        if columnar:
+            result["column_names"] = columns.column_names
+            result["columns"] = columns.columns
+        else:
+            result["data"] = columns.to_rows()
+        result["execution_time"] = (datetime.now() - start_time).total_seconds()
+        return result
+    
     async def natural_language_query(self, question: str, context: Dict[str, Any] = None, max_rows: int = 1000, ai_service: str = "auto") -> Dict[str, Any]:
         """自然语言查询处理"""
         start_time = datetime.now()
@@ -221,6 +248,27 @@ class MCPServer:
         
         logger.info(f"🔍 选择的AI服务: {ai_service}")
         
+        # 0. 查询缓存：相同问题直接复用已生成的SQL，跳过AI调用
+        cached_plan = nl_query_cache.get_plan(question)
+        if cached_plan:
+            logger.info(f"⚡ 命中查询计划缓存: {cached_plan['sql']}")
+            sql_result = await self.execute_sql(cached_plan['sql'], max_rows)
+            if sql_result.get('success'):
+                sql_result['cache_hit'] = "plan+result" if sql_result.get('cache_hit') == "result" else "plan"
+                sql_result['ai_analysis'] = cached_plan['ai_analysis']
+                sql_result['method'] = cached_plan['method']
+                return sql_result
+        
+        if nl_query_cache.fuzzy_template_match:
+            template_result = self._match_query_template(question)
+            if template_result:
+                logger.info(f"⚡ 模板匹配命中，跳过AI调用: {template_result['description']}")
+                nl_query_cache.record_template_hit()
+                sql_result = await self.execute_sql(template_result["sql"], max_rows)
+                sql_result['method'] = "template"
+                sql_result['chart_hint'] = template_result["chart_hint"]
+                return sql_result
+        
         try:
             if ai_service == "claude":
                 # 使用Claude AI分析问题
@@ -242,6 +290,7 @@ class MCPServer:
                         
                         # 如果SQL执行成功，添加AI分析信息
                         if sql_result.get('success'):
+                            self._cache_plan(question, generated_sql, ai_analysis, sql_result, "claude_ai")
                             sql_result['ai_analysis'] = ai_analysis
                             sql_result['method'] = "claude_ai"
                             logger.info("✅ Claude AI调用成功，使用AI生成的SQL")
@@ -272,6 +321,7 @@ class MCPServer:
                     
                     # 如果SQL执行成功，添加AI分析信息
                     if sql_result.get('success'):
+                        self._cache_plan(question, generated_sql, ai_analysis, sql_result, "deepseek_ai")
                         sql_result['ai_analysis'] = ai_analysis
                         sql_result['method'] = "deepseek_ai"
                         logger.info("✅ DeepSeek AI调用成功，使用AI生成的SQL")
@@ -315,6 +365,22 @@ class MCPServer:
                 "method": "error"
             }
     
+    def _cache_plan(self, question: str, sql: str, ai_analysis: Dict[str, Any], sql_result: Dict[str, Any], method: str):
+        """缓存AI生成的SQL（仅缓存在真实数据库上执行成功的SQL）"""
+        if sql_result.get('method') != "database":
+            return
+        nl_query_cache.set_plan(
+            question,
+            sql,
+            chart_type=ai_analysis.get('chart_type'),
+            method=method,
+            ai_analysis=ai_analysis
+        )
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取查询缓存命中统计"""
+        return nl_query_cache.get_stats()
+    
     async def get_database_schema(self, tables: List[str] = None) -> Dict[str, Any]:
         """获取数据库Schema信息"""
         try:
@@ -354,8 +420,8 @@ class MCPServer:
             }
         }
     
-    async def generate_chart_config(self, question: str, data: List[Dict[str, Any]], chart_type: str = "auto") -> Dict[str, Any]:
-        """生成图表配置"""
+    async def generate_chart_config(self, question: str, data: Union[List[Dict[str, Any]], ColumnarData], chart_type: str = "auto") -> Dict[str, Any]:
+        """生成图表配置（data可以是字典行列表或列式数据）"""
         try:
             if chart_type == "auto":
                 chart_config = self.chart_generator.generate_config(data, question)
@@ -368,7 +434,8 @@ class MCPServer:
                 "success": True,
                 "chart_config": chart_config.to_dict(),
                 "question": question,
-                "data_points": len(data)
+                "data_points": len(data),
+                "chart_points": len(chart_config.data)
             }
             
         except Exception as e:
@@ -378,15 +445,15 @@ class MCPServer:
                 "error": str(e)
             }
     
-    async def _execute_database_query(self, sql: str, max_rows: int) -> Optional[List[Dict[str, Any]]]:
-        """执行数据库查询"""
+    async def _execute_database_query(self, sql: str, max_rows: int) -> Optional[ColumnarData]:
+        """执行数据库查询，按块读取为列式数据"""
         try:
             # 检查是否使用模拟模式
             if os.getenv('USE_MOCK_DATA', 'false').lower() == 'true':
                 return None
             
             conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor = conn.cursor()
             
             # 清理SQL语句：移除末尾分号，确保语法正确
             clean_sql = sql.strip().rstrip(';')
@@ -396,15 +463,14 @@ class MCPServer:
                 clean_sql = f"{clean_sql} LIMIT {max_rows}"
             
             cursor.execute(clean_sql)
-            results = cursor.fetchall()
             
-            # 转换为字典列表
-            data = [dict(row) for row in results]
+            # 分块读取为列式数据，不为每行构建字典
+            columns = ColumnarData.from_cursor(cursor, max_rows=max_rows)
             
             cursor.close()
             conn.close()
             
-            return data
+            return columns
             
         except Exception as e:
             logger.error(f"数据库查询失败: {e}")
@@ -414,39 +480,40 @@ class MCPServer:
             return None
     
     async def _get_database_schema_info(self, tables: List[str]) -> Optional[Dict[str, Any]]:
-        """获取数据库Schema信息"""
+        """获取数据库Schema信息（从Schema目录读取）"""
         try:
             if os.getenv('USE_MOCK_DATA', 'false').lower() == 'true':
                 return None
             
-            conn = psycopg2.connect(**self.db_config)
-            cursor = conn.cursor()
+            self.schema_catalog.ensure_fresh()
+            if not self.schema_catalog.is_loaded:
+                return None
             
             schema_info = {}
-            
             for table in tables:
-                # 获取表结构
-                cursor.execute("""
-                    SELECT column_name, data_type, is_nullable, column_default
-                    FROM information_schema.columns 
-                    WHERE table_name = %s 
-                    ORDER BY ordinal_position
-                """, (table,))
-                
-                columns = cursor.fetchall()
+                table_schema = self.schema_catalog.tables.get(table)
+                columns = table_schema["columns"] if table_schema else []
                 schema_info[table] = {
-                    "columns": {col[0]: {"type": col[1], "nullable": col[2], "default": col[3]} for col in columns}
+                    "columns": {
+                        col["name"]: {
+                            "type": col["type"],
+                            "nullable": "YES" if col["nullable"] else "NO",
+                            "default": col["default"]
+                        }
+                        for col in columns
+                    }
                 }
             
-            cursor.close()
-            conn.close()
-            
-            return {"tables": schema_info}
+            return {"tables": schema_info, "fingerprint": self.schema_catalog.fingerprint}
             
         except Exception as e:
             logger.error(f"获取数据库Schema失败: {e}")
             return None
     
+    def get_schema_status(self) -> Dict[str, Any]:
+        """获取Schema目录状态（指纹、加载时间等）"""
+        return self.schema_catalog.get_status()
+    
     def _match_query_template(self, question: str) -> Optional[Dict[str, Any]]:
         """匹配查询模板"""
         question_lower = question.lower()
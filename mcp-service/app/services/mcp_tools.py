@@ -7,6 +7,8 @@ import psycopg2
 from psycopg2.extras import RealDictCursor
 from .mcp_resources import MCPResourcesManager
 from .mcp_prompts import MCPPromptsManager
+from .schema_catalog import SchemaCatalog
+from .chart_data import ColumnarData
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +17,9 @@ class MCPTools:
     
     def __init__(self, db_config: Dict[str, Any]):
         self.db_config = db_config
-        self.resources_manager = MCPResourcesManager(db_config)
+        # Schema目录在启动时加载一次，所有schema类工具调用共享
+        self.schema_catalog = SchemaCatalog(db_config)
+        self.resources_manager = MCPResourcesManager(db_config, self.schema_catalog)
         self.prompts_manager = MCPPromptsManager()
         self.tools = self._define_tools()
     
@@ -217,77 +221,44 @@ class MCPTools:
             return {"error": f"工具执行失败: {str(e)}"}
     
     def _get_table_schema(self, table_name: str) -> Dict[str, Any]:
-        """获取表结构"""
+        """获取表结构（从Schema目录读取）"""
         try:
-            with psycopg2.connect(**self.db_config) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    # 获取字段信息
-                    cursor.execute("""
-                        SELECT column_name, data_type, is_nullable, column_default, 
-                               character_maximum_length, numeric_precision, numeric_scale
-                        FROM information_schema.columns 
-                        WHERE table_name = %s 
-                        ORDER BY ordinal_position
-                    """, (table_name,))
-                    
-                    columns = cursor.fetchall()
-                    
-                    # 获取表描述
-                    cursor.execute("""
-                        SELECT obj_description(c.oid) as table_comment
-                        FROM pg_class c
-                        JOIN pg_namespace n ON n.oid = c.relnamespace
-                        WHERE c.relname = %s AND n.nspname = 'public'
-                    """, (table_name,))
-                    
-                    table_comment = cursor.fetchone()
-                    
-                    return {
-                        "table_name": table_name,
-                        "table_comment": table_comment["table_comment"] if table_comment else None,
-                        "columns": [
-                            {
-                                "name": col["column_name"],
-                                "type": col["data_type"],
-                                "nullable": col["is_nullable"] == "YES",
-                                "default": col["column_default"],
-                                "max_length": col["character_maximum_length"],
-                                "precision": col["numeric_precision"],
-                                "scale": col["numeric_scale"]
-                            }
-                            for col in columns
-                        ],
-                        "total_columns": len(columns)
-                    }
+            table = self.schema_catalog.get_table(table_name)
+            if table is None:
+                return {"error": f"获取表结构失败: 表 {table_name} 不存在或Schema目录不可用"}
+            
+            return {
+                "table_name": table_name,
+                "table_comment": table["table_comment"],
+                "columns": [
+                    {key: value for key, value in col.items() if key != "position"}
+                    for col in table["columns"]
+                ],
+                "total_columns": table["total_columns"],
+                "schema_fingerprint": self.schema_catalog.fingerprint
+            }
         except Exception as e:
             logger.error(f"获取表结构失败: {e}")
             return {"error": f"获取表结构失败: {str(e)}"}
     
     def _list_tables(self) -> Dict[str, Any]:
-        """列出所有表"""
+        """列出所有表（从Schema目录读取）"""
         try:
-            with psycopg2.connect(**self.db_config) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                    cursor.execute("""
-                        SELECT table_name, 
-                               (SELECT COUNT(*) FROM information_schema.columns WHERE table_name = t.table_name) as column_count
-                        FROM information_schema.tables t
-                        WHERE table_schema = 'public'
-                        ORDER BY table_name
-                    """)
-                    
-                    tables = cursor.fetchall()
-                    
-                    return {
-                        "tables": [
-                            {
-                                "name": table["table_name"],
-                                "column_count": table["column_count"]
-                            }
-                            for table in tables
-                        ],
-                        "total_tables": len(tables)
+            tables = self.schema_catalog.list_tables()
+            if not self.schema_catalog.is_loaded:
+                return {"error": "列出表失败: Schema目录不可用"}
+            
+            return {
+                "tables": [
+                    {
+                        "name": table["name"],
+                        "column_count": table["column_count"]
                     }
+                    for table in tables
+                ],
+                "total_tables": len(tables),
+                "schema_fingerprint": self.schema_catalog.fingerprint
+            }
         except Exception as e:
             logger.error(f"列出表失败: {e}")
             return {"error": f"列出表失败: {str(e)}"}
@@ -300,7 +271,7 @@ class MCPTools:
                 return {"error": "SQL安全检查失败", "success": False}
             
             with psycopg2.connect(**self.db_config) as conn:
-                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                with conn.cursor() as cursor:
                     # 强制添加LIMIT子句
                     if "LIMIT" not in sql.upper():
                         sql = f"{sql} LIMIT {max_rows}"
@@ -315,10 +286,9 @@ class MCPTools:
                                 sql = re.sub(r'LIMIT\s+\d+', f'LIMIT {max_rows}', sql.upper())
                     
                     cursor.execute(sql)
-                    rows = cursor.fetchall()
                     
-                    # 转换为字典列表
-                    result = [dict(row) for row in rows]
+                    # 分块读取为列式数据后再组装行，避免逐行复制RealDictRow
+                    result = ColumnarData.from_cursor(cursor, max_rows=max_rows).to_rows()
                     
                     return {
                         "success": True,
@@ -380,21 +350,15 @@ class MCPTools:
                     cursor.execute(f"SELECT COUNT(*) as total_count FROM {table_name}")
                     total_count = cursor.fetchone()["total_count"]
                     
-                    # 获取字段信息
-                    cursor.execute("""
-                        SELECT column_name, data_type
-                        FROM information_schema.columns 
-                        WHERE table_name = %s 
-                        ORDER BY ordinal_position
-                    """, (table_name,))
-                    
-                    columns = cursor.fetchall()
+                    # 字段信息从Schema目录读取
+                    table = self.schema_catalog.get_table(table_name)
+                    columns = table["columns"] if table else []
                     
                     return {
                         "table_name": table_name,
                         "total_rows": total_count,
                         "sample_size": sample_size,
-                        "columns": [{"name": col["column_name"], "type": col["data_type"]} for col in columns],
+                        "columns": [{"name": col["name"], "type": col["type"]} for col in columns],
                         "sample_data": [dict(row) for row in sample_rows]
                     }
         except Exception as e:
@@ -0,0 +1,278 @@
+"""
+数据库Schema目录
+启动时一次性加载所有表结构并计算指纹，之后所有工具调用都从内存读取；
+只有当指纹（字段定义 + alembic版本）变化时才重新加载。
+表行数等统计会随数据变化，不放进按指纹缓存的目录，而是按较短的TTL单独缓存
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger(__name__)
+
+# 加载失败后的重试间隔（秒）
+LOAD_RETRY_INTERVAL = 30
+
+
+class SchemaCatalog:
+    """数据库Schema目录 - 内存缓存 + 指纹校验"""
+
+    def __init__(self, db_config: Dict[str, Any], check_interval: Optional[float] = None):
+        self.db_config = db_config
+        # 两次指纹校验之间的最小间隔（秒），校验本身只是一条轻量查询
+        self.check_interval = check_interval if check_interval is not None else float(
+            os.getenv("SCHEMA_CATALOG_CHECK_INTERVAL", "300")
+        )
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        self.fingerprint: Optional[str] = None
+        self.alembic_version: Optional[str] = None
+        self.loaded_at: Optional[datetime] = None
+        self._last_check = 0.0
+        self._last_load_attempt = 0.0
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[str], None]] = []
+        # 表统计（pg_stat_user_tables）的缓存时间（秒）
+        self.statistics_ttl = float(os.getenv("SCHEMA_CATALOG_STATS_TTL", "60"))
+        self._statistics: Dict[str, Dict[str, int]] = {}
+        self._statistics_at = 0.0
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """注册指纹变化回调，回调参数为新指纹"""
+        self._listeners.append(callback)
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.fingerprint is not None
+
+    # ---- 指纹 ----
+
+    def _query_fingerprint(self, cursor) -> Dict[str, Optional[str]]:
+        """计算当前数据库的schema指纹（一条聚合查询 + alembic版本）"""
+        cursor.execute("""
+            SELECT md5(COALESCE(string_agg(
+                       table_name || '.' || column_name || ':' || data_type || ':' || is_nullable,
+                       ',' ORDER BY table_name, ordinal_position), '')) AS columns_hash,
+                   to_regclass('public.alembic_version') IS NOT NULL AS has_alembic
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+        """)
+        row = cursor.fetchone()
+        alembic_version = None
+        if row["has_alembic"]:
+            cursor.execute("SELECT version_num FROM alembic_version LIMIT 1")
+            version_row = cursor.fetchone()
+            alembic_version = version_row["version_num"] if version_row else None
+
+        fingerprint = hashlib.sha1(
+            f"{row['columns_hash']}|{alembic_version or ''}".encode("utf-8")
+        ).hexdigest()[:16]
+        return {"fingerprint": fingerprint, "alembic_version": alembic_version}
+
+    # ---- 加载 ----
+
+    def load(self) -> bool:
+        """从数据库完整加载所有public表的结构"""
+        self._last_load_attempt = time.monotonic()
+        try:
+            with psycopg2.connect(**self.db_config) as conn:
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    fingerprint_info = self._query_fingerprint(cursor)
+
+                    cursor.execute("""
+                        SELECT table_name, column_name, data_type, is_nullable, column_default,
+                               character_maximum_length, numeric_precision, numeric_scale,
+                               ordinal_position
+                        FROM information_schema.columns
+                        WHERE table_schema = 'public'
+                        ORDER BY table_name, ordinal_position
+                    """)
+                    column_rows = cursor.fetchall()
+
+                    cursor.execute("""
+                        SELECT tc.table_name, kcu.column_name
+                        FROM information_schema.table_constraints tc
+                        JOIN information_schema.key_column_usage kcu
+                            ON tc.constraint_name = kcu.constraint_name
+                           AND tc.table_schema = kcu.table_schema
+                        WHERE tc.constraint_type = 'PRIMARY KEY'
+                            AND tc.table_schema = 'public'
+                        ORDER BY tc.table_name, kcu.ordinal_position
+                    """)
+                    pk_rows = cursor.fetchall()
+
+                    cursor.execute("""
+                        SELECT tablename, indexname, indexdef
+                        FROM pg_indexes
+                        WHERE schemaname = 'public'
+                    """)
+                    index_rows = cursor.fetchall()
+
+                    cursor.execute("""
+                        SELECT c.relname AS table_name, obj_description(c.oid) AS table_comment
+                        FROM pg_class c
+                        JOIN pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'public' AND c.relkind = 'r'
+                    """)
+                    comment_rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"❌ 加载Schema目录失败: {e}")
+            return False
+
+        loaded_at = datetime.now()
+        tables: Dict[str, Dict[str, Any]] = {}
+        for col in column_rows:
+            table = tables.setdefault(col["table_name"], {
+                "table_name": col["table_name"],
+                "table_comment": None,
+                "generated_at": loaded_at.isoformat(),
+                "columns": [],
+                "primary_keys": [],
+                "indexes": [],
+                "total_columns": 0
+            })
+            table["columns"].append({
+                "name": col["column_name"],
+                "type": col["data_type"],
+                "nullable": col["is_nullable"] == "YES",
+                "default": col["column_default"],
+                "max_length": col["character_maximum_length"],
+                "precision": col["numeric_precision"],
+                "scale": col["numeric_scale"],
+                "position": col["ordinal_position"]
+            })
+            table["total_columns"] += 1
+
+        for row in pk_rows:
+            if row["table_name"] in tables:
+                tables[row["table_name"]]["primary_keys"].append(row["column_name"])
+        for row in index_rows:
+            if row["tablename"] in tables:
+                tables[row["tablename"]]["indexes"].append(
+                    {"name": row["indexname"], "definition": row["indexdef"]}
+                )
+        for row in comment_rows:
+            if row["table_name"] in tables:
+                tables[row["table_name"]]["table_comment"] = row["table_comment"]
+
+        with self._lock:
+            previous = self.fingerprint
+            self.tables = tables
+            self.fingerprint = fingerprint_info["fingerprint"]
+            self.alembic_version = fingerprint_info["alembic_version"]
+            self.loaded_at = loaded_at
+            self._last_check = time.monotonic()
+
+        logger.info(f"✅ Schema目录加载完成: {len(tables)} 个表, 指纹={self.fingerprint}")
+        if previous != self.fingerprint:
+            self._notify()
+        return True
+
+    def ensure_fresh(self) -> None:
+        """确保目录可用：未加载时加载，超过校验间隔时比对指纹，变化才重新加载"""
+        if not self.is_loaded:
+            # 数据库不可用时避免每次工具调用都重试完整加载
+            if time.monotonic() - self._last_load_attempt < LOAD_RETRY_INTERVAL:
+                return
+            with self._lock:
+                if not self.is_loaded:
+                    self.load()
+            return
+
+        if time.monotonic() - self._last_check < self.check_interval:
+            return
+
+        with self._lock:
+            if time.monotonic() - self._last_check < self.check_interval:
+                return
+            self._last_check = time.monotonic()
+            try:
+                with psycopg2.connect(**self.db_config) as conn:
+                    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                        current = self._query_fingerprint(cursor)["fingerprint"]
+            except Exception as e:
+                logger.warning(f"⚠️ Schema指纹校验失败，继续使用内存中的目录: {e}")
+                return
+
+        if current != self.fingerprint:
+            logger.info(f"🔄 Schema指纹变化 {self.fingerprint} → {current}，重新加载目录")
+            self.load()
+
+    def _notify(self) -> None:
+        for callback in self._listeners:
+            try:
+                callback(self.fingerprint)
+            except Exception as e:
+                logger.error(f"Schema目录变化回调执行失败: {e}")
+
+    # ---- 表统计 ----
+
+    def _load_statistics(self) -> None:
+        """一条查询读取所有public表的统计"""
+        with psycopg2.connect(**self.db_config) as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT relname, n_tup_ins, n_tup_upd, n_tup_del, n_live_tup
+                    FROM pg_stat_user_tables
+                    WHERE schemaname = 'public'
+                """)
+                rows = cursor.fetchall()
+        self._statistics = {
+            row["relname"]: {
+                "total_rows": row["n_live_tup"],
+                "inserted_rows": row["n_tup_ins"],
+                "updated_rows": row["n_tup_upd"],
+                "deleted_rows": row["n_tup_del"]
+            }
+            for row in rows
+        }
+
+    def get_statistics(self, table_name: str) -> Dict[str, int]:
+        """获取表统计，超过 statistics_ttl 时重新查询；查询失败时沿用上一次的结果"""
+        with self._lock:
+            if time.monotonic() - self._statistics_at >= self.statistics_ttl:
+                # 失败时同样等待一个TTL再重试，避免数据库不可用时每次读取都连接
+                self._statistics_at = time.monotonic()
+                try:
+                    self._load_statistics()
+                except Exception as e:
+                    logger.warning(f"⚠️ 读取表统计失败，使用上一次的结果: {e}")
+            return dict(self._statistics.get(table_name) or {
+                "total_rows": 0,
+                "inserted_rows": 0,
+                "updated_rows": 0,
+                "deleted_rows": 0
+            })
+
+    # ---- 查询 ----
+
+    def get_table(self, table_name: str) -> Optional[Dict[str, Any]]:
+        """获取单个表的结构，不存在时返回None"""
+        self.ensure_fresh()
+        return self.tables.get(table_name)
+
+    def list_tables(self) -> List[Dict[str, Any]]:
+        """列出所有表及字段数"""
+        self.ensure_fresh()
+        return [
+            {"name": name, "column_count": table["total_columns"], "comment": table["table_comment"]}
+            for name, table in sorted(self.tables.items())
+        ]
+
+    def get_status(self) -> Dict[str, Any]:
+        """返回目录状态（指纹、加载时间、表数量）"""
+        self.ensure_fresh()
+        return {
+            "fingerprint": self.fingerprint,
+            "alembic_version": self.alembic_version,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "table_count": len(self.tables),
+            "check_interval": self.check_interval
+        }
@@ -0,0 +1,64 @@
+"""
+MCP工具并发执行
+同一轮模型回复中的多个工具调用彼此独立，放到线程池中并发执行（有并发上限），并记录每轮耗时
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+AI_TOOL_CONCURRENCY = int(os.getenv("AI_TOOL_CONCURRENCY", "4"))
+
+
+async def run_tool_calls(
+    mcp_tools,
+    calls: List[Tuple[str, Dict[str, Any]]],
+    max_concurrency: int = AI_TOOL_CONCURRENCY,
+) -> List[Any]:
+    """并发执行一组工具调用，结果顺序与 calls 一致；单个工具失败时返回错误字典"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        async with semaphore:
+            try:
+                logger.info(f"🔧 执行MCP工具: {tool_name}, 参数: {tool_args}")
+                # execute_tool 是同步的数据库调用，放到线程中避免阻塞事件循环
+                result = await asyncio.to_thread(mcp_tools.execute_tool, tool_name, tool_args)
+                logger.info(f"✅ 工具执行成功: {tool_name}")
+                return result
+            except Exception as e:
+                logger.error(f"❌ 工具执行失败: {tool_name}, 错误: {e}")
+                return {"error": f"工具执行失败: {str(e)}"}
+
+    return await asyncio.gather(*(_run(name, args) for name, args in calls))
+
+
+class TurnLatency:
+    """按轮次记录模型耗时和工具耗时（毫秒）"""
+
+    def __init__(self):
+        self.turns: List[Dict[str, Any]] = []
+
+    def add_turn(self, model_ms: float, tool_ms: float = 0.0, tool_calls: int = 0) -> None:
+        self.turns.append({
+            "turn": len(self.turns) + 1,
+            "model_ms": round(model_ms, 1),
+            "tool_ms": round(tool_ms, 1),
+            "tool_calls": tool_calls,
+        })
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": self.turns,
+            "model_ms": round(sum(t["model_ms"] for t in self.turns), 1),
+            "tool_ms": round(sum(t["tool_ms"] for t in self.turns), 1),
+        }
+
+
+def elapsed_ms(start: float) -> float:
+    """从 time.perf_counter() 起点到现在的毫秒数"""
+    return (time.perf_counter() - start) * 1000
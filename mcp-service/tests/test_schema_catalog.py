@@ -0,0 +1,29 @@
+"""Schema目录表统计缓存测试"""
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from app.services.schema_catalog import SchemaCatalog  # noqa: E402
+
+
+def test_statistics_refresh_after_ttl(monkeypatch):
+    catalog = SchemaCatalog({}, check_interval=300)
+    catalog.statistics_ttl = 60
+    now = [1000.0]
+    calls = []
+
+    def load_statistics():
+        calls.append(now[0])
+        catalog._statistics = {"asset_snapshot": {"total_rows": len(calls)}}
+
+    monkeypatch.setattr("app.services.schema_catalog.time.monotonic", lambda: now[0])
+    monkeypatch.setattr(catalog, "_load_statistics", load_statistics)
+
+    assert catalog.get_statistics("asset_snapshot") == {"total_rows": 1}
+    now[0] += 30
+    assert catalog.get_statistics("asset_snapshot") == {"total_rows": 1}
+    now[0] += 31
+    assert catalog.get_statistics("asset_snapshot") == {"total_rows": 2}
+    assert len(calls) == 2
+    # 统计不属于按指纹缓存的表结构
+    assert catalog.get_statistics("missing")["total_rows"] == 0